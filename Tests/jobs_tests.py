@@ -0,0 +1,332 @@
+# -*-coding: utf-8 -*-
+"""
+
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+
+import os
+import os
+import sys
+import time
+import shutil
+import asyncio
+import unittest
+from pycotools3 import jobs, errors
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+## stands in for qsub, sbatch, qstat and squeue. Submission runs every
+## task of the array at once. The job then stays listed for ACTIVE polls
+FAKE_SCHEDULER = '''#!{python}
+import os, re, sys, subprocess
+here = os.path.dirname(os.path.abspath(__file__))
+command = os.path.basename(sys.argv[0])
+if command in ['qsub', 'sbatch']:
+    script = sys.argv[-1]
+    with open(script) as f:
+        text = f.read()
+    with open(os.path.join(here, 'submitted'), 'a') as f:
+        f.write(text)
+    size = int(re.search(r'(?:-t |--array=)1-(\\d+)', text).group(1))
+    variable = 'SGE_TASK_ID' if command == 'qsub' else 'SLURM_ARRAY_TASK_ID'
+    for i in range(1, size + 1):
+        subprocess.check_call(['bash', script], env=dict(os.environ, **{{variable: str(i)}}))
+    print('42.1-{{}}:1'.format(size) if command == 'qsub' else '42;cluster')
+    sys.exit(0)
+polls = os.path.join(here, 'polls')
+count = int(open(polls).read()) + 1 if os.path.isfile(polls) else 1
+with open(polls, 'w') as f:
+    f.write(str(count))
+if count <= {active}:
+    if command == 'qstat':
+        print('job-ID  prior  name  user  state\\n-----\\n     42 0.5 fit user r')
+    else:
+        print('42_[2-3]')
+elif command == 'squeue':
+    sys.stderr.write('slurm_load_jobs error: Invalid job id specified')
+    sys.exit(1)
+'''
+
+FAKE_COPASISE = '''#!{python}
+import os, sys
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calls'), 'a') as f:
+    f.write(sys.argv[1] + '\\n')
+'''
+
+
+def fake_scheduler(directory, active=2):
+    """Write the fake scheduler commands and CopasiSE to `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    for name, content in [('qsub', FAKE_SCHEDULER), ('qstat', FAKE_SCHEDULER), ('sbatch', FAKE_SCHEDULER),
+                          ('squeue', FAKE_SCHEDULER), ('CopasiSE', FAKE_COPASISE)]:
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(content.format(python=sys.executable, active=active))
+        os.chmod(path, 0o755)
+
+
+class LocalExecutorTests(unittest.TestCase):
+
+    def test_exit_status(self):
+        done = jobs.LocalExecutor(max_active=2).run([
+            jobs.Job(python('pass'), name='ok'),
+            jobs.Job(python('import sys; sys.exit(3)'), name='bad'),
+        ])
+        self.assertListEqual([i.returncode for i in done], [0, 3])
+        self.assertListEqual([i.status for i in done], ['finished', 'failed'])
+
+    def test_stderr(self):
+        job, = jobs.LocalExecutor().run([jobs.Job(python('import sys; sys.stderr.write("oops")'))])
+        self.assertEqual(job.stderr, 'oops')
+        self.assertIsNone(job.stdout)
+
+    def test_capture_stdout(self):
+        job, = jobs.LocalExecutor(capture_stdout=True).run([jobs.Job(python('print("hello")'))])
+        self.assertEqual(job.stdout.strip(), 'hello')
+
+    def test_missing_program(self):
+        job, = jobs.LocalExecutor().run([jobs.Job(['/no/such/program'])])
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.returncode, 127)
+
+    def test_duration(self):
+        job, = jobs.LocalExecutor().run([jobs.Job(python('import time; time.sleep(0.2)'))])
+        self.assertGreaterEqual(job.duration, 0.2)
+
+    def test_max_active(self):
+        ## each job records when it ran. No more than two overlap
+        directory = os.path.join(os.path.dirname(__file__), 'LocalExecutor')
+        os.makedirs(directory, exist_ok=True)
+        code = 'import time, sys; s = time.time(); time.sleep(0.3); ' \
+               'open(sys.argv[1], "w").write("{} {}".format(s, time.time()))'
+        try:
+            jobs.LocalExecutor(max_active=2).run(
+                [jobs.Job(python(code) + [os.path.join(directory, str(i))]) for i in range(6)])
+            spans = [[float(j) for j in open(os.path.join(directory, str(i))).read().split()] for i in range(6)]
+        finally:
+            for i in os.listdir(directory):
+                os.remove(os.path.join(directory, i))
+            os.rmdir(directory)
+        for start, _ in spans:
+            self.assertLessEqual(sum(s <= start < e for s, e in spans), 2)
+
+    def test_children_are_reaped(self):
+        executor = jobs.LocalExecutor(max_active=4)
+        done = executor.run([jobs.Job(python('pass')) for _ in range(8)])
+        self.assertDictEqual(executor._processes, {})
+        for job in done:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(job.pid, os.WNOHANG)
+
+    def test_callback(self):
+        names = []
+        jobs.LocalExecutor().run([jobs.Job(python('pass'), name=str(i)) for i in range(3)],
+                                 callback=lambda job: names.append(job.name))
+        self.assertListEqual(sorted(names), ['0', '1', '2'])
+
+    def test_interrupt_kills_and_cancels(self):
+        executor = jobs.LocalExecutor(max_active=1)
+        todo = [jobs.Job(python('import time; time.sleep(30)')) for _ in range(3)]
+
+        def interrupt(job):
+            raise KeyboardInterrupt
+
+        todo.insert(0, jobs.Job(python('pass')))
+        start = time.time()
+        with self.assertRaises(KeyboardInterrupt):
+            executor.run(todo, callback=interrupt)
+        self.assertLess(time.time() - start, 10)
+        ## the second job may or may not have started, and been killed
+        self.assertEqual(todo[0].status, 'finished')
+        self.assertIn(todo[1].status, ['failed', 'cancelled'])
+        self.assertListEqual([i.status for i in todo[2:]], ['cancelled', 'cancelled'])
+
+    def test_summary(self):
+        done = jobs.LocalExecutor().run([jobs.Job(python('pass'), name='a')])
+        df = jobs.summary(done)
+        self.assertListEqual(list(df.index), ['a'])
+        self.assertListEqual(list(df.columns), ['status', 'returncode', 'duration', 'stderr'])
+
+
+class AsyncJobTests(unittest.TestCase):
+
+    def run_loop(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_exit_status(self):
+        done = self.run_loop(jobs.run_jobs_async([
+            jobs.Job(python('import sys; sys.stderr.write("oops")'), name='ok'),
+            jobs.Job(python('import sys; sys.exit(3)'), name='bad'),
+        ]))
+        self.assertListEqual([i.status for i in done], ['finished', 'failed'])
+        self.assertEqual(done[0].stderr, 'oops')
+        self.assertEqual(done[1].returncode, 3)
+
+    def test_capture_stdout(self):
+        job = self.run_loop(jobs.run_async(jobs.Job(python('print("hello")')), capture_stdout=True))
+        self.assertEqual(job.stdout.strip(), 'hello')
+
+    def test_missing_program(self):
+        job = self.run_loop(jobs.run_async(jobs.Job(['/no/such/program'])))
+        self.assertEqual(job.returncode, 127)
+
+    def test_timeout(self):
+        start = time.time()
+        job = self.run_loop(jobs.run_async(jobs.Job(python('import time; time.sleep(30)')), timeout=0.5))
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(job.status, 'timeout')
+        with self.assertRaises(ChildProcessError):
+            os.waitpid(job.pid, os.WNOHANG)
+
+    def test_concurrency(self):
+        todo = [jobs.Job(python('import time; time.sleep(0.3)')) for _ in range(6)]
+        self.run_loop(jobs.run_jobs_async(todo, concurrency=2))
+        spans = [(i.start_time, i.end_time) for i in todo]
+        for start, _ in spans:
+            self.assertLessEqual(sum(s <= start < e for s, e in spans), 2)
+
+    def test_overlaps_other_work(self):
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.time())
+                await asyncio.sleep(0.05)
+
+        async def both():
+            await asyncio.gather(jobs.run_async(jobs.Job(python('import time; time.sleep(0.5)'))), tick())
+
+        self.run_loop(both())
+        self.assertEqual(len(ticks), 5)
+
+    def test_cancel_kills(self):
+        todo = [jobs.Job(python('import time; time.sleep(30)')) for _ in range(3)]
+
+        async def cancel():
+            task = asyncio.ensure_future(jobs.run_jobs_async(todo, concurrency=2))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.time()
+        self.run_loop(cancel())
+        self.assertLess(time.time() - start, 10)
+        self.assertListEqual([i.status for i in todo], ['failed', 'failed', 'cancelled'])
+        for job in todo[:2]:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(job.pid, os.WNOHANG)
+
+
+class ArrayJobTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Scheduler')
+        fake_scheduler(self.directory)
+        self.copasi_files = [os.path.join(self.directory, 'copy_{}.cps'.format(i)) for i in range(3)]
+        self.script = os.path.join(self.directory, 'fit.sh')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def scheduler(self, cls, **kwargs):
+        submit, status = ('qsub', 'qstat') if cls is jobs.SGE else ('sbatch', 'squeue')
+        return cls(copasise=os.path.join(self.directory, 'CopasiSE'),
+                   submit_command=os.path.join(self.directory, submit),
+                   status_command=os.path.join(self.directory, status), **kwargs)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return f.read()
+
+    def test_sge(self):
+        job = self.scheduler(jobs.SGE).submit(self.copasi_files, self.script)
+        self.assertEqual(job.job_id, '42')
+        self.assertEqual(job.status, 'running')
+        self.assertIs(job.wait(interval=0.01), job)
+        self.assertEqual(job.status, 'finished')
+        self.assertEqual(job.polls, 3)
+        ## one submission runs every copy, in order
+        self.assertListEqual(self.read('calls').split(), self.copasi_files)
+        self.assertFalse(os.path.isfile(self.script))
+
+    def test_slurm(self):
+        job = self.scheduler(jobs.Slurm).submit(self.copasi_files, self.script)
+        self.assertEqual(job.job_id, '42')
+        job.wait(interval=0.01)
+        self.assertEqual(job.polls, 3)
+        self.assertListEqual(self.read('calls').split(), self.copasi_files)
+
+    def test_directives(self):
+        self.scheduler(jobs.SGE, max_active=2, module='COPASI/4.22').submit(self.copasi_files, self.script, name='my fit')
+        submitted = self.read('submitted')
+        self.assertIn('#$ -N my_fit', submitted)
+        self.assertIn('#$ -t 1-3', submitted)
+        self.assertIn('#$ -tc 2', submitted)
+        self.assertIn('module add COPASI/4.22', submitted)
+
+    def test_slurm_directives(self):
+        self.scheduler(jobs.Slurm, max_active=2).submit(self.copasi_files, self.script)
+        submitted = self.read('submitted')
+        self.assertIn('#SBATCH --job-name=fit', submitted)
+        self.assertIn('#SBATCH --array=1-3%2', submitted)
+
+    def test_backoff(self):
+        fake_scheduler(self.directory, active=4)
+        job = self.scheduler(jobs.SGE).submit(self.copasi_files, self.script)
+        start = time.time()
+        job.wait(interval=0.05, backoff=2, max_interval=0.1)
+        ## slept 0.05, 0.1, 0.1 and 0.1 seconds between the five polls
+        self.assertEqual(job.polls, 5)
+        self.assertGreaterEqual(time.time() - start, 0.35)
+
+    def test_timeout(self):
+        fake_scheduler(self.directory, active=100)
+        job = self.scheduler(jobs.Slurm).submit(self.copasi_files, self.script)
+        with self.assertRaises(errors.SchedulerError):
+            job.wait(interval=0.05, timeout=0.2)
+        self.assertEqual(job.status, 'running')
+
+    def test_callback(self):
+        job = self.scheduler(jobs.SGE).submit(self.copasi_files, self.script)
+        self.assertListEqual(job.wait(interval=0.01, callback=lambda job: job.copasi_files), self.copasi_files)
+
+    def test_submit_fails(self):
+        failing = os.path.join(self.directory, 'failing_qsub')
+        with open(failing, 'w') as f:
+            f.write('#!/bin/sh\necho "no queue" >&2\nexit 1\n')
+        os.chmod(failing, 0o755)
+        scheduler = jobs.SGE(submit_command=failing)
+        with self.assertRaises(errors.SchedulerError):
+            scheduler.submit(self.copasi_files, self.script)
+
+    def test_missing_command(self):
+        scheduler = jobs.Slurm(submit_command=os.path.join(self.directory, 'no_such_sbatch'))
+        with self.assertRaises(errors.SchedulerError):
+            scheduler.submit(self.copasi_files, self.script)
+
+
+if __name__ == '__main__':
+    unittest.main()
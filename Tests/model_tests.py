@@ -124,6 +124,24 @@ class ModelLevelAttributeTests(_test_base._BaseTest):
         new_model.save()
         self.assertTrue(os.path.isfile(new_filename))
 
+    def test_save_returns_same_model(self):
+        self.assertIs(self.model.save(), self.model)
+
+    def test_save_leaves_no_temp_files(self):
+        self.model.save()
+        self.assertListEqual([], glob.glob(self.copasi_file + '*.tmp'))
+
+    def test_save_to_new_file(self):
+        new_filename = os.path.join(self.model.root, 'CopasiModel2.cps')
+        self.model.save(new_filename)
+        self.assertTrue(os.path.isfile(new_filename))
+        self.assertEqual(self.model.copasi_file, new_filename)
+
+    def test_save_without_pretty_print(self):
+        self.model.save(pretty_print=False)
+        m = pycotools3.model.Model(self.copasi_file)
+        self.assertEqual(m.name, self.model.name)
+
     def test_new_model1(self):
         """
         Test building of empty new model
@@ -513,6 +531,30 @@ class GetTests(_test_base._BaseTest):
         res = self.model.get('compartment', 'nuc', by='name')
         self.assertEqual(res.name, 'nuc')
 
+    def test_get_nothing(self):
+        self.assertEqual(self.model.get('metabolite', 'not_a_metabolite', by='name'), [])
+
+    def test_get_by_simulation_type_returns_list(self):
+        res = self.model.get('metabolite', 'reactions', by='simulation_type')
+        expected = [i for i in self.model.metabolites if i.simulation_type == 'reactions']
+        self.assertListEqual(expected, res)
+
+    def test_get_after_add(self):
+        """
+        The lookup must be rebuilt when the cached metabolites change
+        :return:
+        """
+        self.model.get('metabolite', 'A', by='name')
+        metab = pycotools3.model.Metabolite(self.model, name='X', concentration=5,
+                                            compartment=self.model.compartments[0])
+        self.model.add_metabolite(metab)
+        self.assertEqual(self.model.get('metabolite', 'X', by='name').key, metab.key)
+
+    def test_contains(self):
+        self.assertTrue('A' in self.model)
+        self.assertTrue('nuc' in self.model)
+        self.assertFalse('not_a_variable' in self.model)
+
     def get_local_parameter_by_name(self):
         res = self.model.get('local_parameter', '(B2C).k1', by='name')
         self.assertEqual(res.name, '(B2C).k1')
@@ -543,6 +585,233 @@ class GetTests(_test_base._BaseTest):
         self.assertListEqual(names, [i.name for i in r.parameters])
 
 
+class ComponentIndexTests(_test_base._BaseTest):
+    """
+    Test the single pass index of the copasiML tree
+    """
+
+    def setUp(self):
+        super(ComponentIndexTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def test_one_walk(self):
+        """
+        Reading component properties should not walk the tree again
+        :return:
+        """
+        for i in ['compartments', 'metabolites', 'global_quantities',
+                  'functions', 'reactions', 'states', 'number_of_reactions']:
+            getattr(self.model, i)
+        self.assertEqual(self.model.component_index.walks, 1)
+
+    def test_find(self):
+        tag = '{http://www.copasi.org/static/schema}ListOfMetabolites'
+        self.assertEqual(self.model.component_index.find(tag).tag, tag)
+
+    def test_get_by_key(self):
+        metab = self.model.component_index.get('Metabolite_1')
+        self.assertEqual(metab.attrib['name'], 'B')
+
+    def test_add_metabolite_is_indexed(self):
+        metab = pycotools3.model.Metabolite(self.model, name='X', concentration=5,
+                                            compartment=self.model.compartments[0])
+        self.model.add_metabolite(metab)
+        self.assertIn(metab.key, self.model.component_index.keys)
+
+    def test_remove_metabolite_is_unindexed(self):
+        self.model.remove('metabolite', 'A')
+        names = [i.attrib['name'] for i in self.model.component_index.findall(
+            '{http://www.copasi.org/static/schema}Metabolite')]
+        self.assertNotIn('A', names)
+
+    def test_copy_rebuilds_index(self):
+        new_model = self.model._copy(os.path.join(self.model.root, 'CopasiModel2.cps'))
+        tag = '{http://www.copasi.org/static/schema}ListOfMetabolites'
+        self.assertIs(new_model.component_index.find(tag).getroottree().getroot(),
+                      new_model.xml)
+
+
+class StateVectorTests(_test_base._BaseTest):
+    """
+    Test the array backed model states
+    """
+
+    def setUp(self):
+        super(StateVectorTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def test_states_match_state_vector(self):
+        self.assertListEqual(list(self.model.states.items()),
+                             self.model.state_vector.items())
+
+    def test_read_by_key(self):
+        key = self.model.get('metabolite', 'A', by='name').key
+        self.assertEqual(self.model.state_vector[key], self.model.states[key])
+
+    def test_set_values_in_one_assignment(self):
+        values = list(range(len(self.model.states)))
+        self.model.state_vector.values = values
+        self.assertListEqual([float(i) for i in values],
+                             list(self.model.states.values()))
+
+    def test_wrong_number_of_states(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            self.model.states = [1, 2]
+
+    def test_append_and_remove(self):
+        sv = pycotools3.model.StateVector(['a', 'b'], [1, 2])
+        sv.append('c', 3)
+        sv.remove('a')
+        self.assertListEqual([('b', 2.0), ('c', 3.0)], sv.items())
+        self.assertEqual(sv.index('c'), 1)
+
+    def test_states_written_on_save(self):
+        values = list(range(len(self.model.states)))
+        self.model.states = values
+        self.model.save()
+        model = pycotools3.model.Model(self.copasi_file)
+        self.assertListEqual([float(i) for i in values],
+                             list(model.states.values()))
+
+
+class CacheInvalidationTests(_test_base._BaseTest):
+    """
+    Test that mutators drop only the caches they touch
+    """
+
+    def setUp(self):
+        super(CacheInvalidationTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def test_invalidate_cascades(self):
+        self.model.compartments, self.model.metabolites, self.model.reactions
+        self.model.functions
+        self.model.invalidate_cache('compartments')
+        for i in ['compartments', 'metabolites', 'reactions']:
+            self.assertNotIn(i, self.model.__dict__)
+        self.assertIn('functions', self.model.__dict__)
+
+    def test_add_metabolite_keeps_global_quantities(self):
+        self.model.global_quantities
+        metab = pycotools3.model.Metabolite(self.model, name='X', concentration=5,
+                                            compartment=self.model.compartments[0])
+        self.model.add_metabolite(metab)
+        self.assertIn('global_quantities', self.model.__dict__)
+        self.assertIn('X', [i.name for i in self.model.metabolites])
+
+    def test_add_reaction_does_not_reload(self):
+        before = os.path.getmtime(self.copasi_file)
+        model = self.model.add('reaction', name='NewReaction',
+                               expression='A -> B', rate_law='k*A')
+        self.assertIs(model, self.model)
+        self.assertEqual(before, os.path.getmtime(self.copasi_file))
+        self.assertIn('NewReaction', [i.name for i in model.reactions])
+        self.assertIn('(NewReaction).k', [i.global_name for i in model.local_parameters])
+
+    def test_set_states_refreshes_metabolites(self):
+        self.model.metabolites
+        values = [1.0] * len(self.model.states)
+        self.model.states = values
+        key = self.model.metabolites[0].key
+        self.assertEqual(float(self.model.metabolites[0].particle_numbers),
+                         self.model.states[key])
+
+
+class LazyModelTests(_test_base._BaseTest):
+    """
+    Test models opened with lazy=True
+    """
+
+    def setUp(self):
+        super(LazyModelTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        self.lazy = pycotools3.model.Model(self.copasi_file, lazy=True)
+
+    def test_header_does_not_load(self):
+        for i in ['name', 'time_unit', 'volume_unit', 'quantity_unit',
+                  'area_unit', 'length_unit', 'avagadro', 'key']:
+            self.assertEqual(getattr(self.model, i), getattr(self.lazy, i))
+        self.assertFalse(self.lazy.loaded)
+
+    def test_fit_item_order(self):
+        self.assertListEqual(self.model.fit_item_order, self.lazy.fit_item_order)
+        self.assertFalse(self.lazy.loaded)
+
+    def test_task_names(self):
+        self.assertListEqual(self.model.task_names, self.lazy.task_names)
+        self.assertIn('Time-Course', self.lazy.task_names)
+        self.assertFalse(self.lazy.loaded)
+
+    def test_components_load_tree(self):
+        self.assertListEqual([i.name for i in self.model.metabolites],
+                             [i.name for i in self.lazy.metabolites])
+        self.assertTrue(self.lazy.loaded)
+
+    def test_set_name_loads_tree(self):
+        self.lazy.name = 'NewName'
+        self.assertTrue(self.lazy.loaded)
+        self.assertEqual(self.lazy.name, 'NewName')
+
+
+class CloneTests(_test_base._BaseTest):
+    """
+    Test Model.clone
+    """
+
+    def setUp(self):
+        super(CloneTests, self).setUp()
+        self.clone_file = os.path.join(os.path.dirname(self.copasi_file), 'clone.cps')
+
+    def tearDown(self):
+        if os.path.isfile(self.clone_file):
+            os.remove(self.clone_file)
+
+    def test_clone_shares_component_tables(self):
+        metabolites = self.model.metabolites
+        clone = self.model.clone(self.clone_file)
+        ## until the clone first reads them
+        self.assertIs(clone._shared_tables['metabolites'], metabolites)
+        self.assertListEqual([str(i) for i in clone.metabolites], [str(i) for i in metabolites])
+        self.assertEqual(clone.copasi_file, self.clone_file)
+
+    def test_clone_components_belong_to_clone(self):
+        self.model.metabolites
+        self.model.reactions
+        clone = self.model.clone(self.clone_file)
+        self.assertIs(clone.metabolites[0].model, clone)
+        self.assertIs(self.model.metabolites[0].model, self.model)
+        reaction = clone.reactions[0]
+        self.assertIs(reaction.model, clone)
+        for i in reaction.substrates + reaction.products + reaction.parameters:
+            self.assertIs(i.model, clone)
+
+    def test_clone_has_own_xml(self):
+        clone = self.model.clone()
+        self.assertIsNot(clone.xml, self.model.xml)
+
+    def test_set_on_clone_does_not_change_original(self):
+        self.model.metabolites
+        clone = self.model.clone(self.clone_file)
+        clone.set('metabolite', 'A', 55, match_field='name', change_field='concentration')
+        self.assertEqual(clone.get('metabolite', 'A', by='name').concentration, 55)
+        self.assertNotEqual(self.model.get('metabolite', 'A', by='name').concentration, 55)
+        self.assertNotEqual(self.model.states, clone.states)
+
+    def test_saved_clone(self):
+        clone = self.model.clone(self.clone_file)
+        clone.set('metabolite', 'A', 55, match_field='name', change_field='concentration')
+        clone.save()
+        mod = pycotools3.model.Model(self.clone_file)
+        self.assertEqual(mod.get('metabolite', 'A', by='name').concentration, 55)
+
+    def test_clone_of_lazy_model(self):
+        lazy = pycotools3.model.Model(self.copasi_file, lazy=True)
+        clone = lazy.clone()
+        self.assertTrue(clone.loaded)
+        self.assertListEqual([i.name for i in self.model.metabolites],
+                             [i.name for i in clone.metabolites])
+
+
 class RemoveTests(_test_base._BaseTest):
     """
     Test removal of  model variables
@@ -1188,6 +1457,64 @@ class InsertParameterTests(_test_base._BaseTest):
         self.assertAlmostEqual(float(conc[0]), float(35))
 
 
+class InsertionPlanTests(_test_base._BaseTest):
+    """
+    Test the InsertionPlan class
+    """
+
+    def setUp(self):
+        super(InsertionPlanTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        self.plan = pycotools3.model.InsertionPlan(self.model, ['B', 'A2B', 'RSS'])
+
+    def test_apply_vector(self):
+        self.plan.apply([35, 597, 1.0])
+        self.assertAlmostEqual(float(self.model.get('metabolite', 'B', by='name').concentration), 35)
+        self.assertAlmostEqual(float(self.model.get('global_quantity', 'A2B', by='name').initial_value), 597)
+
+    def test_apply_many_sets(self):
+        df = pandas.DataFrame({'B': [1, 2, 3], 'A2B': [4, 5, 6], 'RSS': [0, 0, 0]})
+        for i in range(df.shape[0]):
+            self.plan.apply(df.iloc[i])
+        self.assertAlmostEqual(float(self.model.get('metabolite', 'B', by='name').concentration), 3)
+        self.assertAlmostEqual(float(self.model.get('global_quantity', 'A2B', by='name').initial_value), 6)
+
+    def test_missing_values_are_unchanged(self):
+        self.plan.apply({'B': 35})
+        self.assertAlmostEqual(float(self.model.get('global_quantity', 'A2B', by='name').initial_value), 4)
+
+    def test_metabolites_use_new_compartment_volume(self):
+        plan = pycotools3.model.InsertionPlan(self.model, ['nuc', 'B'])
+        plan.apply({'nuc': 2, 'B': 35})
+        self.assertAlmostEqual(float(self.model.get('metabolite', 'B', by='name').concentration), 35)
+        self.assertAlmostEqual(float(self.model.get('metabolite', 'A', by='name').concentration), 0.5)
+
+    def test_assignment_skipped(self):
+        plan = pycotools3.model.InsertionPlan(self.model, ['ThisIsAssignment'])
+        self.assertEqual(plan.global_quantities, [])
+
+    def test_wrong_number_of_values(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            self.plan.apply([1, 2])
+
+    def test_stale_plan(self):
+        self.model.add_metabolite('D')
+        with self.assertRaises(pycotools3.errors.InputError):
+            self.plan.apply([35, 597, 1.0])
+
+    def test_batch(self):
+        df = pandas.DataFrame({'B': [1, 2, 3], 'A2B': [4, 5, 6], 'RSS': [0, 0, 0]})
+        directory = os.path.join(os.path.dirname(self.copasi_file), 'Batch')
+        files = pycotools3.model.InsertParameters.batch(self.model, df, directory)
+        self.assertEqual(len(files), 3)
+        for i, fname in enumerate(files):
+            mod = pycotools3.model.Model(fname)
+            self.assertAlmostEqual(float(mod.get('metabolite', 'B', by='name').concentration), df['B'][i])
+            self.assertAlmostEqual(float(mod.get('global_quantity', 'A2B', by='name').initial_value), df['A2B'][i])
+        ## the model itself is unchanged
+        self.assertAlmostEqual(float(self.model.get('metabolite', 'B', by='name').concentration), 1)
+
+
 class InsertParameterTestsWithAssignments(unittest.TestCase):
     """
     May have found a bug when inserting parameters that are global
@@ -0,0 +1,685 @@
+# -*-coding: utf-8 -*-
+"""
+
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Tests for the in process simulation engine in pycotools3.native
+
+"""
+
+import os
+import shutil
+import unittest
+from unittest import mock
+import numpy
+import pandas
+import pycotools3
+from pycotools3 import native
+from Tests import _test_base
+
+EXAMPLES = os.path.join(os.path.dirname(pycotools3.__file__), 'COPASI', 'linux',
+                        'share', 'copasi', 'examples')
+
+
+class ExpressionTranslatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.translator = native.ExpressionTranslator(lambda kind, value: value)
+
+    def evaluate(self, expression, **values):
+        return eval(self.translator.translate(expression), {'numpy': numpy}, values)
+
+    def test_precedence(self):
+        self.assertAlmostEqual(self.evaluate('a+b*c^2', a=1, b=2, c=3), 19)
+
+    def test_power_is_right_associative(self):
+        self.assertAlmostEqual(self.evaluate('a^b^c', a=2, b=3, c=2), 512)
+
+    def test_unary_minus_binds_looser_than_power(self):
+        self.assertAlmostEqual(self.evaluate('-a^2', a=3), -9)
+
+    def test_if(self):
+        self.assertAlmostEqual(self.evaluate('if(a lt b, 1, 2)', a=1, b=2), 1)
+
+    def test_functions(self):
+        self.assertAlmostEqual(self.evaluate('exp(log(a))+abs(-1)', a=4), 5)
+
+    def test_unsupported_function(self):
+        with self.assertRaises(pycotools3.errors.NotImplementedError):
+            self.translator.translate('delay(a, 1)')
+
+
+class NativeSimulationTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeSimulationTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def test_same_columns_as_copasi(self):
+        native_df = self.model.simulate(0, 10, 1, engine='native', species='mg')
+        copasi_df = self.model.simulate(0, 10, 1, species='mg')
+        self.assertListEqual(list(native_df.columns), list(copasi_df.columns))
+        self.assertEqual(native_df.shape, copasi_df.shape)
+
+    def test_matches_copasi(self):
+        native_df = self.model.simulate(0, 10, 1, engine='native')
+        copasi_df = self.model.simulate(0, 10, 1)
+        numpy.testing.assert_allclose(native_df.values, copasi_df.values, rtol=1e-4, atol=1e-8)
+
+    def test_assignment(self):
+        df = self.model.simulate(0, 10, 1, engine='native', species='g')
+        numpy.testing.assert_allclose(df['ThisIsAssignment'], 13)
+
+    def test_compiled_model_is_reused(self):
+        compiled = native.compile_model(self.model)
+        self.model = self.model.set('global_quantity', 'A2B', 8, 'name', 'initial_value')
+        self.assertIs(native.compile_model(self.model), compiled)
+
+    def test_new_parameters_are_used(self):
+        df1 = self.model.simulate(0, 10, 1, engine='native')
+        self.model = self.model.set('global_quantity', 'A2B', 8, 'name', 'initial_value')
+        df2 = self.model.simulate(0, 10, 1, engine='native')
+        self.assertFalse(numpy.allclose(df1['B'], df2['B']))
+
+    def test_parameters_argument(self):
+        df1 = self.model.simulate(0, 10, 1, engine='native', parameters={'A2B': 8})
+        self.model = self.model.set('global_quantity', 'A2B', 8, 'name', 'initial_value')
+        df2 = self.model.simulate(0, 10, 1, engine='native')
+        numpy.testing.assert_allclose(df1.values, df2.values)
+
+    def test_start_time(self):
+        df = self.model.simulate(5, 10, 1, engine='native')
+        self.assertListEqual(list(df.index), [5, 6, 7, 8, 9, 10])
+
+    def test_batched_rhs(self):
+        compiled = native.compile_model(self.model)
+        y0, p, factor = compiled.values(self.model)
+        y = numpy.random.uniform(0, 1, (len(y0), 4))
+        batched = compiled.rhs(0, y, numpy.repeat(p[:, None], 4, axis=1))
+        for i in range(4):
+            numpy.testing.assert_allclose(batched[:, i], compiled.rhs(0, y[:, i], p))
+
+    def test_bad_engine(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            self.model.simulate(0, 10, 1, engine='tellurium')
+
+
+class NativeEnsembleTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeEnsembleTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        self.df = pandas.DataFrame({'A2B': [1, 2, 4, 8], 'B': [0.5, 1, 2, 4], 'RSS': [0, 0, 0, 0]})
+
+    def test_shape(self):
+        results = native.simulate_ensemble(self.model, self.df, 0, 10, 1, species='mg')
+        self.assertEqual(results.shape, (11, 4, len(self.model.get_variable_names('mg'))))
+
+    def test_matches_one_at_a_time(self):
+        results = native.simulate_ensemble(self.model, self.df, 0, 10, 1)
+        for i in range(self.df.shape[0]):
+            df = self.model.simulate(0, 10, 1, engine='native',
+                                     parameters={'A2B': self.df['A2B'][i], 'B': self.df['B'][i]})
+            numpy.testing.assert_allclose(results[:, i, :], df.values, rtol=1e-4, atol=1e-8)
+
+    def test_array_with_names(self):
+        results = native.simulate_ensemble(self.model, self.df.values, 0, 10, 1,
+                                           names=list(self.df.columns))
+        numpy.testing.assert_allclose(results, native.simulate_ensemble(self.model, self.df, 0, 10, 1))
+
+    def test_chunks_in_processes(self):
+        results = native.simulate_ensemble(self.model, self.df, 0, 10, 1, chunk_size=1, processes=2)
+        numpy.testing.assert_allclose(results, native.simulate_ensemble(self.model, self.df, 0, 10, 1),
+                                      rtol=1e-4, atol=1e-8)
+
+
+@unittest.skipIf(native.sympy is None, 'sympy is not installed')
+class JacobianTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(JacobianTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        self.compiled = native.compile_model(self.model)
+        self.y0, self.p, self.factor = self.compiled.values(self.model)
+        self.y = self.y0 + numpy.random.uniform(0.1, 1, len(self.y0))
+
+    def finite_differences(self, y):
+        step = 1e-7
+        return numpy.array([
+            (self.compiled.rhs(0, y + step * i, self.p) - self.compiled.rhs(0, y - step * i, self.p)) / (2 * step)
+            for i in numpy.eye(len(y))
+        ]).T
+
+    def test_dense(self):
+        numpy.testing.assert_allclose(self.compiled.jacobian.dense(0, self.y, self.p),
+                                      self.finite_differences(self.y), rtol=1e-5, atol=1e-8)
+
+    def test_csc(self):
+        jacobian = self.compiled.jacobian
+        numpy.testing.assert_allclose(jacobian.csc(0, self.y, self.p).toarray(), jacobian.dense(0, self.y, self.p))
+
+    def test_csc_batch(self):
+        y = numpy.array([self.y, 2 * self.y]).T
+        p = numpy.array([self.p, self.p]).T
+        batch = self.compiled.jacobian.csc_batch(0, y, p).toarray()
+        n = len(self.y)
+        numpy.testing.assert_allclose(batch[:n, :n], self.compiled.jacobian.dense(0, self.y, self.p))
+        numpy.testing.assert_allclose(batch[n:, n:], self.compiled.jacobian.dense(0, 2 * self.y, self.p))
+        self.assertEqual(abs(batch[:n, n:]).sum(), 0)
+
+    def test_banded_batch(self):
+        y = numpy.array([self.y, 2 * self.y]).T
+        p = numpy.array([self.p, self.p]).T
+        banded = self.compiled.jacobian.banded_batch(0, y, p)
+        n = len(self.y)
+        ## LSODA's packed format: banded[n - 1 + i - j, j] = jacobian[i, j]
+        self.assertEqual(banded.shape, (3 * n - 2, 2 * n))
+        dense = self.compiled.jacobian.dense(0, self.y, self.p)
+        for i in range(n):
+            for j in range(n):
+                self.assertEqual(banded[n - 1 + i - j, j], dense[i, j])
+
+    def test_derived_once_per_structure(self):
+        jacobian = self.compiled.jacobian
+        self.model = self.model.set('global_quantity', 'A2B', 8, 'name', 'initial_value')
+        self.assertIs(native.compile_model(self.model).jacobian, jacobian)
+
+    def test_same_result_as_finite_differences(self):
+        for method in ['LSODA', 'BDF', 'Radau']:
+            df1 = self.model.simulate(0, 10, 1, engine='native', method=method, jacobian=False)
+            df2 = self.model.simulate(0, 10, 1, engine='native', method=method, jacobian=True)
+            numpy.testing.assert_allclose(df1.values, df2.values, rtol=1e-4, atol=1e-8)
+
+
+@unittest.skipIf(native.sympy is None, 'sympy is not installed')
+class NativeSensitivityTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeSensitivityTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def finite_differences(self, name, value):
+        step = 1e-4 * value
+        variables = native.sensitivity_labels(self.model)[0]
+        up, down = [
+            self.model.simulate(0, 10, 1, engine='native', species='mg', parameters={name: value + i},
+                                method='BDF', relative_tolerance=1e-10, absolute_tolerance=1e-14)[variables]
+            for i in [step, -step]
+        ]
+        return (up.values - down.values) / (2 * step)
+
+    def test_shape(self):
+        variables, parameters = native.sensitivity_labels(self.model)
+        result = native.sensitivities(self.model, 0, 10, 1)
+        self.assertEqual(result.shape, (11, len(variables), len(parameters)))
+
+    def test_no_assignments(self):
+        variables, parameters = native.sensitivity_labels(self.model)
+        self.assertNotIn('ThisIsAssignment', variables + parameters)
+
+    def test_same_result_as_finite_differences(self):
+        for method in ['LSODA', 'BDF', 'Radau']:
+            result = native.sensitivities(self.model, 0, 10, 1, ['A2B'], method=method,
+                                          relative_tolerance=1e-8, absolute_tolerance=1e-14)
+            numpy.testing.assert_allclose(result[:, :, 0], self.finite_differences('A2B', 4),
+                                          rtol=1e-4, atol=1e-6)
+
+    def test_initial_concentration(self):
+        result = native.sensitivities(self.model, 0, 10, 1, ['A'], relative_tolerance=1e-8,
+                                      absolute_tolerance=1e-14)
+        numpy.testing.assert_allclose(result[:, :, 0], self.finite_differences('A', 1),
+                                      rtol=1e-4, atol=1e-6)
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            native.sensitivities(self.model, 0, 10, 1, ['not_a_parameter'])
+
+
+class NativeSteadyStateTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeSteadyStateTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        ## a closed cycle: A + B + C is conserved
+        self.closed_file = os.path.join(os.path.dirname(__file__), 'closed_model.cps')
+        closed = """
+            model closed_model()
+                compartment nuc = 2;
+                species A in nuc, B in nuc, C in nuc;
+                R1: A => B; nuc*kAtoB*A;
+                R2: B -> C; nuc*(kBtoC*B - kCtoB*C);
+                R3: C => A; nuc*kCtoA*C;
+                A = 1; B = 1; C = 1;
+                kAtoB = 4; kBtoC = 9; kCtoB = 0.1; kCtoA = 0.1;
+            end
+            """
+        with pycotools3.model.BuildAntimony(self.closed_file) as loader:
+            self.closed = loader.load(closed)
+
+    def tearDown(self):
+        super(NativeSteadyStateTests, self).tearDown()
+        if os.path.isfile(self.closed_file):
+            os.remove(self.closed_file)
+
+    def test_degraded_to_zero(self):
+        steady_state = native.steady_state(self.model)
+        numpy.testing.assert_allclose(steady_state[['A', 'B', 'C']].values, 0, atol=1e-9)
+        self.assertAlmostEqual(steady_state['ThisIsAssignment'], 13)
+
+    def test_conservation_laws(self):
+        self.assertEqual(native.compile_model(self.model).conservation_laws.shape, (0, 3))
+        compiled = native.compile_model(self.closed)
+        self.assertEqual(compiled.conservation_laws.shape, (1, 3))
+        numpy.testing.assert_allclose(compiled.conservation_laws.dot(compiled.stoichiometry), 0, atol=1e-12)
+
+    def test_conserved_total(self):
+        steady_state = native.steady_state(self.closed)
+        self.assertAlmostEqual(steady_state[['A', 'B', 'C']].sum(), 3)
+        compiled = native.compile_model(self.closed)
+        y0, p, factor = compiled.values(self.closed)
+        y = steady_state[compiled.state_names].values
+        numpy.testing.assert_allclose(compiled.rhs(0, y, p, factor), 0, atol=1e-9)
+
+    def test_same_as_long_time_course(self):
+        steady_state = native.steady_state(self.closed)
+        df = self.closed.simulate(0, 1000, 1000, engine='native', relative_tolerance=1e-10)
+        numpy.testing.assert_allclose(steady_state[['A', 'B', 'C']].values,
+                                      df[['A', 'B', 'C']].iloc[-1].values, rtol=1e-6)
+
+    def test_bad_guess(self):
+        compiled = native.compile_model(self.closed)
+        y0, p, factor = compiled.values(self.closed)
+        y, converged = compiled.steady_state(y0, p, factor, guess=numpy.array([100.0, 0.0, 0.0]))
+        self.assertTrue(converged)
+        self.assertAlmostEqual(y.sum(), 3)
+
+    def test_scan(self):
+        df = pandas.DataFrame({'kAtoB': numpy.linspace(1, 10, 10), 'A': 2},
+                              index=['set{}'.format(i) for i in range(10)])
+        scan = native.steady_state_scan(self.closed, df, species='m')
+        self.assertListEqual(list(scan.index), list(df.index))
+        self.assertListEqual(list(scan.columns), ['A', 'B', 'C'])
+        for i in df.index:
+            steady_state = native.steady_state(self.closed, species='m', parameters=df.loc[i].to_dict())
+            numpy.testing.assert_allclose(scan.loc[i].values, steady_state.values, rtol=1e-6)
+            self.assertAlmostEqual(steady_state.sum(), 4)
+
+
+class NativeStochasticTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeStochasticTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+        factor = native.compile_model(self.model).values(self.model)[2]
+        ## 100 particles of each species and no reverse reaction
+        self.parameters = {'A': 100 / factor, 'B': 100 / factor, 'C': 100 / factor, 'B2C_0_k2': 0}
+
+    def simulate(self, **kwargs):
+        return native.simulate_stochastic(self.model, 0, 5, 0.5, parameters=self.parameters,
+                                          quantity_type='particle_numbers', **kwargs)
+
+    def test_shape(self):
+        self.assertEqual(self.simulate(realisations=7).shape, (11, 7, 3))
+
+    def test_whole_particles(self):
+        result = self.simulate(realisations=7)
+        numpy.testing.assert_array_equal(result, numpy.round(result))
+        numpy.testing.assert_array_equal(result[0], 100)
+
+    def test_reproducible(self):
+        numpy.testing.assert_array_equal(self.simulate(realisations=7, seed=3), self.simulate(realisations=7, seed=3))
+        self.assertFalse(numpy.array_equal(self.simulate(realisations=7, seed=3), self.simulate(realisations=7, seed=4)))
+
+    def test_independent_of_chunks(self):
+        numpy.testing.assert_array_equal(self.simulate(realisations=10),
+                                         self.simulate(realisations=20, chunk_size=3)[:, :10])
+
+    def test_mean_is_deterministic_solution(self):
+        ## every reaction is first order so the mean obeys the ODEs
+        df = self.model.simulate(0, 5, 0.5, engine='native', parameters={'A': 100, 'B': 100, 'C': 100,
+                                                                         'B2C_0_k2': 0})
+        result = self.simulate(realisations=2000)
+        error = result.std(axis=1) / numpy.sqrt(2000)
+        self.assertTrue(numpy.all(numpy.abs(result.mean(axis=1) - df.values) <= 6 * error + 1e-9))
+        ## leaps are approximate
+        result = self.simulate(realisations=2000, method='tau_leap')
+        numpy.testing.assert_allclose(result.mean(axis=1), df.values, rtol=0.05, atol=1)
+
+    def test_summary(self):
+        df = self.simulate(realisations=20, summary=['mean', 'std', 0.5])
+        self.assertEqual(df.shape, (11, 9))
+        self.assertListEqual(list(df.columns.get_level_values(0).unique()), ['mean', 'std', 0.5])
+        numpy.testing.assert_allclose(df['mean'].values, self.simulate(realisations=20).mean(axis=1))
+
+    def test_bad_method(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            self.simulate(method='euler')
+
+    def test_rounding_fires_a_channel_with_propensity(self):
+        compiled = native.compile_model(self.model)
+        y0, p, factor = compiled.values(self.model)
+        X0 = numpy.full((1, len(y0)), 100.0)
+        ## nothing left for the last channel to consume
+        X0[0, compiled.channel_stoichiometry[:, -1] < 0] = 0
+
+        def uniforms(keys, counters, draws):
+            ## a choice above the cumulative sum of the propensities
+            return numpy.column_stack([numpy.full(len(keys), 0.5), numpy.full(len(keys), 1 + 1e-12)])
+
+        with mock.patch.object(native, '_uniforms', uniforms):
+            result = compiled.stochastic(X0, p[None, :], numpy.array([0.0, 1.0]), factor)
+        self.assertTrue(numpy.all(result >= 0))
+
+
+@unittest.skipIf(native.sympy is None, 'sympy is not installed')
+class NativeDimerisationTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(NativeDimerisationTests, self).setUp()
+        self.dimer_file = os.path.join(os.path.dirname(__file__), 'dimer_model.cps')
+        dimer = """
+            model dimer_model()
+                compartment cell = 1;
+                species A in cell, B in cell;
+                R1: 2 A -> B; cell*(k1*A*A - k2*B);
+                A = 1; B = 0;
+                k1 = 1; k2 = 1;
+            end
+            """
+        with pycotools3.model.BuildAntimony(self.dimer_file) as loader:
+            self.dimer = loader.load(dimer)
+        self.compiled = native.compile_model(self.dimer)
+        self.factor = self.compiled.values(self.dimer)[2]
+
+    def tearDown(self):
+        super(NativeDimerisationTests, self).tearDown()
+        if os.path.isfile(self.dimer_file):
+            os.remove(self.dimer_file)
+
+    def test_split_into_forward_and_backward(self):
+        numpy.testing.assert_array_equal(self.compiled.channel_stoichiometry, [[-2, 2], [1, -1]])
+
+    def test_stationary_mean(self):
+        ## 10 particles of A and c1 = 0.2 per pair of them
+        total, c1, k2 = 10, 0.2, 1.0
+        parameters = {'A': total / self.factor, 'B': 0, 'k1': c1 * self.factor, 'k2': k2}
+        result = native.simulate_stochastic(self.dimer, 0, 20, 5, realisations=2000, parameters=parameters,
+                                            quantity_type='particle_numbers')
+        ## detailed balance: p(b + 1) k2 (b + 1) = p(b) c1 a (a - 1) with a = total - 2b
+        weights = [1.0]
+        for b in range(total // 2):
+            a = total - 2 * b
+            weights.append(weights[-1] * c1 * a * (a - 1) / (k2 * (b + 1)))
+        weights = numpy.array(weights) / sum(weights)
+        a = total - 2 * numpy.arange(len(weights))
+        exact = weights.dot(a)
+        error = numpy.sqrt(weights.dot(a ** 2) - exact ** 2) / numpy.sqrt(2000)
+        ## without the X(X-1) correction the mean is 3.59 instead of 4.00
+        self.assertLess(abs(result[1:, :, 0].mean() - exact), 4 * error)
+
+
+class _ObjectiveTest(_test_base._BaseTest):
+    """Writes a time course experiment and one with an independent variable"""
+
+    def setUp(self):
+        super(_ObjectiveTest, self).setUp()
+        self.timecourse = os.path.join(os.path.dirname(__file__), 'objective_timecourse.txt')
+        self.independent = os.path.join(os.path.dirname(__file__), 'objective_independent.txt')
+        df = native.simulate(self.model, 0, 10, 1)
+        df[['A', 'B']].to_csv(self.timecourse, sep='\t')
+        ## an experiment started from A = 5
+        df = native.simulate(self.model, 0, 10, 2, parameters={'A': 5})[['C']]
+        df.insert(0, 'A_indep', 5.0)
+        df.to_csv(self.independent, sep='\t')
+        self.config = self.configure()
+        self.objective = native.Objective(self.config)
+
+    def configure(self, **settings):
+        settings.update(working_directory=os.path.dirname(__file__), weight_method='mean_squared')
+        return pycotools3.tasks.ParameterEstimation.Config(
+            models={'model1': {'copasi_file': self.copasi_file}},
+            datasets={'experiments': {'timecourse': {'filename': self.timecourse},
+                                      'independent': {'filename': self.independent}}},
+            items={'fit_items': {'A2B': {'lower_bound': 0.1, 'upper_bound': 100},
+                                 'B2C': {'lower_bound': 0.1, 'upper_bound': 100},
+                                 'C2A_k1': {'affected_experiments': 'timecourse',
+                                            'lower_bound': 0.01, 'upper_bound': 10}}},
+            settings=settings
+        )
+
+
+class NativeObjectiveTests(_ObjectiveTest):
+
+    def test_experiments(self):
+        self.assertListEqual([i.name for i in self.objective.experiments], ['timecourse', 'independent'])
+        timecourse, independent = self.objective.experiments
+        self.assertListEqual(timecourse.dependents, ['A', 'B'])
+        self.assertListEqual(independent.dependents, ['C'])
+        self.assertListEqual(independent.independents, ['A'])
+
+    def test_zero_at_true_parameters(self):
+        rss = self.objective(numpy.array([[4, 9, 0.1]]))
+        self.assertEqual(rss.shape, (1,))
+        self.assertLess(rss[0], 1e-8)
+
+    def test_independent_variables(self):
+        ## without the independent A of 5 the second experiment would not fit
+        result = self.objective.evaluate(numpy.array([[4, 9, 0.1]]))
+        self.assertLess(result['experiments'].loc[0, 'independent'], 1e-8)
+
+    def test_affected_experiments(self):
+        result = self.objective.evaluate(numpy.array([[4, 9, 0.1], [4, 9, 1]]))
+        self.assertLess(result['experiments'].loc[1, 'independent'], 1e-8)
+        self.assertGreater(result['experiments'].loc[1, 'timecourse'], 1e-3)
+
+    def test_parts_sum_to_rss(self):
+        parameters = numpy.random.RandomState(0).uniform(0.1, 10, (5, 3))
+        result = self.objective.evaluate(parameters)
+        numpy.testing.assert_allclose(result['RSS'].values, self.objective(parameters))
+        numpy.testing.assert_allclose(result['observables'].sum(axis=1).values, result['RSS'].values)
+        numpy.testing.assert_allclose(result['observables']['timecourse'].sum(axis=1).values,
+                                      result['experiments']['timecourse'].values)
+        self.assertEqual(result['residuals']['timecourse'].shape, (5, 11, 2))
+        numpy.testing.assert_allclose((result['residuals']['timecourse'] ** 2).sum(axis=(1, 2)),
+                                      result['experiments']['timecourse'].values)
+
+    def test_data_frame(self):
+        ## like parse output, with an RSS column and a fit item missing
+        df = pandas.DataFrame({'RSS': [1, 2], 'A2B': [4, 5], 'B2C': [9, 9]}, index=['a', 'b'])
+        result = self.objective.evaluate(df)
+        self.assertListEqual(list(result['RSS'].index), ['a', 'b'])
+        numpy.testing.assert_allclose(result['RSS'].values, self.objective(numpy.array([[4, 9, 0.1], [5, 9, 0.1]])))
+
+    def test_weights(self):
+        data = numpy.array([[1.0, 10.0], [3.0, numpy.nan]])
+        weights, scale = native.experiment_weights(data, 'mean_squared')
+        numpy.testing.assert_allclose(weights, [1, 5 / 100.0])
+        numpy.testing.assert_array_equal(scale, 1)
+        weights, scale = native.experiment_weights(data, 'mean_squared', normalize=False)
+        numpy.testing.assert_allclose(weights, [1 / 5.0, 1 / 100.0])
+        weights, scale = native.experiment_weights(data, 'value_scaling')
+        numpy.testing.assert_array_equal(weights, 1)
+        numpy.testing.assert_allclose(scale[0], [1, 10])
+
+    def test_weight_method(self):
+        config = self.configure()
+        config.settings.weight_method = 'standard_deviation'
+        objective = native.Objective(config)
+        with self.assertRaises(pycotools3.errors.InputError):
+            native.experiment_weights(numpy.ones((2, 2)), 'median')
+        self.assertFalse(numpy.allclose(objective.experiments[0].weights, self.objective.experiments[0].weights))
+
+
+class NativeEstimationTests(_ObjectiveTest):
+
+    def test_start_values(self):
+        starts = native.start_values(self.objective, 3)
+        self.assertEqual(starts.shape, (3, 3))
+        numpy.testing.assert_allclose(starts[0], [4, 9, 0.1])
+        starts = native.start_values(self.objective, 100, randomize=True)
+        bounds = self.objective.bounds
+        self.assertTrue(numpy.all((starts >= bounds[:, 0]) & (starts <= bounds[:, 1])))
+        self.assertEqual(len(numpy.unique(starts[:, 0])), 100)
+
+    def test_least_squares(self):
+        starts = native.start_values(self.objective, 2, randomize=True, seed=1)
+        df = native.estimate(self.objective, 'levenberg_marquardt', starts)
+        self.assertListEqual(list(df.columns), ['A2B', 'B2C', 'C2A_k1', 'RSS'])
+        self.assertEqual(df.shape[0], 2)
+        self.assertTrue(df['RSS'].is_monotonic_increasing)
+        numpy.testing.assert_allclose(df.loc[0, ['A2B', 'B2C', 'C2A_k1']].values.astype(float),
+                                      [4, 9, 0.1], rtol=1e-3)
+
+    def test_differential_evolution(self):
+        df = native.estimate(self.objective, 'differential_evolution', population_size=15,
+                             number_of_generations=5)
+        self.assertLess(df.loc[0, 'RSS'], self.objective(native.start_values(self.objective,
+                                                                             randomize=True))[0])
+
+    def test_genetic_algorithm(self):
+        start = native.start_values(self.objective, randomize=True)
+        df = native.estimate(self.objective, 'genetic_algorithm', start, population_size=10,
+                             number_of_generations=5)
+        ## the start is part of the first generation and the best survives
+        self.assertLessEqual(df.loc[0, 'RSS'], self.objective(start)[0])
+
+    def test_particle_swarm(self):
+        start = native.start_values(self.objective, randomize=True)
+        df = native.estimate(self.objective, 'particle_swarm', start, swarm_size=10, iteration_limit=5)
+        self.assertLessEqual(df.loc[0, 'RSS'], self.objective(start)[0])
+
+    def test_population_split_over_processes(self):
+        start = native.start_values(self.objective, randomize=True)
+        for method in ['genetic_algorithm', 'particle_swarm', 'differential_evolution']:
+            serial = native.estimate(self.objective, method, start, population_size=8, swarm_size=8,
+                                     number_of_generations=3, iteration_limit=3)
+            pool = native.estimate(self.objective, method, start, population_size=8, swarm_size=8,
+                                   number_of_generations=3, iteration_limit=3, processes=2)
+            pandas.testing.assert_frame_equal(serial, pool)
+
+    def test_processes(self):
+        starts = native.start_values(self.objective, 4, randomize=True, seed=2)
+        serial = native.estimate(self.objective, 'nelder_mead', starts, iteration_limit=5)
+        pool = native.estimate(self.objective, 'nelder_mead', starts, iteration_limit=5, processes=2)
+        pandas.testing.assert_frame_equal(serial, pool)
+
+    def test_unavailable_method(self):
+        with self.assertRaises(pycotools3.errors.InputError):
+            native.estimate(self.objective, 'scatter_search')
+
+    def test_parameter_estimation(self):
+        config = self.configure(engine='native', method='levenberg_marquardt', run_mode=True,
+                                copy_number=2, pe_number=2, randomize_start_values=True)
+        pe = pycotools3.tasks.ParameterEstimation(config)
+        self.assertEqual(pe.results['model1'].shape, (4, 4))
+        data = pycotools3.viz.Parse(pe).data['model1']
+        numpy.testing.assert_allclose(data['RSS'].values, pe.results['model1']['RSS'].values)
+
+
+class StoichiometryTests(_test_base._BaseTest):
+
+    def setUp(self):
+        super(StoichiometryTests, self).setUp()
+        self.model = pycotools3.model.Model(self.copasi_file)
+
+    def test_matrix(self):
+        stoichiometry = self.model.stoichiometry_matrix
+        self.assertListEqual(list(stoichiometry.species), ['A', 'B', 'C'])
+        self.assertListEqual(list(stoichiometry.reactions), ['A2B_0', 'B2C_0', 'C2A', 'ADeg'])
+        expected = [[-1, 0, 1, -1],
+                    [1, -1, 0, 0],
+                    [0, 1, -1, 0]]
+        numpy.testing.assert_array_equal(stoichiometry.matrix.toarray(), expected)
+        self.assertEqual(stoichiometry.to_df().loc['A', 'ADeg'], -1)
+
+    def test_same_as_compiled_model(self):
+        stoichiometry = self.model.stoichiometry_matrix
+        compiled = native.compile_model(self.model)
+        rows = [compiled.state_names.index(i) for i in stoichiometry.species]
+        numpy.testing.assert_array_equal(stoichiometry.matrix.toarray(), compiled.stoichiometry[rows])
+
+    def test_no_conservation_laws(self):
+        laws = self.model.conservation_laws()
+        self.assertListEqual(laws.dependent, [])
+        self.assertListEqual(sorted(laws.independent), ['A', 'B', 'C'])
+        numpy.testing.assert_array_equal(laws.link_matrix.toarray(), numpy.eye(3))
+
+    def test_closed_cycle(self):
+        ## without degradation A + B + C is conserved
+        matrix = self.model.stoichiometry_matrix.matrix[:, :3]
+        stoichiometry = native.Stoichiometry(matrix, self.model.stoichiometry_matrix.species,
+                                             {'A2B_0': 0, 'B2C_0': 1, 'C2A': 2})
+        laws = stoichiometry.conservation_laws()
+        self.assertEqual(len(laws.dependent), 1)
+        self.assertEqual(len(laws.independent), 2)
+        numpy.testing.assert_allclose(laws.conservation_matrix.toarray(), [[1, 1, 1]])
+        numpy.testing.assert_allclose(laws.conservation_matrix.dot(matrix).toarray(), 0)
+        numpy.testing.assert_allclose(laws.link_matrix.dot(laws.reduced_stoichiometry).toarray(),
+                                      matrix.toarray())
+        numpy.testing.assert_allclose(laws.totals(numpy.array([1.0, 2.0, 3.0])), [6])
+
+    def test_long_chain(self):
+        ## a closed chain of 10000 species has one law, the total
+        n = 10000
+        rows = numpy.concatenate([numpy.arange(n - 1), numpy.arange(1, n)])
+        columns = numpy.concatenate([numpy.arange(n - 1), numpy.arange(n - 1)])
+        values = numpy.concatenate([-numpy.ones(n - 1), numpy.ones(n - 1)])
+        matrix = native.sparse.csr_matrix((values, (rows, columns)), shape=(n, n - 1))
+        independent, dependent, laws = native._conservation_laws(matrix)
+        self.assertEqual(len(independent), n - 1)
+        self.assertEqual(len(laws), 1)
+        self.assertEqual(len(laws[0]), n)
+        numpy.testing.assert_allclose(list(laws[0].values()), 1)
+
+
+@unittest.skipUnless(os.path.isfile(pycotools3.tasks.COPASISE), 'CopasiSE is not available')
+class NativeExampleTests(unittest.TestCase):
+    """
+    Compare against CopasiSE on the example models shipped with COPASI
+    """
+
+    def setUp(self):
+        self.directory = os.path.join(os.path.dirname(__file__), 'NativeExamples')
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compare(self, name, stop, by):
+        copasi_file = os.path.join(self.directory, name)
+        shutil.copy(os.path.join(EXAMPLES, name), copasi_file)
+        mod = pycotools3.model.Model(copasi_file)
+        native_df = mod.simulate(0, stop, by, engine='native')
+        copasi_df = mod.simulate(0, stop, by)
+        numpy.testing.assert_allclose(native_df.values, copasi_df.values, rtol=1e-3, atol=1e-6)
+
+    def test_brusselator(self):
+        self.compare('brusselator.cps', 10, 1)
+
+    def test_circadian_clock(self):
+        self.compare('CircadianClock.cps', 50, 1)
+
+    def test_mapk(self):
+        self.compare('MAPK-HF96-layout.cps', 100, 1)
+
+    def test_dimeric_mwc_stiff(self):
+        self.compare('DimericMWC-stiff.cps', 10, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,10 +32,13 @@ import os
 import pandas
 import re
 from Tests import _test_base
+from Tests.jobs_tests import fake_scheduler
 from pycotools3.tasks import ParameterEstimation
 from pycotools3.utils import DotDict
 import glob
 import time
+import json
+import shutil
 from io import StringIO
 
 
@@ -2280,5 +2283,151 @@ class CrossValidationContextTests(_test_base._BaseTest):
         # self.assertLess(data.loc['3_0', 0]['RSS'], data.loc['3_1', 0]['RSS'])
 
 
+class _ManifestTestBase(_test_base._BaseTest):
+    def setUp(self):
+        super(_ManifestTestBase, self).setUp()
+        ## reports left by other tests
+        shutil.rmtree(os.path.join(os.path.dirname(__file__), 'Problem1'), ignore_errors=True)
+        self.data_file = os.path.join(os.path.dirname(__file__), 'resume_data.txt')
+        pandas.DataFrame(
+            {'Time': [0, 1, 2], 'A': [1, 0.5, 0.25], 'B': [0, 0.4, 0.6]}
+        ).to_csv(self.data_file, sep='\t', index=False)
+
+    def config(self, **settings):
+        defaults = dict(
+            copy_number=3,
+            pe_number=2,
+            working_directory=os.path.dirname(__file__),
+            run_mode=False,
+        )
+        defaults.update(settings)
+        return ParameterEstimation.Config(
+            models={'model1': {'copasi_file': self.model.copasi_file}},
+            datasets={'experiments': {'report1': {'filename': self.data_file}}},
+            items={'fit_items': {'A': {}, 'B': {}}},
+            settings=defaults
+        )
+
+    def write_report(self, pe, copy_number, content):
+        with open(pe._enumerate_output()['model1'][copy_number], 'w') as f:
+            f.write(content)
+
+
+class ResumeTests(_ManifestTestBase):
+
+    def test_report_states(self):
+        pe = ParameterEstimation(self.config())
+        self.write_report(pe, 0, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        self.write_report(pe, 1, 'title\n(\t1\t2\t)\t0.5\n(\t3\t')
+        self.write_report(pe, 2, 'title\n')
+        self.assertDictEqual(
+            {'model1': {0: 'finished', 1: 'partial', 2: 'empty'}},
+            pe.report_states()
+        )
+
+    def test_report_states_missing(self):
+        pe = ParameterEstimation(self.config())
+        self.assertEqual('missing', pe.report_states()['model1'][0])
+
+    def test_report_too_short_is_partial(self):
+        pe = ParameterEstimation(self.config())
+        self.write_report(pe, 0, 'title\n(\t1\t2\t)\t0.5\n')
+        self.assertEqual('partial', pe.report_states()['model1'][0])
+
+    def test_manifest(self):
+        pe = ParameterEstimation(self.config())
+        with open(pe.manifest_file) as f:
+            manifest = json.load(f)
+        copies = manifest['copies']['model1']
+        self.assertEqual(['0', '1', '2'], sorted(copies))
+        self.assertEqual(pe.model_copies['model1'][1].copasi_file, copies['1']['copasi_file'])
+        self.assertEqual(['configured'], [i[0] for i in copies['1']['history']])
+
+    def test_fits_have_their_own_manifest(self):
+        pe1 = ParameterEstimation(self.config())
+        pe2 = ParameterEstimation(self.config(fit=2))
+        self.assertNotEqual(pe1.manifest_file, pe2.manifest_file)
+        ## writing one fit leaves the other alone
+        pe1._record('model1', 0, pe1.RUNNING)
+        with open(pe2.manifest_file) as f:
+            self.assertEqual('configured', json.load(f)['copies']['model1']['0']['state'])
+        with open(pe1.manifest_file) as f:
+            self.assertEqual('running', json.load(f)['copies']['model1']['0']['state'])
+
+    def test_resume_reuses_copies(self):
+        pe = ParameterEstimation(self.config())
+        copasi_file = pe.model_copies['model1'][2].copasi_file
+        mtime = os.path.getmtime(copasi_file)
+        self.write_report(pe, 2, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        time.sleep(0.01)
+        pe = ParameterEstimation(self.config(resume=True, max_active=2))
+        self.assertEqual(copasi_file, pe.model_copies['model1'][2].copasi_file)
+        self.assertEqual(mtime, os.path.getmtime(copasi_file))
+        self.assertEqual('finished', pe.manifest['copies']['model1']['2']['state'])
+        self.assertEqual('missing', pe.manifest['copies']['model1']['0']['state'])
+
+    def test_resume_does_not_run_finished_copies(self):
+        pe = ParameterEstimation(self.config())
+        for i in range(3):
+            self.write_report(pe, i, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        ## nothing to run so CopasiSE is never called
+        pe = ParameterEstimation(self.config(resume=True, run_mode=True))
+        self.assertEqual(
+            ['configured', 'finished'],
+            [i[0] for i in pe.manifest['copies']['model1']['0']['history']]
+        )
+
+    def test_changed_configuration_is_not_resumed(self):
+        pe = ParameterEstimation(self.config())
+        self.write_report(pe, 0, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        pe = ParameterEstimation(self.config(resume=True, pe_number=3))
+        self.assertEqual('configured', pe.manifest['copies']['model1']['0']['state'])
+
+    def test_changed_model_is_not_resumed(self):
+        pe = ParameterEstimation(self.config())
+        for i in range(3):
+            self.write_report(pe, i, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        mod = pycotools3.model.Model(self.model.copasi_file)
+        mod = mod.set('global_quantity', 'A2B', 8, 'name', 'initial_value')
+        mod.save()
+        pe = ParameterEstimation(self.config(resume=True))
+        self.assertEqual({'model1': [0, 1, 2]}, pe._pending(pe.model_copies))
+
+
+class ArrayJobTests(_ManifestTestBase):
+    def setUp(self):
+        super(ArrayJobTests, self).setUp()
+        self.directory = os.path.join(os.path.dirname(__file__), 'Scheduler')
+        fake_scheduler(self.directory, active=1)
+        self.scheduler = pycotools3.jobs.SGE(
+            copasise=os.path.join(self.directory, 'CopasiSE'),
+            submit_command=os.path.join(self.directory, 'qsub'),
+            status_command=os.path.join(self.directory, 'qstat')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_one_array_job_for_all_copies(self):
+        pe = ParameterEstimation(self.config(run_mode='sge'), scheduler=self.scheduler)
+        with open(os.path.join(self.directory, 'submitted')) as f:
+            self.assertIn('#$ -t 1-3', f.read())
+        with open(os.path.join(self.directory, 'calls')) as f:
+            self.assertListEqual(
+                [os.path.abspath(pe.model_copies['model1'][i].copasi_file) for i in range(3)],
+                f.read().split()
+            )
+        self.assertEqual('running', pe.manifest['copies']['model1']['1']['state'])
+
+    def test_wait_parses_results(self):
+        pe = ParameterEstimation(self.config(run_mode='sge'), scheduler=self.scheduler)
+        for i in range(3):
+            self.write_report(pe, i, 'title\n(\t1\t2\t)\t0.5\n(\t3\t4\t)\t0.6\n')
+        data = pe.wait(interval=0.01)
+        self.assertEqual(2, pe.array_job.polls)
+        self.assertEqual('finished', pe.manifest['copies']['model1']['2']['state'])
+        self.assertCountEqual(['A', 'B', 'RSS'], data.data['model1'].columns)
+
+
 if __name__ == '__main__':
     unittest.main()
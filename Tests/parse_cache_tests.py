@@ -0,0 +1,92 @@
+# -*-coding: utf-8 -*-
+"""
+
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+
+import os
+import shutil
+import unittest
+import pycotools3
+from pycotools3.parse_cache import ParseCache
+from Tests import _test_base
+
+
+class ParseCacheTests(_test_base._BaseTest):
+    def setUp(self):
+        super(ParseCacheTests, self).setUp()
+        self.cache_dir = os.path.join(os.path.dirname(__file__), 'ParseCache')
+        self.cache = ParseCache(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_miss_then_hit(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_hit_gives_same_components(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        mod = pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        for i in ['compartments', 'metabolites', 'global_quantities', 'reactions']:
+            self.assertListEqual([str(j) for j in getattr(self.model, i)],
+                                 [str(j) for j in getattr(mod, i)])
+
+    def test_components_belong_to_new_model(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        mod = pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.assertIs(mod.metabolites[0].model, mod)
+
+    def test_hit_does_not_index_tree(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        mod = pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.assertIsNone(mod._component_index)
+        self.assertListEqual(list(self.model.states), list(mod.states))
+
+    def test_changed_file_misses(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.model.name = 'ChangedName'
+        self.model.save()
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_corrupt_entry_falls_back(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        for path, _, _ in self.cache.entries():
+            with open(path, 'wb') as f:
+                f.write(b'not a pickle')
+        mod = pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertListEqual([i.name for i in self.model.metabolites],
+                             [i.name for i in mod.metabolites])
+
+    def test_lru_eviction(self):
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        self.model.name = 'ChangedName'
+        self.model.save()
+        oldest = self.cache.entries()[0][0]
+        self.cache.max_size = self.cache.size()
+        pycotools3.model.Model(self.copasi_file, cache_dir=self.cache)
+        paths = [i[0] for i in self.cache.entries()]
+        self.assertNotIn(oldest, paths)
+        self.assertEqual(len(paths), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*-coding: utf-8 -*-
+"""
+
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+
+import os
+import os
+import shutil
+import unittest
+import pycotools3
+from pycotools3.result_cache import ResultCache
+from Tests import _test_base
+
+
+class ResultCacheTests(_test_base._BaseTest):
+    def setUp(self):
+        super(ResultCacheTests, self).setUp()
+        self.cache_dir = os.path.join(os.path.dirname(__file__), 'ResultCache')
+        self.cache = ResultCache(self.cache_dir)
+        self.report = os.path.join(os.path.dirname(__file__), 'cached_timecourse.txt')
+        self.model = self.time_course(self.model, self.report)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    @staticmethod
+    def time_course(mod, report_name, **kwargs):
+        return pycotools3.tasks.TimeCourse(mod, end=100, intervals=100, step_size=1, run=False,
+                                           report_name=report_name, **kwargs).model
+
+    def copy(self, name):
+        copasi_file = os.path.join(os.path.dirname(self.copasi_file), name + '.cps')
+        shutil.copy(self.copasi_file, copasi_file)
+        return self.time_course(pycotools3.model.Model(copasi_file), copasi_file[:-4] + '.txt')
+
+    def test_miss_then_hit(self):
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        with open(self.report) as f:
+            report = f.read()
+        os.remove(self.report)
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        with open(self.report) as f:
+            self.assertEqual(f.read(), report)
+
+    def test_directory(self):
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache_dir)
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_same_key_for_copies(self):
+        run = pycotools3.tasks.Run(self.model, task='time_course', mode=False)
+        copy = pycotools3.tasks.Run(self.copy('copy'), task='time_course', mode=False)
+        self.assertEqual(ResultCache.key(run.model.xml, run.model.copasi_file, pycotools3.tasks.COPASISE),
+                         ResultCache.key(copy.model.xml, copy.model.copasi_file, pycotools3.tasks.COPASISE))
+
+    def test_changed_parameter_misses(self):
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        self.model = pycotools3.model.InsertParameters(self.model, parameter_dict={'A2B': 10}, inplace=True).model
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_unseeded_stochastic_not_cached(self):
+        mod = self.time_course(self.model, self.report, method='direct', use_random_seed=False)
+        pycotools3.tasks.Run(mod, task='time_course', cache=self.cache)
+        pycotools3.tasks.Run(mod, task='time_course', cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+        self.assertListEqual(self.cache.entries(), [])
+
+    def test_run_parallel(self):
+        models = [self.copy('parallel{}'.format(i)) for i in range(3)]
+        models[2] = pycotools3.model.InsertParameters(models[2], parameter_dict={'A2B': 10}, inplace=True).model
+        pycotools3.tasks.Run(models[0], task='time_course', cache=self.cache)
+        run = pycotools3.tasks.RunParallel(models, task='time_course', cache=self.cache)
+        ## the first two only differ in their report name
+        self.assertListEqual(list(run.summary()['status']), ['cached', 'cached', 'finished'])
+        for mod in models:
+            self.assertTrue(os.path.isfile(mod.copasi_file[:-4] + '.txt'))
+
+    def test_lru_eviction(self):
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        oldest = self.cache.entries()[0][0]
+        self.cache.max_size = int(1.5 * self.cache.size())
+        self.model = pycotools3.model.InsertParameters(self.model, parameter_dict={'A2B': 10}, inplace=True).model
+        pycotools3.tasks.Run(self.model, task='time_course', cache=self.cache)
+        paths = [i[0] for i in self.cache.entries()]
+        self.assertNotIn(oldest, paths)
+        self.assertEqual(len(paths), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,6 +26,7 @@ Date:
 import pycotools3
 import unittest
 import os
+import asyncio
 from Tests import _test_base
 
 
@@ -116,8 +117,28 @@ class RunTests(_test_base._BaseTest):
                 self.assertTrue(i.attrib['scheduled'] == 'true')
 
 
-
-
+    def test_run_tasks(self):
+        """
+        Run time courses of two models in an asyncio event loop
+        :return:
+        """
+        models = []
+        for i in range(2):
+            copasi_file = os.path.join(os.path.dirname(self.copasi_file), 'run_tasks{}.cps'.format(i))
+            self.model.save(copasi_file)
+            mod = pycotools3.model.Model(copasi_file)
+            pycotools3.tasks.TimeCourse(mod, end=100, intervals=100, step_size=1, run=False,
+                                        report_name=copasi_file[:-4] + '.txt')
+            models.append(mod)
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(
+                pycotools3.tasks.run_tasks(models, task='time_course', concurrency=2, timeout=60))
+        finally:
+            loop.close()
+        self.assertListEqual([i.status for i in results], ['finished', 'finished'])
+        for mod in models:
+            self.assertTrue(os.path.isfile(mod.copasi_file[:-4] + '.txt'))
 
 
 if __name__=='__main__':
@@ -26,6 +26,7 @@ Date:
 from pycotools3 import *
 import unittest
 import os
+import numpy
 import pandas
 
 class TestClassVariables(unittest.TestCase):
@@ -210,6 +211,21 @@ class TestFIM(unittest.TestCase):
         s = tasks.FIM(self.mod)#
         self.assertTrue(s.fim.shape[0], s.fim.shape[1])
 
+    def test_native(self):
+        s = tasks.FIM(self.mod, engine='native', end=10, step_size=1)
+        self.assertEqual(s.array.shape, (11, 4, 3))
+        self.assertEqual(s.sensitivities.shape, (44, 3))
+        self.assertEqual(s.fim.shape, (3, 3))
+
+    def test_native_fim_sums_over_time(self):
+        s = tasks.FIM(self.mod, engine='native', end=10, step_size=1)
+        fim = sum(i.T.dot(i) for i in s.array)
+        self.assertTrue(numpy.allclose(s.fim.values, fim))
+
+    def test_native_steady_state(self):
+        with self.assertRaises(errors.InputError):
+            tasks.Sensitivities(self.mod, engine='native', subtask='steady_state')
+
 
 if __name__ == '__main__':
     unittest.main()
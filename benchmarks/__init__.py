@@ -0,0 +1,5 @@
+# -*-coding: utf-8 -*-
+"""
+Benchmarks for pycotools3. Each module is a standalone script,
+run with ``python benchmarks/<name>.py --help``.
+"""
@@ -0,0 +1,127 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Build large synthetic copasi models for the benchmarks.
+
+Building thousands of species through :py:meth:`model.Model.add` is
+exactly the slow path we want to measure, so the models here are written
+directly as copasiML: a chain of `n` species S0 -> S1 -> ... -> Sn-1
+with irreversible mass action reactions, each with its own local parameter.
+"""
+import os
+from lxml import etree
+from pycotools3 import misc
+
+SCHEMA = '{http://www.copasi.org/static/schema}'
+AVOGADRO = 6.0221408570000002e+23
+
+
+def _sub(parent, tag, **attrib):
+    return etree.SubElement(parent, SCHEMA + tag, attrib=attrib)
+
+
+def chain_model(copasi_file, n=1000, concentration=1.0, k=0.1):
+    """Write a linear chain model with `n` species and `n - 1` reactions
+
+    Args:
+        copasi_file (str): where to write the model
+        n (int): number of species
+        concentration (float): initial concentration of every species (mmol/ml)
+        k (float): value of every local parameter
+
+    Returns:
+        str: copasi_file
+
+    """
+    if os.path.isfile(copasi_file):
+        os.remove(copasi_file)
+    misc.new_model(copasi_file)
+    parser = etree.XMLParser(remove_blank_text=True)
+    tree = etree.parse(copasi_file, parser)
+    root = tree.getroot()
+    mod = root.find(SCHEMA + 'Model')
+    model_name = mod.attrib['name']
+    model_ref = 'CN=Root,Model={}'.format(model_name)
+
+    list_of_functions = etree.Element(SCHEMA + 'ListOfFunctions')
+    root.insert(0, list_of_functions)
+    function = _sub(list_of_functions, 'Function', key='Function_13',
+                    name='Mass action (irreversible)', type='MassAction', reversible='false')
+    _sub(function, 'Expression').text = 'k1*PRODUCT<substrate_i>'
+    descriptions = _sub(function, 'ListOfParameterDescriptions')
+    _sub(descriptions, 'ParameterDescription', key='FunctionParameter_80', name='k1', order='0', role='constant')
+    _sub(descriptions, 'ParameterDescription', key='FunctionParameter_81', name='substrate', order='1',
+         role='substrate')
+
+    position = list(mod).index(mod.find(SCHEMA + 'ListOfModelParameterSets'))
+    compartments = etree.Element(SCHEMA + 'ListOfCompartments')
+    metabolites = etree.Element(SCHEMA + 'ListOfMetabolites')
+    reactions = etree.Element(SCHEMA + 'ListOfReactions')
+    for offset, element in enumerate([compartments, metabolites, reactions]):
+        mod.insert(position + offset, element)
+
+    _sub(compartments, 'Compartment', key='Compartment_0', name='cell',
+         simulationType='fixed', dimensionality='3')
+    compartment_ref = '{},Vector=Compartments[cell]'.format(model_ref)
+
+    groups = {i.attrib['cn']: i for i in mod.iter(SCHEMA + 'ModelParameterGroup')}
+    _sub(groups['String=Initial Compartment Sizes'], 'ModelParameter', cn=compartment_ref,
+         value='1', type='Compartment', simulationType='fixed')
+
+    ## quantity unit is mmol and volume 1 ml
+    particles = repr(concentration * AVOGADRO * 1e-3)
+    state_template = mod.find(SCHEMA + 'StateTemplate')
+    for i in range(n):
+        key = 'Metabolite_{}'.format(i)
+        name = 'S{}'.format(i)
+        _sub(metabolites, 'Metabolite', key=key, name=name,
+             simulationType='reactions', compartment='Compartment_0')
+        _sub(groups['String=Initial Species Values'], 'ModelParameter',
+             cn='{},Vector=Metabolites[{}]'.format(compartment_ref, name),
+             value=particles, type='Species', simulationType='reactions')
+        _sub(state_template, 'StateTemplateVariable', objectReference=key)
+
+    for i in range(n - 1):
+        name = 'R{}'.format(i)
+        parameter_key = 'Parameter_{}'.format(i)
+        reaction = _sub(reactions, 'Reaction', key='Reaction_{}'.format(i), name=name,
+                        reversible='false', fast='false')
+        _sub(_sub(reaction, 'ListOfSubstrates'), 'Substrate',
+             metabolite='Metabolite_{}'.format(i), stoichiometry='1')
+        _sub(_sub(reaction, 'ListOfProducts'), 'Product',
+             metabolite='Metabolite_{}'.format(i + 1), stoichiometry='1')
+        _sub(_sub(reaction, 'ListOfConstants'), 'Constant', key=parameter_key, name='k1', value=str(k))
+        kinetic_law = _sub(reaction, 'KineticLaw', function='Function_13', unitType='Default',
+                           scalingCompartment=compartment_ref)
+        call_parameters = _sub(kinetic_law, 'ListOfCallParameters')
+        for function_parameter, source in [('FunctionParameter_80', parameter_key),
+                                           ('FunctionParameter_81', 'Metabolite_{}'.format(i))]:
+            call = _sub(call_parameters, 'CallParameter', functionParameter=function_parameter)
+            _sub(call, 'SourceParameter', reference=source)
+
+        reaction_ref = '{},Vector=Reactions[{}]'.format(model_ref, name)
+        group = _sub(groups['String=Kinetic Parameters'], 'ModelParameterGroup', cn=reaction_ref, type='Reaction')
+        _sub(group, 'ModelParameter', cn='{},ParameterGroup=Parameters,Parameter=k1'.format(reaction_ref),
+             value=str(k), type='ReactionParameter', simulationType='fixed')
+
+    _sub(state_template, 'StateTemplateVariable', objectReference='Compartment_0')
+    initial_state = mod.find(SCHEMA + 'InitialState')
+    initial_state.text = ' '.join(['0'] + [particles] * n + ['1'])
+
+    tree.write(copasi_file)
+    return copasi_file
@@ -0,0 +1,95 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare ways of writing one copasi file per parameter set:
+
+- loop: copy the model file, :py:class:`model.InsertParameters` and save, per set
+- batch: :py:meth:`model.InsertParameters.batch`
+- batch with a process pool
+
+Usage:
+
+    python benchmarks/batch_insert_benchmark.py --sets 200 --species 1000 --processes 4
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model
+from benchmarks._synthetic import chain_model
+
+
+def parameter_sets(mod, sets, seed=0):
+    """Random values for every tenth species and local parameter,
+    plus an RSS column like :py:class:`viz.Parse` output"""
+    names = [i.name for i in mod.metabolites][::10] + \
+            [i.global_name for i in mod.local_parameters][::10]
+    rng = numpy.random.RandomState(seed)
+    df = pandas.DataFrame(rng.uniform(0.1, 10, (sets, len(names))), columns=names)
+    df['RSS'] = rng.uniform(0, 1, sets)
+    return df
+
+
+def loop(copasi_file, df, directory):
+    files = []
+    for i in range(df.shape[0]):
+        fname = os.path.join(directory, 'loop_{}.cps'.format(i))
+        shutil.copy(copasi_file, fname)
+        model.InsertParameters(model.Model(fname), df=df, index=i, inplace=True)
+        files.append(fname)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-5])
+    parser.add_argument('--sets', type=int, default=200)
+    parser.add_argument('--species', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    copasi_file = chain_model(os.path.join(directory, 'chain.cps'), n=args.species)
+    mod = model.Model(copasi_file)
+    df = parameter_sets(mod, args.sets)
+
+    runs = [
+        ('loop', lambda: loop(copasi_file, df, os.path.join(directory, 'loop'))),
+        ('batch', lambda: model.InsertParameters.batch(mod, df, os.path.join(directory, 'batch'))),
+        ('batch x{}'.format(args.processes),
+         lambda: model.InsertParameters.batch(mod, df, os.path.join(directory, 'pool'),
+                                              processes=args.processes)),
+    ]
+    os.makedirs(os.path.join(directory, 'loop'))
+    print('{:<12} {:>12} {:>14}'.format('method', 'seconds', 'files/second'))
+    for name, run in runs:
+        start = time.time()
+        files = run()
+        seconds = time.time() - start
+        print('{:<12} {:>12.4f} {:>14.1f}'.format(name, seconds, len(files) / seconds))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare ways of making many copies of a large model, each with one
+parameter changed, as :py:class:`tasks.ParameterEstimation` does for
+every parallel copy:
+
+- reparse: copy the file and open it again with :py:class:`model.Model`
+- deepcopy: :py:meth:`model.Model._copy`
+- clone: :py:meth:`model.Model.clone`
+
+Each method runs in a fresh interpreter so the peak resident set size
+(RSS) reported for one method is not inflated by another.
+
+Usage:
+
+    python benchmarks/clone_benchmark.py --clones 100 --species 2000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model
+from benchmarks._synthetic import chain_model
+
+METHODS = ['reparse', 'deepcopy', 'clone']
+
+
+def make_clones(copasi_file, method, clones):
+    """Make `clones` copies of the model in `copasi_file` and change
+    the initial concentration of one species in each
+
+    Args:
+        copasi_file (str): the model
+        method (str): one of :py:data:`METHODS`
+        clones (int): how many copies
+
+    Returns:
+        dict: seconds taken and peak RSS of this process in MB
+    """
+    mod = model.Model(copasi_file)
+    ## build the component tables once up front. The clones share them
+    mod.local_parameters
+    directory = os.path.dirname(copasi_file)
+    copies = []
+    start = time.time()
+    for i in range(clones):
+        fname = os.path.join(directory, 'copy_{}.cps'.format(i))
+        if method == 'reparse':
+            shutil.copy(copasi_file, fname)
+            new = model.Model(fname)
+        elif method == 'deepcopy':
+            new = mod._copy(fname)
+        else:
+            new = mod.clone(fname)
+        new = new.set('metabolite', 'S0', float(i), 'name', 'concentration')
+        copies.append(new)
+    seconds = time.time() - start
+    ## kilobytes on linux, bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 1024.0 ** 2 if sys.platform == 'darwin' else peak / 1024.0
+    return {'seconds': seconds, 'peak_rss_mb': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-5])
+    parser.add_argument('--clones', type=int, default=100)
+    parser.add_argument('--species', type=int, default=2000)
+    parser.add_argument('--copasi_file', default=None, help='used internally')
+    parser.add_argument('--method', choices=METHODS, default=None,
+                        help='used internally to run one method per process')
+    args = parser.parse_args()
+
+    if args.method is not None:
+        print(json.dumps(make_clones(args.copasi_file, args.method, args.clones)))
+        return
+
+    copasi_file = os.path.join(tempfile.mkdtemp(), 'chain_{}.cps'.format(args.species))
+    chain_model(copasi_file, n=args.species)
+
+    print('{:<10} {:>12} {:>16}'.format('method', 'seconds', 'peak RSS (MB)'))
+    for method in METHODS:
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                       '--copasi_file', copasi_file, '--method', method,
+                                       '--clones', str(args.clones)])
+        res = json.loads(out.decode().strip().split('\n')[-1])
+        print('{:<10} {:>12.4f} {:>16.1f}'.format(method, res['seconds'], res['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
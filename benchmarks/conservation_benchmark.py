@@ -0,0 +1,78 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Time the structural analysis of a model with `--reactions` reactions:
+
+- walking :py:attr:`model.Model.reactions` to rebuild the stoichiometry
+- :py:attr:`model.Model.stoichiometry_matrix`
+- :py:meth:`model.Model.conservation_laws` on the sparse matrix
+- a dense null space (SVD) of the same matrix, for comparison
+
+The chain model is closed so it has a single conservation law. The
+reaction walk and the SVD are skipped above `--dense-limit` reactions.
+
+Usage:
+
+    python benchmarks/conservation_benchmark.py --reactions 10000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from scipy import linalg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model
+from benchmarks._synthetic import chain_model
+
+
+def timed(run):
+    start = time.time()
+    result = run()
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-5])
+    parser.add_argument('--reactions', type=int, default=10000)
+    parser.add_argument('--dense-limit', type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    copasi_file = chain_model(os.path.join(directory, 'chain.cps'), n=args.reactions + 1)
+    mod = model.Model(copasi_file)
+    seconds, stoichiometry = timed(lambda: mod.stoichiometry_matrix)
+    rows = [('stoichiometry_matrix', seconds, str(stoichiometry))]
+    seconds, laws = timed(stoichiometry.conservation_laws)
+    rows.append(('conservation_laws', seconds, str(laws)))
+    if args.reactions <= args.dense_limit:
+        seconds, null_space = timed(lambda: linalg.null_space(stoichiometry.matrix.T.toarray()))
+        rows.append(('dense null space', seconds, '{} laws'.format(null_space.shape[1])))
+        seconds, reactions = timed(lambda: model.Model(copasi_file).reactions)
+        rows.append(('Model.reactions', seconds, '{} reactions'.format(len(reactions))))
+    print('{:<22} {:>10}  {}'.format('method', 'seconds', 'result'))
+    for name, seconds, result in rows:
+        print('{:<22} {:>10.4f}  {}'.format(name, seconds, result))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
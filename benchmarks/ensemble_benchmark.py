@@ -0,0 +1,106 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare ways of simulating a time course for every member of a
+parameter ensemble:
+
+- copasi: insert each set and run a CopasiSE time course, as
+  :py:meth:`viz.PlotTimeCourseEnsemble.simulate_ensemble` does
+- loop: :py:func:`native.simulate` once per set
+- batch: :py:func:`native.simulate_ensemble`
+
+Usage:
+
+    python benchmarks/ensemble_benchmark.py --sets 1000 --species 20 --copasi
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model, native
+from benchmarks._synthetic import chain_model
+
+
+def parameter_sets(mod, sets, seed=0):
+    """Random values for every local parameter and the first species"""
+    names = [mod.metabolites[0].name] + [i.global_name for i in mod.local_parameters]
+    rng = numpy.random.RandomState(seed)
+    return pandas.DataFrame(rng.uniform(0.05, 0.5, (sets, len(names))), columns=names)
+
+
+def copasi(mod, df, stop, by):
+    plan = model.InsertionPlan(mod, df.columns)
+    results = []
+    for i in range(df.shape[0]):
+        plan.apply(df.iloc[i])
+        mod.save()
+        results.append(mod.simulate(0, stop, by).values)
+    return numpy.array(results).transpose(1, 0, 2)
+
+
+def loop(mod, df, stop, by):
+    results = [mod.simulate(0, stop, by, engine='native', parameters=dict(df.iloc[i]))
+               for i in range(df.shape[0])]
+    return numpy.array([i.values for i in results]).transpose(1, 0, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-4])
+    parser.add_argument('--sets', type=int, default=1000)
+    parser.add_argument('--species', type=int, default=20)
+    parser.add_argument('--stop', type=float, default=100)
+    parser.add_argument('--by', type=float, default=1)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--copasi', action='store_true', help='include CopasiSE. Slow')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    mod = model.Model(chain_model(os.path.join(directory, 'chain.cps'), n=args.species))
+    df = parameter_sets(mod, args.sets)
+
+    runs = [
+        ('loop', lambda: loop(mod, df, args.stop, args.by)),
+        ('batch', lambda: native.simulate_ensemble(mod, df, 0, args.stop, args.by)),
+        ('batch x{}'.format(args.processes),
+         lambda: native.simulate_ensemble(mod, df, 0, args.stop, args.by, processes=args.processes)),
+    ]
+    if args.copasi:
+        runs.insert(0, ('copasi', lambda: copasi(mod, df, args.stop, args.by)))
+
+    print('{:<12} {:>12} {:>12} {:>16}'.format('method', 'seconds', 'sets/second', 'max rel. diff'))
+    reference = None
+    for name, run in runs:
+        start = time.time()
+        result = run()
+        seconds = time.time() - start
+        if reference is None:
+            reference = result
+        difference = numpy.nanmax(abs(result - reference) / (abs(reference) + 1e-9))
+        print('{:<12} {:>12.4f} {:>12.1f} {:>16.2e}'.format(name, seconds, args.sets / seconds, difference))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
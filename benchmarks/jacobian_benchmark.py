@@ -0,0 +1,82 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare finite difference and analytic Jacobians in the implicit
+solvers of the native engine, for a single time course and for an
+ensemble of parameter sets. The time to derive the analytic Jacobian,
+which happens once per model structure, is reported separately.
+
+Usage:
+
+    python benchmarks/jacobian_benchmark.py --species 1000 --sets 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model, native
+from benchmarks._synthetic import chain_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-3])
+    parser.add_argument('--species', type=int, default=1000)
+    parser.add_argument('--sets', type=int, default=200)
+    parser.add_argument('--method', default='BDF', choices=['BDF', 'Radau', 'LSODA'])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    mod = model.Model(chain_model(os.path.join(directory, 'chain.cps'), n=args.species))
+    small = model.Model(chain_model(os.path.join(directory, 'small.cps'), n=20))
+    rng = numpy.random.RandomState(0)
+    names = [i.global_name for i in small.local_parameters]
+    df = pandas.DataFrame(rng.uniform(0.05, 0.5, (args.sets, len(names))), columns=names)
+
+    start = time.time()
+    native.compile_model(mod).jacobian
+    native.compile_model(small).jacobian
+    print('derived Jacobians in {:.4f} seconds'.format(time.time() - start))
+
+    runs = [
+        ('{} species'.format(args.species),
+         lambda jacobian: mod.simulate(0, 100, 1, engine='native', method=args.method, jacobian=jacobian).values),
+        ('{} sets'.format(args.sets),
+         lambda jacobian: native.simulate_ensemble(small, df, 0, 100, 1, method=args.method, jacobian=jacobian)),
+    ]
+    print('{:<14} {:>16} {:>16} {:>14}'.format('problem', 'finite diff. (s)', 'analytic (s)', 'max rel. diff'))
+    for name, run in runs:
+        seconds = []
+        results = []
+        for jacobian in [False, True]:
+            start = time.time()
+            results.append(run(jacobian))
+            seconds.append(time.time() - start)
+        difference = numpy.max(abs(results[1] - results[0]) / (abs(results[0]) + 1e-9))
+        print('{:<14} {:>16.4f} {:>16.4f} {:>14.2e}'.format(name, seconds[0], seconds[1], difference))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare eager and lazy opening of a directory of large models when
+only header information (name, units, fit_item_order, task_names) is read.
+
+Each mode runs in a fresh interpreter so the peak resident set size
+(RSS) reported for one mode is not inflated by the other.
+
+Usage:
+
+    python benchmarks/lazy_load_benchmark.py --models 20 --species 5000
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model
+from benchmarks._synthetic import chain_model
+
+HEADER = ['name', 'time_unit', 'volume_unit', 'quantity_unit',
+          'fit_item_order', 'task_names']
+
+
+def scan(directory, lazy):
+    """Open every model in `directory` and read the header properties
+
+    Args:
+        directory (str): directory of .cps files
+        lazy (bool): open models with `lazy=True`
+
+    Returns:
+        dict: seconds taken and peak RSS of this process in MB
+    """
+    start = time.time()
+    for copasi_file in sorted(glob.glob(os.path.join(directory, '*.cps'))):
+        mod = model.Model(copasi_file, lazy=lazy)
+        for prop in HEADER:
+            getattr(mod, prop)
+    seconds = time.time() - start
+    ## kilobytes on linux, bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 1024.0 ** 2 if sys.platform == 'darwin' else peak / 1024.0
+    return {'seconds': seconds, 'peak_rss_mb': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-3])
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--species', type=int, default=5000)
+    parser.add_argument('--directory', default=None,
+                        help='existing directory of models. Synthetic models are built when not given')
+    parser.add_argument('--mode', choices=['eager', 'lazy'], default=None,
+                        help='used internally to run one mode per process')
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(json.dumps(scan(args.directory, args.mode == 'lazy')))
+        return
+
+    directory = args.directory
+    if directory is None:
+        directory = tempfile.mkdtemp()
+        first = chain_model(os.path.join(directory, 'chain_0.cps'), n=args.species)
+        with open(first, 'rb') as f:
+            content = f.read()
+        for i in range(1, args.models):
+            with open(os.path.join(directory, 'chain_{}.cps'.format(i)), 'wb') as f:
+                f.write(content)
+
+    print('{:<10} {:>12} {:>16}'.format('mode', 'seconds', 'peak RSS (MB)'))
+    for mode in ['eager', 'lazy']:
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                       '--directory', directory, '--mode', mode])
+        res = json.loads(out.decode().strip().split('\n')[-1])
+        print('{:<10} {:>12.4f} {:>16.1f}'.format(mode, res['seconds'], res['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Count full walks of the copasiML tree made while loading a large
+model and reading its component properties.
+
+Every parsed element is an instance of :py:class:`CountingElement`,
+which counts calls to ``iter()`` and ``xpath()`` made on the root
+element, i.e. traversals of the whole tree.
+
+Usage:
+
+    python benchmarks/model_index_benchmark.py --species 5000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model
+from benchmarks._synthetic import chain_model
+
+PROPERTIES = ['compartments', 'metabolites', 'global_quantities',
+              'local_parameters', 'functions', 'reactions',
+              'states', 'number_of_reactions']
+
+
+class CountingElement(etree.ElementBase):
+    """Element class that counts traversals started at the root"""
+    walks = 0
+
+    def iter(self, *args, **kwargs):
+        if self.getparent() is None:
+            CountingElement.walks += 1
+        return super(CountingElement, self).iter(*args, **kwargs)
+
+    def xpath(self, *args, **kwargs):
+        if self.getparent() is None:
+            CountingElement.walks += 1
+        return super(CountingElement, self).xpath(*args, **kwargs)
+
+
+def run(copasi_file):
+    CountingElement.walks = 0
+    start = time.time()
+    mod = model.Model(copasi_file)
+    load_walks = CountingElement.walks
+    load_time = time.time() - start
+    results = [('load', load_walks, load_time)]
+    for prop in PROPERTIES:
+        CountingElement.walks = 0
+        start = time.time()
+        getattr(mod, prop)
+        results.append((prop, CountingElement.walks, time.time() - start))
+    return mod, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-2])
+    parser.add_argument('--species', type=int, default=3000)
+    args = parser.parse_args()
+
+    etree.set_element_class_lookup(etree.ElementDefaultClassLookup(element=CountingElement))
+    copasi_file = os.path.join(tempfile.mkdtemp(), 'chain_{}.cps'.format(args.species))
+    chain_model(copasi_file, n=args.species)
+
+    mod, results = run(copasi_file)
+    print('{:<20} {:>12} {:>12}'.format('step', 'tree walks', 'seconds'))
+    for step, walks, seconds in results:
+        print('{:<20} {:>12} {:>12.4f}'.format(step, walks, seconds))
+    print('{:<20} {:>12} {:>12.4f}'.format('total', sum(i[1] for i in results), sum(i[2] for i in results)))
+    index = getattr(mod, 'component_index', None)
+    if index is not None:
+        print('component index: {}'.format(index))
+
+
+if __name__ == '__main__':
+    main()
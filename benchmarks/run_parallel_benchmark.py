@@ -0,0 +1,110 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Supervisor CPU while running many CopasiSE jobs on the local machine:
+
+- poll: check every child with psutil in a loop until all have exited,
+  as :py:meth:`tasks.RunParallel.run_parallel` used to
+- executor: :py:class:`jobs.LocalExecutor`, which blocks on child exit
+
+Each job is a time course of a chain model. The supervisor CPU is the
+CPU time of the benchmark process itself, excluding its children, so
+ideally close to zero. Use --sleep to run jobs that sleep instead,
+on machines without CopasiSE.
+
+Usage:
+
+    python benchmarks/run_parallel_benchmark.py --jobs 32 --max-active 8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model, tasks, jobs
+from benchmarks._synthetic import chain_model
+
+
+def copasi_commands(directory, n, species, intervals):
+    copasi_file = chain_model(os.path.join(directory, 'chain.cps'), n=species)
+    mod = model.Model(copasi_file)
+    tasks.TimeCourse(mod, end=intervals, intervals=intervals, step_size=1, run=False,
+                     report_name=os.path.join(directory, 'timecourse.txt'))
+    tasks.Run(mod, task='time_course', mode=False)
+    commands = []
+    for i in range(n):
+        fname = os.path.join(directory, 'chain_{}.cps'.format(i))
+        shutil.copy(copasi_file, fname)
+        commands.append([tasks.COPASISE, fname])
+    return commands
+
+
+def poll(commands, max_active):
+    waiting = list(commands)
+    running = []
+    while waiting or running:
+        while waiting and len(running) < max_active:
+            running.append(subprocess.Popen(waiting.pop(0), stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL))
+        for p in list(running):
+            try:
+                status = psutil.Process(p.pid).status()
+            except psutil.NoSuchProcess:
+                status = psutil.STATUS_ZOMBIE
+            if status == psutil.STATUS_ZOMBIE:
+                p.wait()
+                running.remove(p)
+
+
+def executor(commands, max_active):
+    jobs.LocalExecutor(max_active=max_active).run([jobs.Job(i) for i in commands])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-5])
+    parser.add_argument('--jobs', type=int, default=32)
+    parser.add_argument('--max-active', type=int, default=8)
+    parser.add_argument('--species', type=int, default=100)
+    parser.add_argument('--intervals', type=int, default=100000)
+    parser.add_argument('--sleep', type=float, default=None,
+                        help='run jobs sleeping this many seconds instead of CopasiSE')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    if args.sleep is None:
+        commands = copasi_commands(directory, args.jobs, args.species, args.intervals)
+    else:
+        commands = [[sys.executable, '-c', 'import time; time.sleep({})'.format(args.sleep)]] * args.jobs
+
+    print('{:<10} {:>12} {:>16}'.format('method', 'seconds', 'supervisor cpu'))
+    for name, run in [('poll', poll), ('executor', executor)]:
+        start, cpu = time.time(), time.process_time()
+        run(commands, args.max_active)
+        seconds, cpu = time.time() - start, time.process_time() - cpu
+        print('{:<10} {:>12.4f} {:>16.4f}'.format(name, seconds, cpu))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
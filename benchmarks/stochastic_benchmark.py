@@ -0,0 +1,97 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Compare ways of simulating many realisations of the stochastic process
+of a chain of species with 100 particles each:
+
+- copasi: one CopasiSE direct method time course per realisation
+- loop: :py:func:`native.simulate_stochastic` one realisation at a time
+- batch: :py:func:`native.simulate_stochastic` with every realisation together
+- tau leap: the batch with tau leaping
+
+Usage:
+
+    python benchmarks/stochastic_benchmark.py --realisations 2000 --species 10 --copasi
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycotools3 import model, native
+from benchmarks._synthetic import chain_model, AVOGADRO
+
+
+def copasi(mod, realisations, stop, by):
+    results = []
+    for i in range(realisations):
+        df = mod.simulate(0, stop, by, method='direct', random_seed=i + 1,
+                          quantity_type='particle_numbers')
+        results.append(df.values)
+    return numpy.array(results).transpose(1, 0, 2)
+
+
+def native_run(mod, realisations, stop, by, **kwargs):
+    return native.simulate_stochastic(mod, 0, stop, by, realisations=realisations,
+                                      quantity_type='particle_numbers', **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[-4])
+    parser.add_argument('--realisations', type=int, default=2000)
+    parser.add_argument('--species', type=int, default=10)
+    parser.add_argument('--stop', type=float, default=20)
+    parser.add_argument('--by', type=float, default=1)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--copasi', action='store_true', help='include CopasiSE. Slow')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    ## 100 particles of each species with mmol and ml
+    concentration = 100 / (AVOGADRO * 1e-3)
+    mod = model.Model(chain_model(os.path.join(directory, 'chain.cps'), n=args.species,
+                                  concentration=concentration))
+
+    runs = [
+        ('loop', lambda: native_run(mod, args.realisations, args.stop, args.by, chunk_size=1)),
+        ('batch', lambda: native_run(mod, args.realisations, args.stop, args.by)),
+        ('batch x{}'.format(args.processes),
+         lambda: native_run(mod, args.realisations, args.stop, args.by,
+                            chunk_size=args.realisations // args.processes + 1, processes=args.processes)),
+        ('tau leap', lambda: native_run(mod, args.realisations, args.stop, args.by, method='tau_leap')),
+    ]
+    if args.copasi:
+        runs.insert(0, ('copasi', lambda: copasi(mod, args.realisations, args.stop, args.by)))
+
+    print('{:<12} {:>12} {:>20} {:>16}'.format('method', 'seconds', 'realisations/second', 'mean of last'))
+    for name, run in runs:
+        start = time.time()
+        result = run()
+        seconds = time.time() - start
+        print('{:<12} {:>12.4f} {:>20.1f} {:>16.2f}'.format(name, seconds, args.realisations / seconds,
+                                                             result[-1, :, -1].mean()))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -70,6 +70,11 @@ class TimeCourseError(Exception):
     pass
 
 
+class SteadyStateError(Exception):
+    """ """
+    pass
+
+
 class AvagadrosError(Exception):
     """ """
     pass
@@ -100,4 +105,8 @@ class NonFormattedPEFileError(Exception):
 
 class AlreadyExistsError(Exception):
     """ """
-    pass
\ No newline at end of file
+    pass
+
+class SchedulerError(Exception):
+    """ """
+    pass
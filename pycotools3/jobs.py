@@ -0,0 +1,681 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Run external commands, usually CopasiSE, as jobs on the local machine.
+
+A :py:class:`LocalExecutor` keeps at most `max_active` commands running.
+Each running command has a thread that blocks in
+:py:meth:`subprocess.Popen.communicate` until the command exits, which also
+reaps the child, and the supervising thread blocks until one of them
+finishes. Nothing polls, so supervising costs next to no CPU however long
+the jobs take.
+
+For code already running an asyncio event loop, :py:func:`run_async` and
+:py:func:`run_jobs_async` run the same jobs with
+:py:func:`asyncio.create_subprocess_exec`, bounded by a semaphore and
+with an optional timeout per job.
+
+Every :py:class:`Job` records its exit status, start and end times and
+stderr, and :py:func:`summary` tabulates them.
+
+On a cluster, :py:class:`SGE` and :py:class:`Slurm` submit many copasi
+files as a single array job, one task per file, rather than one job per
+file. The :py:class:`ArrayJob` they return polls `qstat` or `squeue`,
+backing off exponentially, until no task is left queued or running.
+"""
+import os
+import re
+import time
+import shlex
+import asyncio
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas
+from . import errors
+
+LOG = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+CACHED = 'cached'
+
+
+class Job(object):
+    """A command to run and, once run, its outcome
+
+    Attributes:
+        command (list): the program followed by its arguments
+        name (str): label used in logs and summaries
+        cwd (str): working directory of the command. Default None, the current one
+        pid (int): process id once started, else None
+        returncode (int): exit status once finished. Negative when killed by a signal
+        stdout (str): output of the command when captured, else None
+        stderr (str): error output of the command
+        start_time (float): time.time() when the command started
+        end_time (float): time.time() when it exited
+        timed_out (bool): True when the command was killed for running too long
+        cached (bool): True when the results were restored from a cache
+            instead of running the command
+    """
+
+    def __init__(self, command, name=None, cwd=None):
+        """
+
+        Args:
+            command (list or str): the program followed by its arguments. A
+                string is a single program without arguments
+            name (str): Default the last item of `command`
+            cwd (str): working directory of the command
+        """
+        if isinstance(command, str):
+            command = [command]
+        self.command = [str(i) for i in command]
+        self.name = name if name is not None else os.path.basename(self.command[-1])
+        self.cwd = cwd
+        self.pid = None
+        self.returncode = None
+        self.stdout = None
+        self.stderr = None
+        self.start_time = None
+        self.end_time = None
+        self.cancelled = False
+        self.timed_out = False
+        self.cached = False
+
+    def __str__(self):
+        return 'Job(name="{}", status="{}", returncode={})'.format(self.name, self.status, self.returncode)
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def status(self):
+        """One of 'pending', 'running', 'finished' (exit status 0),
+        'failed' (any other exit status), 'timeout' (killed after its
+        timeout), 'cancelled' (never started) or 'cached' (not run, the
+        results came from a cache)"""
+        if self.cached:
+            return CACHED
+        if self.cancelled:
+            return CANCELLED
+        if self.timed_out:
+            return TIMEOUT
+        if self.start_time is None:
+            return PENDING
+        if self.returncode is None:
+            return RUNNING
+        return FINISHED if self.returncode == 0 else FAILED
+
+    def restored(self):
+        """Mark the job as done without running it because its results
+        were restored from a cache
+
+        Returns:
+            :py:class:`Job`
+
+        """
+        self.cached = True
+        self.start_time = self.end_time = time.time()
+        self.returncode = 0
+        self.stderr = ''
+        return self
+
+    @property
+    def ok(self):
+        """True when the command exited with status 0"""
+        return self.returncode == 0
+
+    @property
+    def duration(self):
+        """Seconds the command ran for, so far if still running, or None before it starts"""
+        if self.start_time is None:
+            return None
+        end = self.end_time if self.end_time is not None else time.time()
+        return end - self.start_time
+
+
+def summary(jobs):
+    """Tabulate the outcome of `jobs`
+
+    Args:
+        jobs (list): :py:class:`Job` objects
+
+    Returns:
+        pandas.DataFrame indexed by job name with columns status, returncode,
+        duration and stderr
+
+    """
+    return pandas.DataFrame(
+        [[i.status, i.returncode, i.duration, i.stderr] for i in jobs],
+        index=pandas.Index([i.name for i in jobs], name='name'),
+        columns=['status', 'returncode', 'duration', 'stderr']
+    )
+
+
+class LocalExecutor(object):
+    """Run :py:class:`Job` objects with a bounded number at once
+
+    Examples:
+        >>> executor = LocalExecutor(max_active=4)
+        >>> jobs = executor.run([Job([COPASISE, f]) for f in copasi_files])
+        >>> print(summary(jobs))
+    """
+
+    def __init__(self, max_active=None, capture_stdout=False):
+        """
+
+        Args:
+            max_active (int): most commands running at once. Default None, the
+                number of CPUs
+            capture_stdout (bool): Default False. Keep the output of each
+                command in :py:attr:`Job.stdout` rather than discarding it
+        """
+        if max_active is None:
+            max_active = os.cpu_count() or 1
+        max_active = int(max_active)
+        if max_active < 1:
+            raise ValueError('max_active must be at least 1, not {}'.format(max_active))
+        self.max_active = max_active
+        self.capture_stdout = capture_stdout
+        self._processes = {}
+        self._lock = threading.Lock()
+
+    def _execute(self, job):
+        """Start `job` and block until it exits. Runs in a worker thread"""
+        with self._lock:
+            if job.cancelled:
+                return job
+            job.start_time = time.time()
+            try:
+                process = subprocess.Popen(
+                    job.command, cwd=job.cwd, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE if self.capture_stdout else subprocess.DEVNULL,
+                    stderr=subprocess.PIPE, universal_newlines=True
+                )
+            except OSError as error:
+                ## the program could not be started, e.g. it does not exist
+                job.end_time = time.time()
+                job.returncode = 127
+                job.stderr = str(error)
+                return job
+            job.pid = process.pid
+            self._processes[job.pid] = process
+        try:
+            job.stdout, job.stderr = process.communicate()
+        finally:
+            job.end_time = time.time()
+            job.returncode = process.returncode
+            with self._lock:
+                del self._processes[job.pid]
+        return job
+
+    def kill(self):
+        """Kill every running command and wait for it so it leaves no zombie"""
+        with self._lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+        for process in processes:
+            process.wait()
+
+    def run(self, jobs, callback=None):
+        """Run `jobs`, at most :py:attr:`max_active` at once, and block until all have exited
+
+        If the wait is interrupted, e.g. by KeyboardInterrupt, jobs not yet
+        started are cancelled and running ones are killed before the
+        exception propagates.
+
+        Args:
+            jobs (list): :py:class:`Job` objects, started in order
+            callback (callable): Default None. Called with each :py:class:`Job`
+                as it finishes, in the supervising thread
+
+        Returns:
+            list: `jobs`, each with its outcome
+
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return jobs
+        pool = ThreadPoolExecutor(max_workers=min(self.max_active, len(jobs)))
+        try:
+            pending = {pool.submit(self._execute, i) for i in jobs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = future.result()
+                    if job.status == FAILED:
+                        LOG.warning('{} exited with status {}: {}'.format(
+                            job.name, job.returncode, (job.stderr or '').strip()))
+                    else:
+                        LOG.info('{} {} in {:.2f}s'.format(job.name, job.status, job.duration))
+                    if callback is not None:
+                        callback(job)
+        except BaseException:
+            with self._lock:
+                for job in jobs:
+                    if job.start_time is None:
+                        job.cancelled = True
+            self.kill()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+        return jobs
+
+
+async def _kill(process):
+    """Kill an asyncio subprocess and wait for it so it leaves no zombie.
+    Its pipes are read to the end so that they are closed"""
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+    await process.communicate()
+
+
+async def run_async(job, timeout=None, semaphore=None, capture_stdout=False):
+    """Run `job` in the running event loop
+
+    A job that runs longer than `timeout` is killed and its status becomes
+    'timeout'. If the coroutine is cancelled the command is killed, and
+    waited for, before the cancellation propagates.
+
+    Args:
+        job (:py:class:`Job`): the job to run
+        timeout (float): Default None. Seconds the command may run for
+        semaphore (asyncio.Semaphore): Default None. Held while the command runs
+        capture_stdout (bool): Default False. Keep the output of the command
+            in :py:attr:`Job.stdout` rather than discarding it
+
+    Returns:
+        :py:class:`Job`: `job`, with its outcome
+
+    """
+    if semaphore is not None:
+        try:
+            async with semaphore:
+                return await run_async(job, timeout=timeout, capture_stdout=capture_stdout)
+        except asyncio.CancelledError:
+            if job.start_time is None:
+                job.cancelled = True
+            raise
+    job.start_time = time.time()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *job.command, cwd=job.cwd, stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as error:
+        job.end_time = time.time()
+        job.returncode = 127
+        job.stderr = str(error)
+        return job
+    job.pid = process.pid
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        job.timed_out = True
+        await _kill(process)
+        stdout, stderr = None, 'timed out after {}s'.format(timeout).encode()
+    except BaseException:
+        await _kill(process)
+        raise
+    finally:
+        job.end_time = time.time()
+        job.returncode = process.returncode
+    job.stdout = stdout.decode() if stdout is not None else None
+    job.stderr = stderr.decode() if stderr is not None else None
+    if job.status != FINISHED:
+        LOG.warning('{} {} with status {}: {}'.format(job.name, job.status, job.returncode, (job.stderr or '').strip()))
+    return job
+
+
+async def run_jobs_async(jobs, concurrency=None, timeout=None, capture_stdout=False):
+    """Run `jobs` in the running event loop, at most `concurrency` at once
+
+    If the coroutine is cancelled, or a job raises, jobs not yet started
+    are cancelled and running commands are killed.
+
+    Args:
+        jobs (list): :py:class:`Job` objects, started in order
+        concurrency (int): Default None, the number of CPUs. Most commands running at once
+        timeout (float): Default None. Seconds each command may run for
+        capture_stdout (bool): Default False. Keep the output of each command
+
+    Returns:
+        list: `jobs`, each with its outcome
+
+    """
+    jobs = list(jobs)
+    semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+    running = [asyncio.ensure_future(run_async(i, timeout=timeout, semaphore=semaphore,
+                                               capture_stdout=capture_stdout)) for i in jobs]
+    try:
+        await asyncio.gather(*running)
+    except asyncio.CancelledError:
+        ## gather has cancelled each job. Let them kill their commands
+        await asyncio.gather(*running, return_exceptions=True)
+        raise
+    except BaseException:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        raise
+    return jobs
+
+
+class ArrayJob(object):
+    """An array job submitted to a cluster scheduler, one task per copasi file
+
+    Attributes:
+        scheduler (:py:class:`SGE` or :py:class:`Slurm`): the scheduler it was submitted to
+        job_id (str): the id the scheduler gave it
+        script (str): the job script
+        copasi_files (list): the file each task runs, in task order
+        submit_time (float): time.time() at submission
+        end_time (float): time.time() when it was first seen finished, else None
+        polls (int): number of times the scheduler was asked about it
+    """
+
+    def __init__(self, scheduler, job_id, script, copasi_files):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.script = script
+        self.copasi_files = list(copasi_files)
+        self.submit_time = time.time()
+        self.end_time = None
+        self.polls = 0
+
+    def __str__(self):
+        return 'ArrayJob(job_id="{}", tasks={}, status="{}")'.format(
+            self.job_id, len(self.copasi_files), self.status)
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def status(self):
+        """'running' until the scheduler no longer lists any task, then
+        'finished'. The scheduler does not say whether a task succeeded,
+        check the reports it should have written"""
+        return RUNNING if self.end_time is None else FINISHED
+
+    def active(self):
+        """Ask the scheduler whether any task is still queued or running
+
+        Returns:
+            bool
+
+        """
+        if self.end_time is not None:
+            return False
+        self.polls += 1
+        if self.scheduler.active(self.job_id):
+            return True
+        self.end_time = time.time()
+        LOG.info('{} finished after {:.0f}s'.format(self, self.end_time - self.submit_time))
+        return False
+
+    def wait(self, interval=5, max_interval=300, backoff=2, timeout=None, callback=None):
+        """Block until every task has left the scheduler's queue
+
+        The scheduler is polled at once, then after `interval` seconds,
+        with the delay multiplied by `backoff` after each poll up to
+        `max_interval`. Once finished the job script is removed.
+
+        Args:
+            interval (float): Default 5. Seconds before the second poll
+            max_interval (float): Default 300. Longest delay between polls
+            backoff (float): Default 2. Growth factor of the delay
+            timeout (float): Default None. Seconds to wait before raising
+                :py:class:`errors.SchedulerError`. The job is left running
+            callback (callable): Default None. Called with this
+                :py:class:`ArrayJob` once finished, i.e. to parse the reports
+
+        Returns:
+            The return value of `callback`, or this :py:class:`ArrayJob` when there is none
+
+        """
+        start = time.time()
+        delay = interval
+        while self.active():
+            if timeout is not None and time.time() - start + delay > timeout:
+                raise errors.SchedulerError('{} still running after {}s'.format(self, timeout))
+            time.sleep(delay)
+            delay = min(delay * backoff, max_interval)
+        if os.path.isfile(self.script):
+            os.remove(self.script)
+        if callback is not None:
+            return callback(self)
+        return self
+
+
+class _Scheduler(object):
+    """Submit copasi files as an array job and ask whether it is still running
+
+    Subclasses give the script directives and the commands of a scheduler.
+    """
+
+    ## shell variable holding the 1 based index of the running task
+    task_id = None
+
+    def __init__(self, copasise='CopasiSE', module=None, max_active=None, submit_command=None, status_command=None):
+        """
+
+        Args:
+            copasise (str): Default 'CopasiSE'. CopasiSE on the compute nodes
+            module (str): Default None. Environment module loaded with
+                `module add` before CopasiSE runs, i.e. 'COPASI/4.22.170'
+            max_active (int): Default None, no limit. Most tasks running at once
+            submit_command (str): Default the scheduler's own, i.e. 'qsub'.
+                Path to the submission command
+            status_command (str): Default the scheduler's own, i.e. 'qstat'.
+                Path to the status command
+        """
+        self.copasise = copasise
+        self.module = module
+        self.max_active = max_active
+        if submit_command is not None:
+            self.submit_command = submit_command
+        if status_command is not None:
+            self.status_command = status_command
+
+    def __str__(self):
+        return '{}(submit_command="{}", status_command="{}")'.format(
+            self.__class__.__name__, self.submit_command, self.status_command)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _directives(self, name, size):
+        """Scheduler options written at the top of the job script"""
+        raise NotImplementedError
+
+    def _submit_args(self, script):
+        raise NotImplementedError
+
+    def _job_id(self, output):
+        """The job id in the output of the submission command"""
+        raise NotImplementedError
+
+    def active(self, job_id):
+        """Whether any task of job `job_id` is queued or running
+
+        Args:
+            job_id (str): from :py:meth:`submit`
+
+        Returns:
+            bool
+
+        """
+        raise NotImplementedError
+
+    def _status(self, args):
+        """Run the status command. A status command that fails for any
+        other reason than the job being gone is logged and the job is
+        assumed to still be running, so a busy scheduler does not end the
+        wait early"""
+        try:
+            result = subprocess.run([self.status_command] + args, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        except OSError as error:
+            raise errors.SchedulerError('Could not run {}: {}'.format(self.status_command, error))
+        if result.returncode != 0 and not self._gone(result.stderr):
+            LOG.warning('{} exited with status {}: {}'.format(
+                self.status_command, result.returncode, result.stderr.strip()))
+            return None
+        return result.stdout
+
+    def _gone(self, stderr):
+        """Whether the error of the status command says that the job is not known"""
+        return False
+
+    def write_script(self, filename, copasi_files, name=None):
+        """Write an array job script with one task per copasi file
+
+        Args:
+            filename (str): the script
+            copasi_files (list): the copasi file of each task
+            name (str): Default the script name without extension. The job name
+
+        Returns:
+            str: `filename`
+
+        """
+        if not copasi_files:
+            raise errors.InputError('No copasi files to submit')
+        if name is None:
+            name = os.path.splitext(os.path.basename(filename))[0]
+        ## schedulers reject job names with path separators and spaces
+        name = re.sub(r'[^\w.-]', '_', name)
+        lines = ['#!/bin/bash'] + self._directives(name, len(copasi_files))
+        if self.module is not None:
+            lines.append('module add {}'.format(self.module))
+        lines.append('FILES=(')
+        lines += [shlex.quote(os.path.abspath(i)) for i in copasi_files]
+        lines.append(')')
+        lines.append('{} "${{FILES[$(({} - 1))]}}"'.format(shlex.quote(self.copasise), self.task_id))
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return filename
+
+    def submit(self, copasi_files, script, name=None):
+        """Submit `copasi_files` as one array job
+
+        Args:
+            copasi_files (list): the copasi file of each task
+            script (str): where to write the job script. The job runs in its directory
+            name (str): Default the script name without extension. The job name
+
+        Returns:
+            :py:class:`ArrayJob`
+
+        """
+        self.write_script(script, copasi_files, name)
+        try:
+            result = subprocess.run(self._submit_args(script), cwd=os.path.dirname(os.path.abspath(script)),
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, universal_newlines=True)
+        except OSError as error:
+            raise errors.SchedulerError('Could not run {}: {}'.format(self.submit_command, error))
+        if result.returncode != 0:
+            raise errors.SchedulerError('{} exited with status {}: {}'.format(
+                self.submit_command, result.returncode, result.stderr.strip()))
+        job = ArrayJob(self, self._job_id(result.stdout), script, copasi_files)
+        LOG.info('Submitted {}'.format(job))
+        return job
+
+
+class SGE(_Scheduler):
+    """Sun grid engine. Array jobs are submitted with `qsub -t`
+
+    Examples:
+        >>> job = SGE(module='COPASI/4.22.170').submit(copasi_files, 'fits.sh')
+        >>> job.wait()
+    """
+
+    submit_command = 'qsub'
+    status_command = 'qstat'
+    task_id = 'SGE_TASK_ID'
+
+    def _directives(self, name, size):
+        directives = ['#$ -V -cwd', '#$ -N {}'.format(name), '#$ -t 1-{}'.format(size)]
+        if self.max_active is not None:
+            directives.append('#$ -tc {}'.format(self.max_active))
+        return directives
+
+    def _submit_args(self, script):
+        return [self.submit_command, '-terse', script]
+
+    def _job_id(self, output):
+        ## -terse prints "<job id>.<first>-<last>:<step>" for array jobs
+        return output.strip().split('.')[0]
+
+    def active(self, job_id):
+        output = self._status([])
+        if output is None:
+            return True
+        ## the first column is the job id. Pending tasks of an array share a line
+        return any(i.split()[0] == job_id for i in output.splitlines() if i.strip())
+
+
+class Slurm(_Scheduler):
+    """Slurm. Array jobs are submitted with `sbatch --array`
+
+    Examples:
+        >>> job = Slurm(max_active=50).submit(copasi_files, 'fits.sh')
+        >>> job.wait()
+    """
+
+    submit_command = 'sbatch'
+    status_command = 'squeue'
+    task_id = 'SLURM_ARRAY_TASK_ID'
+
+    def _directives(self, name, size):
+        array = '1-{}'.format(size)
+        if self.max_active is not None:
+            array += '%{}'.format(self.max_active)
+        return ['#SBATCH --job-name={}'.format(name), '#SBATCH --array={}'.format(array)]
+
+    def _submit_args(self, script):
+        return [self.submit_command, '--parsable', script]
+
+    def _job_id(self, output):
+        ## --parsable prints "<job id>" or "<job id>;<cluster>"
+        return output.strip().split(';')[0]
+
+    def _gone(self, stderr):
+        ## squeue fails once a finished job has been purged
+        return 'Invalid job id' in stderr
+
+    def active(self, job_id):
+        output = self._status(['-h', '-j', job_id, '-o', '%i'])
+        if output is None:
+            return True
+        ## tasks are listed as "<job id>_<task>" or "<job id>_[<first>-<last>]"
+        return any(i.strip().split('_')[0] == job_id for i in output.splitlines() if i.strip())
@@ -37,18 +37,22 @@ from . import misc
 # import errors, misc, viz
 from . import _base
 from . import tasks
+from . import native
+from .parse_cache import ParseCache
 from .utils import load_copasi, format_timecourse_data
 
 import pandas
+import numpy
 import re
 import sys, inspect
-from copy import deepcopy
+from copy import deepcopy, copy as shallow_copy
 from .mixin import mixin, Mixin
 from functools import wraps
 from .cached_property import cached_property_with_ttl, cached_property
 from subprocess import check_call, call
 from shutil import copy
 from functools import reduce
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import sys
 
@@ -458,6 +462,368 @@ class ImportSBML(object):
         return Model(self.copasi_file)
 
 
+class ComponentIndex(object):
+    """Index of a copasiML tree built in a single traversal.
+
+    :py:class:`Model` reads its sections (``ListOfMetabolites``,
+    ``StateTemplate``, ``InitialState``, ...) from this index rather
+    than walking the whole tree with ``xml.iter()`` every time a component
+    property is needed. Elements are indexed by tag, by key and by
+    (tag, name). :py:class:`Model` mutators keep the index in sync
+    through :py:meth:`ComponentIndex.add` and :py:meth:`ComponentIndex.remove`.
+
+    Examples:
+        >>> index = ComponentIndex(model.xml)
+        >>> index.find('{http://www.copasi.org/static/schema}ListOfMetabolites')
+        >>> index.get('Metabolite_1')
+    """
+
+    def __init__(self, xml):
+        """
+
+        Args:
+            xml (etree._Element): root of the copasiML tree
+        """
+        self.xml = xml
+        self.tags = {}
+        self.keys = {}
+        self.names = {}
+        ## number of full traversals of the tree. Used for benchmarking
+        self.walks = 0
+        self.build()
+
+    def __str__(self):
+        return 'ComponentIndex(tags={}, keys={}, walks={})'.format(
+            len(self.tags), len(self.keys), self.walks
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __deepcopy__(self, memo):
+        ## lxml copies subtrees without consulting memo so the
+        ## indexed elements would not belong to the copied tree. Rebuild instead.
+        return ComponentIndex(deepcopy(self.xml, memo))
+
+    def build(self):
+        """(Re)build the index with a single walk over the tree
+
+        Returns:
+            :py:class:`ComponentIndex`
+
+        """
+        self.tags = {}
+        self.keys = {}
+        self.names = {}
+        self.walks += 1
+        for element in self.xml.iter():
+            self._register(element)
+        return self
+
+    def _register(self, element):
+        """Add a single element to the index"""
+        ## skip comments and processing instructions
+        if not isinstance(element.tag, str):
+            return
+        self.tags.setdefault(element.tag, []).append(element)
+        key = element.attrib.get('key')
+        if key is not None:
+            self.keys[key] = element
+        name = element.attrib.get('name')
+        if name is not None:
+            self.names.setdefault((element.tag, name), []).append(element)
+
+    def _unregister(self, element):
+        """Remove a single element from the index"""
+        if not isinstance(element.tag, str):
+            return
+        tagged = self.tags.get(element.tag, [])
+        if element in tagged:
+            tagged.remove(element)
+        key = element.attrib.get('key')
+        if key is not None and self.keys.get(key) is element:
+            del self.keys[key]
+        name = element.attrib.get('name')
+        if name is not None:
+            named = self.names.get((element.tag, name), [])
+            if element in named:
+                named.remove(element)
+
+    def add(self, element, parent=None, index=None):
+        """Index `element` and its descendants, optionally attaching
+        it to `parent` first
+
+        Args:
+            element (etree._Element): element to add
+            parent (etree._Element): Default None. When given, `element` is
+                appended to (or inserted into at `index`) this element
+            index (int): Default None. Position in `parent`
+
+        Returns:
+            etree._Element: `element`
+
+        """
+        if parent is not None:
+            if index is None:
+                parent.append(element)
+            else:
+                parent.insert(index, element)
+        ## put elements built without a namespace into the copasi
+        ## namespace, as writing and re-reading the file would
+        namespace = etree.QName(self.xml).namespace
+        for i in element.iter():
+            if namespace is not None and isinstance(i.tag, str) and not i.tag.startswith('{'):
+                i.tag = '{%s}%s' % (namespace, i.tag)
+            self._register(i)
+        return element
+
+    def remove(self, element):
+        """Detach `element` from its parent and drop it
+        and its descendants from the index
+
+        Args:
+            element (etree._Element): element to remove
+
+        Returns:
+            etree._Element: `element`
+
+        """
+        for i in element.iter():
+            self._unregister(i)
+        parent = element.getparent()
+        if parent is not None:
+            parent.remove(element)
+        return element
+
+    def find(self, tag):
+        """First element with `tag` or None"""
+        tagged = self.tags.get(tag)
+        if not tagged:
+            return None
+        return tagged[0]
+
+    def findall(self, tag):
+        """All elements with `tag` in the order they were indexed"""
+        return list(self.tags.get(tag, []))
+
+    def get(self, key):
+        """Element with `key` or None"""
+        return self.keys.get(key)
+
+    def get_by_name(self, tag, name):
+        """Elements with `tag` and a name attribute of `name`"""
+        return list(self.names.get((tag, name), []))
+
+
+class StateVector(object):
+    """Initial values of the model states backed by a numpy array.
+
+    :py:class:`Model` keeps a StateVector as the source of truth for
+    the ``StateTemplate`` order and ``InitialState`` values. It is
+    parsed once when the model is loaded and only written back to
+    the ``InitialState`` element by :py:meth:`StateVector.to_xml`
+    when the model is saved. States are indexed by key, i.e. ``Metabolite_1``.
+
+    Examples:
+        >>> sv = StateVector(['Model_1', 'Metabolite_0'], [0, 6.02e20])
+        >>> sv['Metabolite_0']
+        6.02e+20
+        >>> sv.values = [0, 1]
+    """
+
+    def __init__(self, keys=None, values=None):
+        """
+
+        Args:
+            keys (list): state keys in the order of the StateTemplate
+            values (list): initial value of each state
+        """
+        keys = [] if keys is None else list(keys)
+        values = [] if values is None else values
+        values = numpy.array(values, dtype=float)
+        if len(keys) != len(values):
+            raise errors.InputError(
+                'Expected {} values but got {}'.format(len(keys), len(values))
+            )
+        self._keys = keys
+        self._index = {key: i for i, key in enumerate(keys)}
+        ## spare capacity at the end of the buffer makes append amortised O(1)
+        self._buffer = values
+        self._size = len(keys)
+
+    def __str__(self):
+        return 'StateVector({})'.format(dict(self.items()))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __getitem__(self, key):
+        return float(self._buffer[self._index[key]])
+
+    def __setitem__(self, key, value):
+        self._buffer[self._index[key]] = value
+
+    @classmethod
+    def from_xml(cls, state_template, initial_state):
+        """Read the states from copasiML
+
+        Args:
+            state_template (etree._Element): the ``StateTemplate`` element
+            initial_state (etree._Element): the ``InitialState`` element
+
+        Returns:
+            :py:class:`StateVector`
+
+        """
+        keys = [i.attrib['objectReference'] for i in state_template]
+        values = numpy.array(initial_state.text.split(), dtype=float)
+        ## mirror zip: ignore unmatched trailing keys or values
+        n = min(len(keys), len(values))
+        return cls(keys[:n], values[:n])
+
+    @property
+    def values(self):
+        """numpy.ndarray view of the state values. Writes go straight
+        to the model states"""
+        return self._buffer[:self._size]
+
+    @values.setter
+    def values(self, values):
+        if len(values) != self._size:
+            raise errors.InputError(
+                'Not entered the currect number of states. Expected {} and got {}'.format(
+                    self._size, len(values)))
+        self._buffer[:self._size] = values
+
+    def keys(self):
+        """State keys in StateTemplate order"""
+        return list(self._keys)
+
+    def items(self):
+        """(key, value) pairs in StateTemplate order"""
+        return list(zip(self._keys, self.values.tolist()))
+
+    def index(self, key):
+        """Position of `key` in the state vector"""
+        return self._index[key]
+
+    def append(self, key, value):
+        """Add a state to the end of the vector
+
+        Args:
+            key (str): state key
+            value (float): initial value
+
+        Returns:
+            :py:class:`StateVector`
+
+        """
+        if self._size == len(self._buffer):
+            grown = numpy.empty(max(8, 2 * len(self._buffer)), dtype=float)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size] = value
+        self._index[key] = self._size
+        self._keys.append(key)
+        self._size += 1
+        return self
+
+    def remove(self, key):
+        """Remove a state. Missing keys are ignored
+
+        Args:
+            key (str): state key
+
+        Returns:
+            :py:class:`StateVector`
+
+        """
+        if key not in self._index:
+            return self
+        position = self._index.pop(key)
+        self._buffer[position:self._size - 1] = self._buffer[position + 1:self._size]
+        del self._keys[position]
+        self._size -= 1
+        for i in range(position, self._size):
+            self._index[self._keys[i]] = i
+        return self
+
+    def to_dict(self):
+        """
+        Returns:
+            OrderedDict: key -> value in StateTemplate order
+        """
+        return OrderedDict(self.items())
+
+    def to_string(self):
+        """Format the values as ``InitialState`` text"""
+        return ' '.join(repr(i) for i in self.values.tolist())
+
+    def to_xml(self, initial_state):
+        """Write the values into the ``InitialState`` element
+
+        Args:
+            initial_state (etree._Element): the ``InitialState`` element
+
+        Returns:
+            etree._Element: `initial_state`
+
+        """
+        initial_state.text = self.to_string()
+        return initial_state
+
+
+def _rebind(value, model, memo):
+    """Shallow copies of the components in `value`, and of the
+    components they hold, bound to `model`
+
+    Args:
+        value: a component, a `list` or `dict` of them or anything else, which is returned as is
+        model (:py:class:`Model`): the model the copies belong to
+        memo (dict): copies made so far by id of the original
+
+    Returns:
+        `value` with every component replaced by its copy
+
+    """
+    if isinstance(value, list):
+        return [_rebind(i, model, memo) for i in value]
+    if isinstance(value, dict):
+        return {k: _rebind(v, model, memo) for k, v in value.items()}
+    if not isinstance(getattr(value, 'model', None), Model):
+        return value
+    if id(value) not in memo:
+        new = memo[id(value)] = shallow_copy(value)
+        for k, v in value.__dict__.items():
+            new.__dict__[k] = model if k == 'model' else _rebind(v, model, memo)
+    return memo[id(value)]
+
+
+class _component_table(cached_property):
+    """A cached list of components. A clone shares the lists of the
+    model it was cloned from (see :py:meth:`Model.clone`) until it first
+    uses one, when it gets copies of the components bound to the clone"""
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        shared = obj.__dict__.get('_shared_tables')
+        name = self.func.__name__
+        if shared and name in shared:
+            value = obj.__dict__[name] = _rebind(shared.pop(name), obj, {})
+            return value
+        return super(_component_table, self).__get__(obj, cls)
+
+
 class Model(_base._Base):
     """
     Construct a pycotools3 model from a copasi file
@@ -492,6 +858,7 @@ class Model(_base._Base):
     states                      List of states in correct order defined
                                 by copasi StateTemplate element.
     fit_item_order              Order in which fit items appear
+    task_names                  Names of the tasks in the model
     all_variable_names          List of reactions, metabolites, global_quantities
                                 local_parameters, compartment names as string
     number_of_reactions         Number of reactions in :py:class:`model.Model`
@@ -500,21 +867,45 @@ class Model(_base._Base):
     """
 
     def __init__(self, copasi_file, quantity_type='concentration',
-                 new=False, **kwargs):
+                 new=False, lazy=False, cache_dir=None, **kwargs):
         """
 
         Args:
             copasi_file(str): full path to a copasi file
             quantity_type (str): either 'concentration' (default) or 'particle_numbers'
             new (bool): True when constructing a new model
+            lazy (bool): Default False. When True only the attributes of the
+                model element are read. Header properties (name, units, key,
+                fit_item_order, task_names) stream what they need from the file and
+                the full tree is only parsed when something else needs it
+            cache_dir (str or :py:class:`parse_cache.ParseCache`): Default None.
+                Opt in to a persistent cache of the component tables, keyed by
+                the file content and COPASI schema version. Unchanged files
+                load their components from the cache instead of rebuilding them
         """
         super(Model, self).__init__(**kwargs)
         self._copasi_file = copasi_file
+        ## the file the tree is parsed from, even if copasi_file changes first
+        self._source_file = copasi_file
         self.quantity_type = quantity_type
         self.new_model = new
+        self.lazy = lazy
+        if cache_dir is not None and not isinstance(cache_dir, ParseCache):
+            cache_dir = ParseCache(cache_dir)
+        self.parse_cache = cache_dir
         if self.new_model:
             misc.new_model(copasi_file)
-        self.xml = tasks.CopasiMLParser(copasi_file).copasiML
+        self._xml = None
+        self._component_index = None
+        self._state_vector = None
+        ## sections read without building the tree. Only used before _load
+        self._header = {}
+        ## hash indexes over the cached component lists. See Model._lookup
+        self._lookups = {}
+        if self.lazy:
+            self._header['Model'], _ = tasks.CopasiMLParser.read_header(copasi_file)
+        else:
+            self._load()
         ## fill this dict after class is finished
         self.default_properties = {}
         self.default_properties.update(kwargs)
@@ -523,6 +914,87 @@ class Model(_base._Base):
                                       'particle_numbers']:
             raise errors.InputError('quantity_type argument should be concentration or particle_numbers')
 
+    def _load(self):
+        """Parse the full copasiML tree and build the structures
+        read from it. Called on construction, or on first use for
+        lazy models
+
+        With a :py:attr:`Model.parse_cache` the file is read once and the
+        same bytes are parsed and hashed for the cache key. The tree itself
+        is always parsed, only the component tables come from the cache. On
+        a hit the :py:class:`ComponentIndex` is not built until something
+        needs it.
+
+        Returns:
+            :py:class:`Model`
+
+        """
+        if self.parse_cache is None:
+            self._xml = tasks.CopasiMLParser(self._source_file).copasiML
+            ## one walk over the tree. Component properties read from here
+            self._component_index = ComponentIndex(self._xml)
+        else:
+            with open(self._source_file, 'rb') as f:
+                content = f.read()
+            ## parsed as by tasks.CopasiMLParser, which also changes directory
+            self._xml = etree.fromstring(content, etree.XMLParser(remove_blank_text=True))
+            os.chdir(os.path.dirname(self._source_file))
+            self._component_index = None
+        ## source of truth for the InitialState until the model is saved
+        self._state_vector = self._read_states()
+        self._header = {}
+
+        if self.parse_cache is not None:
+            key = ParseCache.key(content, self._xml, self.quantity_type)
+            if not self.parse_cache.load(key, self):
+                self.parse_cache.store(key, self)
+        return self
+
+    @property
+    def loaded(self):
+        """`bool`. True once the full copasiML tree has been parsed"""
+        return self._xml is not None
+
+    @property
+    def xml(self):
+        """The copasiML root element. Parsed here for lazy models"""
+        if self._xml is None:
+            self._load()
+        return self._xml
+
+    @property
+    def component_index(self):
+        """:py:class:`ComponentIndex` of :py:attr:`Model.xml`"""
+        if self._xml is None:
+            self._load()
+        elif self._component_index is None:
+            ## clones index their tree on first use
+            self._component_index = ComponentIndex(self._xml)
+        return self._component_index
+
+    @property
+    def state_vector(self):
+        """:py:class:`StateVector` of the model states"""
+        if self._xml is None:
+            self._load()
+        return self._state_vector
+
+    def _header_section(self, section):
+        """A top level section of a lazy model, streamed from
+        file without building the full tree
+
+        Args:
+            section (str): tag without namespace, i.e. 'ListOfTasks'
+
+        Returns:
+            etree._Element or None
+
+        """
+        if section not in self._header:
+            _, found = tasks.CopasiMLParser.read_header(self._source_file, sections=[section])
+            self._header[section] = found.get(section)
+        return self._header[section]
+
     def __str__(self):
         return 'Model(name={}, time_unit={}, volume_unit={}, quantity_unit={})'.format(self.name, self.time_unit,
                                                                                        self.volume_unit,
@@ -532,7 +1004,58 @@ class Model(_base._Base):
         return self.__str__()
 
     def __contains__(self, item):
-        return item in self.all_variable_names
+        try:
+            return item in self._lookup('metabolites', 'name') \
+                   or item in self._lookup('global_quantities', 'name') \
+                   or item in self._lookup('local_parameters', 'global_name') \
+                   or item in self._lookup('compartments', 'name')
+        except TypeError:
+            ## unhashable item
+            return item in self.all_variable_names
+
+    ## Cached properties and the caches or model data they are computed
+    ## from. 'states' stands for the state vector
+    _cache_dependencies = {
+        'compartments': ['states'],
+        'metabolites': ['compartments', 'states'],
+        'global_quantities': ['states'],
+        'functions': [],
+        'constants': [],
+        'local_parameters': ['constants'],
+        'reactions': ['metabolites', 'constants', 'functions'],
+    }
+
+    def invalidate_cache(self, *props):
+        """Drop cached properties and every cached
+        property that depends on them, directly or not,
+        according to :py:attr:`Model._cache_dependencies`.
+
+        Mutators call this instead of reloading the model so only
+        the caches touched by a change are recomputed.
+
+        Args:
+          *props: str`. Names of changed properties, i.e. 'metabolites',
+            or 'states' when the state values change
+
+        Returns:
+          py:class:`Model`
+
+        """
+        stale = set()
+        queue = list(props)
+        while queue:
+            prop = queue.pop()
+            if prop in stale:
+                continue
+            stale.add(prop)
+            queue += [k for k, v in self._cache_dependencies.items() if prop in v]
+
+        shared = self.__dict__.get('_shared_tables', {})
+        for prop in stale:
+            shared.pop(prop, None)
+            if prop in self.__dict__:
+                del self.__dict__[prop]
+        return self
 
     def reset_cache(self, prop):
         """Delete property from cache then
@@ -599,6 +1122,47 @@ class Model(_base._Base):
         model.copasi_file = filename
         return model
 
+    def clone(self, copasi_file=None):
+        """Cheap copy of the model for ensembles and multi starts.
+
+        Unlike :py:meth:`Model._copy` the cached component tables
+        (metabolites, reactions, ...) are not rebuilt from the tree. The
+        clone shares them until it first reads one, then takes shallow
+        copies of its components bound to the clone, so that
+        `clone.metabolites[0].model is clone`. Mutators on either model
+        only drop their own caches (see :py:meth:`Model.invalidate_cache`)
+        so a table is only rebuilt by the model that changes. The copasiML tree, which tasks
+        edit in place, is copied by lxml in a single call and only indexed
+        (see :py:class:`ComponentIndex`) when first needed. The state vector
+        is copied too.
+
+        Args:
+          copasi_file: str` or `None`. Path for the clone. Defaults
+            to the path of this model. Nothing is written to disk
+
+        Returns:
+          :py:class:`Model`
+
+        """
+        ## lazy models are parsed first so the clone does not depend on the file
+        xml = self.xml
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        ## tables stay shared until the clone reads them, see _component_table
+        new._shared_tables = dict(self.__dict__.get('_shared_tables', {}))
+        for name in self._cache_dependencies:
+            if name in new.__dict__:
+                new._shared_tables[name] = new.__dict__.pop(name)
+        new.kwargs = dict(self.kwargs)
+        new.default_properties = dict(self.default_properties)
+        new._lookups = dict(self._lookups)
+        new._xml = deepcopy(xml)
+        new._component_index = None
+        new._state_vector = deepcopy(self._state_vector)
+        if copasi_file is not None:
+            new.copasi_file = copasi_file
+        return new
+
     def to_antimony(self):
         """
 
@@ -647,6 +1211,30 @@ class Model(_base._Base):
         """
         return "CN=Root,Model={}".format(self.name)
 
+    @property
+    def _model_element(self):
+        """The copasiML Model element which holds the model
+        name, key and units as attributes
+
+        Returns:
+            etree._Element
+
+        """
+        return self.component_index.find('{http://www.copasi.org/static/schema}Model')
+
+    @property
+    def _model_attributes(self):
+        """Attributes of the Model element. Read from
+        the header for lazy models that have not been parsed yet
+
+        Returns:
+            dict-like
+
+        """
+        if self._xml is None:
+            return self._header['Model']
+        return self._model_element.attrib
+
     @property
     def time_unit(self):
         """:return:
@@ -657,8 +1245,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['timeUnit']
+        return self._model_attributes['timeUnit']
 
     @property
     def name(self):
@@ -670,8 +1257,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['name']
+        return self._model_attributes['name']
 
     @name.setter
     def name(self, name):
@@ -684,8 +1270,7 @@ class Model(_base._Base):
           py:class:`Model`
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        self.xml.xpath(query)[0].attrib['name'] = str(name)
+        self._model_element.attrib['name'] = str(name)
         return self
 
     @property
@@ -698,8 +1283,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['volumeUnit']
+        return self._model_attributes['volumeUnit']
 
     @property
     def quantity_unit(self):
@@ -711,8 +1295,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['quantityUnit']
+        return self._model_attributes['quantityUnit']
 
     @property
     def area_unit(self):
@@ -724,8 +1307,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['areaUnit']
+        return self._model_attributes['areaUnit']
 
     @property
     def length_unit(self):
@@ -737,8 +1319,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['lengthUnit']
+        return self._model_attributes['lengthUnit']
 
     @property
     def avagadro(self):
@@ -754,8 +1335,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        avagadro_from_model = float(self.xml.xpath(query)[0].attrib['avogadroConstant'])
+        avagadro_from_model = float(self._model_attributes['avogadroConstant'])
         avagadros_from_version19 = 6.022140857e+23
         avagadros_from_version21 = 6.02214179e+23
         if avagadro_from_model != avagadros_from_version21:
@@ -776,8 +1356,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        query = '//*[@timeUnit]' and '//*[@volumeUnit]' and '//*[@areaUnit]'
-        return self.xml.xpath(query)[0].attrib['key']
+        return self._model_attributes['key']
 
     @property
     def states(self):
@@ -792,21 +1371,7 @@ class Model(_base._Base):
         Returns:
 
         """
-        collection = []
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}StateTemplate':
-                for j in i:
-                    collection.append(j.attrib['objectReference'])
-
-        query = '//*[@type="initialState"]'
-        for i in self.xml.xpath(query):
-            state_values = i.text
-
-        state_values = state_values.split(' ')
-        state_values = [i for i in state_values if i not in ['', ' ', '\n']]
-        state_values = [float(i) for i in state_values]
-
-        return OrderedDict(list(zip(collection, state_values)))
+        return self.state_vector.to_dict()
 
     @states.setter
     def states(self, states):
@@ -820,23 +1385,39 @@ class Model(_base._Base):
 
         """
         ## first check what data type states is
-        if not isinstance(states, str):
-            ## if not str then convert list to str in appropriate format
-            state_string = reduce(lambda x, y: '{} {}'.format(x, y), states)
+        if isinstance(states, str):
+            states = states.split()
 
-        ## get number of model states
-        number_of_model_states = len(self.states)
+        ## a single array assignment. Raises InputError on the wrong number of states
+        self.state_vector.values = states
+        self.invalidate_cache('states')
+        return self
 
-        ##check we have correct number of model states
-        if len(states) != number_of_model_states:
-            raise errors.InputError(
-                'Not entered the currect number of states. Expected {} and got {}'.format(number_of_model_states,
-                                                                                          len(states)))
+    def _read_states(self):
+        """Build the :py:class:`StateVector` from the StateTemplate
+        and InitialState elements
+
+        Returns:
+            :py:class:`StateVector`
+
+        """
+        ## direct children of Model, so the tree is not indexed for them
+        template = self._xml.find('{0}Model/{0}StateTemplate'.format('{http://www.copasi.org/static/schema}'))
+        initial_state = self._xml.find('{0}Model/{0}InitialState'.format('{http://www.copasi.org/static/schema}'))
+        if template is None or initial_state is None:
+            return StateVector()
+        return StateVector.from_xml(template, initial_state)
 
-        ## enter states into model
-        query = '//*[@type="initialState"]'
-        for i in self.xml.xpath(query):
-            i.text = state_string
+    def _write_states(self):
+        """Serialize the :py:class:`StateVector` into
+        the InitialState element before writing the model
+
+        Returns:
+            :py:class:`Model`
+
+        """
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}InitialState'):
+            self.state_vector.to_xml(i)
         return self
 
     @property
@@ -854,7 +1435,13 @@ class Model(_base._Base):
         """
         lst = []
         query = '//*[@name="FitItem"]'
-        for i in self.xml.xpath(query):
+        if self._xml is None:
+            ## lazy model. Only stream the tasks
+            list_of_tasks = self._header_section('ListOfTasks')
+            fit_items = [] if list_of_tasks is None else list_of_tasks.xpath('.' + query)
+        else:
+            fit_items = self.xml.xpath(query)
+        for i in fit_items:
             ## exclude FitItems that match elements of the constraint list
             if i.getparent().attrib['name'] == 'OptimizationConstraintList':
                 continue
@@ -877,6 +1464,24 @@ class Model(_base._Base):
                         lst.append(match2)
         return lst
 
+    @property
+    def task_names(self):
+        """Names of the tasks in the ListOfTasks element, i.e.
+        'Time-Course' or 'Parameter Estimation'. Streamed
+        from file for lazy models
+
+        Returns:
+            `list` of `str`
+
+        """
+        if self._xml is None:
+            list_of_tasks = self._header_section('ListOfTasks')
+        else:
+            list_of_tasks = self.xml.find('{http://www.copasi.org/static/schema}ListOfTasks')
+        if list_of_tasks is None:
+            return []
+        return [i.attrib['name'] for i in list_of_tasks]
+
     def add_state(self, state, value):
         """Append state on to end of state template.
         Used within add_metabolite and add_global_quantity. Shouldn't
@@ -891,12 +1496,9 @@ class Model(_base._Base):
         """
         element = etree.Element('{http://www.copasi.org/static/schema}StateTemplateVariable',
                                 attrib={'objectReference': state})
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}StateTemplate':
-                i.append(element)
-                for j in i.getparent():
-                    if j.tag == '{http://www.copasi.org/static/schema}InitialState':
-                        j.text = "{} {} \n".format(j.text.replace('\n', '').strip(), str(value))  # + '\n'
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}StateTemplate'):
+            self.component_index.add(element, parent=i)
+        self.state_vector.append(state, float(value))
         return self
 
     def remove_state(self, state):
@@ -911,29 +1513,15 @@ class Model(_base._Base):
           py:class:`Model`
 
         """
-        ##count the number of states
-        count = -1  # 0 indexed python
-
-        stop_count = 0
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}StateTemplate':
-                for j in i:
-                    count = count + 1
-                    if j.attrib['objectReference'] == state:
-                        j.getparent().remove(j)
-                        ##collect the number where we hit our desired state
-                        stop_count = count
-
-            if i.tag == '{http://www.copasi.org/static/schema}InitialState':
-                states = i.text.strip().split(' ')
-                del states[stop_count]  ## get component of interest
-        # reassign the states list to the InitialState
-        states = [float(i) for i in states]
-        self.states = states
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}StateTemplate'):
+            for j in list(i):
+                if j.attrib['objectReference'] == state:
+                    self.component_index.remove(j)
+        self.state_vector.remove(state)
         return self
 
     # @property
-    @cached_property
+    @_component_table
     def compartments(self):
         """Get list of model compartments
         
@@ -945,20 +1533,14 @@ class Model(_base._Base):
         Returns:
 
         """
-        collection = {}
         lst = []
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfCompartments':
-                df_list = []
-                for j in i:
-                    lst.append(Compartment(self,
-                                           key=j.attrib['key'],
-                                           name=j.attrib['name'],
-                                           simulation_type=j.attrib['simulationType'],
-                                           initial_value=float(self.states[j.attrib['key']])))
-        if 'compartments' in self.__dict__:
-            del self.__dict__['compartments']
-
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfCompartments'):
+            for j in i:
+                lst.append(Compartment(self,
+                                       key=j.attrib['key'],
+                                       name=j.attrib['name'],
+                                       simulation_type=j.attrib['simulationType'],
+                                       initial_value=self.state_vector[j.attrib['key']]))
         return lst
 
     def add_compartment(self, compartment):
@@ -997,8 +1579,7 @@ class Model(_base._Base):
                 'with key: "{}"'.format(compartment.key)
             )
 
-        if 'compartments' in self.__dict__:
-            del self.__dict__['compartments']
+        self.invalidate_cache('compartments')
 
         ## if ListOfCompartment tag not exist, create
         comp_tag = '{http://www.copasi.org/static/schema}ListOfCompartments'
@@ -1011,11 +1592,10 @@ class Model(_base._Base):
                 if self.xml.find(mod_tag)[i].tag == miriam:
                     miriam_index = i
 
-            self.xml.find(mod_tag).insert(miriam_index + 1, new_comp)
+            self.component_index.add(new_comp, parent=self.xml.find(mod_tag), index=miriam_index + 1)
 
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfCompartments':
-                i.append(compartment.to_xml())
+        for i in self.component_index.findall(comp_tag):
+            self.component_index.add(compartment.to_xml(), parent=i)
 
         ## add compartment to state template
         self.add_state(compartment.key, compartment.initial_value)
@@ -1040,16 +1620,14 @@ class Model(_base._Base):
             raise errors.ComponentDoesNotExistError('Component with {}={} does not exist'.format(by, value))
 
         ## first remove compartment from list of compartments
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfCompartments':
-                for j in i:
-                    if j.attrib[by] == value:
-                        j.getparent().remove(j)
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfCompartments'):
+            for j in list(i):
+                if j.attrib[by] == value:
+                    self.component_index.remove(j)
 
         ## then remove from state template and initial state
         self.remove_state(comp.key)
-        if 'compartments' in self.__dict__:
-            del self.__dict__['compartments']
+        self.invalidate_cache('compartments')
         return self
 
     @property
@@ -1133,25 +1711,25 @@ class Model(_base._Base):
         Returns:
             correct model object
         """
-        if string not in self.all_variable_names:
+        if string not in self:
             raise errors.InputError(f'"{string}" not in {self.all_variable_names}')
 
-        if string in [i.name for i in self.metabolites]:
+        if string in self._lookup('metabolites', 'name'):
             return self.get('metabolite', string)
 
-        elif string in [i.name for i in self.local_parameters]:
+        elif string in self._lookup('local_parameters', 'name'):
             return self.get('local_parameter', string)
 
-        elif string in [i.name for i in self.global_quantities]:
+        elif string in self._lookup('global_quantities', 'name'):
             return self.get('global_quantity', string)
 
-        elif string in [i.name for i in self.compartments]:
+        elif string in self._lookup('compartments', 'name'):
             return self.get('compartment', string)
 
         else:
             raise errors.SomethingWentHorriblyWrongError
 
-    @cached_property
+    @_component_table
     def local_parameters(self):
         """Get local parameters in model. local_parameters are
         those which are actively used in reactions and do not have
@@ -1189,22 +1767,28 @@ class Model(_base._Base):
           py:class:`Model`
 
         """
-        ## remove frome cache
-        if 'local_parameters' in self.__dict__:
-            del self.__dict__['local_parameters']
-
         ## do not add if already exists
         if local_parameter.global_name in [i.global_name for i in self.local_parameters]:
             return self
 
-        query = '//*[@cn="String=Kinetic Parameters"]'
-        for i in self.xml.xpath(query):
-            i.append(local_parameter.to_xml())
+        for i in self._kinetic_parameter_groups():
+            self.component_index.add(local_parameter.to_xml(), parent=i)
 
-        # self.refresh()
-        # print self.refresh().local_parameters
+        ## remove frome cache
+        self.invalidate_cache('constants')
         return self
 
+    def _kinetic_parameter_groups(self):
+        """The ModelParameterGroup elements holding the
+        kinetic (local) parameters of each parameter set
+
+        Returns:
+            `list` of etree._Element
+
+        """
+        groups = self.component_index.findall('{http://www.copasi.org/static/schema}ModelParameterGroup')
+        return [i for i in groups if i.attrib.get('cn') == 'String=Kinetic Parameters']
+
     @staticmethod
     def convert_particles_to_molar(particles, mol_unit, compartment_volume):
         """Converts particle numbers to Molarity.
@@ -1300,7 +1884,7 @@ class Model(_base._Base):
             molarity = float(particles)
         return particles
 
-    @cached_property
+    @_component_table
     def metabolites(self):
         """:return:
             `list`. Each element is :py:class:`Metabolite`
@@ -1311,14 +1895,13 @@ class Model(_base._Base):
 
         """
         metabs = {}
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfMetabolites':
-                for j in i:
-                    metabs[j.attrib['key']] = j.attrib
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfMetabolites'):
+            for j in i:
+                metabs[j.attrib['key']] = j.attrib
 
-        for key, value in list(self.states.items()):
-            if key in list(metabs.keys()):
-                metabs[key]['particle_numbers'] = str(value)
+        for key in metabs:
+            if key in self.state_vector:
+                metabs[key]['particle_numbers'] = str(self.state_vector[key])
 
         lst = []
         for key in metabs:
@@ -1350,7 +1933,6 @@ class Model(_base._Base):
         ## if no compartments exist, make one
         if self.compartments == []:
             self.add_component('compartment', 'NewCompartment')
-            self.save()
 
         ## If metab is str convert to Metabolite
         ## with default parameters
@@ -1359,8 +1941,7 @@ class Model(_base._Base):
         if isinstance(metab, str):
             metab = Metabolite(self, metab)
 
-        if 'metabolites' in self.__dict__:
-            del self.__dict__['metabolites']
+        self.invalidate_cache('metabolites')
 
         if not isinstance(metab, Metabolite):
             raise errors.InputError('Input must be Metabolite class')
@@ -1376,14 +1957,13 @@ class Model(_base._Base):
                 if self.xml.find(mod_tag)[i].tag == comp:
                     miriam_index = i
 
-            self.xml.find(mod_tag).insert(miriam_index + 1, new_m)
+            self.component_index.add(new_m, parent=self.xml.find(mod_tag), index=miriam_index + 1)
 
         metabolite_element = metab.to_xml()
         ## add the metabolute to list of metabolites
         list_of_metabolites = '{http://www.copasi.org/static/schema}ListOfMetabolites'
-        for i in self.xml.iter():
-            if i.tag == list_of_metabolites:
-                i.append(metabolite_element)
+        for i in self.component_index.findall(list_of_metabolites):
+            self.component_index.add(metabolite_element, parent=i)
 
         ## add metabolite to state_template and initial state fields
         self.add_state(metab.key, metab.particle_numbers)
@@ -1417,16 +1997,14 @@ class Model(_base._Base):
         metab = self.get('metabolite', value, by=by)
         if metab == []:
             raise TypeError('No metab with "{}" attribute == "{}" exists'.format(by, value))
-        for i in self.xml.iter():
-            if i.tag == list_of_metabolites:
-                for j in i:
-                    if j.attrib[by] == value:
-                        j.getparent().remove(j)
+        for i in self.component_index.findall(list_of_metabolites):
+            for j in list(i):
+                if j.attrib[by] == value:
+                    self.component_index.remove(j)
         self.remove_state(metab.key)
 
         ## remove cached
-        if 'metabolites' in self.__dict__:
-            del self.__dict__['metabolites']
+        self.invalidate_cache('metabolites')
         return self
 
     def add_global_quantity(self, global_quantity):
@@ -1460,8 +2038,7 @@ class Model(_base._Base):
             )
             return self
 
-        if 'global_quantities' in self.__dict__:
-            del self.__dict__['global_quantities']
+        self.invalidate_cache('global_quantities')
 
         ## if ListOfCompartment tag not exist, create
         m = '{http://www.copasi.org/static/schema}ListOfModelValues'
@@ -1474,19 +2051,18 @@ class Model(_base._Base):
                 if self.xml.find(mod_tag)[i].tag == comp:
                     idx = i
 
-            self.xml.find(mod_tag).insert(idx + 1, new_m)
+            self.component_index.add(new_m, parent=self.xml.find(mod_tag), index=idx + 1)
 
         model_value = global_quantity.to_xml()
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfModelValues':
-                i.append(model_value)
+        for i in self.component_index.findall(m):
+            self.component_index.add(model_value, parent=i)
 
         self.add_state(global_quantity.key, global_quantity.initial_value)
 
         self.global_quantities
         return self
 
-    @cached_property
+    @_component_table
     def global_quantities(self):
         """:return:
             `list` each element is :py:class:`GlobalQuantity`
@@ -1497,14 +2073,13 @@ class Model(_base._Base):
 
         """
         model_values = {}
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfModelValues':
-                for j in i:
-                    model_values[j.attrib['key']] = j.attrib
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfModelValues'):
+            for j in i:
+                model_values[j.attrib['key']] = j.attrib
 
-        for key, value in list(self.states.items()):
-            if key in list(model_values.keys()):
-                model_values[key]['initial_value'] = str(value)
+        for key in model_values:
+            if key in self.state_vector:
+                model_values[key]['initial_value'] = str(self.state_vector[key])
 
         lst = []
         for key in model_values:
@@ -1531,18 +2106,17 @@ class Model(_base._Base):
                                 by)
 
         ##remove cached
-        del self.__dict__['global_quantities']
+        self.invalidate_cache('global_quantities')
 
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfModelValues':
-                for j in i:
-                    if j.attrib[by] == value:
-                        j.getparent().remove(j)
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfModelValues'):
+            for j in list(i):
+                if j.attrib[by] == value:
+                    self.component_index.remove(j)
 
         self.remove_state(global_value.key)
         return self
 
-    @cached_property
+    @_component_table
     def functions(self):
         """get model functions
         :return:
@@ -1554,33 +2128,32 @@ class Model(_base._Base):
 
         """
         lst = []
-        for element in self.xml.iter():
-            if element.tag == '{http://www.copasi.org/static/schema}ListOfFunctions':
-                for child in list(element):
-                    name = child.attrib['name']
-                    key = child.attrib['key']
-                    type = child.attrib['type']
-                    reversible = child.attrib['reversible']
-                    list_of_parameter_descriptions = []
-                    for grandchild in child:
-                        if grandchild.tag == '{http://www.copasi.org/static/schema}Expression':
-                            expression = grandchild.text.replace('\n', '').strip()
-
-                        if grandchild.tag == '{http://www.copasi.org/static/schema}ListOfParameterDescriptions':
-                            for greatgrandchild in grandchild:
-                                list_of_parameter_descriptions.append(
-                                    ParameterDescription(self,
-                                                         name=greatgrandchild.attrib['name'],
-                                                         key=greatgrandchild.attrib['key'],
-                                                         order=greatgrandchild.attrib['order'],
-                                                         role=greatgrandchild.attrib['role']))
-                    lst.append(Function(self,
-                                        name=name,
-                                        key=key,
-                                        type=type,
-                                        expression=expression,
-                                        reversible=reversible,
-                                        list_of_parameter_descriptions=list_of_parameter_descriptions))
+        for element in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfFunctions'):
+            for child in list(element):
+                name = child.attrib['name']
+                key = child.attrib['key']
+                type = child.attrib['type']
+                reversible = child.attrib['reversible']
+                list_of_parameter_descriptions = []
+                for grandchild in child:
+                    if grandchild.tag == '{http://www.copasi.org/static/schema}Expression':
+                        expression = grandchild.text.replace('\n', '').strip()
+
+                    if grandchild.tag == '{http://www.copasi.org/static/schema}ListOfParameterDescriptions':
+                        for greatgrandchild in grandchild:
+                            list_of_parameter_descriptions.append(
+                                ParameterDescription(self,
+                                                     name=greatgrandchild.attrib['name'],
+                                                     key=greatgrandchild.attrib['key'],
+                                                     order=greatgrandchild.attrib['order'],
+                                                     role=greatgrandchild.attrib['role']))
+                lst.append(Function(self,
+                                    name=name,
+                                    key=key,
+                                    type=type,
+                                    expression=expression,
+                                    reversible=reversible,
+                                    list_of_parameter_descriptions=list_of_parameter_descriptions))
         return lst
 
     @property
@@ -1594,13 +2167,12 @@ class Model(_base._Base):
 
         """
         lst = []
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ParameterDescription':
-                lst.append(ParameterDescription(self,
-                                                name=i.attrib['name'],
-                                                key=i.attrib['key'],
-                                                order=i.attrib['order'],
-                                                role=i.attrib['role']))
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ParameterDescription'):
+            lst.append(ParameterDescription(self,
+                                            name=i.attrib['name'],
+                                            key=i.attrib['key'],
+                                            order=i.attrib['order'],
+                                            role=i.attrib['role']))
         return lst
 
     def add_function(self, function):
@@ -1628,16 +2200,15 @@ class Model(_base._Base):
         ## If ListOfFunctions element not exist, create
         m = '{http://www.copasi.org/static/schema}ListOfFunctions'
         if self.xml.find(m) is None:
-            self.xml.insert(0, etree.Element(m))
+            self.component_index.add(etree.Element(m), parent=self.xml, index=0)
 
         ## add the function to list of functions
         if function.key in [i.key for i in self.functions]:
             return self
 
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfFunctions':
-                i.append(function.to_xml())
-        del self.__dict__['functions']
+        for i in self.component_index.findall(m):
+            self.component_index.add(function.to_xml(), parent=i)
+        self.invalidate_cache('functions')
         return self
 
     def remove_function(self, value, by='name'):
@@ -1651,11 +2222,11 @@ class Model(_base._Base):
           py:class:`model.Model`
 
         """
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfFunctions':
-                for j in i:
-                    if j.attrib[by] == value:
-                        j.getparent().remove(j)
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfFunctions'):
+            for j in list(i):
+                if j.attrib[by] == value:
+                    self.component_index.remove(j)
+        self.invalidate_cache('functions')
         return self
 
     @property
@@ -1669,13 +2240,11 @@ class Model(_base._Base):
 
         """
         count = 0
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                for j in list(i):
-                    count = count + 1
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfReactions'):
+            count = count + len(i)
         return count
 
-    @cached_property
+    @_component_table
     def constants(self):
         """Get list of constants from xml attribute
         `cn="String=Kinetic Parameters"
@@ -1687,11 +2256,8 @@ class Model(_base._Base):
         Returns:
 
         """
-        if 'constants' in self.__dict__:
-            del self.__dict__['keys']
-        query = '//*[@cn="String=Kinetic Parameters"]'
         dct = {}
-        for i in self.xml.xpath(query):
+        for i in self._kinetic_parameter_groups():
             for j in i:
                 for k in j:
                     reaction_name, parameter_name = re.findall('.*Reactions\[(.*)\].*Parameter=(.*)', k.attrib['cn'])[0]
@@ -1705,29 +2271,58 @@ class Model(_base._Base):
                     dct[global_name]['simulation_type'] = simulation_type
 
         res = []
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                for j in i:
-                    reaction_name = j.attrib['name']
-                    for k in j:
-                        for l in k:
-                            if l.tag == '{http://www.copasi.org/static/schema}Constant':
-                                parameter_name = l.attrib['name']
-                                global_name = "({}).{}".format(reaction_name, parameter_name)
-                                parameter_key = l.attrib['key']
-                                loc = LocalParameter(self,
-                                                     name=dct[global_name]['parameter_name'],
-                                                     value=dct[global_name]['value'],
-                                                     key=parameter_key,
-                                                     reaction_name=dct[global_name]['reaction_name'],
-                                                     global_name=global_name,
-                                                     simulation_type=dct[global_name]['simulation_type']
-                                                     )
-                                res.append(loc)
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfReactions'):
+            for j in i:
+                reaction_name = j.attrib['name']
+                for k in j:
+                    for l in k:
+                        if l.tag == '{http://www.copasi.org/static/schema}Constant':
+                            parameter_name = l.attrib['name']
+                            global_name = "({}).{}".format(reaction_name, parameter_name)
+                            ## add_reaction adds the reaction before its
+                            ## entries in the kinetic parameters
+                            if global_name not in dct:
+                                continue
+                            parameter_key = l.attrib['key']
+                            loc = LocalParameter(self,
+                                                 name=dct[global_name]['parameter_name'],
+                                                 value=dct[global_name]['value'],
+                                                 key=parameter_key,
+                                                 reaction_name=dct[global_name]['reaction_name'],
+                                                 global_name=global_name,
+                                                 simulation_type=dct[global_name]['simulation_type']
+                                                 )
+                            res.append(loc)
 
         return res
 
-    @cached_property
+    @property
+    def stoichiometry_matrix(self):
+        """The stoichiometry matrix of the species determined by reactions,
+        read from the xml without assembling :py:attr:`Model.reactions`
+
+        Returns:
+            :py:class:`native.Stoichiometry` holding a scipy.sparse matrix
+            with maps from species and reaction names to its rows and columns
+
+        """
+        return native.stoichiometry(self)
+
+    def conservation_laws(self, tolerance=1e-9):
+        """Find the conservation laws (moieties) of the model
+
+        Args:
+            tolerance (float): Default 1e-9. Relative size below which
+                entries are zero while reducing the stoichiometry matrix
+
+        Returns:
+            :py:class:`native.ConservationLaws` with the link matrix and the
+            independent species of the reduced system
+
+        """
+        return self.stoichiometry_matrix.conservation_laws(tolerance)
+
+    @_component_table
     def reactions(self):
         """assemble a list of reactions
         :return:
@@ -1739,75 +2334,70 @@ class Model(_base._Base):
 
         """
         ## make sure list of reaction tag exists befor continuing
-        exist = False
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                exist = True
-
-        if exist == False:
+        list_of_reactions = self.component_index.findall('{http://www.copasi.org/static/schema}ListOfReactions')
+        if list_of_reactions == []:
             return []
 
         reaction_count = 0
         reactions_dict = {}
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                for j in list(i):
-                    reaction_count += 1
-                    reactions_dict[reaction_count] = {}
-                    ##defaults
-                    reactions_dict[reaction_count]['reversible'] = 'false'
-                    ## sometimes these are not being updated
-                    reactions_dict[reaction_count]['substrates'] = []
-                    reactions_dict[reaction_count]['products'] = []
-                    reactions_dict[reaction_count]['modifiers'] = []
-                    reactions_dict[reaction_count]['constants'] = []
-                    reactions_dict[reaction_count]['function'] = []
-                    for k in list(j):
-                        reactions_dict[reaction_count]['reversible'] = j.attrib['reversible']
-                        reactions_dict[reaction_count]['name'] = j.attrib['name']
-                        reactions_dict[reaction_count]['key'] = j.attrib['key']
-                        if k.tag == '{http://www.copasi.org/static/schema}ListOfSubstrates':
-                            list_of_substrates = []
-                            for l in list(k):
-                                substrate = self.get('metabolite', l.attrib['metabolite'], by='key')
-                                if isinstance(substrate, list):
-                                    raise errors.SomethingWentHorriblyWrongError('substrate matched >1 substrate')
-                                ##convert to substrate
-                                substrate = substrate.to_substrate()
-                                list_of_substrates.append(substrate)
-                            reactions_dict[reaction_count]['substrates'] = list_of_substrates
-
-                        elif k.tag == '{http://www.copasi.org/static/schema}ListOfProducts':
-                            list_of_products = []
-                            for l in list(k):
-                                ## get list of metabolites and convert them to Product class
-                                product = self.get('metabolite', l.attrib['metabolite'], by='key')
-                                product = product.to_product()
-                                list_of_products.append(product)
-                                reactions_dict[reaction_count]['products'] = list_of_products
-
-                        elif k.tag == '{http://www.copasi.org/static/schema}ListOfModifiers':
-                            list_of_modifiers = []
-                            for l in list(k):
-                                ## get list of metabolites and convert them to Moifier class
-                                modifier = self.get('metabolite', l.attrib['metabolite'], by='key')
-                                modifier = modifier.to_product()
-                                list_of_modifiers.append(modifier)
-                                reactions_dict[reaction_count]['modifiers'] = list_of_modifiers
-
-                        elif k.tag == '{http://www.copasi.org/static/schema}ListOfConstants':
-                            list_of_constants = []
-
-                            ##assertain the parameters simulation type
-                            for l in list(k):
-                                global_name = "({}).{}".format(j.attrib['name'], l.attrib['name'])
-                                # LOG.warning('Experimental section of reactions function')
-                                constant = self.get('local_parameter', global_name, by='global_name')
-                                list_of_constants.append(constant)
-
-                        elif k.tag == '{http://www.copasi.org/static/schema}KineticLaw':
-                            function = self.get('function', k.attrib['function'], by='key')
-                            reactions_dict[reaction_count]['function'] = function
+        for i in list_of_reactions:
+            for j in list(i):
+                reaction_count += 1
+                reactions_dict[reaction_count] = {}
+                ##defaults
+                reactions_dict[reaction_count]['reversible'] = 'false'
+                ## sometimes these are not being updated
+                reactions_dict[reaction_count]['substrates'] = []
+                reactions_dict[reaction_count]['products'] = []
+                reactions_dict[reaction_count]['modifiers'] = []
+                reactions_dict[reaction_count]['constants'] = []
+                reactions_dict[reaction_count]['function'] = []
+                for k in list(j):
+                    reactions_dict[reaction_count]['reversible'] = j.attrib['reversible']
+                    reactions_dict[reaction_count]['name'] = j.attrib['name']
+                    reactions_dict[reaction_count]['key'] = j.attrib['key']
+                    if k.tag == '{http://www.copasi.org/static/schema}ListOfSubstrates':
+                        list_of_substrates = []
+                        for l in list(k):
+                            substrate = self.get('metabolite', l.attrib['metabolite'], by='key')
+                            if isinstance(substrate, list):
+                                raise errors.SomethingWentHorriblyWrongError('substrate matched >1 substrate')
+                            ##convert to substrate
+                            substrate = substrate.to_substrate()
+                            list_of_substrates.append(substrate)
+                        reactions_dict[reaction_count]['substrates'] = list_of_substrates
+
+                    elif k.tag == '{http://www.copasi.org/static/schema}ListOfProducts':
+                        list_of_products = []
+                        for l in list(k):
+                            ## get list of metabolites and convert them to Product class
+                            product = self.get('metabolite', l.attrib['metabolite'], by='key')
+                            product = product.to_product()
+                            list_of_products.append(product)
+                            reactions_dict[reaction_count]['products'] = list_of_products
+
+                    elif k.tag == '{http://www.copasi.org/static/schema}ListOfModifiers':
+                        list_of_modifiers = []
+                        for l in list(k):
+                            ## get list of metabolites and convert them to Moifier class
+                            modifier = self.get('metabolite', l.attrib['metabolite'], by='key')
+                            modifier = modifier.to_product()
+                            list_of_modifiers.append(modifier)
+                            reactions_dict[reaction_count]['modifiers'] = list_of_modifiers
+
+                    elif k.tag == '{http://www.copasi.org/static/schema}ListOfConstants':
+                        list_of_constants = []
+
+                        ##assertain the parameters simulation type
+                        for l in list(k):
+                            global_name = "({}).{}".format(j.attrib['name'], l.attrib['name'])
+                            # LOG.warning('Experimental section of reactions function')
+                            constant = self.get('local_parameter', global_name, by='global_name')
+                            list_of_constants.append(constant)
+
+                    elif k.tag == '{http://www.copasi.org/static/schema}KineticLaw':
+                        function = self.get('function', k.attrib['function'], by='key')
+                        reactions_dict[reaction_count]['function'] = function
 
         ## assemble the expression for the reaction
         # LOG.warning('move below code to separate function for clean code')
@@ -1925,8 +2515,7 @@ class Model(_base._Base):
             raise errors.ReactionAlreadyExists(
                 'Your model already contains a reaction with the name: {}'.format(reaction.name))
 
-        if 'reactions' in self.__dict__:
-            del self.__dict__['reactions']
+        self.invalidate_cache('reactions')
 
         existing_functions = [i.name for i in self.functions]
         if reaction.rate_law.name not in existing_functions:
@@ -1955,18 +2544,18 @@ class Model(_base._Base):
                 if self.xml.find(mod_tag)[i].tag == metab:
                     idx = i
 
-            self.xml.find(mod_tag).insert(idx + 1, new_m)
+            self.component_index.add(new_m, parent=self.xml.find(mod_tag), index=idx + 1)
 
-        for i in self.xml.iter():
-            if i.tag == m:
-                i.append(reaction.to_xml())
+        for i in self.component_index.findall(m):
+            self.component_index.add(reaction.to_xml(), parent=i)
         ## needed?
         # self.save()
         for local_parameter in reaction.parameters:
             if local_parameter.key in [i.key for i in self.local_parameters]:
                 local_parameter.key = KeyFactory(self, 'parameter').generate()
             self.add_local_parameter(local_parameter)
-        return self.refresh()
+        self.invalidate_cache('reactions')
+        return self
 
     def remove_reaction(self, value, by='name'):
         """Remove reaction
@@ -1989,40 +2578,44 @@ class Model(_base._Base):
         ##Why does the new reaction give empty lists of substrates
         ## and products?
         reaction = self.get('reaction', value, by)
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                for j in i:
-                    if j.attrib[by] == value:
-                        j.getparent().remove(j)
-
-        if 'reactions' in self.__dict__:
-            del self.__dict__['reactions']
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfReactions'):
+            for j in list(i):
+                if j.attrib[by] == value:
+                    self.component_index.remove(j)
+
+        ## the reaction's constants go with it
+        self.invalidate_cache('constants')
         return self
 
     def refresh(self):
-        """Save the file then reload the Model. Can't use the
-        save method though because the save method uses
-        the refresh method.
+        """Save the file then reload the Model. Mutators do not
+        need this, they invalidate the affected caches
+        instead (see :py:meth:`Model.invalidate_cache`).
         :return:
 
         Args:
 
         Returns:
+          :py:class:`Model`. A new model parsed from the saved file
 
         """
-        with open(self.copasi_file, 'wb') as f:
-            f.write(etree.tostring(self.xml, pretty_print=True))
-
+        self._write_states()
+        tasks.CopasiMLParser.write_copasi_file(self.copasi_file, self.xml, pretty_print=True)
         return Model(self.copasi_file)
 
-    def save(self, copasi_file=None):
+    def save(self, copasi_file=None, pretty_print=True):
         """Save copasiML to copasi_filename.
 
+        The copasiML is serialized once and written atomically
+        (temporary file then rename). The model is not parsed again.
+
         Args:
-          copasi_filename: str` or `None`. Deafult is `None`. When `None`
+          copasi_file: str` or `None`. Deafult is `None`. When `None`
         defaults to same filepath the model came from.
-        If another path, saves to that path.
-          copasi_file:  (Default value = None)
+        If another path, saves to that path and the model
+        now refers to that path.
+          pretty_print: bool`. Default True. Set to False to skip
+        indenting the output, which is faster for large models
 
         Returns:
           py:class:`Model`
@@ -2031,20 +2624,15 @@ class Model(_base._Base):
         if copasi_file == None:
             copasi_file = self.copasi_file
 
-        ##
+        ## update copasi file for when copasi_file is not None
+        self.copasi_file = copasi_file
+
         if not os.path.isdir(self.root):
             os.makedirs(self.root)
 
-        ## Then remove existing copasi file for ovewrite
-        if os.path.isfile(copasi_file):
-            os.remove(copasi_file)
-
         ## write
-        tasks.CopasiMLParser.write_copasi_file(self.copasi_file, self.xml)
-
-        ## update copasi file for when copasi_file is not None
-        self.copasi_file = copasi_file
-        self.refresh()
+        self._write_states()
+        tasks.CopasiMLParser.write_copasi_file(copasi_file, self.xml, pretty_print=pretty_print)
         return self
 
     def open(self, copasi_file=None, as_temp=False):
@@ -2090,6 +2678,48 @@ class Model(_base._Base):
                 'local_parameter', 'global_quantity',
                 'function']
 
+    def _component_properties(self):
+        """Map model components to the cached
+        property that lists them
+
+        Returns:
+            dict
+
+        """
+        return {
+            'metabolite': 'metabolites',
+            'compartment': 'compartments',
+            'reaction': 'reactions',
+            'local_parameter': 'constants',
+            'global_quantity': 'global_quantities',
+            'function': 'functions',
+        }
+
+    def _lookup(self, prop, by):
+        """Hash index of the component list `prop` by attribute `by`
+
+        The index is built the first time it is needed and rebuilt only
+        when the cached list behind `prop` is recomputed, so repeated
+        lookups against the same cache generation are O(1).
+
+        Args:
+            prop (str): name of a component list property, i.e. 'metabolites'
+            by (str): attribute to index by, i.e. 'key'
+
+        Returns:
+            dict: attribute value -> `list` of components in model order
+
+        """
+        components = getattr(self, prop)
+        cached = self._lookups.get((prop, by))
+        if cached is not None and cached[0] is components:
+            return cached[1]
+        index = {}
+        for i in components:
+            index.setdefault(getattr(i, by), []).append(i)
+        self._lookups[(prop, by)] = (components, index)
+        return index
+
     def get(self, component, value, by='name'):
         """Factory method for getting a model component by a value of a certain type
 
@@ -2129,23 +2759,17 @@ class Model(_base._Base):
         if component not in self._model_components():
             raise errors.InputError('{} not in list of components: {}'.format(component, self._model_components()))
 
-        if component == 'metabolite':
-            res = [i for i in self.metabolites if getattr(i, by) == value]
-
-        elif component == 'compartment':
-            res = [i for i in self.compartments if getattr(i, by) == value]
-
-        elif component == 'local_parameter':
-            res = [i for i in self.constants if getattr(i, by) == value]
-
-        elif component == 'global_quantity':
-            res = [i for i in self.global_quantities if getattr(i, by) == value]
-
-        elif component == 'function':
-            res = [i for i in self.functions if getattr(i, by) == value]
+        prop = self._component_properties()[component]
+        res = None
+        if by in ['name', 'key', 'global_name', 'compartment', 'simulation_type']:
+            try:
+                res = list(self._lookup(prop, by).get(value, []))
+            except TypeError:
+                ## unhashable value. Fall back to a linear search
+                pass
 
-        elif component == 'reaction':
-            res = [i for i in self.reactions if getattr(i, by) == value]
+        if res is None:
+            res = [i for i in getattr(self, prop) if getattr(i, by) == value]
 
         if len(res) == 1:
             res = res[0]
@@ -2186,6 +2810,11 @@ class Model(_base._Base):
                 'model.get has returned a list --> {}'.format(comp)
             )
 
+        ## cached components can be shared with clones (see Model.clone)
+        ## so change a copy
+        comp = shallow_copy(comp)
+        comp.model = self
+
         if change_field not in list(comp.__dict__.keys()):
             raise errors.InputError('"{}" not valid for component type "{}"'.format(
                 change_field, component
@@ -2333,9 +2962,8 @@ class Model(_base._Base):
         Returns:
 
         """
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfModelParameterSets':
-                return i.attrib['active_set']
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfModelParameterSets'):
+            return i.attrib['active_set']
 
     @active_parameter_set.setter
     def active_parameter_set(self, parameter_set):
@@ -2355,9 +2983,8 @@ class Model(_base._Base):
         if parameter_set not in self.active_parameter_set:
             raise errors.InputError('{} not in available parameter sets'.format(parameter_set))
 
-        for i in self.xml.iter():
-            if i.tag == '{http://www.copasi.org/static/schema}ListOfModelParameterSets':
-                i.attrib['active_set'] = parameter_set
+        for i in self.component_index.findall('{http://www.copasi.org/static/schema}ListOfModelParameterSets'):
+            i.attrib['active_set'] = parameter_set
         return self
 
     @property
@@ -2446,11 +3073,48 @@ class Model(_base._Base):
         if kwargs.get('show_parameters'):
             LOG.info('Parameter set that was inserted: \n\n{}'.format(I.parameters.transpose()))
 
-    def simulate(self, start, stop, by, species='m', **kwargs):
+    def insert_parameters_batch(self, df, directory, **kwargs):
+        """Wrapper around :py:meth:`InsertParameters.batch`. Write one
+        copasi file per row of `df` into `directory`
+
+        Args:
+          df: `pandas.DataFrame`. Parameter sets. Columns are parameter names
+          directory: `str`. Where to write the files
+          **kwargs: Arguments for :py:meth:`InsertParameters.batch`
+
+        Returns:
+          `list` of `str`. The files written
+
+        """
+        return InsertParameters.batch(self, df, directory, **kwargs)
+
+    def simulate(self, start, stop, by, species='m', engine='copasi', **kwargs):
+        """Simulate a time course and return it as a DataFrame
+
+        Args:
+            start (float): first output time
+            stop (float): end time
+            by (float): step size
+            species (str): Default 'm'. Which variables to return, see
+                :py:meth:`Model.get_variable_names`
+            engine (str): Default 'copasi'. 'copasi' runs a :py:class:`tasks.TimeCourse`
+                with CopasiSE. 'native' integrates the model in process with
+                :py:func:`native.simulate`
+            **kwargs: for :py:class:`tasks.TimeCourse` or :py:func:`native.simulate`
+
+        Returns:
+            pandas.DataFrame
+
+        """
         for i in [start, stop, by]:
             if not isinstance(i, (float, int)):
                 raise TypeError(f'\"{i}" must be of type int or float. Got "{type(i)}"')
 
+        if engine == 'native':
+            return native.simulate(self, start, stop, by, species=species, **kwargs)
+        elif engine != 'copasi':
+            raise errors.InputError(f'engine should be "copasi" or "native". Got "{engine}"')
+
         TC = tasks.TimeCourse(self, start=start,
                               end=stop, step_size=by,
                               intervals=stop * by - start,
@@ -2498,6 +3162,320 @@ class Model(_base._Base):
         return tasks.Sensitivities(**kwargs)
 
 
+@mixin(ReadModelMixin)
+class InsertionPlan(object):
+    """
+    Compiled insertion of parameter values into a model
+
+    Each parameter name is resolved once, when the plan is built, to
+    where its value lives: a slot of the :py:class:`StateVector` for
+    compartments, global quantities and metabolites, or the copasiML
+    elements holding the value of a local parameter. Applying a
+    parameter set is then a single pass over the parameters and does
+    not rescan the component lists of the model.
+
+    A plan is tied to the structure of the model it was built from.
+    Build a new one after adding or removing components.
+
+    Examples:
+        >>> plan = InsertionPlan(model, df.columns)
+        >>> for i in range(df.shape[0]):
+        >>>     plan.apply(df.iloc[i])
+        >>>     model.save()
+    """
+
+    def __init__(self, model, names, quantity_type='concentration'):
+        """
+
+        Args:
+            model (:py:class:`Model`): The model to insert parameters into
+            names (list): parameter names. Names that are not in the model,
+                such as the RSS column of parameter estimation output, are ignored
+            quantity_type (str): concentration (default) or particle_numbers.
+                The unit of values given for metabolites
+        """
+        self.model = self.read_model(model)
+        self.names = list(names)
+        self.quantity_type = quantity_type
+        if self.quantity_type not in ['concentration', 'particle_numbers']:
+            raise errors.InputError('quantity_type should be "concentration" or "particle_numbers"')
+
+        ## (position in names, state slot) per component type
+        self.compartments = []
+        self.global_quantities = []
+        ## (position in names, state slot, compartment state slot or None, compartment volume)
+        self.metabolites = []
+        ## (position in names, [elements with a value attribute])
+        self.locals = []
+        self._compile()
+
+    def __str__(self):
+        return 'InsertionPlan(compartments={}, global_quantities={}, metabolites={}, local_parameters={})'.format(
+            len(self.compartments), len(self.global_quantities), len(self.metabolites), len(self.locals)
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _compile(self):
+        """Resolve every name to where its value is stored"""
+        positions = {}
+        for i, name in enumerate(self.names):
+            positions.setdefault(name, i)
+
+        self._state_vector = self.model.state_vector
+        self._number_of_states = len(self._state_vector)
+        slot = self._state_vector.index
+
+        for i in self.model.compartments:
+            if i.name in positions:
+                self.compartments.append((positions[i.name], slot(i.key)))
+        if self.compartments:
+            LOG.critical(
+                'Changing a compartment volume has consequences for the rest of the metabolites assigned to that compartment')
+
+        for i in self.model.global_quantities:
+            if i.name not in positions:
+                continue
+            if i.simulation_type == 'assignment':
+                LOG.info('Global quantity "{}" skipped because it is set to assignment'.format(i.name))
+                continue
+            self.global_quantities.append((positions[i.name], slot(i.key)))
+
+        for i in self.model.metabolites:
+            if i.name not in positions:
+                continue
+            compartment = slot(i.compartment.key) if i.compartment.key in self._state_vector else None
+            self.metabolites.append((positions[i.name], slot(i.key), compartment,
+                                     float(i.compartment.initial_value)))
+
+        local_parameters = {i.global_name: i for i in self.model.local_parameters if i.global_name in positions}
+        if local_parameters:
+            ## the value is stored in the reactions ListOfConstants and
+            ## in the kinetic parameters of every parameter set
+            elements = {}
+            for list_of_reactions in self.model.component_index.findall(
+                    '{http://www.copasi.org/static/schema}ListOfReactions'):
+                for reaction in list_of_reactions:
+                    for constant in reaction.iter('{http://www.copasi.org/static/schema}Constant'):
+                        global_name = '({}).{}'.format(reaction.attrib['name'], constant.attrib['name'])
+                        elements.setdefault(global_name, []).append(constant)
+            for group in self.model._kinetic_parameter_groups():
+                for parameter in group.iter('{http://www.copasi.org/static/schema}ModelParameter'):
+                    reaction_name, parameter_name = re.findall(
+                        '.*Reactions\[(.*)\].*Parameter=(.*)', parameter.attrib['cn'])[0]
+                    global_name = '({}).{}'.format(reaction_name, parameter_name)
+                    elements.setdefault(global_name, []).append(parameter)
+            for global_name in local_parameters:
+                self.locals.append((positions[global_name], elements.get(global_name, [])))
+
+    def _values(self, values):
+        """Values in the order of :py:attr:`InsertionPlan.names`
+
+        Args:
+            values: `dict`, `pandas.Series`, single row `pandas.DataFrame`
+                or sequence in the order of `names`
+
+        Returns:
+            numpy.ndarray
+
+        """
+        if isinstance(values, pandas.DataFrame):
+            if values.shape[0] != 1:
+                raise errors.InputError('Expected a single parameter set but got {} rows'.format(values.shape[0]))
+            values = values.iloc[0]
+
+        if isinstance(values, (dict, pandas.Series)):
+            ## names not given keep their current value
+            return numpy.array([values[i] if i in values else numpy.nan for i in self.names], dtype=float)
+
+        values = numpy.asarray(values, dtype=float)
+        if values.shape != (len(self.names),):
+            raise errors.InputError('Expected {} values but got {}'.format(len(self.names), values.shape))
+        return values
+
+    def _check_current(self):
+        """Raise if components were added to or removed from the model
+        since the plan was built"""
+        if self.model.state_vector is not self._state_vector or \
+                len(self._state_vector) != self._number_of_states:
+            raise errors.InputError('The model has changed since this InsertionPlan was built. Build a new one')
+
+    def insert_states(self, values, states):
+        """Write the compartment, global quantity and metabolite values
+        of a parameter set into an array of states
+
+        Args:
+            values (numpy.ndarray): values in the order of :py:attr:`InsertionPlan.names`.
+                `nan` leaves a state unchanged
+            states (numpy.ndarray): state values in StateTemplate order. Changed in place
+
+        Returns:
+            numpy.ndarray: `states`
+
+        """
+        for position, index in self.compartments + self.global_quantities:
+            if not numpy.isnan(values[position]):
+                states[index] = values[position]
+
+        if self.metabolites:
+            quantity_unit = self.model.quantity_unit
+            for position, index, compartment, volume in self.metabolites:
+                value = values[position]
+                if numpy.isnan(value):
+                    continue
+                if self.quantity_type == 'concentration':
+                    ## after any change to the compartment above
+                    if compartment is not None:
+                        volume = float(states[compartment])
+                    value = self.model.convert_molar_to_particles(value, quantity_unit, volume)
+                states[index] = value
+        return states
+
+    def apply(self, values):
+        """Insert a parameter set into the model
+
+        Args:
+            values: `dict`, `pandas.Series` or single row `pandas.DataFrame`
+                indexed by parameter name, or a `list` or `numpy.ndarray`
+                in the order of :py:attr:`InsertionPlan.names`
+
+        Returns:
+            :py:class:`Model`
+
+        """
+        self._check_current()
+        values = self._values(values)
+        self.insert_states(values, self._state_vector.values)
+
+        for position, elements in self.locals:
+            if numpy.isnan(values[position]):
+                continue
+            value = str(float(values[position]))
+            for element in elements:
+                element.attrib['value'] = value
+
+        self.model.invalidate_cache('states')
+        if self.locals:
+            self.model.invalidate_cache('constants')
+        return self.model
+
+    def _template(self, pretty_print=True):
+        """Serialize the model once with a placeholder wherever a
+        parameter set changes the document
+
+        Placeholder 0 is the InitialState text. The others are the
+        value attributes of local parameters.
+
+        Args:
+            pretty_print (bool): indent the output
+
+        Returns:
+            tuple: `list` of the document split on the placeholders, with
+            placeholder numbers at the odd positions, and `list` of
+            (position in names, original value) per local parameter placeholder
+
+        """
+        initial_states = self.model.component_index.findall('{http://www.copasi.org/static/schema}InitialState')
+        elements = [(position, element) for position, lst in self.locals for element in lst]
+        local_tokens = [(position, element.attrib['value']) for position, element in elements]
+        original_states = [i.text for i in initial_states]
+        try:
+            for i in initial_states:
+                i.text = _PLACEHOLDER.format(0)
+            for token, (_, element) in enumerate(elements, 1):
+                element.attrib['value'] = _PLACEHOLDER.format(token)
+            content = etree.tostring(self.model.xml, pretty_print=pretty_print).decode()
+        finally:
+            for i, text in zip(initial_states, original_states):
+                i.text = text
+            for (_, element), (_, value) in zip(elements, local_tokens):
+                element.attrib['value'] = value
+
+        parts = re.split(_PLACEHOLDER.format('(\\d+)'), content)
+        parts[1::2] = [int(i) for i in parts[1::2]]
+        return parts, local_tokens
+
+    def write_files(self, df, filenames, processes=1, pretty_print=True):
+        """Write one copasi file per parameter set without changing the model
+
+        The model is serialized once into a template and each file is
+        the template with the changed values substituted, so there is
+        no per file tree manipulation, serialization or parsing.
+
+        Args:
+            df (pandas.DataFrame): parameter sets. Columns are parameter names
+            filenames (list): where to write each row of `df`
+            processes (int): Default 1. Number of worker processes to write with.
+                Worth it for thousands of files of a large model
+            pretty_print (bool): Default True. Indent the output
+
+        Returns:
+            `list` of `str`: `filenames`
+
+        """
+        self._check_current()
+        filenames = list(filenames)
+        if len(filenames) != df.shape[0]:
+            raise errors.InputError('Got {} filenames for {} parameter sets'.format(len(filenames), df.shape[0]))
+
+        ## names of the plan missing from df are left unchanged
+        values = numpy.asarray(df.reindex(columns=self.names).values, dtype=float)
+        template, local_tokens = self._template(pretty_print)
+        base = numpy.array(self._state_vector.values)
+
+        def jobs(rows):
+            for i in rows:
+                states = self.insert_states(values[i], base.copy())
+                local = [value if numpy.isnan(values[i][position]) else str(float(values[i][position]))
+                         for position, value in local_tokens]
+                yield filenames[i], states, local
+
+        if processes is None or processes <= 1:
+            _write_parameter_files(template, jobs(range(len(filenames))))
+            return filenames
+
+        chunk_size = max(1, int(numpy.ceil(len(filenames) / float(processes * 4))))
+        pending = set()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for start in range(0, len(filenames), chunk_size):
+                ## bound the number of chunks held in memory
+                if len(pending) >= processes * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                rows = range(start, min(start + chunk_size, len(filenames)))
+                pending.add(pool.submit(_write_parameter_files, template, list(jobs(rows))))
+            for future in pending:
+                future.result()
+        return filenames
+
+
+## marks the values substituted by InsertionPlan.write_files
+_PLACEHOLDER = '@@pycotools3:{}@@'
+
+
+def _write_parameter_files(template, jobs):
+    """Fill in and write the template made by :py:meth:`InsertionPlan._template`.
+    Module level so process pools can pickle it
+
+    Args:
+        template (list): document split on placeholders
+        jobs (iterable): (filename, states, local parameter values)
+
+    Returns:
+        int: the number of files written
+
+    """
+    count = 0
+    for filename, states, local in jobs:
+        replacements = [' '.join(repr(i) for i in states.tolist())] + local
+        content = ''.join(replacements[part] if i % 2 else part for i, part in enumerate(template))
+        tasks.CopasiMLParser.write_copasi_file(filename, content.encode())
+        count += 1
+    return count
+
+
 @mixin(ReadModelMixin)
 class InsertParameters(object):
     """
@@ -2626,27 +3604,58 @@ class InsertParameters(object):
             df = pandas.DataFrame(self.df.iloc[self.index]).transpose()
         return df
 
-    def insert_locals(self):
-        """:return:"""
-        # print self.parameters
+    @classmethod
+    def batch(cls, model, df, directory, quantity_type='concentration',
+              processes=1, pretty_print=True):
+        """Write one copasi file per parameter set, i.e. per row of
+        :py:class:`viz.Parse` output, without changing `model`.
+
+        Files are named after the model with the index of the row
+        appended, i.e. `model_0.cps`, `model_1.cps`, ...
+
+        Args:
+            model (:py:class:`Model`): The model to parse parameters into
+            df (pandas.DataFrame): parameter sets. Columns are parameter names
+            directory (str): where to write the files. Created if it does not exist
+            quantity_type (str): concentration (default) or particle_numbers
+            processes (int): Default 1. Number of worker processes to write with
+            pretty_print (bool): Default True. Indent the output
+
+        Returns:
+            `list` of `str`. The files written, in the order of the rows of `df`
+
+        """
+        model = cls.read_model(model)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        name = os.path.splitext(os.path.basename(model.copasi_file))[0]
+        filenames = [os.path.join(directory, '{}_{}.cps'.format(name, i)) for i in df.index]
+        plan = InsertionPlan(model, df.columns, quantity_type=quantity_type)
+        return plan.write_files(df, filenames, processes=processes, pretty_print=pretty_print)
+
+    @cached_property
+    def plan(self):
+        """:py:class:`InsertionPlan` for the parameters being inserted"""
+        return InsertionPlan(self.model, self.parameters.columns, quantity_type=self.quantity_type)
+
+    def _insert_subset(self, names):
+        """Insert the parameters in `names` only
 
-        locals = [j for i in self.model.reactions for j in i.parameters if
-                  j.global_name in list(self.parameters.keys())]
-        if locals == []:
+        Args:
+          names: `list` of parameter names
+
+        Returns:
+          :py:class:`Model`
+
+        """
+        if names == []:
             return self.model
-        else:
-            for loc in locals:
-                for element_tags in self.model.xml.iter():
-                    if element_tags.tag == '{http://www.copasi.org/static/schema}ListOfReactions':
-                        for reaction in element_tags:
-                            if reaction.attrib['name'] == loc.reaction_name:
-                                for reaction_xml in reaction:
-                                    if reaction_xml.tag == '{http://www.copasi.org/static/schema}ListOfConstants':
-                                        for constant_xml in reaction_xml:
-                                            if constant_xml.attrib['name'] == loc.name:
-                                                constant_xml.attrib['value'] = str(
-                                                    float(self.parameters[loc.global_name]))
-        return self.model
+        return InsertionPlan(self.model, names, quantity_type=self.quantity_type).apply(self.parameters)
+
+    def insert_locals(self):
+        """:return:"""
+        return self._insert_subset(
+            [i.global_name for i in self.model.local_parameters if i.global_name in self.parameters])
 
     def insert_compartments(self):
         """insert new parameters into compartment
@@ -2657,17 +3666,7 @@ class InsertParameters(object):
         Returns:
 
         """
-        compartments = [i for i in self.model.compartments if i.name in self.parameters]
-        if compartments == []:
-            return self.model
-        else:
-
-            LOG.critical(
-                'Changing a compartment volume has consequences for the rest of the metabolites assigned to that compartment')
-            for i in compartments:
-                self.model = self.model.set('compartment', i.name, str(self.parameters[i.name][self.index]),
-                                            match_field='name', change_field='initial_value')
-            return self.model
+        return self._insert_subset([i.name for i in self.model.compartments if i.name in self.parameters])
 
     def insert_metabolites(self):
         """insert new parameters into compartment
@@ -2678,16 +3677,7 @@ class InsertParameters(object):
         Returns:
 
         """
-        metabolites = [i for i in self.model.metabolites if i.name in self.parameters]
-        if metabolites == []:
-            return self.model
-        else:
-            for i in metabolites:
-                self.model = self.model.set('metabolite',
-                                            i.name,
-                                            str(self.parameters[i.name][self.index]),
-                                            match_field='name', change_field=self.quantity_type)
-            return self.model
+        return self._insert_subset([i.name for i in self.model.metabolites if i.name in self.parameters])
 
     def insert_global_quantities(self):
         """insert new parameters into compartment
@@ -2698,20 +3688,7 @@ class InsertParameters(object):
         Returns:
 
         """
-        global_quantities = [i for i in self.model.global_quantities if i.name in self.parameters]
-        if global_quantities == []:
-            return self.model
-        else:
-            for i in global_quantities:
-                if i.simulation_type == 'assignment':
-                    LOG.info('Global quantity "{}" skipped because it is set to assignment'.format(i.name))
-                    continue
-
-                self.model = self.model.set('global_quantity',
-                                            i.name,
-                                            str(self.parameters[i.name][self.index]),
-                                            match_field='name', change_field='initial_value')
-            return self.model
+        return self._insert_subset([i.name for i in self.model.global_quantities if i.name in self.parameters])
 
     def insert(self):
         """User other methods defined in this class to insert parameters
@@ -2723,11 +3700,7 @@ class InsertParameters(object):
         Returns:
 
         """
-        self.model = self.insert_locals()
-        self.model = self.insert_compartments()
-        self.model = self.insert_global_quantities()
-        self.model = self.insert_metabolites()
-        return self.model
+        return self.plan.apply(self.parameters)
 
 
 @mixin(ReadModelMixin)
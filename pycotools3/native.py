@@ -0,0 +1,3411 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+In process simulation of a :py:class:`model.Model` without CopasiSE.
+
+The reactions, rate laws, assignments and ODEs of a model are compiled
+into python source that operates on numpy arrays. That source is
+integrated with :py:func:`scipy.integrate.solve_ivp`. The compiled form
+only depends on the structure of the model. Values are read from the
+model at every call: initial concentrations, global quantities, local
+parameters and compartment volumes. A :py:class:`CompiledModel` is
+therefore reused across parameter sets and cached by structure (see
+:py:func:`compile_model`).
+
+Species are integrated as concentrations in the quantity unit of the
+model. A reaction rate is scaled to an amount per time the way COPASI
+does it, by the volume of the scaling compartment. Each species then
+changes by the stoichiometry weighted sum of these fluxes divided by
+the volume of its own compartment.
+
+With sympy installed the implicit solvers are given an analytic
+Jacobian, derived once per structure (see :py:class:`Jacobian`).
+
+The generated right hand side is vectorized over a trailing axis, so
+many parameter sets can be integrated as one system. See
+:py:func:`simulate_ensemble`.
+
+Not supported: events, compartments that are not fixed, references to
+the initial value of a variable, and the delay and random number functions.
+Models that use them raise :py:class:`errors.NotImplementedError`.
+
+Examples:
+    >>> from pycotools3 import native
+    >>> df = native.simulate(model, 0, 100, 1)
+    >>> ## or
+    >>> df = model.simulate(0, 100, 1, engine='native')
+    >>> ## time x parameter set x species
+    >>> array = native.simulate_ensemble(model, parse_output, 0, 100, 1)
+"""
+import re
+import heapq
+import pickle
+import hashlib
+import logging
+from collections import OrderedDict, Counter
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+import pandas
+from scipy import optimize, sparse, special
+from scipy.integrate import solve_ivp
+
+from . import errors
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import sympy
+except ImportError:
+    sympy = None
+
+SCHEMA = '{http://www.copasi.org/static/schema}'
+
+## compiled models kept by compile_model
+CACHE_SIZE = 32
+_CACHE = OrderedDict()
+
+
+def _sec(x):
+    return 1.0 / numpy.cos(x)
+
+
+def _csc(x):
+    return 1.0 / numpy.sin(x)
+
+
+def _cot(x):
+    return 1.0 / numpy.tan(x)
+
+
+def _factorial(x):
+    return special.gamma(numpy.add(x, 1.0))
+
+
+## copasi function name -> python callable name in the namespace
+## of the generated code
+_FUNCTIONS = {
+    'exp': 'numpy.exp', 'log': 'numpy.log', 'ln': 'numpy.log', 'log10': 'numpy.log10',
+    'sqrt': 'numpy.sqrt', 'abs': 'numpy.abs', 'fabs': 'numpy.abs',
+    'floor': 'numpy.floor', 'ceil': 'numpy.ceil', 'factorial': '_factorial',
+    'sin': 'numpy.sin', 'cos': 'numpy.cos', 'tan': 'numpy.tan',
+    'sec': '_sec', 'csc': '_csc', 'cot': '_cot',
+    'sinh': 'numpy.sinh', 'cosh': 'numpy.cosh', 'tanh': 'numpy.tanh',
+    'asin': 'numpy.arcsin', 'arcsin': 'numpy.arcsin', 'acos': 'numpy.arccos',
+    'arccos': 'numpy.arccos', 'atan': 'numpy.arctan', 'arctan': 'numpy.arctan',
+    'asinh': 'numpy.arcsinh', 'arcsinh': 'numpy.arcsinh', 'acosh': 'numpy.arccosh',
+    'arccosh': 'numpy.arccosh', 'atanh': 'numpy.arctanh', 'arctanh': 'numpy.arctanh',
+    'min': 'numpy.minimum', 'max': 'numpy.maximum', 'if': 'numpy.where',
+}
+
+_CONSTANTS = {
+    'pi': 'numpy.pi', 'PI': 'numpy.pi', 'exponentiale': 'numpy.e',
+    'infinity': 'numpy.inf', 'INFINITY': 'numpy.inf',
+    'nan': 'numpy.nan', 'NaN': 'numpy.nan',
+    'true': '1.0', 'TRUE': '1.0', 'false': '0.0', 'FALSE': '0.0',
+}
+
+## binary operators: token -> (binding power, format)
+_BINARY = {
+    'or': (10, 'numpy.logical_or({}, {})'), '||': (10, 'numpy.logical_or({}, {})'),
+    'xor': (10, 'numpy.logical_xor({}, {})'),
+    'and': (20, 'numpy.logical_and({}, {})'), '&&': (20, 'numpy.logical_and({}, {})'),
+    'eq': (30, 'numpy.equal({}, {})'), '==': (30, 'numpy.equal({}, {})'),
+    'ne': (30, 'numpy.not_equal({}, {})'), '!=': (30, 'numpy.not_equal({}, {})'),
+    'lt': (30, '({} < {})'), '<': (30, '({} < {})'),
+    'le': (30, '({} <= {})'), '<=': (30, '({} <= {})'),
+    'gt': (30, '({} > {})'), '>': (30, '({} > {})'),
+    'ge': (30, '({} >= {})'), '>=': (30, '({} >= {})'),
+    '+': (40, '({} + {})'), '-': (40, '({} - {})'),
+    '*': (50, '({} * {})'), '/': (50, '({} / {})'), '%': (50, 'numpy.fmod({}, {})'),
+    '^': (70, '({} ** {})'),
+}
+_UNARY_POWER = 60
+
+_TOKENS = re.compile(r'''\s*(?:
+    (?P<vector>(?:PRODUCT|SUM)<(?P<vname>[^>]*)>)
+    |<(?P<cn>CN=[^>]*)>
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |"(?P<quoted>(?:[^"\\]|\\.)*)"
+    |(?P<name>(?:[^\W\d]|\\.)(?:\w|\\.)*)
+    |(?P<op>\*\*|<=|>=|==|!=|&&|\|\||[-+*/%^(),<>!])
+    )''', re.VERBOSE | re.UNICODE)
+
+
+class ExpressionTranslator(object):
+    """Translate a COPASI infix expression into python source
+    operating on numpy arrays
+
+    Identifiers and CN references are handed to the `resolve` callable,
+    which returns the python source to use for them.
+
+    Examples:
+        >>> ExpressionTranslator(lambda kind, value: value).translate('k1*A^2')
+        '(k1 * (A ** 2.0))'
+    """
+
+    def __init__(self, resolve):
+        """
+
+        Args:
+            resolve (callable): `resolve(kind, value)` where kind is 'name',
+                'cn' or 'vector' and value the identifier, the CN without
+                the angle brackets, or the name inside PRODUCT<...>
+        """
+        self.resolve = resolve
+
+    def tokenize(self, expression):
+        """Split `expression` into (kind, value) tuples"""
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = _TOKENS.match(expression, position)
+            if match is None or match.end() == position:
+                raise errors.InputError('Cannot parse "{}" at position {} of "{}"'.format(
+                    expression[position:], position, expression))
+            position = match.end()
+            if match.group('vector') is not None:
+                tokens.append(('vector', (match.group('vector').split('<')[0], match.group('vname'))))
+            elif match.group('cn') is not None:
+                tokens.append(('cn', match.group('cn')))
+            elif match.group('number') is not None:
+                tokens.append(('number', match.group('number')))
+            elif match.group('quoted') is not None:
+                tokens.append(('name', re.sub(r'\\(.)', r'\1', match.group('quoted'))))
+            elif match.group('name') is not None:
+                tokens.append(('name', re.sub(r'\\(.)', r'\1', match.group('name'))))
+            elif match.group('op') is not None:
+                tokens.append(('op', match.group('op')))
+        return tokens
+
+    def translate(self, expression):
+        """Python source for `expression`
+
+        Args:
+            expression (str): COPASI infix expression
+
+        Returns:
+            str
+
+        """
+        self._tokens = self.tokenize(expression)
+        self._position = 0
+        if not self._tokens:
+            raise errors.InputError('Empty expression')
+        source = self._expression(0)
+        if self._position != len(self._tokens):
+            raise errors.InputError('Unexpected "{}" in "{}"'.format(
+                self._tokens[self._position][1], expression))
+        return source
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None, None
+
+    def _next(self):
+        token = self._peek()
+        self._position += 1
+        return token
+
+    def _expect(self, op):
+        kind, value = self._next()
+        if kind != 'op' or value != op:
+            raise errors.InputError('Expected "{}" but got "{}"'.format(op, value))
+
+    def _binary_operator(self):
+        """The binary operator at the current position or None"""
+        kind, value = self._peek()
+        if kind == 'op' and value in _BINARY:
+            return value
+        ## word operators, i.e. "a le b"
+        if kind == 'name' and value in _BINARY and value.isalpha():
+            return value
+        return None
+
+    def _expression(self, power):
+        left = self._prefix()
+        while True:
+            op = self._binary_operator()
+            if op is None or _BINARY[op][0] <= power:
+                break
+            self._next()
+            op_power, template = _BINARY[op]
+            ## ^ is right associative
+            right = self._expression(op_power - 1 if op == '^' else op_power)
+            left = template.format(left, right)
+        return left
+
+    def _prefix(self):
+        kind, value = self._next()
+        if kind is None:
+            raise errors.InputError('Unexpected end of expression')
+
+        if kind == 'number':
+            return repr(float(value))
+
+        if kind == 'cn':
+            return self.resolve('cn', value)
+
+        if kind == 'vector':
+            operation, name = value
+            if operation != 'PRODUCT':
+                raise errors.NotImplementedError('{}<...> is not supported'.format(operation))
+            return self.resolve('vector', name)
+
+        if kind == 'op':
+            if value == '(':
+                source = self._expression(0)
+                self._expect(')')
+                return source
+            if value == '-':
+                return '(-{})'.format(self._expression(_UNARY_POWER))
+            if value == '+':
+                return self._expression(_UNARY_POWER)
+            if value == '!':
+                return 'numpy.logical_not({})'.format(self._expression(_UNARY_POWER))
+            raise errors.InputError('Unexpected "{}"'.format(value))
+
+        ## names
+        if value == 'not':
+            return 'numpy.logical_not({})'.format(self._expression(_UNARY_POWER))
+
+        next_kind, next_value = self._peek()
+        if next_kind == 'op' and next_value == '(':
+            self._next()
+            arguments = []
+            if self._peek() != ('op', ')'):
+                arguments.append(self._expression(0))
+                while self._peek() == ('op', ','):
+                    self._next()
+                    arguments.append(self._expression(0))
+            self._expect(')')
+            if value not in _FUNCTIONS:
+                raise errors.NotImplementedError('Function "{}" is not supported'.format(value))
+            return '{}({})'.format(_FUNCTIONS[value], ', '.join(arguments))
+
+        if value in _CONSTANTS:
+            return _CONSTANTS[value]
+        return self.resolve('name', value)
+
+
+def _text(element, tag):
+    """Stripped text of the child `tag` of `element` or None"""
+    child = element.find(SCHEMA + tag)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip()
+
+
+def _cn_parts(cn):
+    """Parse a CN into a list of (type, name) pairs
+
+    Examples:
+        >>> _cn_parts('CN=Root,Model=m,Vector=Compartments[cell],Reference=Volume')
+        [('CN', 'Root'), ('Model', 'm'), ('Vector', 'Compartments[cell]'), ('Reference', 'Volume')]
+    """
+    parts = []
+    ## commas inside names are escaped with a backslash
+    for part in re.split(r'(?<!\\),', cn):
+        if '=' not in part:
+            continue
+        key, value = part.split('=', 1)
+        parts.append((key, value.replace('\\,', ',')))
+    return parts
+
+
+def _vector_name(value):
+    """'Metabolites[A]' -> ('Metabolites', 'A')"""
+    match = re.match(r'(\w+)\[(.*)\]$', value)
+    if match is None:
+        raise errors.InputError('Cannot parse "{}"'.format(value))
+    return match.group(1), match.group(2).replace('\\]', ']').replace('\\[', '[')
+
+
+def _key_order(key):
+    """Sort 'Metabolite_10' after 'Metabolite_9'"""
+    prefix, _, number = key.rpartition('_')
+    return (prefix, int(number)) if number.isdigit() else (key, -1)
+
+
+def read_structure(model):
+    """Read everything from `model` that the compiled code depends on.
+    Values are left out so models differing only by their parameters
+    share a structure. Compartments, species and global quantities are
+    ordered by key because :py:meth:`model.Model.set` moves the
+    component it changes to the end of its list.
+
+    Args:
+        model (:py:class:`model.Model`): the model
+
+    Returns:
+        dict
+
+    """
+    index = model.component_index
+    for events in index.findall(SCHEMA + 'ListOfEvents'):
+        if len(events):
+            raise errors.NotImplementedError('Models with events cannot be simulated natively')
+
+    structure = OrderedDict()
+    structure['model_key'] = model.key
+    structure['quantity_unit'] = model.quantity_unit
+
+    structure['compartments'] = []
+    for i in index.findall(SCHEMA + 'Compartment'):
+        if i.attrib.get('simulationType', 'fixed') != 'fixed':
+            raise errors.NotImplementedError(
+                'Compartment "{}" is not fixed. Only fixed compartments can be simulated natively'.format(
+                    i.attrib['name']))
+        structure['compartments'].append((i.attrib['key'], i.attrib['name']))
+
+    structure['metabolites'] = []
+    for i in index.findall(SCHEMA + 'Metabolite'):
+        structure['metabolites'].append((i.attrib['key'], i.attrib['name'], i.attrib['compartment'],
+                                         i.attrib.get('simulationType', 'reactions'), _text(i, 'Expression')))
+
+    structure['global_quantities'] = []
+    for i in index.findall(SCHEMA + 'ModelValue'):
+        structure['global_quantities'].append((i.attrib['key'], i.attrib['name'],
+                                               i.attrib.get('simulationType', 'fixed'), _text(i, 'Expression')))
+
+    for i in ['compartments', 'metabolites', 'global_quantities']:
+        structure[i] = sorted(structure[i], key=lambda x: _key_order(x[0]))
+
+    structure['functions'] = {}
+    for i in index.findall(SCHEMA + 'Function'):
+        descriptions = sorted(i.iter(SCHEMA + 'ParameterDescription'), key=lambda x: int(x.attrib['order']))
+        structure['functions'][i.attrib['key']] = (
+            _text(i, 'Expression'),
+            [(j.attrib['key'], j.attrib['name'], j.attrib.get('role')) for j in descriptions],
+            i.attrib.get('type')
+        )
+
+    structure['reactions'] = []
+    for i in index.findall(SCHEMA + 'Reaction'):
+        substrates = [(j.attrib['metabolite'], float(j.attrib['stoichiometry']))
+                      for j in i.iter(SCHEMA + 'Substrate')]
+        products = [(j.attrib['metabolite'], float(j.attrib['stoichiometry']))
+                    for j in i.iter(SCHEMA + 'Product')]
+        constants = [(j.attrib['key'], j.attrib['name']) for j in i.iter(SCHEMA + 'Constant')]
+        kinetic_law = i.find(SCHEMA + 'KineticLaw')
+        if kinetic_law is None:
+            function, unit_type, scaling, calls = None, None, None, []
+        else:
+            function = kinetic_law.attrib.get('function')
+            unit_type = kinetic_law.attrib.get('unitType', 'Default')
+            scaling = kinetic_law.attrib.get('scalingCompartment')
+            if scaling is not None:
+                scaling = _vector_name(dict(_cn_parts(scaling))['Vector'])[1]
+            calls = [(j.attrib['functionParameter'], [k.attrib['reference'] for k in j.iter(SCHEMA + 'SourceParameter')])
+                     for j in kinetic_law.iter(SCHEMA + 'CallParameter')]
+        structure['reactions'].append((i.attrib['key'], i.attrib['name'], substrates, products, constants,
+                                       function, unit_type, scaling, calls,
+                                       i.attrib.get('reversible', 'false') == 'true'))
+    return structure
+
+
+def structure_key(structure):
+    """Hash identifying a structure from :py:func:`read_structure`"""
+    return hashlib.sha1(repr(structure).encode('utf-8')).hexdigest()
+
+
+def compile_model(model):
+    """The :py:class:`CompiledModel` of `model`. Models with the same
+    structure share one, so changing parameter values does not recompile
+
+    Args:
+        model (:py:class:`model.Model`): the model
+
+    Returns:
+        :py:class:`CompiledModel`
+
+    """
+    structure = read_structure(model)
+    key = structure_key(structure)
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        return _CACHE[key]
+    compiled = CompiledModel(structure)
+    _CACHE[key] = compiled
+    while len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return compiled
+
+
+
+def stoichiometry(model):
+    """The stoichiometry matrix of `model`, read straight from its xml
+
+    Rows are the species determined by reactions, like COPASI's
+    stoichiometry matrix. Fixed species and species determined by
+    assignments or ODEs are left out. Columns are reactions. A species
+    name used in more than one compartment is followed by its
+    compartment, as in 'A{cytoplasm}'.
+
+    Args:
+        model (:py:class:`model.Model`): the model
+
+    Returns:
+        :py:class:`Stoichiometry`
+
+    """
+    index = model.component_index
+    compartments = {i.attrib['key']: i.attrib['name'] for i in index.findall(SCHEMA + 'Compartment')}
+    metabolites = [i for i in index.findall(SCHEMA + 'Metabolite')
+                   if i.attrib.get('simulationType', 'reactions') == 'reactions']
+    counts = Counter(i.attrib['name'] for i in metabolites)
+    keys = {}
+    species = OrderedDict()
+    for i in metabolites:
+        name = i.attrib['name']
+        if counts[name] > 1:
+            name = '{}{{{}}}'.format(name, compartments[i.attrib['compartment']])
+        keys[i.attrib['key']] = species[name] = len(species)
+    reactions = OrderedDict()
+    rows, columns, values = [], [], []
+    for i in index.findall(SCHEMA + 'Reaction'):
+        column = reactions[i.attrib['name']] = len(reactions)
+        for tag, sign in [('Substrate', -1.0), ('Product', 1.0)]:
+            for j in i.iter(SCHEMA + tag):
+                if j.attrib['metabolite'] in keys:
+                    rows.append(keys[j.attrib['metabolite']])
+                    columns.append(column)
+                    values.append(sign * float(j.attrib['stoichiometry']))
+    ## duplicates, i.e. a species on both sides, are summed
+    matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(species), len(reactions)))
+    matrix.eliminate_zeros()
+    return Stoichiometry(matrix, species, reactions)
+
+
+def _conservation_laws(matrix, tolerance=1e-9):
+    """Independent rows and conservation laws of a sparse matrix N
+
+    Rows are reduced one at a time, sparsest first, against the rows
+    already found to be independent. A row that reduces to zero is a
+    conservation law. Each pivot is the column with the fewest entries
+    among those within a factor of 10 of the largest, which keeps the
+    fill low for networks of pathways around a few hub species. Dense,
+    randomly connected networks fill in and are slow.
+
+    Args:
+        matrix (scipy.sparse.spmatrix): shape (species, reactions)
+        tolerance (float): Default 1e-9. Entries smaller than this, relative to
+            the largest entry of N, are zero
+
+    Returns:
+        tuple: (independent, dependent, laws). independent lists the rows of N
+        that span its row space, in the order found, and dependent the other
+        rows. laws holds a dict, row -> c, for each dependent row r with
+        c[r] = 1 and c N = 0. Its other rows are independent
+
+    """
+    matrix = sparse.csr_matrix(matrix)
+    column_counts = numpy.diff(matrix.tocsc().indptr)
+    zero = tolerance * (abs(matrix).max() if matrix.nnz else 1.0)
+    pivot_of = {}
+    pivots = []
+    independent, dependent, laws = [], [], []
+    for i in numpy.argsort(numpy.diff(matrix.indptr), kind='stable').tolist():
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        row = dict(zip(matrix.indices[start:end].tolist(), matrix.data[start:end].tolist()))
+        ## eliminate in the order the pivots were made. Pivot k holds no
+        ## column of an earlier pivot so each step only adds later ones
+        queue = [pivot_of[c] for c in row if c in pivot_of]
+        heapq.heapify(queue)
+        queued = set(queue)
+        factors = []
+        while queue:
+            k = heapq.heappop(queue)
+            column, pivot_row = pivots[k][:2]
+            if column not in row:
+                continue
+            f = row[column] / pivot_row[column]
+            factors.append((k, f))
+            for c, x in pivot_row.items():
+                y = row.get(c, 0.0) - f * x
+                if c == column or abs(y) <= zero:
+                    row.pop(c, None)
+                    continue
+                row[c] = y
+                k = pivot_of.get(c)
+                if k is not None and k not in queued:
+                    heapq.heappush(queue, k)
+                    queued.add(k)
+        if row:
+            largest = max(abs(x) for x in row.values())
+            column = min((c for c, x in row.items() if abs(x) >= 0.1 * largest), key=lambda c: column_counts[c])
+            pivot_of[column] = len(pivots)
+            pivots.append((column, row, i, factors))
+            independent.append(i)
+            continue
+        ## the row is now zero. Unwind the factors, latest pivot first,
+        ## to find the rows that make it up. Only the factors are stored
+        ## because pivot combinations grow quadratically along pathways
+        dependent.append(i)
+        law = {i: 1.0}
+        weights = {}
+        for k, f in factors:
+            weights[k] = weights.get(k, 0.0) - f
+        queue = [-k for k in weights]
+        heapq.heapify(queue)
+        while queue:
+            k = -heapq.heappop(queue)
+            w = weights.pop(k)
+            _, _, r, earlier = pivots[k]
+            law[r] = law.get(r, 0.0) + w
+            for k, f in earlier:
+                if k not in weights:
+                    weights[k] = 0.0
+                    heapq.heappush(queue, -k)
+                weights[k] -= w * f
+        laws.append({r: x for r, x in law.items() if abs(x) > tolerance})
+    return independent, dependent, laws
+
+
+class Stoichiometry(object):
+    """The stoichiometry matrix of a model as a scipy.sparse matrix
+
+    Examples:
+        >>> stoichiometry = native.stoichiometry(model)
+        >>> ## or
+        >>> stoichiometry = model.stoichiometry_matrix
+        >>> stoichiometry.matrix[stoichiometry.species['A'], stoichiometry.reactions['R1']]
+        >>> laws = stoichiometry.conservation_laws()
+
+    Attributes:
+        matrix (scipy.sparse.csr_matrix): shape (species, reactions)
+        species (OrderedDict): species name -> row
+        reactions (OrderedDict): reaction name -> column
+    """
+
+    def __init__(self, matrix, species, reactions):
+        """
+
+        Args:
+            matrix (scipy.sparse.spmatrix): shape (species, reactions)
+            species (OrderedDict): species name -> row
+            reactions (OrderedDict): reaction name -> column
+        """
+        self.matrix = sparse.csr_matrix(matrix)
+        self.species = species
+        self.reactions = reactions
+
+    def __str__(self):
+        return 'Stoichiometry(species={}, reactions={}, entries={})'.format(
+            len(self.species), len(self.reactions), self.matrix.nnz)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def to_df(self):
+        """The matrix as a dense pandas.DataFrame with species
+        for rows and reactions for columns"""
+        return pandas.DataFrame(self.matrix.toarray(), index=list(self.species), columns=list(self.reactions))
+
+    def conservation_laws(self, tolerance=1e-9):
+        """Find the conservation laws (moieties) and reduce the species
+        to an independent set
+
+        Args:
+            tolerance (float): Default 1e-9. Relative size below which
+                entries are zero while reducing the matrix
+
+        Returns:
+            :py:class:`ConservationLaws`
+
+        """
+        independent, dependent, laws = _conservation_laws(self.matrix, tolerance)
+        ## back into the order of the species
+        names = list(self.species)
+        laws = [laws[i] for i in numpy.argsort(dependent)]
+        return ConservationLaws(self, [names[i] for i in sorted(independent)],
+                                [names[i] for i in sorted(dependent)], laws)
+
+
+class ConservationLaws(object):
+    """Conservation laws of a :py:class:`Stoichiometry`
+
+    The species split into an independent set, whose rows N_R of the
+    stoichiometry matrix N are linearly independent, and a dependent set,
+    each of which is fixed by one conservation law. The link matrix L
+    gives N = L N_R, so only the independent species need integrating.
+    The conservation matrix G has a row per law with G N = 0. The amounts
+    G y then stay at their initial totals and give back the dependent species.
+
+    Attributes:
+        stoichiometry (:py:class:`Stoichiometry`): the analysed stoichiometry
+        independent (list): names of the independent species, in the
+            order of :py:attr:`Stoichiometry.species`
+        dependent (list): names of the dependent species, one per law, in
+            the same order
+        conservation_matrix (scipy.sparse.csr_matrix): G, shape (dependent, species).
+            Columns are in the order of :py:attr:`Stoichiometry.species` and
+            each row has a 1 for its dependent species
+        link_matrix (scipy.sparse.csr_matrix): L, shape (species, independent).
+            Rows are in the order of :py:attr:`Stoichiometry.species`
+        reduced_stoichiometry (scipy.sparse.csr_matrix): N_R, shape (independent, reactions)
+    """
+
+    def __init__(self, stoichiometry, independent, dependent, laws):
+        """
+
+        Args:
+            stoichiometry (:py:class:`Stoichiometry`): the analysed stoichiometry
+            independent (list): names of the independent species
+            dependent (list): names of the dependent species
+            laws (list): dicts of row -> coefficient, one per dependent species
+        """
+        self.stoichiometry = stoichiometry
+        self.independent = independent
+        self.dependent = dependent
+        species = len(stoichiometry.species)
+        rows = [i for i, law in enumerate(laws) for _ in law]
+        columns = [r for law in laws for r in law]
+        values = [x for law in laws for x in law.values()]
+        self.conservation_matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(laws), species))
+
+        ## independent species link to themselves. A dependent one is minus
+        ## the rest of its law
+        position = {stoichiometry.species[name]: i for i, name in enumerate(independent)}
+        rows, columns, values = [], [], []
+        for name, i in position.items():
+            rows.append(name)
+            columns.append(i)
+            values.append(1.0)
+        for name, law in zip(dependent, laws):
+            row = stoichiometry.species[name]
+            for r, x in law.items():
+                if r != row:
+                    rows.append(row)
+                    columns.append(position[r])
+                    values.append(-x)
+        self.link_matrix = sparse.csr_matrix((values, (rows, columns)), shape=(species, len(independent)))
+        self.reduced_stoichiometry = stoichiometry.matrix[[stoichiometry.species[i] for i in independent]]
+
+    def __str__(self):
+        return 'ConservationLaws(independent={}, dependent={})'.format(len(self.independent), len(self.dependent))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def totals(self, amounts):
+        """The conserved totals G y of species `amounts`
+
+        Args:
+            amounts (numpy.ndarray): species amounts in the order of
+                :py:attr:`Stoichiometry.species`, shape (species,) or (species, k)
+
+        Returns:
+            numpy.ndarray of shape (dependent,) or (dependent, k)
+
+        """
+        return self.conservation_matrix.dot(amounts)
+
+    def to_df(self):
+        """The conservation matrix as a dense pandas.DataFrame indexed by
+        dependent species with a column per species"""
+        return pandas.DataFrame(self.conservation_matrix.toarray(), index=self.dependent,
+                                columns=list(self.stoichiometry.species))
+
+class CompiledModel(object):
+    """Python source and numpy functions for the ODEs of a model
+
+    The state vector `y` holds the concentrations of species determined
+    by reactions or ODEs followed by the values of global quantities
+    determined by ODEs, each ordered by key. The parameter vector `p`
+    holds the values of fixed global quantities, compartment volumes,
+    the concentrations of fixed species and local parameters.
+
+    :py:attr:`CompiledModel.rhs` and :py:attr:`CompiledModel.observe`
+    accept a trailing batch dimension: `y` of shape (n, k) with `p` of
+    shape (m, k) evaluates k models at once.
+
+    Attributes:
+        state_names (list): names of the variables in `y`
+        parameter_names (list): names of the values in `p`. Local parameters
+            are named like '(reaction).parameter'
+        metabolite_names (list): names of all species
+        global_quantity_names (list): names of all global quantities
+        source (str): the generated python code
+    """
+
+    def __init__(self, structure):
+        """
+
+        Args:
+            structure (dict): from :py:func:`read_structure`
+        """
+        self.structure = structure
+        self.key = structure_key(structure)
+        self._compile()
+
+    def __str__(self):
+        return 'CompiledModel(states={}, parameters={}, reactions={})'.format(
+            len(self.state_names), len(self.parameter_names), len(self.structure['reactions'])
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _compile(self):
+        structure = self.structure
+        compartments = {key: name for key, name in structure['compartments']}
+        metabolites = {i[0]: i for i in structure['metabolites']}
+        global_quantities = {i[0]: i for i in structure['global_quantities']}
+        reactions = {i[0]: i for i in structure['reactions']}
+        reaction_names = {i[1]: i[0] for i in structure['reactions']}
+
+        ## (kind, key) of every state and parameter. Values are read with these
+        self.state_refs = []
+        self.parameter_refs = []
+        self.state_names = []
+        self.parameter_names = []
+        ## key -> python source of its value
+        symbols = {}
+        ## assignments: symbol -> (source of expression, name)
+        pending = OrderedDict()
+
+        for key, name, compartment, simulation_type, expression in structure['metabolites']:
+            if simulation_type in ['reactions', 'ode']:
+                symbols[key] = '_y{}'.format(len(self.state_refs))
+                self.state_refs.append(('metabolite', key))
+                self.state_names.append(name)
+            elif simulation_type == 'fixed':
+                symbols[key] = '_p{}'.format(len(self.parameter_refs))
+                self.parameter_refs.append(('metabolite', key))
+                self.parameter_names.append(name)
+            elif simulation_type == 'assignment':
+                symbols[key] = '_a_{}'.format(key)
+            else:
+                raise errors.NotImplementedError('Species "{}" has simulation type "{}"'.format(
+                    name, simulation_type))
+
+        for key, name, simulation_type, expression in structure['global_quantities']:
+            if simulation_type == 'ode':
+                symbols[key] = '_y{}'.format(len(self.state_refs))
+                self.state_refs.append(('global_quantity', key))
+                self.state_names.append(name)
+            elif simulation_type == 'fixed':
+                symbols[key] = '_p{}'.format(len(self.parameter_refs))
+                self.parameter_refs.append(('global_quantity', key))
+                self.parameter_names.append(name)
+            elif simulation_type == 'assignment':
+                symbols[key] = '_a_{}'.format(key)
+            else:
+                raise errors.NotImplementedError('Global quantity "{}" has simulation type "{}"'.format(
+                    name, simulation_type))
+
+        for key, name in structure['compartments']:
+            symbols[key] = '_p{}'.format(len(self.parameter_refs))
+            self.parameter_refs.append(('compartment', key))
+            self.parameter_names.append(name)
+
+        for reaction_key, reaction_name, _, _, constants, _, _, _, _, _ in structure['reactions']:
+            for key, name in constants:
+                symbols[key] = '_p{}'.format(len(self.parameter_refs))
+                self.parameter_refs.append(('local_parameter', key))
+                self.parameter_names.append('({}).{}'.format(reaction_name, name))
+            symbols[reaction_key] = '_v_{}'.format(reaction_key)
+
+        symbols[structure['model_key']] = 't'
+        self.metabolite_names = [i[1] for i in structure['metabolites']]
+        self.global_quantity_names = [i[1] for i in structure['global_quantities']]
+        self.local_parameter_names = [i for i, ref in zip(self.parameter_names, self.parameter_refs)
+                                      if ref[0] == 'local_parameter']
+        self.compartment_names = [i[1] for i in structure['compartments']]
+        self.state_index = {name: i for i, name in enumerate(self.state_names)}
+        self.parameter_index = {name: i for i, name in enumerate(self.parameter_names)}
+
+        ## quantity unit -> particles
+        self._factor = '_factor'
+
+        def species_compartment(key):
+            return symbols[metabolites[key][2]]
+
+        def resolve_cn(cn, used):
+            parts = _cn_parts(cn)
+            reference = dict(parts).get('Reference')
+            vectors = [_vector_name(value) for kind, value in parts if kind == 'Vector']
+            if not vectors:
+                if reference == 'Time':
+                    return 't'
+                if reference == 'Avogadro Constant':
+                    return repr(6.022140857e+23)
+                if reference == 'Quantity Conversion Factor':
+                    return self._factor
+                raise errors.NotImplementedError('Reference "{}" is not supported'.format(cn))
+
+            vector, name = vectors[-1]
+            if vector == 'Metabolites':
+                compartment = vectors[0][1]
+                matches = [i for i in structure['metabolites']
+                           if i[1] == name and compartments.get(i[2]) == compartment]
+                if not matches:
+                    raise errors.InputError('No species "{}" in compartment "{}"'.format(name, compartment))
+                key = matches[0][0]
+                source = use(key, used, initial=reference.startswith('Initial'))
+                if reference in ['Concentration', 'InitialConcentration']:
+                    return source
+                if reference in ['ParticleNumber', 'InitialParticleNumber']:
+                    return '({} * {} * {})'.format(source, species_compartment(key), self._factor)
+            elif vector == 'Values':
+                key = [i[0] for i in structure['global_quantities'] if i[1] == name][0]
+                if reference in ['Value', 'InitialValue']:
+                    return use(key, used, initial=reference == 'InitialValue')
+            elif vector == 'Compartments':
+                key = [i[0] for i in structure['compartments'] if i[1] == name][0]
+                if reference in ['Volume', 'InitialVolume', 'Value', 'InitialValue']:
+                    return symbols[key]
+            elif vector == 'Reactions':
+                key = reaction_names[name]
+                if reference == 'Flux':
+                    return use(key, used)
+                if reference == 'ParticleFlux':
+                    return '({} * {})'.format(use(key, used), self._factor)
+                parameter = dict(parts).get('Parameter')
+                if parameter is not None and reference == 'Value':
+                    for constant_key, constant_name in reactions[key][4]:
+                        if constant_name == parameter:
+                            return symbols[constant_key]
+            raise errors.NotImplementedError('Reference "{}" is not supported'.format(cn))
+
+        def use(key, used, initial=False):
+            source = symbols[key]
+            if initial and not source.startswith('_p'):
+                raise errors.NotImplementedError(
+                    'References to the initial value of variable "{}" are not supported'.format(key))
+            if source.startswith('_a_') or source.startswith('_v_'):
+                used.add(source)
+            return source
+
+        def translate(expression, used, names=None):
+            def resolve(kind, value):
+                if kind == 'cn':
+                    return resolve_cn(value, used)
+                if names is not None:
+                    if kind == 'vector':
+                        ## PRODUCT<substrate_i> is the product of the sources of 'substrate'
+                        value = value.rsplit('_', 1)[0]
+                    if value in names:
+                        return names[value]
+                raise errors.InputError('Unknown name "{}" in "{}"'.format(value, expression))
+
+            return ExpressionTranslator(resolve).translate(expression)
+
+        ## rate laws as python functions
+        lines = []
+        function_names = {}
+        for reaction in structure['reactions']:
+            function_key = reaction[5]
+            if function_key is None or function_key in function_names:
+                continue
+            if function_key not in structure['functions']:
+                raise errors.InputError('Function "{}" of reaction "{}" not in model'.format(function_key, reaction[1]))
+            expression, descriptions, _ = structure['functions'][function_key]
+            arguments = {name: '_x{}'.format(i) for i, (_, name, _) in enumerate(descriptions)}
+            body = translate(expression, set(), arguments)
+            function_names[function_key] = '_f_{}'.format(re.sub(r'\W', '_', function_key))
+            lines.append('def {}({}):'.format(function_names[function_key],
+                                              ', '.join(arguments[i[1]] for i in descriptions)))
+            lines.append('    return {}'.format(body))
+            lines.append('')
+
+        ## assignments and fluxes
+        for key, name, _, simulation_type, expression in structure['metabolites']:
+            if simulation_type == 'assignment':
+                used = set()
+                pending[symbols[key]] = (translate(expression, used), used)
+        for key, name, simulation_type, expression in structure['global_quantities']:
+            if simulation_type == 'assignment':
+                used = set()
+                pending[symbols[key]] = (translate(expression, used), used)
+
+        self.stoichiometry = numpy.zeros((len(self.state_refs), len(structure['reactions'])))
+        state_position = {key: i for i, (_, key) in enumerate(self.state_refs)}
+        ## channels of the stochastic process: (reaction, direction, python source of
+        ## the rate, reactants). Reversible reactions have a forward and a backward channel
+        channels = []
+        ## forward channels of reversible reactions whose rate laws are split with sympy
+        self._unsplit = []
+        for j, (key, name, substrates, products, constants, function_key, unit_type, scaling, calls,
+                reversible) in enumerate(structure['reactions']):
+            used = set()
+            if function_key is None:
+                pending[symbols[key]] = ('0.0', used)
+                channels.append((j, 1.0, '0.0', substrates))
+                continue
+            calls = dict(calls)
+            _, descriptions, function_type = structure['functions'][function_key]
+            arguments = []
+            for description_key, description_name, role in descriptions:
+                references = calls.get(description_key, [])
+                if not references:
+                    raise errors.InputError('Parameter "{}" of reaction "{}" is not mapped'.format(
+                        description_name, name))
+                sources = [use(i, used) for i in references]
+                arguments.append(sources[0] if len(sources) == 1 else '({})'.format(' * '.join(sources)))
+            rate = '{}({})'.format(function_names[function_key], ', '.join(arguments))
+
+            ## COPASI: kinetic functions of reactions within a single compartment
+            ## are concentration per time and scaled to amount per time
+            species_compartments = set(metabolites[i][2] for i, _ in substrates + products)
+            concentration = unit_type == 'ConcentrationPerTime' or \
+                (unit_type != 'AmountPerTime' and len(species_compartments) <= 1)
+            scale = ''
+            if concentration:
+                if scaling is not None:
+                    scaling_key = [k for k, v in compartments.items() if v == scaling][0]
+                elif substrates or products:
+                    ## older files leave the scaling compartment implicit. It is
+                    ## that of the first substrate, or product if there are none
+                    scaling_key = metabolites[(substrates or products)[0][0]][2]
+                else:
+                    scaling_key = None
+                if scaling_key is not None:
+                    scale = ' * {}'.format(symbols[scaling_key])
+            pending[symbols[key]] = (rate + scale, used)
+
+            if not reversible:
+                channels.append((j, 1.0, symbols[key], substrates))
+            elif function_type == 'MassAction':
+                ## k1*PRODUCT<substrate_i> - k2*PRODUCT<product_j>
+                roles = [(description[2], argument) for description, argument in zip(descriptions, arguments)]
+                rate_constants = [argument for role, argument in roles if role == 'constant']
+                sides = [(1.0, 'substrate', substrates), (-1.0, 'product', products)]
+                for rate_constant, (direction, side, reactants) in zip(rate_constants, sides):
+                    factors = [rate_constant] + [argument for role, argument in roles if role == side]
+                    channels.append((j, direction, ' * '.join(factors) + scale, reactants))
+            else:
+                self._unsplit.append(len(channels))
+                channels.append((j, 1.0, symbols[key], substrates))
+                channels.append((j, -1.0, '0.0', products))
+
+            for metabolite, stoichiometry in substrates:
+                if metabolite in state_position and metabolites[metabolite][3] == 'reactions':
+                    self.stoichiometry[state_position[metabolite], j] -= stoichiometry
+            for metabolite, stoichiometry in products:
+                if metabolite in state_position and metabolites[metabolite][3] == 'reactions':
+                    self.stoichiometry[state_position[metabolite], j] += stoichiometry
+
+        self.channel_reactions = numpy.array([i[0] for i in channels], dtype=int)
+        self.channel_stoichiometry = self.stoichiometry[:, self.channel_reactions] * \
+            numpy.array([i[1] for i in channels])
+        ## highest order of the channels each state is a reactant of
+        self.reactant_orders = numpy.zeros(len(self.state_refs))
+        ## (channel, state, multiplicity) of the states that react with themselves
+        self._corrections = []
+        for c, (_, _, _, reactants) in enumerate(channels):
+            multiplicities = Counter()
+            for metabolite, stoichiometry in reactants:
+                multiplicities[metabolite] += stoichiometry
+            for metabolite, multiplicity in multiplicities.items():
+                if metabolite not in state_position or metabolites[metabolite][3] != 'reactions':
+                    continue
+                position = state_position[metabolite]
+                self.reactant_orders[position] = max(self.reactant_orders[position],
+                                                     sum(i[1] for i in reactants))
+                if multiplicity >= 2 and multiplicity == int(multiplicity):
+                    self._corrections.append((c, position, int(multiplicity)))
+
+        order = self._order(pending)
+
+        ## derivatives
+        derivatives = []
+        reaction_symbols = [symbols[i[0]] for i in structure['reactions']]
+        ## position in p of the compartment of each species changed by reactions
+        self.state_compartments = [None] * len(self.state_refs)
+        for i, (kind, key) in enumerate(self.state_refs):
+            if kind == 'metabolite' and metabolites[key][3] == 'reactions':
+                self.state_compartments[i] = int(species_compartment(key)[2:])
+                terms = []
+                for j in numpy.nonzero(self.stoichiometry[i])[0]:
+                    coefficient = self.stoichiometry[i, j]
+                    if coefficient == 1:
+                        terms.append('+ {}'.format(reaction_symbols[j]))
+                    elif coefficient == -1:
+                        terms.append('- {}'.format(reaction_symbols[j]))
+                    else:
+                        terms.append('{} {} * {}'.format('+' if coefficient > 0 else '-',
+                                                         repr(abs(coefficient)), reaction_symbols[j]))
+                if terms:
+                    derivative = '({}) / {}'.format(' '.join(terms).lstrip('+ '), species_compartment(key))
+                else:
+                    derivative = '0.0'
+            else:
+                expression = metabolites[key][4] if kind == 'metabolite' else global_quantities[key][3]
+                used = set()
+                derivative = translate(expression, used)
+                for symbol in self._order(pending, used):
+                    if symbol not in order:
+                        order.append(symbol)
+            derivatives.append(derivative)
+
+        prologue = ['    _y{0} = y[{0}]'.format(i) for i in range(len(self.state_refs))]
+        prologue += ['    _p{0} = p[{0}]'.format(i) for i in range(len(self.parameter_refs))]
+        prologue += ['    {} = {}'.format(symbol, pending[symbol][0]) for symbol in order]
+
+        lines.append('def rhs(t, y, p, _factor=1.0):')
+        lines += prologue
+        lines.append('    _dy = numpy.empty(numpy.shape(y))')
+        lines += ['    _dy[{}] = {}'.format(i, derivative) for i, derivative in enumerate(derivatives)]
+        lines.append('    return _dy')
+        lines.append('')
+
+        lines.append('def fluxes(t, y, p, _factor=1.0):')
+        lines += prologue
+        lines.append('    return [{}]'.format(', '.join(reaction_symbols)))
+        lines.append('')
+
+        lines.append('def channels(t, y, p, _factor=1.0):')
+        lines += prologue
+        lines.append('    return [{}]'.format(', '.join(i[2] for i in channels)))
+        lines.append('')
+
+        ## every species and global quantity
+        observed = [symbols[i[0]] for i in structure['metabolites']] + \
+                   [symbols[i[0]] for i in structure['global_quantities']]
+        all_symbols = list(pending.keys())
+        lines.append('def observe(t, y, p, _factor=1.0):')
+        lines += prologue[:len(self.state_refs) + len(self.parameter_refs)]
+        lines += ['    {} = {}'.format(symbol, pending[symbol][0]) for symbol in self._order(pending, set(all_symbols))]
+        lines.append('    return [{}]'.format(', '.join(observed)))
+        lines.append('')
+
+        self.source = '\n'.join(lines)
+        namespace = {'numpy': numpy, '_sec': _sec, '_csc': _csc, '_cot': _cot, '_factorial': _factorial}
+        exec(compile(self.source, '<pycotools3.native {}>'.format(self.key[:8]), 'exec'), namespace)
+        self._rhs = namespace['rhs']
+        self._observe = namespace['observe']
+        self._fluxes = namespace['fluxes']
+        self._channels = namespace['channels']
+
+    @staticmethod
+    def _order(pending, required=None):
+        """Order assignments and fluxes so that each comes after those it uses
+
+        Args:
+            pending (dict): symbol -> (source, set of symbols used)
+            required (set): Default None, meaning the symbols needed by the
+                reaction fluxes. Symbols to compute
+
+        Returns:
+            list of symbols
+
+        """
+        if required is None:
+            required = set(i for i in pending if i.startswith('_v_'))
+        order = []
+        state = {}
+
+        def visit(symbol, path):
+            if state.get(symbol) == 'done':
+                return
+            if state.get(symbol) == 'visiting':
+                raise errors.InputError('Circular assignment: {}'.format(' -> '.join(path + [symbol])))
+            state[symbol] = 'visiting'
+            for i in sorted(pending[symbol][1]):
+                visit(i, path + [symbol])
+            state[symbol] = 'done'
+            order.append(symbol)
+
+        ## keep model order where dependencies allow
+        for symbol in pending:
+            if symbol in required:
+                visit(symbol, [])
+        return order
+
+    def rhs(self, t, y, p, factor=1.0):
+        """Time derivative of the states
+
+        Args:
+            t (float): time
+            y (numpy.ndarray): states, shape (n,) or (n, k)
+            p (numpy.ndarray): parameters, shape (m,) or (m, k)
+            factor (float): particles per quantity unit, for particle number
+                references. See :py:meth:`CompiledModel.values`
+
+        Returns:
+            numpy.ndarray shaped like `y`
+
+        """
+        return self._rhs(t, y, p, factor)
+
+    def observe(self, t, y, p, factor=1.0):
+        """Concentrations of every species followed by the values of
+        every global quantity
+
+        Args:
+            t (float or numpy.ndarray): time. Arrays broadcast against the trailing axis of `y`
+            y (numpy.ndarray): states, shape (n,) or (n, ...)
+            p (numpy.ndarray): parameters
+            factor (float): particles per quantity unit
+
+        Returns:
+            numpy.ndarray of shape (species + global quantities, ...)
+
+        """
+        shape = numpy.shape(y)[1:]
+        return numpy.array([numpy.broadcast_to(i, shape) for i in self._observe(t, y, p, factor)], dtype=float)
+
+    def values(self, model):
+        """Read the initial states, parameters and the particle conversion
+        factor from `model`
+
+        Args:
+            model (:py:class:`model.Model`): a model with this structure
+
+        Returns:
+            tuple: (y0, p, factor)
+
+        """
+        state_vector = model.state_vector
+        quantity_unit = model.quantity_unit
+        compartments = {}
+        for key, _ in self.structure['compartments']:
+            compartments[key] = state_vector[key] if key in state_vector else 1.0
+        metabolites = {i[0]: i[2] for i in self.structure['metabolites']}
+
+        def value(kind, key):
+            if kind == 'metabolite':
+                particles = state_vector[key] if key in state_vector else 0.0
+                return model.convert_particles_to_molar(particles, quantity_unit, compartments[metabolites[key]])
+            if kind == 'global_quantity':
+                return state_vector[key] if key in state_vector else 0.0
+            if kind == 'compartment':
+                return compartments[key]
+            return float(model.component_index.get(key).attrib['value'])
+
+        y0 = numpy.array([value(*i) for i in self.state_refs], dtype=float)
+        p = numpy.array([value(*i) for i in self.parameter_refs], dtype=float)
+        factor = model.convert_molar_to_particles(1.0, quantity_unit, 1.0)
+        return y0, p, factor
+
+    def override(self, y0, p, values):
+        """Copy `y0` and `p` with some values replaced by name
+
+        Args:
+            y0 (numpy.ndarray): initial states
+            p (numpy.ndarray): parameters
+            values (dict): name -> value. Species names set initial
+                concentrations, other names set parameters
+
+        Returns:
+            tuple: (y0, p)
+
+        """
+        y0 = numpy.array(y0, dtype=float)
+        p = numpy.array(p, dtype=float)
+        for name, value in values.items():
+            if name in self.state_index:
+                y0[self.state_index[name]] = value
+            elif name in self.parameter_index:
+                p[self.parameter_index[name]] = value
+            else:
+                raise errors.InputError('"{}" is not a state or parameter of the model'.format(name))
+        return y0, p
+
+    @property
+    def jacobian(self):
+        """The analytic :py:class:`Jacobian` of :py:meth:`CompiledModel.rhs`.
+        Derived once per structure on first use. None when sympy is not installed
+        """
+        if '_jacobian' not in self.__dict__:
+            if sympy is None:
+                LOG.debug('sympy is not installed. Jacobians are estimated by finite differences')
+                self._jacobian = None
+            else:
+                self._jacobian = Jacobian(self)
+        return self._jacobian
+
+    def _jacobian_option(self, method, jacobian):
+        """The Jacobian to give an implicit `method`, or None"""
+        if not jacobian or method not in _IMPLICIT_METHODS:
+            return None
+        return self.jacobian
+
+    def integrate(self, y0, p, times, factor=1.0, method='LSODA', relative_tolerance=1e-6,
+                  absolute_tolerance=1e-12, max_step=numpy.inf, jacobian=True):
+        """Integrate from time 0 and return the states at `times`
+
+        Args:
+            y0 (numpy.ndarray): initial states
+            p (numpy.ndarray): parameters
+            times (numpy.ndarray): ascending output times, >= 0
+            factor (float): particles per quantity unit
+            method (str): Default 'LSODA'. Any :py:func:`scipy.integrate.solve_ivp` method
+            relative_tolerance (float): Default 1e-6
+            absolute_tolerance (float): Default 1e-12
+            max_step (float): Default inf. Largest step the integrator may take
+            jacobian (bool): Default True. Give the implicit methods (LSODA, BDF
+                and Radau) the analytic Jacobian. Without it, or without sympy,
+                they estimate it by finite differences
+
+        Returns:
+            numpy.ndarray of shape (states, times)
+
+        """
+        times = numpy.asarray(times, dtype=float)
+        if len(y0) == 0:
+            return numpy.zeros((0, len(times)))
+        options = {}
+        analytic = self._jacobian_option(method, jacobian)
+        if analytic is not None:
+            ## LSODA needs a dense matrix
+            dense = method == 'LSODA' or not analytic.sparse
+            options['jac'] = analytic.dense if dense else analytic.csc
+        result = solve_ivp(self._rhs, (0.0, float(times[-1])), y0, method=method, t_eval=times,
+                           args=(p, factor), rtol=relative_tolerance, atol=absolute_tolerance,
+                           max_step=max_step, **options)
+        if not result.success:
+            raise errors.TimeCourseError('Integration failed: {}'.format(result.message))
+        return result.y
+
+    def timecourse(self, y0, p, times, factor=1.0, **kwargs):
+        """Species concentrations and global quantity values at `times`
+
+        Args:
+            y0 (numpy.ndarray): initial states
+            p (numpy.ndarray): parameters
+            times (numpy.ndarray): ascending output times, >= 0
+            factor (float): particles per quantity unit
+            **kwargs: for :py:meth:`CompiledModel.integrate`
+
+        Returns:
+            pandas.DataFrame indexed by 'Time' with a column per
+            species and global quantity
+
+        """
+        y = self.integrate(y0, p, times, factor=factor, **kwargs)
+        observed = self.observe(numpy.asarray(times, dtype=float), y, p, factor)
+        df = pandas.DataFrame(observed.T, index=pandas.Index(times, name='Time'),
+                              columns=self.metabolite_names + self.global_quantity_names)
+        return df
+
+    def values_batch(self, model, parameters, names=None):
+        """Initial states and parameters of many parameter sets
+
+        Args:
+            model (:py:class:`model.Model`): a model with this structure.
+                Provides every value not given in `parameters`
+            parameters (pandas.DataFrame or numpy.ndarray): one row per
+                parameter set. Columns are names as in :py:meth:`CompiledModel.override`.
+                Names that are not a state or parameter of the model, such as
+                the RSS column of parameter estimation output, are ignored
+            names (list): Default None. Column names when `parameters` is an array
+
+        Returns:
+            tuple: (Y0, P, factor) with Y0 of shape (sets, states) and P of
+            shape (sets, parameters)
+
+        """
+        if isinstance(parameters, pandas.DataFrame):
+            names = list(parameters.columns)
+            parameters = parameters.values
+        parameters = numpy.atleast_2d(numpy.asarray(parameters, dtype=float))
+        if names is None or len(names) != parameters.shape[1]:
+            raise errors.InputError('Need a name for each of the {} columns of parameters'.format(
+                parameters.shape[1]))
+
+        y0, p, factor = self.values(model)
+        sets = parameters.shape[0]
+        Y0 = numpy.repeat(y0[None, :], sets, axis=0)
+        P = numpy.repeat(p[None, :], sets, axis=0)
+        for column, name in enumerate(names):
+            if name in self.state_index:
+                Y0[:, self.state_index[name]] = parameters[:, column]
+            elif name in self.parameter_index:
+                P[:, self.parameter_index[name]] = parameters[:, column]
+            else:
+                LOG.debug('"{}" is not a state or parameter of the model and is ignored'.format(name))
+        return Y0, P, factor
+
+    def integrate_batch(self, Y0, P, times, factor=1.0, method='LSODA', relative_tolerance=1e-6,
+                        absolute_tolerance=1e-12, max_step=numpy.inf, jacobian=True):
+        """Integrate many parameter sets as one system
+
+        The sets are stacked into a single state vector and integrated
+        together, so each step evaluates the vectorized right hand side
+        once for all of them. Sets do not interact, so the Jacobian is
+        block diagonal and the integrator is told so. Its cost then grows
+        linearly with the number of sets.
+
+        Args:
+            Y0 (numpy.ndarray): initial states, shape (sets, states)
+            P (numpy.ndarray): parameters, shape (sets, parameters)
+            times (numpy.ndarray): ascending output times, >= 0
+            factor (float): particles per quantity unit
+            method (str): Default 'LSODA'. Any :py:func:`scipy.integrate.solve_ivp` method
+            relative_tolerance (float): Default 1e-6
+            absolute_tolerance (float): Default 1e-12
+            max_step (float): Default inf
+            jacobian (bool): Default True. Give the implicit methods the
+                analytic Jacobian, see :py:meth:`CompiledModel.integrate`
+
+        Returns:
+            numpy.ndarray of shape (states, sets, times)
+
+        """
+        Y0 = numpy.asarray(Y0, dtype=float)
+        times = numpy.asarray(times, dtype=float)
+        sets, states = Y0.shape
+        if states == 0:
+            return numpy.zeros((0, sets, len(times)))
+        p = numpy.asarray(P, dtype=float).T
+        rhs = self._rhs
+
+        ## the stacked state vector is set major: y[set * states + state]
+        def fun(t, y):
+            return rhs(t, y.reshape(sets, states).T, p, factor).T.ravel()
+
+        options = {}
+        if method == 'LSODA':
+            options['lband'] = options['uband'] = states - 1
+        analytic = self._jacobian_option(method, jacobian)
+        if analytic is not None:
+            if method == 'LSODA':
+                options['jac'] = lambda t, y: analytic.banded_batch(t, y.reshape(sets, states).T, p, factor)
+            else:
+                options['jac'] = lambda t, y: analytic.csc_batch(t, y.reshape(sets, states).T, p, factor)
+        elif method in ['BDF', 'Radau']:
+            options['jac_sparsity'] = sparse.block_diag([numpy.ones((states, states))] * sets, format='csc')
+
+        result = solve_ivp(fun, (0.0, float(times[-1])), Y0.ravel(), method=method, t_eval=times,
+                           rtol=relative_tolerance, atol=absolute_tolerance, max_step=max_step,
+                           **options)
+        if not result.success:
+            raise errors.TimeCourseError('Integration failed: {}'.format(result.message))
+        return result.y.reshape(sets, states, len(times)).transpose(1, 0, 2)
+
+    def ensemble(self, Y0, P, times, factor=1.0, **kwargs):
+        """Every variable of many parameter sets at `times`
+
+        A batch that fails to integrate is retried one set at a time and
+        the sets that still fail are filled with NaN.
+
+        Args:
+            Y0 (numpy.ndarray): initial states, shape (sets, states)
+            P (numpy.ndarray): parameters, shape (sets, parameters)
+            times (numpy.ndarray): ascending output times, >= 0
+            factor (float): particles per quantity unit
+            **kwargs: for :py:meth:`CompiledModel.integrate_batch`
+
+        Returns:
+            numpy.ndarray of shape (times, sets, variables). Variables are
+            :py:attr:`CompiledModel.variable_names`
+
+        """
+        times = numpy.asarray(times, dtype=float)
+        try:
+            y = self.integrate_batch(Y0, P, times, factor, **kwargs)
+        except errors.TimeCourseError:
+            if len(Y0) == 1:
+                raise
+            y = numpy.full((len(self.state_names), len(Y0), len(times)), numpy.nan)
+            for i in range(len(Y0)):
+                try:
+                    y[:, i:i + 1] = self.integrate_batch(Y0[i:i + 1], P[i:i + 1], times, factor, **kwargs)
+                except errors.TimeCourseError as e:
+                    LOG.warning('Parameter set {} failed to integrate: {}'.format(i, e))
+        return self._variables(times, y, P, factor)
+
+    def _variables(self, times, y, P, factor):
+        """Every variable from states `y` of shape (states, sets, times),
+        shaped (times, sets, variables)"""
+        p = numpy.asarray(P, dtype=float).T[:, :, None]
+        observed = self.observe(times, y, p, factor)
+        constants = numpy.broadcast_to(p[self._constant_positions], (len(self._constant_positions),) + y.shape[1:])
+        return numpy.concatenate([observed, constants]).transpose(2, 1, 0)
+
+    def sensitivities(self, y0, p, times, causes, factor=1.0, method='BDF', relative_tolerance=1e-6,
+                      absolute_tolerance=1e-12, max_step=numpy.inf):
+        """Forward sensitivities of the states to parameters and initial values
+
+        Integrates the states together with their sensitivities S, which obey
+        dS/dt = J S + df/dp, where J is the Jacobian and df/dp the derivative of
+        the right hand side with respect to the parameters. A sensitivity to
+        an initial value starts at 1 for that state, the others at 0. The
+        implicit methods are given the block diagonal part of the Jacobian of
+        the whole system.
+
+        Args:
+            y0 (numpy.ndarray): initial states
+            p (numpy.ndarray): parameters
+            times (numpy.ndarray): ascending output times, >= 0
+            causes (list): names of parameters or states. States mean their initial value
+            factor (float): particles per quantity unit
+            method (str): Default 'BDF'. Any :py:func:`scipy.integrate.solve_ivp` method
+            relative_tolerance (float): Default 1e-6
+            absolute_tolerance (float): Default 1e-12
+            max_step (float): Default inf
+
+        Returns:
+            tuple: the states, shape (states, times), and the
+            sensitivities, shape (times, states, causes)
+
+        """
+        jacobian = self.jacobian
+        if jacobian is None:
+            raise errors.NotImplementedError('Sensitivities need sympy. Use `pip install sympy`')
+        times = numpy.asarray(times, dtype=float)
+        states = len(self.state_names)
+        parameters = []
+        S0 = numpy.zeros((states, len(causes)))
+        for i, name in enumerate(causes):
+            if name in self.state_index:
+                S0[self.state_index[name], i] = 1.0
+                parameters.append(None)
+            elif name in self.parameter_index:
+                parameters.append(self.parameter_index[name])
+            else:
+                raise errors.InputError('"{}" is not a state or parameter of the model'.format(name))
+        ## columns of df/dp for each cause. Zero for initial values
+        selected = [i for i, j in enumerate(parameters) if j is not None]
+        columns = [parameters[i] for i in selected]
+        blocks = len(causes) + 1
+
+        ## z holds y then each column of S: z[block * states + state]
+        def fun(t, z):
+            Z = z.reshape(blocks, states).T
+            y = Z[:, 0]
+            derivative = jacobian.csc(t, y, p, factor) if jacobian.sparse else jacobian.dense(t, y, p, factor)
+            dZ = numpy.empty_like(Z)
+            dZ[:, 0] = self._rhs(t, y, p, factor)
+            dZ[:, 1:] = derivative.dot(Z[:, 1:])
+            if selected:
+                dZ[:, [i + 1 for i in selected]] += jacobian.parameters(t, y, p, factor)[:, columns]
+            return dZ.T.ravel()
+
+        def jac(t, z):
+            values = jacobian.entries(t, z[:states], p, factor)
+            return jacobian.block_diagonal(numpy.repeat(values[:, None], blocks, axis=1),
+                                           banded=method == 'LSODA')
+
+        options = {}
+        if method in _IMPLICIT_METHODS:
+            options['jac'] = jac
+            if method == 'LSODA':
+                options['lband'] = options['uband'] = states - 1
+        z0 = numpy.column_stack([y0, S0]).T.ravel()
+        result = solve_ivp(fun, (0.0, float(times[-1])), z0, method=method, t_eval=times,
+                           rtol=relative_tolerance, atol=absolute_tolerance, max_step=max_step, **options)
+        if not result.success:
+            raise errors.TimeCourseError('Integration failed: {}'.format(result.message))
+        z = result.y.reshape(blocks, states, len(times))
+        return z[0], z[1:].transpose(2, 1, 0)
+
+    @property
+    def conservation_laws(self):
+        """Rows c with c N = 0, where N is the stoichiometry of the species
+        changed by reactions. The amounts c_i V_i y_i of each row add up to a
+        constant. Shape (laws, states), with zeros for the other states
+        """
+        if '_conservation_laws' not in self.__dict__:
+            rows = [i for i, j in enumerate(self.state_compartments) if j is not None]
+            _, _, found = _conservation_laws(self.stoichiometry[rows])
+            laws = numpy.zeros((len(found), len(self.state_names)))
+            for i, law in enumerate(found):
+                for r, x in law.items():
+                    laws[i, rows[r]] = x
+            self._conservation_laws = laws
+        return self._conservation_laws
+
+    def _dense_jacobian(self, y, p, factor, jacobian=True):
+        """Analytic Jacobian or, without it, forward differences in one batched call"""
+        analytic = self.jacobian if jacobian else None
+        if analytic is not None:
+            return analytic.dense(0.0, y, p, factor)
+        steps = 1e-8 * numpy.maximum(numpy.abs(y), 1e-6)
+        f = self._rhs(0.0, y, p, factor)
+        shifted = self._rhs(0.0, y[:, None] + numpy.diag(steps), p[:, None], factor)
+        return (shifted - f[:, None]) / steps[None, :]
+
+    def _newton(self, y, p, factor, moieties, totals, resolution, iterations, jacobian):
+        """Damped Newton iteration on the rates together with the conservation
+        laws. Each step is halved until the residual falls. Like COPASI, a state
+        is steady when every rate is below `resolution` relative to its state,
+        or when a full Newton step moves no state by more than that. Steady
+        states with negative concentrations are rejected
+
+        Returns:
+            tuple: (y, converged)
+
+        """
+        species = numpy.array([kind == 'metabolite' for kind, _ in self.state_refs], dtype=bool)
+        states = len(y)
+
+        def residual(y):
+            return numpy.concatenate([self._rhs(0.0, y, p, factor), moieties.dot(y) - totals])
+
+        def small(values, y):
+            return numpy.all(numpy.abs(values) <= resolution * numpy.maximum(numpy.abs(y), resolution))
+
+        def positive(y):
+            return bool(numpy.all(y[species] >= -resolution * numpy.abs(y).max()))
+
+        r = residual(y)
+        for _ in range(iterations):
+            if not numpy.all(numpy.isfinite(r)):
+                return y, False
+            conserved = numpy.all(numpy.abs(r[states:]) <= resolution)
+            if conserved and small(r[:states], y):
+                return y, positive(y)
+            matrix = numpy.vstack([self._dense_jacobian(y, p, factor, jacobian), moieties])
+            step = numpy.linalg.lstsq(matrix, -r, rcond=None)[0]
+            norm = numpy.linalg.norm(r)
+            ## a short step only means a steady state when it solves the linear system
+            exact = numpy.linalg.norm(matrix.dot(step) + r) <= 1e-6 * norm
+            if conserved and exact and small(step, y):
+                return y + step, positive(y + step)
+            damping = 1.0
+            while damping > 1e-3:
+                trial = y + damping * step
+                trial_residual = residual(trial)
+                if numpy.linalg.norm(trial_residual) < norm:
+                    break
+                damping /= 2.0
+            else:
+                return y, False
+            y, r = trial, trial_residual
+        return y, False
+
+    def steady_state(self, y0, p, factor=1.0, guess=None, resolution=1e-9, iterations=50,
+                     integration=True, max_duration=1e9, jacobian=True):
+        """Find a steady state like COPASI's steady state task
+
+        Newton's method is tried first, from `guess` and then from `y0`.
+        If it fails the model is integrated from `y0` and Newton's method
+        is tried again from the states at t = 0.1, 1, 10, ... `max_duration`.
+        The conservation laws keep the solution on the moieties of `y0`.
+
+        Args:
+            y0 (numpy.ndarray): initial states. Set the conserved totals
+            p (numpy.ndarray): parameters
+            factor (float): particles per quantity unit
+            guess (numpy.ndarray): Default None. Where to start Newton's method,
+                e.g. the steady state of a similar parameter set
+            resolution (float): Default 1e-9. Largest rate of change at the steady state
+            iterations (int): Default 50. Newton iterations per attempt
+            integration (bool): Default True. Fall back on integration
+            max_duration (float): Default 1e9. Longest integration
+            jacobian (bool): Default True. Use the analytic Jacobian. Otherwise
+                it is estimated by finite differences
+
+        Returns:
+            tuple: (y, converged). y is the best estimate when not converged
+
+        """
+        y0 = numpy.asarray(y0, dtype=float)
+        p = numpy.asarray(p, dtype=float)
+        if len(y0) == 0:
+            return y0, True
+        volumes = numpy.array([1.0 if i is None else p[i] for i in self.state_compartments])
+        moieties = self.conservation_laws * volumes[None, :]
+        totals = moieties.dot(y0)
+        ## measure the conservation residual relative to the size of each moiety
+        scale = numpy.abs(moieties).dot(numpy.abs(y0))
+        scale[scale == 0] = 1.0
+        moieties, totals = moieties / scale[:, None], totals / scale
+        arguments = (p, factor, moieties, totals, resolution, iterations, jacobian)
+
+        starts = [y0] if guess is None else [numpy.asarray(guess, dtype=float), y0]
+        for start in starts:
+            y, converged = self._newton(start, *arguments)
+            if converged:
+                return y, True
+        if integration:
+            times = 10.0 ** numpy.arange(-1, numpy.floor(numpy.log10(max_duration)) + 1)
+            try:
+                states = self.integrate(y0, p, times, factor, method='LSODA', jacobian=jacobian)
+            except errors.TimeCourseError as e:
+                LOG.debug('Integration towards steady state failed: {}'.format(e))
+                states = numpy.zeros((len(y0), 0))
+            for state in states.T:
+                y, converged = self._newton(state, *arguments)
+                if converged:
+                    return y, True
+        return y, False
+
+    def steady_state_batch(self, Y0, P, factor=1.0, **kwargs):
+        """Steady states of many parameter sets
+
+        Each set starts Newton's method from the steady state of the set
+        before it, so sets that change gradually, as in a dose response
+        or parameter scan, need few iterations.
+
+        Args:
+            Y0 (numpy.ndarray): initial states, shape (sets, states)
+            P (numpy.ndarray): parameters, shape (sets, parameters)
+            factor (float): particles per quantity unit
+            **kwargs: for :py:meth:`CompiledModel.steady_state`
+
+        Returns:
+            tuple: (Y, converged). Y holds the steady states, shape (sets, states),
+            with NaN for sets that did not converge
+
+        """
+        Y0 = numpy.asarray(Y0, dtype=float)
+        P = numpy.asarray(P, dtype=float)
+        Y = numpy.full(Y0.shape, numpy.nan)
+        converged = numpy.zeros(len(Y0), dtype=bool)
+        guess = None
+        for i in range(len(Y0)):
+            y, converged[i] = self.steady_state(Y0[i], P[i], factor, guess=guess, **kwargs)
+            if converged[i]:
+                Y[i] = guess = y
+        return Y, converged
+
+    @property
+    def _split(self):
+        """Forward and backward rates of the reversible reactions in
+        :py:attr:`CompiledModel._unsplit`. The rate law of each is expanded
+        with sympy and its negative terms make the backward rate"""
+        if '_split_rates' not in self.__dict__:
+            t, factor = sympy.Symbol('t'), sympy.Symbol('factor')
+            y = [sympy.Symbol('y{}'.format(i)) for i in range(len(self.state_names))]
+            p = [sympy.Symbol('p{}'.format(i)) for i in range(len(self.parameter_names))]
+            namespace = _sympy_namespace()
+            exec(compile(self.source, '<pycotools3.native {}>'.format(self.key[:8]), 'exec'), namespace)
+            fluxes = namespace['fluxes'](t, y, p, factor)
+            expressions = []
+            for c in self._unsplit:
+                terms = sympy.Add.make_args(sympy.expand(sympy.sympify(fluxes[self.channel_reactions[c]])))
+                expressions.append(sympy.Add(*[i for i in terms if not i.could_extract_minus_sign()]))
+                expressions.append(-sympy.Add(*[i for i in terms if i.could_extract_minus_sign()]))
+            self._split_rates = sympy.lambdify([t, y, p, factor], expressions, modules='numpy')
+        return self._split_rates
+
+    def propensities(self, t, X, P, factor=1.0):
+        """Rates of the channels in particles per time
+
+        Each reaction is a channel and each reversible reaction two: a
+        forward channel then a backward one. Mass action rate laws are split
+        into their two terms. Other rate laws are expanded with sympy and
+        their negative terms make the backward channel.
+
+        The rate laws are evaluated on the concentrations of the particle
+        numbers. Like COPASI, a channel consuming n particles of one species
+        is then corrected by X(X-1)...(X-n+1) / X^n, so that mass action
+        rates count distinct particles.
+
+        Args:
+            t (numpy.ndarray): time of each realisation, shape (k,)
+            X (numpy.ndarray): particle numbers, shape (k, states)
+            P (numpy.ndarray): parameters, shape (k, parameters)
+            factor (float): particles per quantity unit
+
+        Returns:
+            numpy.ndarray of shape (k, channels)
+
+        """
+        volumes = P[:, self.state_compartments]
+        y = (X / (factor * volumes)).T
+        rates = numpy.zeros((len(self.channel_reactions), len(X)))
+        for c, rate in enumerate(self._channels(t, y, P.T, factor)):
+            rates[c] = rate
+        if self._unsplit:
+            split = self._split(t, y, P.T, factor)
+            for i, c in enumerate(self._unsplit):
+                rates[c] = split[2 * i]
+                rates[c + 1] = split[2 * i + 1]
+        rates *= factor
+        for c, position, multiplicity in self._corrections:
+            x = X[:, position]
+            for k in range(1, multiplicity):
+                rates[c] *= numpy.where(x > k, 1.0 - k / numpy.maximum(x, 1.0), 0.0)
+        if numpy.any(rates < 0):
+            c = numpy.nonzero((rates < 0).any(1))[0][0]
+            raise errors.InputError('Reaction "{}" has a negative rate'.format(
+                self.structure['reactions'][self.channel_reactions[c]][1]))
+        return rates.T
+
+    def stochastic(self, X0, P, times, factor=1.0, keys=None, method='direct', epsilon=0.03,
+                   max_steps=1000000):
+        """Realisations of the stochastic process of the reactions
+
+        Every realisation advances together: each pass draws the next
+        event of the direct method, or the next leap of tau leaping, for
+        all of them at once. Tau leaping chooses its steps as in Cao,
+        Gillespie and Petzold (2006) and takes direct method steps where a
+        leap would cover fewer than 10 reactions. A leap that makes a
+        particle number negative is retried with half the step. The
+        channels are those of :py:meth:`CompiledModel.propensities`.
+
+        Args:
+            X0 (numpy.ndarray): initial particle numbers, shape (realisations, states)
+            P (numpy.ndarray): parameters, shape (realisations, parameters)
+            times (numpy.ndarray): ascending output times, >= 0
+            factor (float): particles per quantity unit
+            keys (numpy.ndarray): Default None, meaning :py:func:`realisation_keys` (1, n).
+                Key of the random stream of each realisation
+            method (str): Default 'direct'. Or 'tau_leap'
+            epsilon (float): Default 0.03. Largest relative change of
+                the propensities in a leap
+            max_steps (int): Default 1000000. Steps per realisation. Later
+                output of realisations that need more is NaN
+
+        Returns:
+            numpy.ndarray of shape (states, realisations, times)
+
+        """
+        for name, compartment in zip(self.state_names, self.state_compartments):
+            if compartment is None:
+                raise errors.NotImplementedError('"{}" is determined by an ODE. Stochastic simulation '
+                                                 'needs every variable to be changed by reactions'.format(name))
+        if self._unsplit and sympy is None:
+            raise errors.NotImplementedError(
+                'Reaction "{}" is reversible and not mass action. Splitting it into a forward and a backward '
+                'channel needs sympy. Use `pip install sympy`'.format(
+                    self.structure['reactions'][self.channel_reactions[self._unsplit[0]]][1]))
+        if method not in ['direct', 'tau_leap']:
+            raise errors.InputError('method should be "direct" or "tau_leap". Got "{}"'.format(method))
+        X = numpy.array(X0, dtype=float)
+        P = numpy.asarray(P, dtype=float)
+        times = numpy.asarray(times, dtype=float)
+        keys = realisation_keys(1, len(X)) if keys is None else keys
+        realisations, states = X.shape
+        stoichiometry = self.channel_stoichiometry.T
+        reactions = len(stoichiometry)
+        reactants = self.reactant_orders > 0
+
+        t = numpy.zeros(realisations)
+        steps = numpy.zeros(realisations, dtype=numpy.uint64)
+        shrink = numpy.ones(realisations)
+        following = numpy.zeros(realisations, dtype=int)
+        output = numpy.full((len(times), realisations, states), numpy.nan)
+
+        def record(rows, until, inclusive):
+            """Give the output times up to `until` the current states of `rows`"""
+            while len(rows):
+                position = following[rows]
+                due = position < len(times)
+                passed = times[numpy.minimum(position, len(times) - 1)]
+                due &= passed <= until if inclusive else passed < until
+                rows, until = rows[due], until[due]
+                output[following[rows], rows] = X[rows]
+                following[rows] += 1
+
+        def direct(rows, rates, total):
+            uniform = _uniforms(keys[rows], steps[rows], 2)
+            steps[rows] += numpy.uint64(1)
+            with numpy.errstate(divide='ignore'):
+                tau = numpy.where(total > 0, -numpy.log(uniform[:, 0]) / total, numpy.inf)
+            arrival = t[rows] + tau
+            ## output before the event sees the state before it
+            record(rows, arrival, False)
+            fire = arrival <= times[-1]
+            threshold = uniform[fire, 1] * total[fire]
+            choice = (numpy.cumsum(rates[fire], axis=1) < threshold[:, None]).sum(axis=1)
+            ## the cumulative sum can round below the threshold. Then the last
+            ## channel that can fire does, never one without propensity
+            last = reactions - 1 - numpy.argmax(rates[fire][:, ::-1] > 0, axis=1)
+            X[rows[fire]] += stoichiometry[numpy.minimum(choice, last)]
+            t[rows] = arrival
+
+        def leap(rows, rates, tau):
+            ## leaps end at the next output time at the latest
+            following_time = times[following[rows]]
+            capped = t[rows] + tau >= following_time
+            arrival = numpy.where(capped, following_time, t[rows] + tau)
+            uniform = _uniforms(keys[rows], steps[rows], 2 * reactions)
+            steps[rows] += numpy.uint64(1)
+            fired = _poisson(rates * (arrival - t[rows])[:, None], uniform[:, :reactions], uniform[:, reactions:])
+            new = X[rows] + fired.dot(stoichiometry)
+            valid = numpy.all(new >= 0, axis=1)
+            shrink[rows[~valid]] /= 2.0
+            rows, arrival = rows[valid], arrival[valid]
+            X[rows] = new[valid]
+            t[rows] = arrival
+            shrink[rows] = 1.0
+            record(rows, arrival, True)
+
+        while True:
+            rows = numpy.nonzero(following < len(times))[0]
+            exhausted = steps[rows] >= max_steps
+            if numpy.any(exhausted):
+                LOG.warning('{} realisations took more than {} steps'.format(int(exhausted.sum()), max_steps))
+                following[rows[exhausted]] = len(times)
+                rows = rows[~exhausted]
+            if not len(rows):
+                break
+            rates = self.propensities(t[rows], X[rows], P[rows], factor)
+            total = rates.sum(axis=1)
+            if method == 'direct' or reactions == 0:
+                direct(rows, rates, total)
+                continue
+            mean = rates.dot(stoichiometry)
+            variance = rates.dot(stoichiometry ** 2)
+            bound = numpy.maximum(epsilon * X[rows] / numpy.where(reactants, self.reactant_orders, 1.0), 1.0)
+            with numpy.errstate(divide='ignore'):
+                tau = numpy.minimum(
+                    numpy.where(reactants & (mean != 0), bound / numpy.abs(mean), numpy.inf).min(axis=1),
+                    numpy.where(reactants & (variance > 0), bound ** 2 / variance, numpy.inf).min(axis=1)
+                ) * shrink[rows]
+            leaping = (total > 0) & (tau * total >= 10)
+            if numpy.any(~leaping):
+                direct(rows[~leaping], rates[~leaping], total[~leaping])
+            if numpy.any(leaping):
+                leap(rows[leaping], rates[leaping], tau[leaping])
+        return output.transpose(2, 1, 0)
+
+    @property
+    def variable_names(self):
+        """Names of the variables returned by :py:meth:`CompiledModel.ensemble`:
+        species, global quantities, local parameters then compartments"""
+        return self.metabolite_names + self.global_quantity_names + \
+            self.local_parameter_names + self.compartment_names
+
+    @property
+    def _constant_positions(self):
+        return [self.parameter_index[i] for i in self.local_parameter_names + self.compartment_names]
+
+
+## solve_ivp methods that use a Jacobian
+_IMPLICIT_METHODS = ['LSODA', 'BDF', 'Radau']
+
+
+class _SympyNumpy(object):
+    """Stands in for numpy when the code generated by :py:class:`CompiledModel`
+    is run on sympy symbols, so that it returns expressions"""
+
+    def __init__(self):
+        self.pi = sympy.pi
+        self.e = sympy.E
+        self.inf = sympy.oo
+        self.nan = sympy.nan
+        self.exp = sympy.exp
+        self.log = sympy.log
+        self.log10 = lambda x: sympy.log(x, 10)
+        self.sqrt = sympy.sqrt
+        self.abs = sympy.Abs
+        self.floor = sympy.floor
+        self.ceil = sympy.ceiling
+        for name in ['sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh']:
+            setattr(self, name, getattr(sympy, name))
+        for name in ['sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh']:
+            setattr(self, 'arc' + name, getattr(sympy, 'a' + name))
+        self.minimum = sympy.Min
+        self.maximum = sympy.Max
+        self.where = lambda condition, a, b: sympy.Piecewise((a, condition), (b, True))
+        self.logical_and = sympy.And
+        self.logical_or = sympy.Or
+        self.logical_xor = sympy.Xor
+        self.logical_not = sympy.Not
+        self.equal = sympy.Eq
+        self.not_equal = sympy.Ne
+        self.fmod = sympy.Mod
+        self.shape = len
+        self.empty = lambda size: [sympy.Integer(0)] * size
+
+
+def _sympy_namespace():
+    """Namespace to run the code of a :py:class:`CompiledModel` on sympy symbols"""
+    return {'numpy': _SympyNumpy(), '_sec': sympy.sec, '_csc': sympy.csc,
+            '_cot': sympy.cot, '_factorial': sympy.factorial}
+
+
+class Jacobian(object):
+    """Analytic Jacobian of the right hand side of a :py:class:`CompiledModel`
+
+    The generated right hand side is run on sympy symbols to get it as
+    expressions, which are differentiated and turned back into numpy code.
+    Only the structurally non zero entries are kept, so the Jacobian is
+    equally cheap as a dense matrix, a sparse matrix or the block diagonal
+    matrix of a batch.
+
+    Attributes:
+        rows (numpy.ndarray): row of each non zero entry
+        columns (numpy.ndarray): column of each non zero entry
+        size (int): number of states
+        sparse (bool): whether a sparse matrix is the better choice
+        expressions (list): sympy expression of each entry
+    """
+
+    ## fraction of non zero entries below which a sparse matrix is used
+    SPARSE_DENSITY = 0.1
+    SPARSE_SIZE = 50
+
+    def __init__(self, compiled):
+        """
+
+        Args:
+            compiled (:py:class:`CompiledModel`): the model
+        """
+        if sympy is None:
+            raise errors.NotImplementedError('The analytic Jacobian needs sympy. Use `pip install sympy`')
+        self.compiled = compiled
+        self.size = len(compiled.state_names)
+        self._t = sympy.Symbol('t')
+        self._y = [sympy.Symbol('y{}'.format(i)) for i in range(self.size)]
+        self._p = [sympy.Symbol('p{}'.format(i)) for i in range(len(compiled.parameter_names))]
+        self._factor = sympy.Symbol('factor')
+
+        namespace = _sympy_namespace()
+        exec(compile(compiled.source, '<pycotools3.native {}>'.format(compiled.key[:8]), 'exec'), namespace)
+        arguments = (self._t, self._y, self._p, self._factor)
+        self._fluxes = [sympy.sympify(i) for i in namespace['fluxes'](*arguments)]
+        self._derivatives = None
+        self._rhs = lambda: namespace['rhs'](*arguments)
+
+        self.rows, self.columns, self.expressions = self._differentiate(self._y)
+        self.sparse = self.size >= self.SPARSE_SIZE and \
+            len(self.expressions) < self.SPARSE_DENSITY * self.size ** 2
+        self._entries = self._lambdify(self.expressions)
+        self._parameters = None
+
+    def _lambdify(self, expressions):
+        return sympy.lambdify([self._t, self._y, self._p, self._factor], expressions, modules='numpy')
+
+    def _differentiate(self, variables):
+        """Non zero derivatives of the right hand side with respect to `variables`
+
+        Args:
+            variables (list): sympy symbols
+
+        Returns:
+            tuple: (rows, columns, expressions)
+
+        """
+        compiled = self.compiled
+        positions = {variable: j for j, variable in enumerate(variables)}
+
+        def gradient(expression):
+            """{position: derivative} of the variables `expression` depends on"""
+            expression = sympy.sympify(expression)
+            found = sorted(positions[i] for i in expression.free_symbols if i in positions)
+            return OrderedDict((j, sympy.diff(expression, variables[j])) for j in found)
+
+        ## species changed by reactions: the stoichiometry weighted sum of the
+        ## gradients of the fluxes, which are cheaper to differentiate than the sum
+        fluxes = [gradient(i) for i in self._fluxes]
+        rows, columns, expressions = [], [], []
+        for i in range(self.size):
+            if compiled.state_compartments[i] is not None:
+                volume = self._p[compiled.state_compartments[i]]
+                terms = OrderedDict()
+                rate = []
+                for j in numpy.nonzero(compiled.stoichiometry[i])[0]:
+                    coefficient = compiled.stoichiometry[i, j]
+                    coefficient = int(coefficient) if coefficient == int(coefficient) else coefficient
+                    for k, derivative in fluxes[j].items():
+                        terms.setdefault(k, []).append(coefficient * derivative)
+                    rate.append(coefficient * self._fluxes[j])
+                row = OrderedDict((k, sympy.Add(*v) / volume) for k, v in terms.items())
+                ## the quotient rule for the volume itself
+                if volume in positions and rate:
+                    k = positions[volume]
+                    row[k] = sympy.cancel(row.get(k, 0) - sympy.Add(*rate) / volume ** 2)
+            else:
+                if self._derivatives is None:
+                    self._derivatives = self._rhs()
+                row = gradient(self._derivatives[i])
+            for k in sorted(row):
+                if row[k] != 0:
+                    rows.append(i)
+                    columns.append(k)
+                    expressions.append(row[k])
+        return numpy.array(rows, dtype=int), numpy.array(columns, dtype=int), expressions
+
+    def __str__(self):
+        return 'Jacobian(size={}, non_zero={})'.format(self.size, len(self.expressions))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def entries(self, t, y, p, factor=1.0):
+        """Values of the non zero entries
+
+        Args:
+            t (float): time
+            y (numpy.ndarray): states, shape (n,) or (n, k)
+            p (numpy.ndarray): parameters, shape (m,) or (m, k)
+            factor (float): particles per quantity unit
+
+        Returns:
+            numpy.ndarray of shape (entries,) or (entries, k)
+
+        """
+        shape = numpy.broadcast(numpy.empty(numpy.shape(y)[1:]), numpy.empty(numpy.shape(p)[1:])).shape
+        values = self._entries(t, y, p, factor) if self.expressions else []
+        if not shape:
+            return numpy.array(values, dtype=float).reshape(len(self.expressions))
+        return numpy.array([numpy.broadcast_to(i, shape) for i in values], dtype=float).reshape(
+            (len(self.expressions),) + shape)
+
+    def parameters(self, t, y, p, factor=1.0):
+        """Derivatives of the right hand side with respect to the
+        parameters. Derived on first use
+
+        Args:
+            t (float): time
+            y (numpy.ndarray): states, shape (n,)
+            p (numpy.ndarray): parameters, shape (m,)
+            factor (float): particles per quantity unit
+
+        Returns:
+            numpy.ndarray of shape (n, m)
+
+        """
+        if self._parameters is None:
+            rows, columns, expressions = self._differentiate(self._p)
+            self._parameters = rows, columns, expressions, self._lambdify(expressions)
+        rows, columns, expressions, entries = self._parameters
+        derivatives = numpy.zeros((self.size, len(self._p)))
+        if expressions:
+            derivatives[rows, columns] = numpy.array(entries(t, y, p, factor), dtype=float)
+        return derivatives
+
+    def dense(self, t, y, p, factor=1.0):
+        """The Jacobian as a (n, n) array"""
+        jacobian = numpy.zeros((self.size, self.size))
+        jacobian[self.rows, self.columns] = self.entries(t, y, p, factor)
+        return jacobian
+
+    def csc(self, t, y, p, factor=1.0):
+        """The Jacobian as a :py:class:`scipy.sparse.csc_matrix`"""
+        return sparse.csc_matrix((self.entries(t, y, p, factor), (self.rows, self.columns)),
+                                 shape=(self.size, self.size))
+
+    def csc_batch(self, t, y, p, factor=1.0):
+        """Block diagonal Jacobian of the stacked system of
+        :py:meth:`CompiledModel.integrate_batch`
+
+        Args:
+            t (float): time
+            y (numpy.ndarray): states, shape (n, k)
+            p (numpy.ndarray): parameters, shape (m, k)
+            factor (float): particles per quantity unit
+
+        Returns:
+            :py:class:`scipy.sparse.csc_matrix` of shape (n * k, n * k)
+
+        """
+        return self.block_diagonal(self.entries(t, y, p, factor))
+
+    def banded_batch(self, t, y, p, factor=1.0):
+        """Block diagonal Jacobian of the stacked system of
+        :py:meth:`CompiledModel.integrate_batch` in the packed banded
+        format LSODA takes with lband = uband = n - 1
+
+        Args:
+            t (float): time
+            y (numpy.ndarray): states, shape (n, k)
+            p (numpy.ndarray): parameters, shape (m, k)
+            factor (float): particles per quantity unit
+
+        Returns:
+            numpy.ndarray of shape (3n - 2, n * k)
+
+        """
+        return self.block_diagonal(self.entries(t, y, p, factor), banded=True)
+
+    def block_diagonal(self, values, banded=False):
+        """Block diagonal matrix with a Jacobian in each block
+
+        Args:
+            values (numpy.ndarray): entries of each block, shape (entries, blocks),
+                see :py:meth:`Jacobian.entries`
+            banded (bool): Default False. Return the packed banded format of
+                LSODA instead of a :py:class:`scipy.sparse.csc_matrix`. LSODA
+                wants lband more rows than the band itself, left as zeros
+
+        Returns:
+            :py:class:`scipy.sparse.csc_matrix` or numpy.ndarray
+
+        """
+        blocks = values.shape[1]
+        offsets = numpy.arange(blocks) * self.size
+        columns = (self.columns[:, None] + offsets[None, :]).ravel()
+        if banded:
+            matrix = numpy.zeros((3 * self.size - 2, self.size * blocks))
+            matrix[numpy.repeat(self.size - 1 + self.rows - self.columns, blocks), columns] = values.ravel()
+            return matrix
+        rows = (self.rows[:, None] + offsets[None, :]).ravel()
+        size = self.size * blocks
+        return sparse.csc_matrix((values.ravel(), (rows, columns)), shape=(size, size))
+
+
+def time_points(start, stop, by):
+    """Output times of a time course like COPASI's: every `by`
+    from 0 to `stop`, dropping those before `start`
+
+    Args:
+        start (float): first output time
+        stop (float): end time
+        by (float): step size
+
+    Returns:
+        numpy.ndarray
+
+    """
+    if by <= 0:
+        raise errors.InputError('Step size must be positive. Got "{}"'.format(by))
+    intervals = int(round(stop / float(by)))
+    times = numpy.linspace(0, intervals * by, intervals + 1)
+    return times[times >= start - 1e-12 * max(1.0, abs(start))]
+
+
+## TimeCourse method names accepted as well as scipy's
+_METHODS = {'deterministic': 'LSODA'}
+
+
+def simulate(model, start, stop, by, species='m', method='LSODA', relative_tolerance=1e-6,
+             absolute_tolerance=1e-12, max_internal_step_size=0, parameters=None, jacobian=True):
+    """Simulate a time course of `model` in process
+
+    Returns the same DataFrame as :py:meth:`model.Model.simulate`.
+
+    Args:
+        model (:py:class:`model.Model`): the model
+        start (float): first output time
+        stop (float): end time
+        by (float): step size between output times
+        species (str): Default 'm'. Which variables to return, as for
+            :py:meth:`model.Model.get_variable_names`
+        method (str): Default 'LSODA'. 'deterministic' or a
+            :py:func:`scipy.integrate.solve_ivp` method, i.e. 'BDF'
+        relative_tolerance (float): Default 1e-6
+        absolute_tolerance (float): Default 1e-12
+        max_internal_step_size (float): Default 0, no limit
+        parameters (dict): Default None. Values to use instead of those in the
+            model, by name. Species names set initial concentrations
+        jacobian (bool): Default True. Use the analytic Jacobian with
+            implicit methods, see :py:class:`Jacobian`
+
+    Returns:
+        pandas.DataFrame
+
+    """
+    compiled = compile_model(model)
+    y0, p, factor = compiled.values(model)
+    if parameters:
+        y0, p = compiled.override(y0, p, parameters)
+    df = compiled.timecourse(
+        y0, p, time_points(start, stop, by), factor=factor, method=_METHODS.get(method, method),
+        relative_tolerance=relative_tolerance, absolute_tolerance=absolute_tolerance,
+        max_step=max_internal_step_size if max_internal_step_size else numpy.inf, jacobian=jacobian
+    )
+    for name in compiled.local_parameter_names:
+        df[name] = p[compiled.parameter_index[name]]
+    for name in compiled.compartment_names:
+        df[name] = p[compiled.parameter_index[name]]
+    variables = model.get_variable_names(which=species, include_assignments=True)
+    return df[variables]
+
+
+def _ensemble_chunk(structure, Y0, P, times, factor, kwargs):
+    """Integrate one chunk of an ensemble in a worker process"""
+    key = structure_key(structure)
+    if key not in _CACHE:
+        _CACHE[key] = CompiledModel(structure)
+    return _CACHE[key].ensemble(Y0, P, times, factor, **kwargs)
+
+
+def simulate_ensemble(model, parameters, start, stop, by, species='m', names=None, method='LSODA',
+                      relative_tolerance=1e-6, absolute_tolerance=1e-12, max_internal_step_size=0,
+                      chunk_size=250, processes=1, jacobian=True):
+    """Simulate a time course of `model` for each of many parameter sets
+
+    The parameter sets are integrated together in chunks of `chunk_size`
+    as described in :py:meth:`CompiledModel.integrate_batch`. Chunks can
+    be spread over a pool of processes.
+
+    Args:
+        model (:py:class:`model.Model`): the model. Values not given in
+            `parameters` are taken from here
+        parameters (pandas.DataFrame or numpy.ndarray): one row per parameter set,
+            i.e. the output of :py:class:`viz.Parse`. Columns name species
+            (initial concentrations), global quantities, local parameters like
+            '(reaction).parameter' or compartments. Other columns are ignored
+        start (float): first output time
+        stop (float): end time
+        by (float): step size between output times
+        species (str): Default 'm'. Which variables to return, as for
+            :py:meth:`model.Model.get_variable_names`
+        names (list): Default None. Column names when `parameters` is an array
+        method (str): Default 'LSODA'. 'deterministic' or a
+            :py:func:`scipy.integrate.solve_ivp` method, i.e. 'BDF'
+        relative_tolerance (float): Default 1e-6
+        absolute_tolerance (float): Default 1e-12
+        max_internal_step_size (float): Default 0, no limit
+        chunk_size (int): Default 250. Parameter sets integrated together.
+            The step size of a chunk is set by its hardest set
+        processes (int): Default 1. Number of worker processes
+        jacobian (bool): Default True. Use the analytic Jacobian with
+            implicit methods, see :py:class:`Jacobian`
+
+    Returns:
+        numpy.ndarray of shape (times, sets, variables). The times are
+        :py:func:`time_points` and the variables are
+        ``model.get_variable_names(which=species)``
+
+    """
+    compiled = compile_model(model)
+    Y0, P, factor = compiled.values_batch(model, parameters, names)
+    times = time_points(start, stop, by)
+    kwargs = {
+        'method': _METHODS.get(method, method),
+        'relative_tolerance': relative_tolerance,
+        'absolute_tolerance': absolute_tolerance,
+        'max_step': max_internal_step_size if max_internal_step_size else numpy.inf,
+        'jacobian': jacobian,
+    }
+
+    chunks = [slice(i, i + chunk_size) for i in range(0, len(Y0), chunk_size)]
+    if processes is None or processes <= 1 or len(chunks) == 1:
+        results = [compiled.ensemble(Y0[i], P[i], times, factor, **kwargs) for i in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_ensemble_chunk, compiled.structure, Y0[i], P[i], times, factor, kwargs)
+                       for i in chunks]
+            results = [i.result() for i in futures]
+    result = numpy.concatenate(results, axis=1)
+
+    positions = {name: i for i, name in enumerate(compiled.variable_names)}
+    variables = model.get_variable_names(which=species, include_assignments=True)
+    return result[:, :, [positions[i] for i in variables]]
+
+
+def sensitivity_labels(model, parameters=None):
+    """Names along the axes of the output of :py:func:`sensitivities`
+
+    Args:
+        model (:py:class:`model.Model`): the model
+        parameters (list): Default None. As for :py:func:`sensitivities`
+
+    Returns:
+        tuple: (variables, parameters)
+
+    """
+    compiled = compile_model(model)
+    variables = [i.name for i in model.metabolites] + [i.name for i in model.global_quantities]
+    variables = [i for i in variables if i in compiled.state_index]
+    if parameters is None:
+        parameters = [i for i in model.get_variable_names('gl', include_assignments=False)
+                      if i in compiled.parameter_index]
+    return variables, list(parameters)
+
+
+def sensitivities(model, start, stop, by, parameters=None, method='BDF', relative_tolerance=1e-6,
+                  absolute_tolerance=1e-12, max_internal_step_size=0):
+    """Sensitivities of the time course of `model` to its parameters
+
+    Unlike :py:class:`tasks.Sensitivities` every time point, variable and
+    parameter comes out of one call. See :py:meth:`CompiledModel.sensitivities`.
+    Needs sympy.
+
+    Args:
+        model (:py:class:`model.Model`): the model
+        start (float): first output time
+        stop (float): end time
+        by (float): step size between output times
+        parameters (list): Default None, meaning all global quantities and local
+            parameters that are not assignments. Names of parameters, compartments
+            or species. Species that are not fixed mean their initial concentration
+        method (str): Default 'BDF'. 'deterministic' or a
+            :py:func:`scipy.integrate.solve_ivp` method
+        relative_tolerance (float): Default 1e-6
+        absolute_tolerance (float): Default 1e-12
+        max_internal_step_size (float): Default 0, no limit
+
+    Returns:
+        numpy.ndarray of shape (times, variables, parameters). The times are
+        :py:func:`time_points` and the names of the variables and parameters
+        come from :py:func:`sensitivity_labels`. The variables are the species
+        and global quantities that are integrated, not assignments or fixed ones
+
+    """
+    compiled = compile_model(model)
+    variables, parameters = sensitivity_labels(model, parameters)
+    y0, p, factor = compiled.values(model)
+    times = time_points(start, stop, by)
+    ## always integrate from 0 and drop output before start
+    _, result = compiled.sensitivities(
+        y0, p, times, parameters, factor, method=_METHODS.get(method, method),
+        relative_tolerance=relative_tolerance, absolute_tolerance=absolute_tolerance,
+        max_step=max_internal_step_size if max_internal_step_size else numpy.inf
+    )
+    return result[:, [compiled.state_index[i] for i in variables], :]
+
+
+def steady_state(model, species='mg', parameters=None, resolution=1e-9, iterations=50,
+                 integration=True, max_duration=1e9, jacobian=True):
+    """Steady state of `model` found in process
+
+    See :py:meth:`CompiledModel.steady_state`.
+
+    Args:
+        model (:py:class:`model.Model`): the model
+        species (str): Default 'mg'. Which variables to return, as for
+            :py:meth:`model.Model.get_variable_names`
+        parameters (dict): Default None. Values to use instead of those in the
+            model, by name. Species names set initial concentrations
+        resolution (float): Default 1e-9. Largest rate of change at the steady state
+        iterations (int): Default 50. Newton iterations per attempt
+        integration (bool): Default True. Fall back on integration when
+            Newton's method fails
+        max_duration (float): Default 1e9. Longest integration
+        jacobian (bool): Default True. Use the analytic Jacobian
+
+    Returns:
+        pandas.Series indexed by variable name
+
+    """
+    compiled = compile_model(model)
+    y0, p, factor = compiled.values(model)
+    if parameters:
+        y0, p = compiled.override(y0, p, parameters)
+    y, converged = compiled.steady_state(y0, p, factor, resolution=resolution, iterations=iterations,
+                                         integration=integration, max_duration=max_duration,
+                                         jacobian=jacobian)
+    if not converged:
+        raise errors.SteadyStateError('No steady state found to a resolution of {}'.format(resolution))
+    values = compiled._variables(0.0, y[:, None, None], p[None, :], factor)[0, 0]
+    series = pandas.Series(values, index=compiled.variable_names)
+    return series[model.get_variable_names(which=species, include_assignments=True)]
+
+
+def steady_state_scan(model, parameters, species='mg', names=None, resolution=1e-9, iterations=50,
+                      integration=True, max_duration=1e9, jacobian=True):
+    """Steady states of `model` for each of many parameter sets
+
+    Each set is warm started from the steady state of the row before it.
+    See :py:meth:`CompiledModel.steady_state_batch`. Sets without a steady
+    state are NaN.
+
+    Args:
+        model (:py:class:`model.Model`): the model. Values not given in
+            `parameters` are taken from here
+        parameters (pandas.DataFrame or numpy.ndarray): one row per parameter set.
+            Columns are named as for :py:func:`simulate_ensemble`. Order the
+            rows so that neighbours are similar, i.e. by increasing dose
+        species (str): Default 'mg'. Which variables to return, as for
+            :py:meth:`model.Model.get_variable_names`
+        names (list): Default None. Column names when `parameters` is an array
+        resolution (float): Default 1e-9. Largest rate of change at the steady state
+        iterations (int): Default 50. Newton iterations per attempt
+        integration (bool): Default True. Fall back on integration when
+            Newton's method fails
+        max_duration (float): Default 1e9. Longest integration
+        jacobian (bool): Default True. Use the analytic Jacobian
+
+    Returns:
+        pandas.DataFrame with a row per parameter set, indexed like
+        `parameters`, and a column per variable
+
+    """
+    compiled = compile_model(model)
+    Y0, P, factor = compiled.values_batch(model, parameters, names)
+    Y, converged = compiled.steady_state_batch(Y0, P, factor, resolution=resolution, iterations=iterations,
+                                               integration=integration, max_duration=max_duration,
+                                               jacobian=jacobian)
+    if not numpy.all(converged):
+        LOG.warning('No steady state found for {} of {} parameter sets'.format(
+            int((~converged).sum()), len(converged)))
+    values = compiled._variables(0.0, Y.T[:, :, None], P, factor)[0]
+    index = parameters.index if isinstance(parameters, pandas.DataFrame) else None
+    df = pandas.DataFrame(values, index=index, columns=compiled.variable_names)
+    return df[model.get_variable_names(which=species, include_assignments=True)]
+
+
+## stochastic methods of TimeCourse. The next reaction method of Gibson and
+## Bruck samples the same process as the direct method
+_STOCHASTIC_METHODS = {
+    'direct': 'direct',
+    'gibson_bruck': 'direct',
+    'tau_leap': 'tau_leap',
+    'adaptive_tau_leap': 'tau_leap',
+}
+
+_MIX1 = numpy.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = numpy.uint64(0x94D049BB133111EB)
+_GOLDEN = numpy.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(z):
+    """SplitMix64 finaliser of an array of uint64"""
+    with numpy.errstate(over='ignore'):
+        z = (z ^ (z >> numpy.uint64(30))) * _MIX1
+        z = (z ^ (z >> numpy.uint64(27))) * _MIX2
+    return z ^ (z >> numpy.uint64(31))
+
+
+def realisation_keys(seed, realisations, offset=0):
+    """Keys of the random streams of realisations `offset` to `offset + realisations`
+
+    A realisation's stream depends only on `seed` and its index, so results
+    do not change with the chunk or process that simulates it.
+
+    Args:
+        seed (int): random seed
+        realisations (int): number of keys
+        offset (int): Default 0. Index of the first realisation
+
+    Returns:
+        numpy.ndarray of uint64
+
+    """
+    index = numpy.arange(offset, offset + realisations, dtype=numpy.uint64)
+    with numpy.errstate(over='ignore'):
+        return _mix(_mix(numpy.array([seed], dtype=numpy.uint64)) + index * _GOLDEN)
+
+
+def _uniforms(keys, counters, draws):
+    """Uniform numbers in (0, 1) of shape (len(keys), draws). Draw j of
+    step `counter` of a stream is a hash of its key, the counter and j"""
+    position = (counters[:, None] << numpy.uint64(24)) + numpy.arange(draws, dtype=numpy.uint64)[None, :]
+    z = _mix(keys[:, None] ^ _mix(position))
+    return ((z >> numpy.uint64(11)).astype(float) + 0.5) * 2.0 ** -53
+
+
+def _poisson(means, u, v):
+    """Poisson numbers from the uniforms `u` and `v`: by inversion for means
+    below 30 and from a normal approximation above"""
+    result = numpy.zeros(means.shape)
+    small = means < 30
+    mean, uniform = means[small], u[small]
+    count = numpy.zeros(mean.shape)
+    probability = numpy.exp(-mean)
+    cumulative = probability.copy()
+    limit = mean + 20 * numpy.sqrt(mean) + 20
+    while True:
+        more = (uniform > cumulative) & (count < limit)
+        if not numpy.any(more):
+            break
+        count[more] += 1
+        probability[more] *= mean[more] / count[more]
+        cumulative[more] += probability[more]
+    result[small] = count
+    mean = means[~small]
+    normal = numpy.sqrt(-2 * numpy.log(u[~small])) * numpy.cos(2 * numpy.pi * v[~small])
+    result[~small] = numpy.maximum(numpy.round(mean + numpy.sqrt(mean) * normal), 0)
+    return result
+
+
+def _stochastic_chunk(structure, X0, P, times, factor, keys, kwargs):
+    """Simulate one chunk of realisations in a worker process"""
+    key = structure_key(structure)
+    if key not in _CACHE:
+        _CACHE[key] = CompiledModel(structure)
+    return _CACHE[key].stochastic(X0, P, times, factor, keys, **kwargs)
+
+
+def _summarise(values, statistic):
+    """A statistic over axis 1, ignoring NaN"""
+    functions = {'mean': numpy.nanmean, 'std': numpy.nanstd, 'median': numpy.nanmedian,
+                 'min': numpy.nanmin, 'max': numpy.nanmax}
+    if statistic in functions:
+        return functions[statistic](values, axis=1)
+    if isinstance(statistic, float) and 0 <= statistic <= 1:
+        return numpy.nanquantile(values, statistic, axis=1)
+    raise errors.InputError('Statistic "{}" not one of "{}" or a quantile between 0 and 1'.format(
+        statistic, list(functions)))
+
+
+def simulate_stochastic(model, start, stop, by, realisations=100, method='direct', seed=1, species='m',
+                        quantity_type='concentration', summary=None, parameters=None, epsilon=0.03,
+                        max_steps=1000000, chunk_size=1000, processes=1):
+    """Simulate many realisations of the stochastic process of `model`
+
+    See :py:meth:`CompiledModel.stochastic`. Species start from their
+    initial particle numbers, rounded to whole particles.
+
+    Args:
+        model (:py:class:`model.Model`): the model. Every variable must be
+            a species changed by reactions with rates that are not negative
+        start (float): first output time
+        stop (float): end time
+        by (float): step size between output times
+        realisations (int): Default 100
+        method (str): Default 'direct'. 'direct', 'gibson_bruck', 'tau_leap' or
+            'adaptive_tau_leap'. The latter two both leap with adaptive steps
+        seed (int): Default 1. The same seed gives the same realisations
+        species (str): Default 'm'. Which variables to return, as for
+            :py:meth:`model.Model.get_variable_names`
+        quantity_type (str): Default 'concentration'. Or 'particle_numbers'
+        summary (list): Default None. Statistics over the realisations to return
+            instead of the realisations: 'mean', 'std', 'median', 'min', 'max'
+            or quantiles between 0 and 1
+        parameters (dict): Default None. Values to use instead of those in the
+            model, by name. Species names set initial concentrations
+        epsilon (float): Default 0.03. Error control of tau leaping
+        max_steps (int): Default 1000000. Steps per realisation
+        chunk_size (int): Default 1000. Realisations simulated together
+        processes (int): Default 1. Number of worker processes
+
+    Returns:
+        numpy.ndarray of shape (times, realisations, variables), or with
+        `summary` a pandas.DataFrame indexed by 'Time' with a column
+        for each statistic and variable
+
+    """
+    if method not in _STOCHASTIC_METHODS:
+        raise errors.InputError('method "{}" not in "{}"'.format(method, list(_STOCHASTIC_METHODS)))
+    if quantity_type not in ['concentration', 'particle_numbers']:
+        raise errors.InputError('quantity_type should be "concentration" or "particle_numbers". '
+                                'Got "{}"'.format(quantity_type))
+    compiled = compile_model(model)
+    y0, p, factor = compiled.values(model)
+    if parameters:
+        y0, p = compiled.override(y0, p, parameters)
+    volumes = numpy.array([numpy.nan if i is None else p[i] for i in compiled.state_compartments])
+    X0 = numpy.round(y0 * factor * volumes)
+    X0 = numpy.repeat(X0[None, :], realisations, axis=0)
+    P = numpy.repeat(p[None, :], realisations, axis=0)
+    times = time_points(start, stop, by)
+    kwargs = {'method': _STOCHASTIC_METHODS[method], 'epsilon': epsilon, 'max_steps': max_steps}
+
+    chunks = [slice(i, i + chunk_size) for i in range(0, realisations, chunk_size)]
+    keys = [realisation_keys(seed, len(X0[i]), i.start) for i in chunks]
+    if processes is None or processes <= 1 or len(chunks) == 1:
+        results = [compiled.stochastic(X0[i], P[i], times, factor, k, **kwargs) for i, k in zip(chunks, keys)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_stochastic_chunk, compiled.structure, X0[i], P[i], times, factor, k, kwargs)
+                       for i, k in zip(chunks, keys)]
+            results = [i.result() for i in futures]
+    X = numpy.concatenate(results, axis=1)
+    y = X / (factor * volumes[:, None, None])
+    result = compiled._variables(times, y, P, factor)
+
+    positions = {name: i for i, name in enumerate(compiled.variable_names)}
+    if quantity_type == 'particle_numbers':
+        compartments = {key: name for key, name in compiled.structure['compartments']}
+        for _, name, compartment, _, _ in compiled.structure['metabolites']:
+            volume = p[compiled.parameter_index[compartments[compartment]]]
+            result[:, :, positions[name]] *= factor * volume
+    variables = model.get_variable_names(which=species, include_assignments=True)
+    result = result[:, :, [positions[i] for i in variables]]
+    if summary is None:
+        return result
+    columns = pandas.MultiIndex.from_product([summary, variables], names=['statistic', 'variable'])
+    values = numpy.concatenate([_summarise(result, i) for i in summary], axis=1)
+    return pandas.DataFrame(values, index=pandas.Index(times, name='Time'), columns=columns)
+
+
+## weight methods of parameter estimation settings, including the spelling
+## ParameterEstimation uses when it maps them to COPASI
+_WEIGHT_METHODS = {
+    'mean': 'mean',
+    'mean_squared': 'mean_squared',
+    'standard_deviation': 'standard_deviation',
+    'stardard_deviation': 'standard_deviation',
+    'value_scaling': 'value_scaling',
+}
+
+
+def experiment_weights(data, weight_method='mean_squared', normalize=True):
+    """Weights of the dependent columns of an experiment, computed
+    the way COPASI's parameter estimation computes them
+
+    Each column gets a scale from its data: the mean of its squares,
+    its variance or its squared mean. The weight of a column is one
+    over its scale, and normalizing divides the weights by the largest
+    of them. With 'value_scaling' every residual is instead divided by
+    its own data point, or by the smallest non zero value of its column
+    when the data point is smaller than that.
+
+    Args:
+        data (numpy.ndarray): dependent data, shape (rows, columns). NaN marks
+            missing values, which are ignored
+        weight_method (str): Default 'mean_squared'. 'mean_squared',
+            'standard_deviation', 'mean' or 'value_scaling'
+        normalize (bool): Default True. Normalize weights per experiment
+
+    Returns:
+        tuple: (weights, scale). weights of shape (columns,). scale of shape
+        (rows, columns) to divide the residuals by before weighting
+
+    """
+    if weight_method not in _WEIGHT_METHODS:
+        raise errors.InputError('weight_method "{}" not in "{}"'.format(weight_method, list(_WEIGHT_METHODS)))
+    weight_method = _WEIGHT_METHODS[weight_method]
+    data = numpy.atleast_2d(numpy.asarray(data, dtype=float))
+    scale = numpy.ones(data.shape)
+    if weight_method == 'value_scaling':
+        magnitude = numpy.abs(data)
+        nonzero = numpy.where(magnitude > 0, magnitude, numpy.nan)
+        with numpy.errstate(all='ignore'):
+            epsilon = numpy.nanmin(nonzero, axis=0) if data.shape[0] else numpy.ones(data.shape[1])
+        epsilon[~numpy.isfinite(epsilon)] = numpy.finfo(float).eps
+        scale = numpy.fmax(magnitude, epsilon[None, :])
+        return numpy.ones(data.shape[1]), scale
+
+    with numpy.errstate(all='ignore'):
+        mean = numpy.nanmean(data, axis=0)
+        mean_square = numpy.nanmean(data ** 2, axis=0)
+    columns = {
+        'mean_squared': mean_square,
+        'standard_deviation': mean_square - mean ** 2,
+        'mean': mean ** 2,
+    }[weight_method]
+    ## a column without data or spread cannot set its own weight
+    columns = numpy.where(numpy.isfinite(columns) & (columns > 0), columns, numpy.nan)
+    if numpy.all(numpy.isnan(columns)):
+        return numpy.ones(data.shape[1]), scale
+    weights = (numpy.nanmin(columns) if normalize else 1.0) / columns
+    weights[numpy.isnan(weights)] = 1.0
+    return weights, scale
+
+
+class _Experiment(object):
+    """One experiment of a parameter estimation configuration, read
+    from its data file and resolved against a :py:class:`CompiledModel`"""
+
+    def __init__(self, name, dataset, compiled, weight_method):
+        self.name = name
+        data = pandas.read_csv(dataset.filename, sep=dataset.separator)
+        mappings = dataset.mappings if dataset.mappings else {i: {'model_object': i} for i in data.columns}
+        variables = {name: i for i, name in enumerate(compiled.variable_names)}
+
+        self.times = None
+        self.dependents, self.dependent_positions, dependent_columns = [], [], []
+        self.independents, independent_columns = [], []
+        for column, mapping in mappings.items():
+            if column not in data.columns:
+                raise errors.InputError('Column "{}" of experiment "{}" is not in "{}"'.format(
+                    column, name, dataset.filename))
+            model_object = mapping.get('model_object', column)
+            role = mapping.get('role')
+            if role is None:
+                role = 'time' if model_object.lower() == 'time' else \
+                    'independent' if model_object.endswith('_indep') else 'dependent'
+            if model_object.endswith('_indep'):
+                model_object = model_object[:-6]
+
+            if role == 'time':
+                self.times = data[column].values.astype(float)
+            elif role == 'dependent':
+                if model_object not in variables:
+                    LOG.warning('skipping column "{}" of experiment "{}" as "{}" is not a variable '
+                                'of the model'.format(column, name, model_object))
+                    continue
+                self.dependents.append(model_object)
+                self.dependent_positions.append(variables[model_object])
+                dependent_columns.append(column)
+            elif role == 'independent':
+                if model_object not in compiled.state_index and model_object not in compiled.parameter_index:
+                    LOG.warning('skipping column "{}" of experiment "{}" as "{}" is not a state or '
+                                'parameter of the model'.format(column, name, model_object))
+                    continue
+                self.independents.append(model_object)
+                independent_columns.append(column)
+
+        self.data = data[dependent_columns].values.astype(float)
+        self.independent_data = data[independent_columns].values.astype(float)
+        self.weights, self.scale = experiment_weights(
+            self.data, weight_method, dataset.get('normalize_weights_per_experiment', True))
+        self.factors = numpy.sqrt(self.weights)[None, :] / self.scale
+
+    @property
+    def timecourse(self):
+        return self.times is not None
+
+    def __str__(self):
+        return '_Experiment(name="{}", timecourse={}, dependents={})'.format(
+            self.name, self.timecourse, self.dependents)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _objective_ensemble(compiled, Y0, P, times, factor, kwargs):
+    """:py:meth:`CompiledModel.ensemble` with NaN for a single set that
+    fails to integrate, which it would raise"""
+    try:
+        return compiled.ensemble(Y0, P, times, factor, **kwargs)
+    except errors.TimeCourseError as e:
+        LOG.debug('Parameter set failed to integrate: {}'.format(e))
+        return numpy.full((len(times), len(Y0), len(compiled.variable_names)), numpy.nan)
+
+
+def _objective_chunk(structure, Y0, P, times, factor, kwargs):
+    """Simulate one chunk of an experiment in a worker process"""
+    key = structure_key(structure)
+    if key not in _CACHE:
+        _CACHE[key] = CompiledModel(structure)
+    return _objective_ensemble(_CACHE[key], Y0, P, times, factor, kwargs)
+
+
+class Objective(object):
+    """The objective function of a parameter estimation, evaluated in process
+
+    Reads the experiments, mappings and fit items of a
+    :py:class:`tasks.ParameterEstimation.Config` and scores parameter sets
+    by the weighted residual sum of squares that COPASI minimises, without
+    running CopasiSE. Many parameter sets are simulated together, see
+    :py:meth:`CompiledModel.ensemble`.
+
+    Experiments with a time column are time courses integrated from time 0.
+    Their independent variables set initial values from the first row of
+    data. Experiments without a time column are steady states, one per row,
+    with the independent variables of that row. Weights follow the
+    `weight_method` setting and the `normalize_weights_per_experiment`
+    option of each experiment (see :py:func:`experiment_weights`). A fit
+    item only applies to the experiments in its `affected_experiments`.
+    Constraint items are not applied.
+
+    Parameter sets that fail to simulate score an RSS of infinity.
+
+    Examples:
+        >>> objective = native.Objective(config)
+        >>> ## one RSS per row of parse output
+        >>> rss = objective(viz.Parse(pe).data['model1'])
+        >>> ## or with residuals per experiment and observable
+        >>> result = objective.evaluate(numpy.random.uniform(0.1, 10, (1000, len(objective.parameter_names))))
+
+    Attributes:
+        parameter_names (list): names of the fit items
+        experiments (list): the experiments, read from their files
+    """
+
+    def __init__(self, config, model_name=None, validation=False, method='LSODA', relative_tolerance=1e-6,
+                 absolute_tolerance=1e-12, max_internal_step_size=0, jacobian=True, resolution=1e-9,
+                 chunk_size=250, processes=1):
+        """
+
+        Args:
+            config (:py:class:`tasks.ParameterEstimation.Config`): the configuration
+            model_name (str): Default None, the first model. Which model of the
+                configuration to simulate
+            validation (bool): Default False. Score the validation experiments
+                instead of the experiments
+            method (str): Default 'LSODA'. Integration method, as for :py:func:`simulate`
+            relative_tolerance (float): Default 1e-6
+            absolute_tolerance (float): Default 1e-12
+            max_internal_step_size (float): Default 0, no limit
+            jacobian (bool): Default True. Use the analytic Jacobian
+            resolution (float): Default 1e-9. Resolution of steady state experiments
+            chunk_size (int): Default 250. Parameter sets simulated together
+            processes (int): Default 1. Number of worker processes
+        """
+        if model_name is None:
+            model_name = list(config.models.keys())[0]
+        if model_name not in config.models:
+            raise errors.InputError('Model "{}" not in "{}"'.format(model_name, list(config.models.keys())))
+        self.config = config
+        self.model_name = model_name
+        self.model = config.models[model_name].model
+        self.compiled = compile_model(self.model)
+        self.validation = validation
+        self.quantity_type = config.settings.quantity_type
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.resolution = resolution
+        self.kwargs = {
+            'method': _METHODS.get(method, method),
+            'relative_tolerance': relative_tolerance,
+            'absolute_tolerance': absolute_tolerance,
+            'max_step': max_internal_step_size if max_internal_step_size else numpy.inf,
+            'jacobian': jacobian,
+        }
+
+        self.items = config.items.fit_items
+        self.parameter_names = list(self.items.keys())
+        for name in self.parameter_names:
+            if name not in self.compiled.state_index and name not in self.compiled.parameter_index:
+                raise errors.InputError('Fit item "{}" is not a state or parameter of the model'.format(name))
+
+        datasets = config.datasets.validations if validation else config.datasets.experiments
+        self.experiments = [
+            _Experiment(name, datasets[name], self.compiled, config.settings.weight_method)
+            for name in datasets if model_name in datasets[name].affected_models
+        ]
+        self.y0, self.p, self.factor = self.compiled.values(self.model)
+
+    def __getstate__(self):
+        ## workers rebuild the compiled model from its structure. The
+        ## configuration and model hold xml and stay behind
+        state = dict(self.__dict__)
+        for name in ['config', 'model', 'compiled']:
+            del state[name]
+        state['structure'] = self.compiled.structure
+        return state
+
+    def __setstate__(self, state):
+        structure = state.pop('structure')
+        self.__dict__.update(state)
+        self.config = self.model = None
+        ## already inside a worker process
+        self.processes = 1
+        key = structure_key(structure)
+        if key not in _CACHE:
+            _CACHE[key] = CompiledModel(structure)
+        self.compiled = _CACHE[key]
+
+    def __str__(self):
+        return 'Objective(model="{}", experiments={}, parameters={})'.format(
+            self.model_name, [i.name for i in self.experiments], len(self.parameter_names))
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def bounds(self):
+        """Lower and upper bounds of the fit items
+
+        Returns:
+            numpy.ndarray of shape (parameters, 2)
+        """
+        return numpy.array([[float(self.items[i].lower_bound), float(self.items[i].upper_bound)]
+                            for i in self.parameter_names])
+
+    @property
+    def model_values(self):
+        """Values of the fit items in the model, in the quantity type of
+        the configuration
+
+        Returns:
+            numpy.ndarray of shape (parameters,)
+        """
+        values = numpy.array([self.y0[self.compiled.state_index[i]] if i in self.compiled.state_index
+                              else self.p[self.compiled.parameter_index[i]] for i in self.parameter_names])
+        if self.quantity_type == 'particle_numbers':
+            ## the inverse of the conversion in _parameters
+            ones = numpy.ones((1, len(values)))
+            values = values / self._parameters(ones, None)[1][0]
+        return values
+
+    def _affects(self, name, experiment):
+        key = 'affected_validation_experiments' if self.validation else 'affected_experiments'
+        affected = self.items[name].get(key, 'all')
+        return affected == 'all' or experiment.name in affected
+
+    def _set(self, Y0, P, name, values):
+        """Set a state or parameter of every set by name, inplace"""
+        if name in self.compiled.state_index:
+            Y0[:, self.compiled.state_index[name]] = values
+        else:
+            P[:, self.compiled.parameter_index[name]] = values
+
+    def _parameters(self, parameters, names):
+        """Parameter sets as (names, values (sets, columns), index)"""
+        index = None
+        if isinstance(parameters, pandas.DataFrame):
+            index = parameters.index
+            names = [i for i in parameters.columns if i in self.parameter_names]
+            parameters = parameters[names].values
+        elif isinstance(parameters, pandas.Series):
+            names = [i for i in parameters.index if i in self.parameter_names]
+            parameters = parameters[names].values
+        if names is None:
+            names = self.parameter_names
+        parameters = numpy.atleast_2d(numpy.asarray(parameters, dtype=float))
+        if parameters.shape[1] != len(names):
+            raise errors.InputError('Need a value for each of the {} parameters "{}". Got {} columns'.format(
+                len(names), names, parameters.shape[1]))
+        if self.quantity_type == 'particle_numbers':
+            compartments = {key: name for key, name in self.compiled.structure['compartments']}
+            species = {i[1]: compartments[i[2]] for i in self.compiled.structure['metabolites']}
+            parameters = parameters.copy()
+            for column, name in enumerate(names):
+                if name in species:
+                    volume = self.p[self.compiled.parameter_index[species[name]]]
+                    parameters[:, column] /= self.factor * volume
+        return names, parameters, index
+
+    def _simulate(self, experiment, Y0, P):
+        """Dependent variables of `experiment`, shape (sets, rows, dependents)"""
+        sets = len(Y0)
+        if experiment.timecourse:
+            for column, name in enumerate(experiment.independents):
+                self._set(Y0, P, name, experiment.independent_data[0, column])
+            times, rows = numpy.unique(experiment.times, return_inverse=True)
+            chunks = [slice(i, i + self.chunk_size) for i in range(0, sets, self.chunk_size)]
+            if self.processes is None or self.processes <= 1 or len(chunks) == 1:
+                results = [_objective_ensemble(self.compiled, Y0[i], P[i], times, self.factor, self.kwargs)
+                           for i in chunks]
+            else:
+                with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                    futures = [pool.submit(_objective_chunk, self.compiled.structure, Y0[i], P[i], times,
+                                           self.factor, self.kwargs) for i in chunks]
+                    results = [i.result() for i in futures]
+            variables = numpy.concatenate(results, axis=1)[rows]
+            return variables[:, :, experiment.dependent_positions].transpose(1, 0, 2)
+
+        ## one steady state per set and row, rows of a set in sequence to warm start
+        rows = len(experiment.data)
+        Y0, P = numpy.repeat(Y0, rows, axis=0), numpy.repeat(P, rows, axis=0)
+        for column, name in enumerate(experiment.independents):
+            self._set(Y0, P, name, numpy.tile(experiment.independent_data[:, column], sets))
+        Y, _ = self.compiled.steady_state_batch(Y0, P, self.factor, resolution=self.resolution,
+                                                jacobian=self.kwargs['jacobian'])
+        variables = self.compiled._variables(0.0, Y.T[:, :, None], P, self.factor)[0]
+        return variables[:, experiment.dependent_positions].reshape(sets, rows, -1)
+
+    def residuals(self, parameters, names=None):
+        """Weighted residuals of every experiment
+
+        Args:
+            parameters (pandas.DataFrame or numpy.ndarray): one row per parameter set.
+                A DataFrame, i.e. :py:class:`viz.Parse` output, names its columns.
+                Columns that are not fit items, such as RSS, are ignored and fit
+                items without a column keep their model value. An array has a
+                column per name in `names`
+            names (list): Default None, :py:attr:`Objective.parameter_names`
+
+        Returns:
+            OrderedDict: experiment name -> numpy.ndarray of shape
+            (sets, rows, dependents). Simulated minus measured values, times the
+            square root of the weights. NaN where data is missing or the
+            simulation failed
+
+        """
+        names, values, _ = self._parameters(parameters, names)
+        Y0 = numpy.repeat(self.y0[None, :], len(values), axis=0)
+        P = numpy.repeat(self.p[None, :], len(values), axis=0)
+        residuals = OrderedDict()
+        for experiment in self.experiments:
+            Y0e, Pe = Y0.copy(), P.copy()
+            for column, name in enumerate(names):
+                if self._affects(name, experiment):
+                    self._set(Y0e, Pe, name, values[:, column])
+            simulated = self._simulate(experiment, Y0e, Pe)
+            residuals[experiment.name] = (simulated - experiment.data[None]) * experiment.factors[None]
+        return residuals
+
+    @staticmethod
+    def _sums(residuals, data):
+        """Residual sums of squares over rows, shape (sets, dependents).
+        Infinite where the simulation failed"""
+        missing = numpy.isnan(data)[None]
+        squares = numpy.where(missing, 0.0, residuals ** 2)
+        return numpy.where(numpy.isnan(squares), numpy.inf, squares).sum(axis=1)
+
+    def __call__(self, parameters, names=None):
+        """The RSS of each parameter set
+
+        Args:
+            parameters (pandas.DataFrame or numpy.ndarray): as for
+                :py:meth:`Objective.residuals`
+            names (list): Default None, :py:attr:`Objective.parameter_names`
+
+        Returns:
+            numpy.ndarray of shape (sets,)
+
+        """
+        residuals = self.residuals(parameters, names)
+        rss = 0.0
+        for experiment in self.experiments:
+            rss = rss + self._sums(residuals[experiment.name], experiment.data).sum(axis=1)
+        return rss
+
+    def evaluate(self, parameters, names=None):
+        """The RSS of each parameter set with its parts
+
+        Args:
+            parameters (pandas.DataFrame or numpy.ndarray): as for
+                :py:meth:`Objective.residuals`
+            names (list): Default None, :py:attr:`Objective.parameter_names`
+
+        Returns:
+            dict with keys
+
+            - 'RSS': pandas.Series of the RSS of each set
+            - 'experiments': pandas.DataFrame of the RSS of each set (rows)
+              and experiment (columns)
+            - 'observables': pandas.DataFrame of the RSS of each set (rows),
+              experiment and dependent variable (columns)
+            - 'residuals': as returned by :py:meth:`Objective.residuals`
+
+        """
+        _, values, index = self._parameters(parameters, names)
+        sets = len(values)
+        residuals = self.residuals(parameters, names)
+        sums = [self._sums(residuals[i.name], i.data) for i in self.experiments]
+        columns = pandas.MultiIndex.from_tuples(
+            [(i.name, j) for i in self.experiments for j in i.dependents], names=['experiment', 'observable'])
+        observables = pandas.DataFrame(numpy.concatenate(sums, axis=1) if sums else numpy.zeros((sets, 0)),
+                                       index=index, columns=columns)
+        experiments = pandas.DataFrame(
+            numpy.array([i.sum(axis=1) for i in sums]).T if sums else numpy.zeros((sets, 0)),
+            index=index, columns=[i.name for i in self.experiments])
+        return {
+            'RSS': experiments.sum(axis=1).rename('RSS'),
+            'experiments': experiments,
+            'observables': observables,
+            'residuals': residuals,
+        }
+
+
+## residual given to the optimisers for data points that failed to simulate
+_FAILED = 1e10
+
+## parameter estimation methods available in process, by their names in
+## ParameterEstimation settings. Gradient methods share a quasi Newton optimiser
+## and the stochastic ranking of constraints does not apply
+_ESTIMATION_METHODS = {
+    'current_solution_statistics': 'current_solution_statistics',
+    'levenberg_marquardt': 'least_squares',
+    'differential_evolution': 'differential_evolution',
+    'genetic_algorithm': 'genetic_algorithm',
+    'genetic_algorithm_sr': 'genetic_algorithm',
+    'particle_swarm': 'particle_swarm',
+    'random_search': 'random_search',
+    'nelder_mead': 'Nelder-Mead',
+    'hooke_jeeves': 'Powell',
+    'praxis': 'Powell',
+    'steepest_descent': 'L-BFGS-B',
+    'truncated_newton': 'L-BFGS-B',
+}
+
+## methods that score a population of parameter sets at a time
+_POPULATION_METHODS = ['differential_evolution', 'genetic_algorithm', 'particle_swarm', 'random_search']
+
+
+class _Scaling(object):
+    """The space the optimisers search: log10 of fit items with positive
+    bounds, the values of the others. Points are clipped to the bounds"""
+
+    def __init__(self, bounds):
+        bounds = numpy.asarray(bounds, dtype=float)
+        self.log = bounds[:, 0] > 0
+        self.bounds = numpy.where(self.log[:, None], numpy.log10(numpy.where(bounds > 0, bounds, 1.0)), bounds)
+
+    def to_values(self, Z):
+        Z = numpy.clip(Z, self.bounds[:, 0], self.bounds[:, 1])
+        return numpy.where(self.log, 10 ** Z, Z)
+
+    def from_values(self, X):
+        X = numpy.asarray(X, dtype=float)
+        return numpy.where(self.log, numpy.log10(numpy.where(X > 0, X, numpy.nan)), X)
+
+    def uniform(self, rng, sets):
+        return rng.uniform(self.bounds[:, 0], self.bounds[:, 1], (sets, len(self.bounds)))
+
+
+def _residual_matrix(objective, X):
+    """Every weighted residual with data of each set, shape (sets, residuals)"""
+    residuals = objective.residuals(X)
+    parts = [residuals[i.name].reshape(len(X), -1)[:, ~numpy.isnan(i.data).ravel()]
+             for i in objective.experiments]
+    R = numpy.concatenate(parts, axis=1) if parts else numpy.zeros((len(X), 0))
+    return numpy.where(numpy.isfinite(R), R, _FAILED)
+
+
+def _steps(scaling, z, size=1e-4):
+    """Forward difference steps away from the upper bounds"""
+    step = size * numpy.maximum(numpy.abs(z), 1.0)
+    return numpy.where(z + step > scaling.bounds[:, 1], -step, step)
+
+
+def _into_bounds(Z, lower, upper, rng):
+    """Redraw the entries of Z outside the bounds uniformly between them"""
+    outside = (Z < lower) | (Z > upper)
+    return numpy.where(outside, rng.uniform(lower, upper, Z.shape), Z)
+
+
+def _population(z0, size, lower, upper, rng):
+    """The start followed by parameter sets drawn uniformly between the bounds"""
+    return numpy.vstack([z0, rng.uniform(lower, upper, (max(size, 2) - 1, len(z0)))])
+
+
+def _genetic_algorithm(score, z0, lower, upper, rng, number_of_generations, population_size):
+    """Real coded genetic algorithm like COPASI's. Each generation pairs the
+    parents at random for uniform crossover, mutates the children by the
+    spread of the population and keeps the parents and children that win
+    the most of a tournament against random opponents"""
+    Z = _population(z0, population_size, lower, upper, rng)
+    values = score(Z)
+    size, n = Z.shape
+    opponents = max(1, size // 10)
+    for generation in range(number_of_generations):
+        partners = rng.permutation(size)
+        children = numpy.where(rng.uniform(size=Z.shape) < 0.5, Z, Z[partners])
+        spread = Z.std(axis=0) + 1e-3 * (upper - lower)
+        children = _into_bounds(children + rng.normal(0.0, 1.0, Z.shape) * spread, lower, upper, rng)
+        Z = numpy.vstack([Z, children])
+        values = numpy.append(values, score(children))
+        ## the best always wins
+        wins = (values[:, None] <= values[rng.randint(0, 2 * size, (2 * size, opponents))]).sum(axis=1)
+        wins[values.argmin()] = opponents + 1
+        keep = numpy.argsort(-wins, kind='stable')[:size]
+        Z, values = Z[keep], values[keep]
+    return Z[values.argmin()]
+
+
+def _particle_swarm(score, z0, lower, upper, rng, iteration_limit, swarm_size, std_deviation):
+    """Particle swarm with the constriction coefficients of Clerc and Kennedy.
+    Stops early when the best values of the particles agree to `std_deviation`"""
+    Z = _population(z0, swarm_size, lower, upper, rng)
+    width = upper - lower
+    velocity = rng.uniform(-0.1, 0.1, Z.shape) * width
+    values = score(Z)
+    best, best_values = Z.copy(), values.copy()
+    for iteration in range(iteration_limit):
+        leader = best[best_values.argmin()]
+        velocity = 0.7298 * velocity + 1.4962 * rng.uniform(size=Z.shape) * (best - Z) + \
+            1.4962 * rng.uniform(size=Z.shape) * (leader - Z)
+        velocity = numpy.clip(velocity, -width, width)
+        Z = Z + velocity
+        ## particles stop at the bounds
+        stopped = (Z < lower) | (Z > upper)
+        Z, velocity = numpy.clip(Z, lower, upper), numpy.where(stopped, 0.0, velocity)
+        values = score(Z)
+        improved = values < best_values
+        best[improved], best_values[improved] = Z[improved], values[improved]
+        if best_values.std() < std_deviation:
+            break
+    return best[best_values.argmin()]
+
+
+def _differential_evolution(score, z0, lower, upper, rng, number_of_generations, population_size, tolerance):
+    """Differential evolution, rand/1/bin with a dithered weight. Stops early
+    when the spread of the values is within `tolerance` of their mean"""
+    Z = _population(z0, max(population_size, 4), lower, upper, rng)
+    values = score(Z)
+    size, n = Z.shape
+    for generation in range(number_of_generations):
+        ## three distinct partners other than itself for each member
+        order = rng.uniform(size=(size, size))
+        numpy.fill_diagonal(order, numpy.inf)
+        r = numpy.argsort(order, axis=1)[:, :3]
+        mutants = Z[r[:, 0]] + rng.uniform(0.5, 1.0) * (Z[r[:, 1]] - Z[r[:, 2]])
+        cross = rng.uniform(size=Z.shape) < 0.9
+        cross[numpy.arange(size), rng.randint(0, n, size)] = True
+        trials = _into_bounds(numpy.where(cross, mutants, Z), lower, upper, rng)
+        trial_values = score(trials)
+        better = trial_values <= values
+        Z[better], values[better] = trials[better], trial_values[better]
+        if values.std() <= tolerance * abs(values.mean()):
+            break
+    return Z[values.argmin()]
+
+
+def _random_search(score, z0, lower, upper, rng, number_of_iterations, chunk_size):
+    """The best of the start and `number_of_iterations` parameter sets
+    drawn uniformly between the bounds"""
+    best, best_value = z0, score(z0[None])[0]
+    for i in range(0, number_of_iterations, chunk_size):
+        Z = rng.uniform(lower, upper, (min(chunk_size, number_of_iterations - i), len(z0)))
+        values = score(Z)
+        if values.min() < best_value:
+            best, best_value = Z[values.argmin()], values.min()
+    return best
+
+
+def _score_in_worker(payload, X):
+    return _worker_objective(payload)(X)
+
+
+def _optimise(objective, x0, method, seed, options, pool=None, shards=1, payload=None):
+    """One estimation from `x0`. Populations are split into `shards`
+    scored by `pool` when given, which is sent the objective as `payload`
+    from :py:func:`_pickle_objective`. Returns (x, rss)"""
+    scaling = _Scaling(objective.bounds)
+    lower, upper = scaling.bounds.T
+    z = numpy.clip(scaling.from_values(x0), lower, upper)
+    z = numpy.where(numpy.isnan(z), lower, z)
+    rng = numpy.random.RandomState(seed)
+
+    def score(Z):
+        X = scaling.to_values(Z)
+        if pool is None or len(X) < 2 * shards:
+            values = objective(X)
+        else:
+            values = numpy.concatenate(list(pool.map(_score_in_worker, [payload] * shards,
+                                                     numpy.array_split(X, shards))))
+        return numpy.where(numpy.isfinite(values), values, _FAILED ** 2)
+
+    if method == 'least_squares':
+        def fun(z):
+            return _residual_matrix(objective, scaling.to_values(z[None]))[0]
+
+        def jac(z):
+            ## every column of the Jacobian from one batch
+            step = _steps(scaling, z)
+            R = _residual_matrix(objective, scaling.to_values(numpy.vstack([z, z + numpy.diag(step)])))
+            return ((R[1:] - R[0]) / step[:, None]).T
+
+        z = optimize.least_squares(fun, z, jac=jac, bounds=(lower, upper), method='trf',
+                                   max_nfev=options['iteration_limit'], ftol=options['tolerance'],
+                                   xtol=options['tolerance']).x
+
+    elif method == 'genetic_algorithm':
+        z = _genetic_algorithm(score, z, lower, upper, rng, options['number_of_generations'],
+                               options['population_size'])
+
+    elif method == 'particle_swarm':
+        z = _particle_swarm(score, z, lower, upper, rng, options['iteration_limit'], options['swarm_size'],
+                            options['std_deviation'])
+
+    elif method == 'differential_evolution':
+        z = _differential_evolution(score, z, lower, upper, rng, options['number_of_generations'],
+                                    options['population_size'], options['tolerance'])
+
+    elif method == 'random_search':
+        z = _random_search(score, z, lower, upper, rng, options['number_of_iterations'], objective.chunk_size)
+
+    elif method != 'current_solution_statistics':
+        minimize_options = {'maxiter': options['iteration_limit']}
+        jac = None
+        if method == 'L-BFGS-B':
+            def jac(z):
+                step = _steps(scaling, z)
+                values = score(numpy.vstack([z, z + numpy.diag(step)]))
+                return (values[1:] - values[0]) / step
+            minimize_options['ftol'] = options['tolerance']
+        elif method == 'Nelder-Mead':
+            minimize_options['fatol'] = options['tolerance']
+        else:
+            minimize_options['ftol'] = options['tolerance']
+        bounds = list(zip(lower, upper)) if method == 'L-BFGS-B' else None
+        z = optimize.minimize(lambda z: score(z[None])[0], z, method=method, jac=jac, bounds=bounds,
+                              options=minimize_options).x
+
+    x = scaling.to_values(z[None])
+    return x[0], objective(x)[0]
+
+
+## the objective of each worker process and the key of its payload. The
+## payload comes with every task because ProcessPoolExecutor only takes
+## an initializer from python 3.7. It is unpickled once per worker
+_OBJECTIVE = None
+_OBJECTIVE_KEY = None
+
+
+def _pickle_objective(objective):
+    """The payload that sends `objective` to worker processes: (key, pickle)"""
+    data = pickle.dumps(objective)
+    return hashlib.sha1(data).hexdigest(), data
+
+
+def _worker_objective(payload):
+    """The objective of a payload from :py:func:`_pickle_objective`"""
+    global _OBJECTIVE, _OBJECTIVE_KEY
+    key, data = payload
+    if key != _OBJECTIVE_KEY:
+        _OBJECTIVE = pickle.loads(data)
+        _OBJECTIVE_KEY = key
+    return _OBJECTIVE
+
+
+def _optimise_in_worker(payload, x0, method, seed, options):
+    return _optimise(_worker_objective(payload), x0, method, seed, options)
+
+
+def start_values(objective, starts=1, randomize=False, seed=0):
+    """Start values of a multi start parameter estimation
+
+    Args:
+        objective (:py:class:`Objective`): the objective
+        starts (int): Default 1. Number of starts
+        randomize (bool): Default False. Draw start values uniformly between the
+            bounds, on a log scale for fit items with positive bounds. Otherwise
+            every start is the `start_value` of the fit items, or their model
+            value for 'model_value'
+        seed (int): Default 0. Seeds the random start values
+
+    Returns:
+        numpy.ndarray of shape (starts, parameters)
+
+    """
+    bounds = objective.bounds
+    if randomize:
+        scaling = _Scaling(bounds)
+        return scaling.to_values(scaling.uniform(numpy.random.RandomState(seed), starts))
+    model_values = objective.model_values
+    values = [model_values[i] if objective.items[name].get('start_value', 'model_value') == 'model_value'
+              else float(objective.items[name].start_value) for i, name in enumerate(objective.parameter_names)]
+    return numpy.clip(numpy.repeat([values], starts, axis=0), bounds[:, 0], bounds[:, 1])
+
+
+def estimate(objective, method='levenberg_marquardt', starts=None, processes=1, seed=0, iteration_limit=50,
+             tolerance=1e-5, number_of_generations=200, population_size=50, swarm_size=50,
+             std_deviation=1e-6, number_of_iterations=100000):
+    """Multi start parameter estimation in process
+
+    Each start is optimised independently. Fit items with positive bounds
+    are searched on a log10 scale.
+
+    'levenberg_marquardt' is a bounded trust region least squares
+    (:py:func:`scipy.optimize.least_squares`) and the other local methods
+    use :py:func:`scipy.optimize.minimize`. Their finite difference
+    gradients are scored as one batch per point. The population methods,
+    'genetic_algorithm', 'particle_swarm', 'differential_evolution' and
+    'random_search', score each generation as one batch.
+
+    With `processes`, a pool of worker processes is started that each
+    receive the objective and its experiment data once. The starts of the
+    local methods are spread over the pool. The population methods run their
+    starts one after the other and split every generation over the pool,
+    so that a single estimation uses every worker.
+
+    Args:
+        objective (:py:class:`Objective`): what to minimise
+        method (str): Default 'levenberg_marquardt'. One of 'current_solution_statistics',
+            'levenberg_marquardt', 'genetic_algorithm', 'genetic_algorithm_sr',
+            'particle_swarm', 'differential_evolution', 'random_search', 'nelder_mead',
+            'hooke_jeeves', 'praxis', 'steepest_descent' or 'truncated_newton'
+        starts (numpy.ndarray): Default None, one start from the start values of
+            the fit items. Start values of shape (starts, parameters), see
+            :py:func:`start_values`. Population methods include the start in
+            their first generation
+        processes (int): Default 1. Number of worker processes
+        seed (int): Default 0. Start i of the stochastic methods is seeded with `seed` + i
+        iteration_limit (int): Default 50. Iterations of the local methods and particle_swarm
+        tolerance (float): Default 1e-5. Convergence tolerance
+        number_of_generations (int): Default 200. For genetic_algorithm and differential_evolution
+        population_size (int): Default 50. For genetic_algorithm and differential_evolution
+        swarm_size (int): Default 50. For particle_swarm
+        std_deviation (float): Default 1e-6. particle_swarm stops when the best
+            values of its particles have a smaller standard deviation
+        number_of_iterations (int): Default 100000. For random_search
+
+    Returns:
+        pandas.DataFrame with a column per fit item and an RSS column, a row per
+        start and sorted by RSS, like the :py:class:`viz.Parse` output of a
+        :py:class:`tasks.ParameterEstimation`
+
+    """
+    if method not in _ESTIMATION_METHODS:
+        raise errors.InputError('method "{}" is not available with the native engine. Use one of "{}"'.format(
+            method, list(_ESTIMATION_METHODS)))
+    if starts is None:
+        starts = start_values(objective)
+    starts = numpy.atleast_2d(numpy.asarray(starts, dtype=float))
+    options = {
+        'iteration_limit': iteration_limit,
+        'tolerance': tolerance,
+        'number_of_generations': number_of_generations,
+        'population_size': population_size,
+        'swarm_size': swarm_size,
+        'std_deviation': std_deviation,
+        'number_of_iterations': number_of_iterations,
+    }
+    method = _ESTIMATION_METHODS[method]
+    population = method in _POPULATION_METHODS
+
+    if processes is None or processes <= 1 or (len(starts) == 1 and not population):
+        results = [_optimise(objective, x0, method, seed + i, options) for i, x0 in enumerate(starts)]
+    else:
+        payload = _pickle_objective(objective)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            if population:
+                results = [_optimise(objective, x0, method, seed + i, options, pool, processes, payload)
+                           for i, x0 in enumerate(starts)]
+            else:
+                futures = [pool.submit(_optimise_in_worker, payload, x0, method, seed + i, options)
+                           for i, x0 in enumerate(starts)]
+                results = [i.result() for i in futures]
+
+    df = pandas.DataFrame([numpy.append(x, rss) for x, rss in results],
+                          columns=objective.parameter_names + ['RSS'])
+    return df.sort_values(by='RSS').reset_index(drop=True)
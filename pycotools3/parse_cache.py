@@ -0,0 +1,283 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Persistent on disk cache of the component tables of a :py:class:`model.Model`.
+
+Building the component objects (metabolites, reactions, ...) of a large
+model costs far more than parsing it. When a :py:class:`model.Model` is
+constructed with a `cache_dir`, the tables are pickled into that directory
+under a key made from the sha256 of the file content and the COPASI schema
+version, and restored the next time any process opens an unchanged file.
+
+The directory has a size cap. Entries are evicted least recently used
+first, where "used" is the modification time of the entry which is bumped
+on every hit.
+"""
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from lxml import etree
+
+LOG = logging.getLogger(__name__)
+
+## bump whenever the pickled layout or the component classes change
+CACHE_VERSION = 1
+
+## cached properties of model.Model that are stored
+TABLES = ['compartments', 'metabolites', 'global_quantities', 'functions',
+          'constants', 'local_parameters', 'reactions']
+
+
+class _TablePickler(pickle.Pickler):
+    """Pickle component tables without the model they belong to.
+
+    Components hold a reference to their :py:class:`model.Model`. That
+    reference is stored as a placeholder and swapped for the model being
+    loaded by :py:class:`_TableUnpickler`.
+    """
+
+    def __init__(self, file, model):
+        super(_TablePickler, self).__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.model = model
+
+    def persistent_id(self, obj):
+        if obj is self.model:
+            return 'model'
+        if isinstance(obj, etree._Element):
+            raise pickle.PicklingError('Component tables must not hold copasiML elements')
+        return None
+
+
+class _TableUnpickler(pickle.Unpickler):
+    """Counterpart of :py:class:`_TablePickler`"""
+
+    def __init__(self, file, model):
+        super(_TableUnpickler, self).__init__(file)
+        self.model = model
+
+    def persistent_load(self, pid):
+        if pid == 'model':
+            return self.model
+        raise pickle.UnpicklingError('Unknown persistent id "{}"'.format(pid))
+
+
+class _DirectoryCache(object):
+    """A directory of cache entries, one file each, with a size cap.
+
+    Entries are evicted least recently used first, where "used" is the
+    modification time of the entry which is bumped on every hit.
+    Subclasses choose the :py:attr:`suffix` of their entry files and
+    what goes in them.
+    """
+
+    suffix = '.pickle'
+
+    def __init__(self, directory, max_size=500 * 1024 ** 2):
+        """
+
+        Args:
+            directory (str): where entries are stored. Created if it does not exist
+            max_size (int): Default 500MB. Total size in bytes of the entries
+                above which the least recently used are deleted
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+    def __str__(self):
+        return '{}(directory="{}", max_size={}, hits={}, misses={})'.format(
+            self.__class__.__name__, self.directory, self.max_size, self.hits, self.misses
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    @staticmethod
+    def _touch(path):
+        """mark an entry as recently used"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, path, content):
+        """Atomically write `content` to the entry at `path`, then evict
+
+        Returns:
+            bool: True if the entry was written
+
+        """
+        temp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        try:
+            with open(temp, 'wb') as f:
+                f.write(content)
+            os.replace(temp, path)
+        except OSError as e:
+            LOG.debug('Could not write cache entry "{}": {}'.format(path, e))
+            if os.path.isfile(temp):
+                os.remove(temp)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """Cache entries, least recently used first
+
+        Returns:
+            list of (path, size, mtime)
+
+        """
+        entries = []
+        for i in os.listdir(self.directory):
+            if not i.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, i)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                ## removed by another process
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda x: x[2])
+
+    def size(self):
+        """Total size in bytes of the cache entries"""
+        return sum(i[1] for i in self.entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in `max_size`
+
+        Returns:
+            list of str: paths removed
+
+        """
+        entries = self.entries()
+        total = sum(i[1] for i in entries)
+        removed = []
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed.append(path)
+        return removed
+
+    def clear(self):
+        """Delete every entry
+
+        Returns:
+            the cache
+
+        """
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return self
+
+
+class ParseCache(_DirectoryCache):
+    """Directory of pickled model component tables
+
+    Examples:
+        >>> cache = ParseCache('/tmp/pycotools_cache', max_size=200 * 1024 ** 2)
+        >>> mod = model.Model('/path/to/model.cps', cache_dir=cache.directory)
+        >>> cache.hits, cache.misses
+    """
+
+    @staticmethod
+    def key(content, xml, quantity_type='concentration'):
+        """Cache key of a copasi file
+
+        Args:
+            content (bytes): content of the copasi file
+            xml (etree._Element): the parsed copasiML root. Supplies the schema version
+            quantity_type (str): the :py:class:`model.Model` quantity_type
+
+        Returns:
+            str
+
+        """
+        schema_version = '.'.join(xml.attrib.get(i, '') for i in
+                                  ['versionMajor', 'versionMinor', 'versionDevel'])
+        digest = hashlib.sha256(content).hexdigest()
+        return '{}-{}-{}-v{}'.format(digest, schema_version, quantity_type, CACHE_VERSION)
+
+    def load(self, key, model):
+        """Restore the component tables stored under `key` into the
+        cached properties of `model`
+
+        Args:
+            key (str): from :py:meth:`ParseCache.key`
+            model (:py:class:`model.Model`): the model to fill
+
+        Returns:
+            bool: True on a hit
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                tables = _TableUnpickler(f, model).load()
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        except Exception as e:
+            ## corrupt or written by an incompatible version. Fall back to a normal load
+            LOG.debug('Ignoring unreadable cache entry "{}": {}'.format(path, e))
+            self.misses += 1
+            return False
+
+        self._touch(path)
+        model.__dict__.update(tables)
+        self.hits += 1
+        return True
+
+    def store(self, key, model):
+        """Compute the component tables of `model` and store them under `key`
+
+        Args:
+            key (str): from :py:meth:`ParseCache.key`
+            model (:py:class:`model.Model`): a freshly loaded model
+
+        Returns:
+            bool: True if the entry was written
+
+        """
+        try:
+            tables = {i: getattr(model, i) for i in TABLES}
+            buffer = BytesIO()
+            _TablePickler(buffer, model).dump(tables)
+        except Exception as e:
+            LOG.debug('Not caching "{}": {}'.format(model.copasi_file, e))
+            return False
+
+        return self._write(self._path(key), buffer.getvalue())
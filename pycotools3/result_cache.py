@@ -0,0 +1,357 @@
+# -*-coding: utf-8 -*-
+"""
+ This file is part of pycotools3.
+
+ pycotools3 is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ pycotools3 is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with pycotools3.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Content addressed cache of the reports written by CopasiSE.
+
+When :py:class:`tasks.Run` or :py:class:`tasks.RunParallel` is given a
+`cache`, the key of each run is the sha256 of
+
+- the canonicalised copasiML: the model, its tasks and reports, with
+  keys renumbered in document order and report targets, annotations,
+  plots and layouts left out
+- the content of the experiment files the tasks read
+- the CopasiSE executable
+
+If an entry exists for the key, the reports it holds are written to the
+report targets of the scheduled tasks and CopasiSE is not run. Otherwise
+CopasiSE runs and the reports it wrote are stored. Tasks that are not
+reproducible, a stochastic method or optimiser without a fixed seed, or
+that change the model (updateModel), are never cached.
+
+Like :py:class:`parse_cache.ParseCache` the directory has a size cap and
+entries are evicted least recently used first.
+"""
+import os
+import pickle
+import hashlib
+import logging
+from lxml import etree
+from .parse_cache import _DirectoryCache
+
+LOG = logging.getLogger(__name__)
+
+## bump whenever the key or the entry layout change
+CACHE_VERSION = 1
+
+SCHEMA = '{http://www.copasi.org/static/schema}'
+
+## elements that do not change what CopasiSE writes to a report
+_IGNORED = ['MiriamAnnotation', 'Comment', 'ListOfUnsupportedAnnotations',
+            'ListOfPlots', 'GUI', 'ListOfLayouts', 'SBMLReference']
+
+## task type of each value of the Subtask parameter of a scan
+_SCAN_SUBTASKS = {'0': 'steadyState', '1': 'timeCourse', '4': 'optimization',
+                  '5': 'parameterFitting', '6': 'metabolicControlAnalysis',
+                  '7': 'lyapunovExponents', '8': 'timeScaleSeparationAnalysis',
+                  '9': 'sensitivities', '11': 'crosssection', '12': 'linearNoiseApproximation'}
+
+## digests of executables by (path, size, mtime)
+_EXECUTABLES = {}
+
+
+def _off(value):
+    return str(value).lower() in ['0', 'false']
+
+
+def _parsed(xml):
+    """A copy of `xml` as if read from its file. Elements added by pycotools
+    have no namespace until the model is saved and read again"""
+    return etree.fromstring(etree.tostring(xml))
+
+
+def _executable_digest(path):
+    """sha256 of an executable, computed once per version of the file"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _EXECUTABLES:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(block)
+        _EXECUTABLES[key] = digest.hexdigest()
+    return _EXECUTABLES[key]
+
+
+def scheduled_tasks(xml):
+    """The scheduled tasks of a copasiML document and, for a scan, its subtask
+
+    Args:
+        xml (etree._Element): copasiML root, as read from a file
+
+    Returns:
+        list of etree._Element
+
+    """
+    tasks = xml.find(SCHEMA + 'ListOfTasks')
+    if tasks is None:
+        return []
+    by_type = {i.attrib.get('type'): i for i in tasks}
+    found = []
+    for task in tasks:
+        if task.attrib.get('scheduled') != 'true':
+            continue
+        found.append(task)
+        if task.attrib.get('type') == 'scan':
+            for i in task.iter(SCHEMA + 'Parameter'):
+                if i.attrib.get('name') == 'Subtask' and i.attrib.get('value') in _SCAN_SUBTASKS:
+                    found.append(by_type[_SCAN_SUBTASKS[i.attrib['value']]])
+    return found
+
+
+def cacheable(xml):
+    """Whether the scheduled tasks of a copasiML document give the same
+    reports every time they run
+
+    Tasks that update the model, stochastic methods with 'Use Random Seed'
+    off and optimisers with a 'Seed' of 0 are not cacheable.
+
+    Args:
+        xml (etree._Element): copasiML root, as read from a file
+
+    Returns:
+        bool
+
+    """
+    tasks = scheduled_tasks(xml)
+    if not tasks:
+        return False
+    for task in tasks:
+        update_model = task.attrib.get('updateModel', task.attrib.get('update_model', 'false'))
+        if task.attrib.get('scheduled') == 'true' and not _off(update_model):
+            return False
+        method = task.find(SCHEMA + 'Method')
+        if method is None:
+            continue
+        for i in method.iter(SCHEMA + 'Parameter'):
+            name, value = i.attrib.get('name'), i.attrib.get('value')
+            if name == 'Use Random Seed' and _off(value):
+                return False
+            if name == 'Seed' and value == '0':
+                return False
+    return True
+
+
+def report_targets(xml, copasi_file):
+    """Report files written by the scheduled tasks
+
+    Args:
+        xml (etree._Element): copasiML root, as read from a file
+        copasi_file (str): the copasi file. Relative targets are relative to its directory
+
+    Returns:
+        list of (path, append). append is True when CopasiSE appends to the file
+
+    """
+    targets = []
+    for task in xml.find(SCHEMA + 'ListOfTasks'):
+        if task.attrib.get('scheduled') != 'true':
+            continue
+        report = task.find(SCHEMA + 'Report')
+        if report is None or not report.attrib.get('target'):
+            continue
+        path = report.attrib['target']
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(copasi_file)), path)
+        targets.append((path, not _off(report.attrib.get('append', '0'))))
+    return targets
+
+
+class ResultCache(_DirectoryCache):
+    """Directory of CopasiSE reports keyed by what produced them
+
+    Examples:
+        >>> cache = ResultCache('/tmp/pycotools_results', max_size=1024 ** 3)
+        >>> tasks.Run(model, task='time_course', cache=cache)
+        >>> tasks.Run(model, task='time_course', cache=cache)  # restored, CopasiSE not run
+        >>> cache.hits, cache.misses
+        (1, 1)
+    """
+
+    suffix = '.reports'
+
+    def __init__(self, directory, max_size=1024 ** 3):
+        """
+
+        Args:
+            directory (str): where entries are stored. Created if it does not exist
+            max_size (int): Default 1GB. Total size in bytes of the entries
+                above which the least recently used are deleted
+        """
+        super(ResultCache, self).__init__(directory, max_size=max_size)
+
+    @staticmethod
+    def key(xml, copasi_file, copasise):
+        """Cache key of running the scheduled tasks of a copasi file
+
+        Args:
+            xml (etree._Element): copasiML root, as it will be run
+            copasi_file (str): the copasi file. Experiment files are relative to its directory
+            copasise (str): path to the CopasiSE executable
+
+        Returns:
+            str, or None when :py:func:`cacheable` is False
+
+        """
+        return ResultCache._key(_parsed(xml), copasi_file, copasise)
+
+    @staticmethod
+    def _key(xml, copasi_file, copasise):
+        """:py:meth:`ResultCache.key` of a copy of the copasiML that it may change"""
+        if not cacheable(xml):
+            return None
+        for name in _IGNORED:
+            for i in list(xml.iter(SCHEMA + name)):
+                i.getparent().remove(i)
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(copasi_file))
+        for i in xml.iter(SCHEMA + 'Report'):
+            if 'target' in i.attrib:
+                i.attrib['target'] = ''
+        ## keys are renumbered whenever pycotools or COPASI rewrite a file
+        names = {}
+        for i in xml.iter():
+            if 'key' in i.attrib:
+                names.setdefault(i.attrib['key'], 'key{}'.format(len(names)))
+        for i in xml.iter():
+            for attribute, value in i.attrib.items():
+                if value in names:
+                    i.attrib[attribute] = names[value]
+        for i in xml.find(SCHEMA + 'ListOfTasks').iter(SCHEMA + 'Parameter'):
+            if i.attrib.get('name') == 'File Name' and i.attrib.get('value'):
+                path = i.attrib['value']
+                if not os.path.isabs(path):
+                    path = os.path.join(directory, path)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        digest.update(hashlib.sha256(f.read()).digest())
+        for i in xml.iter():
+            if i.text is not None and not i.text.strip():
+                i.text = None
+            if i.tail is not None and not i.tail.strip():
+                i.tail = None
+        digest.update(etree.tostring(xml, method='c14n'))
+        digest.update(_executable_digest(copasise).encode())
+        return '{}-v{}'.format(digest.hexdigest(), CACHE_VERSION)
+
+    def restore(self, key, targets):
+        """Write the reports stored under `key` to `targets`
+
+        Args:
+            key (str): from :py:meth:`ResultCache.key`
+            targets (list): (path, append) from :py:func:`report_targets`
+
+        Returns:
+            bool: True on a hit
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                reports = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        except Exception as e:
+            LOG.debug('Ignoring unreadable cache entry "{}": {}'.format(path, e))
+            self.misses += 1
+            return False
+        if len(reports) != len(targets):
+            self.misses += 1
+            return False
+        self._touch(path)
+        for (target, append), content in zip(targets, reports):
+            with open(target, 'ab' if append else 'wb') as f:
+                f.write(content)
+        self.hits += 1
+        return True
+
+    @staticmethod
+    def offsets(targets):
+        """Sizes of the report files before a run. CopasiSE appends to
+        existing reports so only what follows these is stored
+
+        Args:
+            targets (list): (path, append) from :py:func:`report_targets`
+
+        Returns:
+            list of int
+
+        """
+        return [os.path.getsize(path) if append and os.path.isfile(path) else 0
+                for path, append in targets]
+
+    def store(self, key, targets, offsets):
+        """Store the reports written by a run under `key`
+
+        Args:
+            key (str): from :py:meth:`ResultCache.key`
+            targets (list): (path, append) from :py:func:`report_targets`
+            offsets (list): from :py:meth:`ResultCache.offsets`, taken before the run
+
+        Returns:
+            bool: True if the entry was written
+
+        """
+        reports = []
+        for (path, _), offset in zip(targets, offsets):
+            if not os.path.isfile(path):
+                LOG.debug('Not caching, no report at "{}"'.format(path))
+                return False
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                reports.append(f.read())
+        return self._write(self._path(key), pickle.dumps(reports, pickle.HIGHEST_PROTOCOL))
+
+    def restore_run(self, xml, copasi_file, copasise):
+        """Restore the reports of running the scheduled tasks of a copasi
+        file, if they are cached
+
+        Args:
+            xml (etree._Element): copasiML root, as it will be run
+            copasi_file (str): the copasi file
+            copasise (str): path to the CopasiSE executable
+
+        Returns:
+            tuple: (hit, pending). On a miss, pass pending to
+            :py:meth:`ResultCache.store_run` once CopasiSE has run
+            successfully. pending is None when the run cannot be cached
+
+        """
+        xml = _parsed(xml)
+        targets = report_targets(xml, copasi_file)
+        key = self._key(xml, copasi_file, copasise) if targets else None
+        if key is None:
+            return False, None
+        if self.restore(key, targets):
+            return True, None
+        return False, (key, targets, self.offsets(targets))
+
+    def store_run(self, pending):
+        """Store the reports of a run that missed
+
+        Args:
+            pending (tuple): from :py:meth:`ResultCache.restore_run`. Nothing
+                is stored when None
+
+        Returns:
+            bool: True if the entry was written
+
+        """
+        if pending is None:
+            return False
+        return self.store(*pending)
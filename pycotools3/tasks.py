@@ -25,12 +25,14 @@ from . import viz
 from . import errors
 from . import misc
 from . import model
+from . import native
+from . import jobs
+from .result_cache import ResultCache
 from .munch import Munch
 from . import munch
 import time
 import threading
 import queue as queue
-import psutil
 import shutil
 import numpy
 import pandas
@@ -51,7 +53,9 @@ from .mixin import mixin
 from functools import reduce
 import yaml, json
 import sys
+import hashlib
 import itertools
+import tempfile
 
 COPASISE, COPASIUI = load_copasi()
 
@@ -356,19 +360,104 @@ class CopasiMLParser(_Task):
         return tree
 
     @staticmethod
-    def write_copasi_file(copasi_filename, xml):
-        """write to file with lxml write function
+    def read_header(copasi_file, sections=()):
+        """Stream a copasi file with ``iterparse`` and pull out only the
+        attributes of the ``Model`` element and the top level `sections`
+        asked for (i.e. ``ListOfTasks``). Everything else is discarded as
+        it is read so the full tree is never built. Reading stops as soon
+        as everything asked for has been found.
 
         Args:
-          copasi_filename: 
-          xml: 
+          copasi_file: str. Full path to a copasi file
+          sections: iterable of str. Tag names, without namespace, of
+            top level sections to return
 
         Returns:
+          tuple. (`dict` of Model element attributes, empty when there
+          is no Model in the copasi namespace, `dict` mapping each found section to its etree._Element)
 
         """
-        # first convert the copasiML to a root element tree
-        root = etree.ElementTree(xml)
-        root.write(copasi_filename)
+        if not os.path.isfile(copasi_file):
+            raise errors.FileDoesNotExistError('{} is not a copasi file'.format(copasi_file))
+        schema = '{http://www.copasi.org/static/schema}'
+        wanted = set(schema + i for i in sections)
+        ## large sections, dropped as soon as they have been read so the
+        ## tree never holds more than one of them
+        disposable = set(schema + i for i in [
+            'ListOfFunctions', 'ListOfCompartments', 'ListOfMetabolites',
+            'ListOfModelValues', 'ListOfReactions', 'ListOfEvents',
+            'ListOfModelParameterSets', 'StateTemplate', 'InitialState', 'Model',
+            'ListOfTasks', 'ListOfReports', 'ListOfPlots', 'GUI', 'ListOfLayouts',
+            'SBMLReference', 'ListOfUnitDefinitions',
+        ]) - wanted
+        model_attrib = None
+        found = {}
+        ## only events for these tags reach python, the rest is parsed in C
+        context = etree.iterparse(copasi_file, events=('start', 'end'),
+                                  tag=list(disposable | wanted), remove_blank_text=True)
+        for event, element in context:
+            if event == 'start':
+                if element.tag == schema + 'Model' and model_attrib is None:
+                    model_attrib = dict(element.attrib)
+                    if not wanted:
+                        break
+                continue
+
+            if any(i.tag in wanted for i in element.iterancestors()):
+                continue
+
+            if element.tag in wanted:
+                found[element.tag] = element
+                if model_attrib is not None and wanted.issubset(found):
+                    break
+                continue
+
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                parent.remove(element)
+
+        if model_attrib is None:
+            model_attrib = {}
+        return model_attrib, {key.replace(schema, ''): value for key, value in found.items()}
+
+    @staticmethod
+    def write_copasi_file(copasi_filename, xml, pretty_print=False):
+        """Serialize `xml` once and write it atomically: the
+        copasiML goes to a temporary file in the same directory which
+        is flushed to disk and then renamed over `copasi_filename`. A
+        crashed process or machine never leaves a half written copasi
+        file behind.
+
+        Args:
+          copasi_filename: str. Where to write
+          xml: etree._Element. The copasiML root, or `bytes` of an
+            already serialized document
+          pretty_print: bool. Default False. Indent the output
+
+        Returns:
+          str. copasi_filename
+
+        """
+        if isinstance(xml, bytes):
+            content = xml
+        else:
+            content = etree.tostring(xml, pretty_print=pretty_print)
+        ## unique per process and thread so parallel writers never share a temp file
+        temp = '{}.{}.{}.tmp'.format(copasi_filename, os.getpid(), threading.get_ident())
+        try:
+            with open(temp, 'wb') as f:
+                f.write(content)
+                ## the data must be on disk before the rename is, or a crash
+                ## can leave the new name pointing at an empty file
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, copasi_filename)
+        except BaseException:
+            if os.path.isfile(temp):
+                os.remove(temp)
+            raise
+        return copasi_filename
 
 
 @mixin(model.ReadModelMixin)
@@ -400,6 +489,15 @@ class Run(_Task):
     mode                How to run the task
     sge_job_filename    Optional name of sh file
                         generated for running sge
+                        or slurm
+    scheduler           Optional :py:class:`jobs.SGE` or
+                        :py:class:`jobs.Slurm` the job is
+                        submitted to. Defaults to the
+                        scheduler of the mode
+    cache               Optional :py:class:`result_cache.ResultCache`,
+                        or its directory. Reports of runs
+                        already done are restored from it
+                        instead of running CopasiSE
     ==========          ===================
     
     =============
@@ -459,6 +557,8 @@ class Run(_Task):
         self.default_properties = {'task': 'time_course',
                                    'mode': True,
                                    'sge_job_filename': None,
+                                   'cache': None,
+                                   'scheduler': None,
                                    # 'copasi_location': COPASI_DIR
                                    # 'copasi_location': 'apps/COPASI/4.21.166-Linux-64bit',  # for sge mode
                                    }
@@ -472,6 +572,9 @@ class Run(_Task):
         if self.sge_job_filename is None:
             self.sge_job_filename = os.path.join(os.getcwd(), 'sge_job_file.sh')
 
+        if self.cache is not None and not isinstance(self.cache, ResultCache):
+            self.cache = ResultCache(self.cache)
+
         # if self.mode is 'slurm':
         #     self.copasi_location = r'COPASI/4.22.170'
 
@@ -479,10 +582,7 @@ class Run(_Task):
         self.model.save()
 
         if self.mode is True:
-            try:
-                self.run()
-            except errors.CopasiError:
-                self.run_linux()
+            self.run()
 
         elif self.mode == 'sge':
             self.submit_copasi_job_SGE()
@@ -552,25 +652,67 @@ class Run(_Task):
 
     def run(self):
         """Run copasi model with CopasiSE distributed with pycotools
-        :return:
 
-        Args:
+        CopasiSE is run once. A non zero exit status, e.g. for a task
+        that is not set up, is logged as a warning with its error output.
 
         Returns:
+            bytes: the output of CopasiSE
 
         """
-        p = subprocess.Popen(f'{COPASISE} "{self.model.copasi_file}"', stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE, shell=True)
+        hit, pending = self._restore_cached()
+        if hit:
+            return b''
+        p = subprocess.Popen([COPASISE, self.model.copasi_file], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
         output, err = p.communicate()
-        d = {}
-        d['output'] = output
-        d['error'] = err
-        if err != '':
-            try:
-                self.run_linux()
-            except:
-                raise errors.CopasiError('Failed with Copasi error: \n\n' + d['error'])
-        return d['output']
+        if p.returncode != 0:
+            LOG.warning('CopasiSE exited with status {} running "{}": {}'.format(
+                p.returncode, self.model.copasi_file, err.decode(errors='replace').strip()))
+        elif pending is not None:
+            self.cache.store_run(pending)
+        return output
+
+    def _restore_cached(self):
+        """Restore the reports of this run from :py:attr:`Run.cache`
+
+        Returns:
+            tuple: (hit, pending), see :py:meth:`result_cache.ResultCache.restore_run`
+
+        """
+        return _restore_cached(self.cache, self.model)
+
+    async def run_async(self, timeout=None, semaphore=None):
+        """Run copasi model with CopasiSE in the running asyncio event loop
+
+        Create the :py:class:`Run` with mode=False to schedule the task
+        without running it, then await this. If the coroutine is cancelled
+        or the timeout passes, CopasiSE is killed.
+
+        Args:
+            timeout (float): Default None. Seconds CopasiSE may run for
+            semaphore (asyncio.Semaphore): Default None. Held while CopasiSE runs
+
+        Returns:
+            :py:class:`jobs.Job` with the exit status, duration and stderr of
+            the run. Its status is 'cached' when the reports were restored
+            from :py:attr:`Run.cache`
+
+        Examples:
+            >>> run = Run(model, task='time_course', mode=False)
+            >>> job = await run.run_async(timeout=60)
+            >>> job.status
+            'finished'
+
+        """
+        job = jobs.Job([COPASISE, self.model.copasi_file])
+        hit, pending = self._restore_cached()
+        if hit:
+            return job.restored()
+        await jobs.run_async(job, timeout=timeout, semaphore=semaphore)
+        if job.ok and pending is not None:
+            self.cache.store_run(pending)
+        return job
 
     def run_linux(self):
         """Linux systems do not respond to the run function
@@ -591,45 +733,61 @@ class Run(_Task):
     def submit_copasi_job_SGE(self):
         """Submit copasi file as job to SGE based job scheduler.
 
-        Args:
-          copasi_location: Location to copasi on the sge cluster. Gets passed to `module add` to load copasi
+        The job is a one task array job, see :py:func:`submit_array`. Wait
+        for it with `self.array_job.wait()`
 
         Returns:
-          None
+          :py:class:`jobs.ArrayJob`
 
         """
-        self.sge_job_filename = self.sge_job_filename.replace('/', '_')
-        with open(self.sge_job_filename, 'w') as f:
-            f.write('#!/bin/bash\n#$ -V -cwd\nmodule add {}\nCopasiSE "{}"'.format(
-                self.copasi_location, self.model.copasi_file
-            )
-            )
-
-        ## -N option for job namexx
-        os.system('qsub "{}" -N "{}" '.format(self.sge_job_filename, self.sge_job_filename))
-        os.remove(self.sge_job_filename)
+        self.array_job = submit_array([self.model], scheduler=self.scheduler or jobs.SGE(),
+                                      script=self.sge_job_filename)
+        return self.array_job
 
     def submit_copasi_job_slurm(self):
-        """Submit copasi file as job to SGE based job scheduler.
+        """Submit copasi file as job to a slurm job scheduler.
 
-        Args:
-          copasi_location: Location to copasi on the sge cluster. Gets passed to `module add` to load copasi
+        The job is a one task array job, see :py:func:`submit_array`. Wait
+        for it with `self.array_job.wait()`
 
         Returns:
-          None
+          :py:class:`jobs.ArrayJob`
 
         """
-        self.sge_job_filename = self.sge_job_filename.replace('/', '_')
-        with open(self.sge_job_filename, 'w') as f:
-            f.write('#!/bin/bash\n#$ \nmodule add {}\nCopasiSE "{}"'.format(
-                self.copasi_location, self.model.copasi_file
-            )
-            )
+        self.array_job = submit_array([self.model], scheduler=self.scheduler or jobs.Slurm(),
+                                      script=self.sge_job_filename)
+        return self.array_job
+
 
-        ## -N option for job namexx
-        os.system('sbatch "{}"  --job-name "{}"'.format(self.sge_job_filename, self.sge_job_filename))
-        ## remove .sh file after used.
-        os.remove(self.sge_job_filename)
+def submit_array(models, scheduler, script=None, name=None):
+    """Submit copasi models to a cluster as a single array job, one task per model
+
+    The task each model should run must already be scheduled, i.e. by
+    :py:class:`Run` with mode=False. The models are saved before submission.
+
+    Args:
+        models (list): :py:class:`model.Model` objects
+        scheduler (:py:class:`jobs.SGE` or :py:class:`jobs.Slurm`): where to submit them
+        script (str): Default 'array_job.sh' in the directory of the first model. The job script
+        name (str): Default the script name without extension. The job name
+
+    Returns:
+        :py:class:`jobs.ArrayJob`. Its `wait` method polls the scheduler until
+        every task has finished
+
+    Examples:
+        >>> copies = [Run(i, task='scan', mode=False).model for i in models]
+        >>> job = submit_array(copies, jobs.Slurm(max_active=100))
+        >>> job.wait(callback=lambda job: [viz.Parse(i) for i in scans])
+
+    """
+    if not models:
+        raise errors.InputError('No models to submit')
+    for i in models:
+        i.save()
+    if script is None:
+        script = os.path.join(os.path.dirname(models[0].copasi_file), 'array_job.sh')
+    return scheduler.submit([i.copasi_file for i in models], script, name=name)
 
 
 @mixin(model.GetModelComponentFromStringMixin)
@@ -643,6 +801,7 @@ class RunParallel(_Task):
         self.default_properties = {
             'max_active': None,
             'task': 'parameter_estimation',
+            'cache': None,
         }
         self.default_properties.update(self.kwargs)
         self.default_properties = self.convert_bool_to_numeric(self.default_properties)
@@ -686,6 +845,9 @@ class RunParallel(_Task):
         if self.max_active is None:
             self.max_active = len(self.models)
 
+        if self.cache is not None and not isinstance(self.cache, ResultCache):
+            self.cache = ResultCache(self.cache)
+
     # def __str__(self):
     #     return 'RunParallel({})'.format()
 
@@ -704,46 +866,97 @@ class RunParallel(_Task):
         return model_list
 
     def run_parallel(self):
-        """Run models in parallel. Only have self.max_active
-        models running at once
-        :return:
-            None
+        """Run models in parallel with the bundled CopasiSE. Only have
+        self.max_active models running at once.
 
-        Args:
+        The models are run by a :py:class:`jobs.LocalExecutor`, which blocks
+        until a CopasiSE process exits rather than polling them. The outcome
+        of each run is kept in :py:attr:`RunParallel.jobs` and tabulated by
+        :py:meth:`RunParallel.summary`. Failed runs are logged as warnings.
+        With a cache, models whose reports are cached are not run.
 
         Returns:
+            list: of :py:class:`jobs.Job`, one per model
 
         """
-        pids = []
-        num_models_to_process = len(self.models)
+        self.jobs = [jobs.Job([COPASISE, i.copasi_file]) for i in self.models]
+        pending = {}
+        for job, mod in zip(self.jobs, self.models):
+            hit, pending[id(job)] = _restore_cached(self.cache, mod)
+            if hit:
+                job.restored()
 
-        while num_models_to_process > 0:
+        def store(job):
+            if job.ok and pending[id(job)] is not None:
+                self.cache.store_run(pending[id(job)])
 
-            # for copy_number, model in self.models.items():
-            model = self.models[num_models_to_process - 1]
-            if len(pids) < int(self.max_active):
-                num_models_to_process -= 1
-                subp = subprocess.Popen(['CopasiSE', model.copasi_file])
-                pids.append(subp.pid)
+        jobs.LocalExecutor(max_active=self.max_active).run([i for i in self.jobs if not i.cached], callback=store)
+        return self.jobs
 
-            try:
-                for pid in range(len(pids)):
-                    try:
-                        p = psutil.Process(pids[pid])
-                    except psutil.NoSuchProcess:
-                        LOG.info('No such process: {}. Skipping'.format(pid))
-                        continue
-                    if psutil.pid_exists(pids[pid]) is False:
-                        del pids[pid]
-
-                    if p.status() is 'zombie':
-                        LOG.info('is zombie')
-
-                        del pids[pid]
-
-            except IndexError:
-                LOG.warning('index error skipped')
-                continue
+    def summary(self):
+        """Exit status, duration and stderr of each CopasiSE run
+
+        Returns:
+            pandas.DataFrame, see :py:func:`jobs.summary`
+
+        """
+        return jobs.summary(self.jobs)
+
+
+def _restore_cached(cache, mod):
+    """Restore the reports of running `mod` from `cache`
+
+    Args:
+        cache (:py:class:`result_cache.ResultCache`): or None for no cache
+        mod (:py:class:`model.Model`): a model with its task scheduled
+
+    Returns:
+        tuple: (hit, pending), see :py:meth:`result_cache.ResultCache.restore_run`
+
+    """
+    if cache is None:
+        return False, None
+    return cache.restore_run(mod.xml, mod.copasi_file, COPASISE)
+
+
+async def run_tasks(models, task='time_course', concurrency=None, timeout=None, cache=None):
+    """Run a task of many models with CopasiSE in the running asyncio event loop
+
+    The task is scheduled and the models saved as :py:class:`Run` does.
+    At most `concurrency` CopasiSE processes run at once. Those running
+    longer than `timeout` are killed, as are all running ones if the
+    coroutine is cancelled.
+
+    Args:
+        models (list): of :py:class:`model.Model`
+        task (str): Default 'time_course'. Any task accepted by :py:class:`Run`
+        concurrency (int): Default None, the number of CPUs. Most CopasiSE processes at once
+        timeout (float): Default None. Seconds each CopasiSE process may run for
+        cache (:py:class:`result_cache.ResultCache` or str): Default None. Models
+            whose reports are in the cache are restored from it instead of run
+
+    Returns:
+        list: of :py:class:`jobs.Job`, one per model in order, with the exit
+        status, duration and stderr of each run
+
+    Examples:
+        >>> results = await run_tasks(models, task='scan', concurrency=8, timeout=600)
+        >>> jobs.summary(results)
+
+    """
+    if cache is not None and not isinstance(cache, ResultCache):
+        cache = ResultCache(cache)
+    runs = [Run(i, task=task, mode=False) for i in models]
+    todo = [jobs.Job([COPASISE, i.model.copasi_file]) for i in runs]
+    pending = [_restore_cached(cache, i.model) for i in runs]
+    for job, (hit, _) in zip(todo, pending):
+        if hit:
+            job.restored()
+    await jobs.run_jobs_async([i for i in todo if not i.cached], concurrency=concurrency, timeout=timeout)
+    for job, (_, entry) in zip(todo, pending):
+        if job.ok and not job.cached and entry is not None:
+            cache.store_run(entry)
+    return todo
 
 
 @mixin(model.GetModelComponentFromStringMixin)
@@ -2294,8 +2507,28 @@ class ParameterEstimation(_Task):
         configured and is called `config`
         >>> pe = ParameterEstimation(config)
 
+        The state of each copy of the model is kept in a manifest in the
+        problem directory (see :py:meth:`ParameterEstimation.report_states`).
+        With the `resume` setting a configuration that was interrupted, or
+        had copies fail, is run again without repeating finished copies
+        >>> config.settings.resume = True
+        >>> pe = ParameterEstimation(config)
+
     """
 
+    ## states of a copy of the model in the run manifest
+    CONFIGURED = 'configured'
+    RUNNING = 'running'
+    MISSING = 'missing'
+    EMPTY = 'empty'
+    PARTIAL = 'partial'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    ## settings that change how, not what, is run. They do not invalidate
+    ## the copies of the model a resumed configuration reuses
+    _runtime_settings = ['run_mode', 'max_active', 'resume', 'overwrite_config_file']
+
     valid_methods = ['current_solution_statistics',
                      'differential_evolution',
                      'evolutionary_strategy_sr',
@@ -2359,7 +2592,7 @@ class ParameterEstimation(_Task):
             for i in df.columns:
                 if i.lower() == 'time':
                     roles[i] = 'time'
-                elif i[:-6] == '_indep':
+                elif i[-6:] == '_indep':
                     roles[i] = 'independent'
                 else:
                     roles[i] = 'dependent'
@@ -2461,7 +2694,9 @@ class ParameterEstimation(_Task):
                 'context': 's',
                 'pl_upper_bound': 1000,
                 'pl_lower_bound': 1000,
-                'cross_validation_depth': 1
+                'cross_validation_depth': 1,
+                'resume': False,
+                'engine': 'copasi',
             }
 
     @staticmethod
@@ -3214,7 +3449,7 @@ class ParameterEstimation(_Task):
             """
             return self.items.constraint_items
 
-    def __init__(self, config):
+    def __init__(self, config, scheduler=None):
         """
         Configure a the parameter estimation task in copasi
 
@@ -3224,6 +3459,9 @@ class ParameterEstimation(_Task):
         Args:
             config (ParameterEstimation.Config):
                 An appropriately configured :py:class:`ParameterEstimation.Config` class
+            scheduler (jobs.SGE or jobs.Slurm):
+                Default None, the scheduler of the 'sge' or 'slurm' run_mode with
+                its default commands. Where copies are submitted in those run modes
 
         Examples:
             See :py:class:`ParameterEstimation.Config` or :py:class:`ParameterEstimation.Context`
@@ -3234,10 +3472,28 @@ class ParameterEstimation(_Task):
 
             Assuming the :py:class:`ParameterEstimation.Config` class has already been created
             >>> pe = ParameterEstimation(config)
+
+            On a slurm cluster every copy is submitted as one array job.
+            Block until it finishes and parse the results
+            >>> config.settings.run_mode = 'slurm'
+            >>> pe = ParameterEstimation(config, scheduler=jobs.Slurm(module='COPASI/4.22.170'))
+            >>> data = pe.wait()
         """
         self.config = config
+        self.scheduler = scheduler
         self.do_checks()
 
+        self.results = None
+        self.manifest = None
+        self.array_job = None
+        self._submitted = []
+        if self.config.settings.engine == 'native':
+            ## nothing to configure on disk
+            self.model_copies = {}
+            if self.config.settings.run_mode is not False:
+                self.results = self.run_native()
+            return
+
         self.model_copies = self._setup()
 
         if self.config.settings.run_mode is not False:
@@ -3251,6 +3507,10 @@ class ParameterEstimation(_Task):
                 f'but was expecting an instance of '
                 f'ParameterEstimation.Config'
             )
+        if self.config.settings.engine not in ['copasi', 'native']:
+            raise errors.InputError(
+                f'settings.engine should be "copasi" or "native". Got "{self.config.settings.engine}"'
+            )
 
     def __str__(self):
         return f"ParameterEstimation(\n\t{self.config}\n)"
@@ -4663,28 +4923,243 @@ class ParameterEstimation(_Task):
                 dct[model_name][i] = new_file
         return dct
 
+    @staticmethod
+    def _report_state(report, expected_rows=None):
+        """
+        Inspect a parameter estimation report file
+
+        The first line of a report is its title or, once parsed by
+        :py:class:`viz.Parse`, its header. Every other line is a parameter set.
+
+        Args:
+            report (str): path to the report
+            expected_rows (int): Default None. Parameter sets in a finished
+                report. When None any number will do
+
+        Returns:
+            str. 'missing' when there is no file, 'empty' when it has no
+            parameter sets, 'partial' when its last line is cut short or it has
+            fewer than `expected_rows` parameter sets, else 'finished'
+
+        """
+        if not os.path.isfile(report):
+            return ParameterEstimation.MISSING
+        with open(report, 'rb') as f:
+            rows = f.read().splitlines(keepends=True)[1:]
+        truncated = bool(rows) and not rows[-1].endswith(b'\n')
+        complete = [i for i in rows if i.endswith(b'\n') and i.strip()]
+        if not complete and not truncated:
+            return ParameterEstimation.EMPTY
+        if truncated or (expected_rows is not None and len(complete) < expected_rows):
+            return ParameterEstimation.PARTIAL
+        return ParameterEstimation.FINISHED
+
+    def _expected_rows(self):
+        """Parameter sets in a finished report. None for a profile likelihood,
+        whose scan has as many as it has steps"""
+        if self.config.settings.context == 'pl':
+            return None
+        return int(self.config.settings.pe_number)
+
+    def report_states(self):
+        """
+        Inspect the report of each copy of the model
+
+        Returns:
+            dict[model_name][copy_number] = state. See :py:meth:`ParameterEstimation._report_state`
+
+        """
+        expected_rows = self._expected_rows()
+        return {
+            model_name: {
+                copy_number: self._report_state(report, expected_rows)
+                for copy_number, report in reports.items()
+            } for model_name, reports in self._enumerate_output().items()
+        }
+
+    @property
+    def manifest_file(self):
+        """
+        The run manifest, a json file in the fit directory. It holds a
+        fingerprint of the configuration and, for each copy of each model,
+        its copasi file, report, state and the history of its states. Each
+        fit has its own so that fits running at the same time do not
+        overwrite each other
+
+        Returns:
+            str. A file path
+        """
+        return os.path.join(self.fit_dir, 'manifest.json')
+
+    def _fingerprint(self):
+        """
+        Digest of what the configuration runs: the configuration without
+        the runtime settings, the content of the experiment files and the
+        functions and model definition of each configured model. The tasks
+        and reports of the models are left out because configuring writes them
+
+        Returns:
+            str. A sha256 hex digest
+
+        """
+        config = json.loads(self.config.to_json())
+        for setting in self._runtime_settings:
+            config['settings'].pop(setting, None)
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+        for datasets in [config['datasets']['experiments'], config['datasets']['validations']]:
+            for name in sorted(datasets):
+                filename = datasets[name].get('filename')
+                if filename is not None and os.path.isfile(filename):
+                    with open(filename, 'rb') as f:
+                        digest.update(hashlib.sha256(f.read()).digest())
+        for model_name in sorted(self.models):
+            xml = self.models[model_name].model.xml
+            for tag in ['ListOfFunctions', 'Model']:
+                element = xml.find('{http://www.copasi.org/static/schema}' + tag)
+                if element is not None:
+                    digest.update(hashlib.sha256(etree.tostring(element)).digest())
+        return digest.hexdigest()
+
+    def _read_manifest(self):
+        """
+        Read the run manifest
+
+        Returns:
+            dict. Empty when there is no manifest or it is unreadable
+
+        """
+        try:
+            with open(self.manifest_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            LOG.warning(f'Ignoring unreadable manifest "{self.manifest_file}"')
+            return {}
+
+    def _write_manifest(self):
+        """Atomically replace the run manifest. The temporary file is synced
+        before the rename so that a crash cannot leave an empty manifest behind"""
+        fd, temp = tempfile.mkstemp(prefix='manifest.', suffix='.tmp', dir=self.fit_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.manifest, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.manifest_file)
+        except BaseException:
+            if os.path.isfile(temp):
+                os.remove(temp)
+            raise
+
+    def _new_manifest(self, models):
+        """
+        Start the manifest entry of this fit with every copy configured
+
+        Args:
+            models: dict of models. Output from _setup()
+
+        Returns:
+            None
+
+        """
+        reports = self._enumerate_output()
+        self.manifest = {'fingerprint': self._fingerprint(), 'copies': {}}
+        for model_name in models:
+            self.manifest['copies'][model_name] = {}
+            for copy_number, mod in models[model_name].items():
+                self.manifest['copies'][model_name][str(copy_number)] = {
+                    'copasi_file': mod.copasi_file,
+                    'report': reports[model_name][copy_number],
+                    'state': None,
+                    'returncode': None,
+                    'history': [],
+                }
+                self._record(model_name, copy_number, self.CONFIGURED, write=False)
+        self._write_manifest()
+
+    def _record(self, model_name, copy_number, state, returncode=None, write=True):
+        """
+        Record the state of a copy of a model in the manifest
+
+        Args:
+            model_name (str): name of the model
+            copy_number (int): the copy
+            state (str): its new state
+            returncode (int): Default None. Exit status of CopasiSE, if known
+            write (bool): Default True. Write the manifest to disk
+
+        Returns:
+            None
+
+        """
+        entry = self.manifest['copies'][model_name][str(copy_number)]
+        entry['returncode'] = returncode
+        if entry['state'] != state:
+            entry['state'] = state
+            entry['history'].append([state, time.time()])
+        if write:
+            self._write_manifest()
+
+    def _resumed_copies(self):
+        """
+        Copies of the models configured by an earlier, identical, configuration
+
+        Returns:
+            dict[model_name][copy_number] = :py:class:`model.Model`, or None when the
+            configuration has changed or a copy is gone and the models must
+            be copied again
+
+        """
+        entry = self._read_manifest()
+        if not entry:
+            return None
+        if entry.get('fingerprint') != self._fingerprint():
+            LOG.info('The configuration has changed since it last ran. Not resuming')
+            return None
+        copies = {}
+        for model_name in self.models:
+            files = entry['copies'].get(model_name, {})
+            if len(files) != int(self.config.settings.copy_number):
+                return None
+            copies[model_name] = {}
+            for copy_number in range(int(self.config.settings.copy_number)):
+                copasi_file = files.get(str(copy_number), {}).get('copasi_file')
+                if copasi_file is None or not os.path.isfile(copasi_file):
+                    LOG.info(f'"{copasi_file}" is gone. Not resuming')
+                    return None
+                ## parsed only if it runs again
+                copies[model_name][copy_number] = model.Model(copasi_file, lazy=True)
+        self.manifest = entry
+        for model_name, states in self.report_states().items():
+            for copy_number, state in states.items():
+                ## failures are only known from the exit status
+                previous = entry['copies'][model_name][str(copy_number)]
+                if not (previous['state'] == self.FAILED and state != self.FINISHED):
+                    self._record(model_name, copy_number, state, previous['returncode'], write=False)
+        self._write_manifest()
+        return copies
+
     def _copy_model(self):
         """
-        Copy the model n times Uses deep copy to ensure separate models
+        Copy the model n times into the fit directory. The copies are clones
+        of the configured model in memory. Each is written when its scan is
+        set up (see :py:meth:`ParameterEstimation._setup_scan`)
         Returns:
             dict[index] = model copy
         """
         dct = {}
         for model_name in self.models:
             mod = self.models[model_name].model
-            ## a save is required here to 'commit' changed to xml before copying
+            ## keep the configured parameter estimation in the original file
             mod.save()
-            ## copy model into fit problem dir
             fle = os.path.split(mod.copasi_file)[1]
-            fname = os.path.join(self.models_dir[model_name], fle)
-            shutil.copy(mod.copasi_file, fname)
             dct[model_name] = {}
-            dct[model_name][0] = model.Model(fname)
+            ## clones share the component tables instead of parsing each file again
+            dct[model_name][0] = mod.clone(os.path.join(self.models_dir[model_name], fle))
             for i in range(1, int(self.config.settings.copy_number)):
-                # dire, fle = os.path.split(fname)
                 new_cps = os.path.join(self.models_dir[model_name], fle[:-4] + f'_{i}.cps')
-                shutil.copy(fname, new_cps)
-                dct[model_name][i] = model.Model(new_cps)
+                dct[model_name][i] = mod.clone(new_cps)
         return dct
 
     def _setup1scan(self, q, mod, report):
@@ -4785,7 +5260,9 @@ class ParameterEstimation(_Task):
         Setup the copasi parameter estimation task
 
         Uses the other methods in this class to configure the parameter estimation
-        according to the :py:class:`ParameterEstimation.Config`
+        according to the :py:class:`ParameterEstimation.Config`. With the resume
+        setting the copies of the models made by an earlier run of the same
+        configuration are reused
         Returns:
             dict[model_name][sub_model_index] = :py:class:`model.Model` object
 
@@ -4809,10 +5286,13 @@ class ParameterEstimation(_Task):
         self._set_options()
         self._set_method()
 
-        ##copy
-        copied_models = self._copy_model()
-        ##configure scan task
-        copied_models = self._setup_scan(copied_models)
+        copied_models = self._resumed_copies() if self.config.settings.resume else None
+        if copied_models is None:
+            ##copy
+            copied_models = self._copy_model()
+            ##configure scan task
+            copied_models = self._setup_scan(copied_models)
+            self._new_manifest(copied_models)
 
         return copied_models
 
@@ -4820,6 +5300,10 @@ class ParameterEstimation(_Task):
         """
         Run a parameter estimation using command line copasi.
 
+        With the 'sge' and 'slurm' run modes the copies are submitted as a
+        single array job and this returns at once. Use
+        :py:meth:`ParameterEstimation.wait` to wait for them.
+
         Args:
           models: dict of models. Output from _setup()
 
@@ -4828,33 +5312,166 @@ class ParameterEstimation(_Task):
 
         """
 
-        if self.config.settings.run_mode == 'sge':
-            try:
-                check_call('qhost')
-            except errors.NotImplementedError:
+        if self.config.settings.run_mode in ['sge', 'slurm']:
+            if self.scheduler is None:
+                self.scheduler = jobs.SGE() if self.config.settings.run_mode == 'sge' else jobs.Slurm()
+            if shutil.which(self.scheduler.submit_command) is None:
                 LOG.warning(
-                    'Attempting to run in SGE mode but SGE specific commands are unavailable. Switching to \'parallel\' mode')
+                    f'Attempting to run in {self.config.settings.run_mode} mode but "{self.scheduler.submit_command}" '
+                    f'is unavailable. Switching to \'parallel\' mode')
                 self.config.settings.run_mode = 'parallel'
 
-        if self.config.settings.run_mode == 'parallel':
-            for model_name in models:
-                RunParallel(
-                    list(models[model_name].values()),
+        if not self.config.settings.run_mode:
+            return
+
+        if self.config.settings.run_mode not in ['parallel', True, 'sge', 'slurm']:
+            raise ValueError('"{}" is not a valid argument'.format(self.config.settings.run_mode))
+
+        todo = self._pending(models)
+        if self.config.settings.run_mode in ['sge', 'slurm']:
+            self._submitted = [(model_name, i) for model_name in todo for i in todo[model_name]]
+            if not self._submitted:
+                return
+            copies = [Run(models[model_name][i], mode=False, task='scan').model for model_name, i in self._submitted]
+            for model_name, copy_number in self._submitted:
+                self._record(model_name, copy_number, self.RUNNING, write=False)
+            self._write_manifest()
+            ## one array job for every copy of every model
+            self.array_job = submit_array(
+                copies, self.scheduler,
+                script=os.path.join(self.fit_dir, f'{self.config.settings.problem}_Fit{self.config.settings.fit}.sh'))
+
+        elif self.config.settings.run_mode == 'parallel':
+            for model_name in todo:
+                if not todo[model_name]:
+                    continue
+                for copy_number in todo[model_name]:
+                    self._record(model_name, copy_number, self.RUNNING, write=False)
+                self._write_manifest()
+                runner = RunParallel(
+                    [models[model_name][i] for i in todo[model_name]],
                     mode=self.config.settings.run_mode,
                     max_active=self.config.settings.max_active,
                     task='scan')
+                for copy_number, job in zip(todo[model_name], runner.jobs):
+                    self._record_outcome(model_name, copy_number, job.returncode)
 
-        elif self.config.settings.run_mode is True:
-            for model_name in models:
-                for copy_number, mod in list(models[model_name].items()):
+        else:
+            for model_name in todo:
+                for copy_number in todo[model_name]:
                     LOG.info(f'running model {model_name}: {copy_number}')
-                    Run(mod, mode=self.config.settings.run_mode, task='scan')
+                    self._record(model_name, copy_number, self.RUNNING)
+                    Run(models[model_name][copy_number], mode=self.config.settings.run_mode, task='scan')
+                    self._record_outcome(model_name, copy_number)
 
-        elif not self.config.settings.run_mode:
-            pass
+    def wait(self, interval=5, max_interval=300, timeout=None):
+        """
+        Wait for the copies submitted with the 'sge' or 'slurm' run_mode to
+        finish, record their state in the manifest and parse the results.
+        The scheduler is polled with backoff, see :py:meth:`jobs.ArrayJob.wait`
 
-        else:
-            raise ValueError('"{}" is not a valid argument'.format(self.config.settings.run_mode))
+        Args:
+            interval (float): Default 5. Seconds before the second poll
+            max_interval (float): Default 300. Longest delay between polls
+            timeout (float): Default None. Seconds to wait before raising
+                :py:class:`errors.SchedulerError`
+
+        Returns:
+            :py:class:`viz.Parse` of the results
+
+        """
+        if self.array_job is not None:
+            self.array_job.wait(interval=interval, max_interval=max_interval, timeout=timeout)
+            for model_name, copy_number in self._submitted:
+                self._record_outcome(model_name, copy_number)
+        return viz.Parse(self)
+
+    def _pending(self, models):
+        """
+        Copies of the models to run. When resuming, copies whose report is
+        finished are left out. Left over reports of the others are removed
+        so that a copy that fails again is not mistaken for a finished one
+
+        Args:
+          models: dict of models. Output from _setup()
+
+        Returns:
+            dict[model_name] = list of copy numbers
+
+        """
+        reports = self._enumerate_output()
+        todo = {}
+        for model_name in models:
+            todo[model_name] = []
+            for copy_number in models[model_name]:
+                state = self.manifest['copies'][model_name][str(copy_number)]['state']
+                if self.config.settings.resume and state == self.FINISHED:
+                    continue
+                if os.path.isfile(reports[model_name][copy_number]):
+                    os.remove(reports[model_name][copy_number])
+                todo[model_name].append(copy_number)
+            if self.config.settings.resume:
+                LOG.info(f'{model_name}: running {len(todo[model_name])} of '
+                         f'{len(models[model_name])} copies, the rest are finished')
+        return todo
+
+    def _record_outcome(self, model_name, copy_number, returncode=None):
+        """
+        Record the state of a copy of a model once CopasiSE has run it
+
+        Args:
+            model_name (str): name of the model
+            copy_number (int): the copy
+            returncode (int): Default None. Exit status of CopasiSE, if known
+
+        Returns:
+            None
+
+        """
+        state = self._report_state(self._enumerate_output()[model_name][copy_number], self._expected_rows())
+        if state != self.FINISHED and returncode not in [None, 0]:
+            state = self.FAILED
+        if state != self.FINISHED:
+            LOG.warning(f'{model_name}: copy {copy_number} is {state}. Run again with the resume setting to retry it')
+        self._record(model_name, copy_number, state, returncode)
+
+    def run_native(self):
+        """
+        Run the parameter estimation in process with the native engine
+
+        Used instead of :py:meth:`ParameterEstimation.run` when the engine setting
+        is 'native'. Each model is scored by a :py:class:`native.Objective` and
+        optimised from copy_number * pe_number starts with :py:func:`native.estimate`.
+        With run_mode 'parallel' max_active processes share the work: the starts
+        of local methods, or each generation of the population methods.
+        Results are written to the results directory in the layout
+        :py:class:`viz.Parse` reads.
+
+        Returns:
+            dict[model_name] = pandas.DataFrame of parameter sets sorted by RSS
+
+        """
+        settings = self.config.settings
+        processes = settings.max_active if settings.run_mode == 'parallel' else 1
+        results = {}
+        for model_name in self.models:
+            objective = native.Objective(self.config, model_name)
+            starts = native.start_values(objective, settings.copy_number * settings.pe_number,
+                                         randomize=settings.randomize_start_values, seed=settings.seed)
+            df = native.estimate(
+                objective, settings.method, starts, processes=processes, seed=settings.seed,
+                iteration_limit=settings.iteration_limit, tolerance=settings.tolerance,
+                number_of_generations=settings.number_of_generations,
+                population_size=settings.population_size, swarm_size=settings.swarm_size,
+                std_deviation=settings.std_deviation, number_of_iterations=settings.number_of_iterations,
+            )
+            df.to_csv(os.path.join(self.results_directory[model_name], settings.report_name),
+                      sep='\t', index=False)
+            if settings.update_model:
+                model.InsertParameters(self.models[model_name].model, df=df, index=0,
+                                       quantity_type=settings.quantity_type, inplace=True)
+            results[model_name] = df
+        return results
 
     class Context:
         """
@@ -5352,7 +5969,15 @@ class ParameterEstimation(_Task):
 @mixin(model.GetModelComponentFromStringMixin)
 @mixin(model.ReadModelMixin)
 class Sensitivities(_Task):
-    """Interface to COPASI sensitivity task"""
+    """Interface to COPASI sensitivity task
+
+    With engine='native' the sensitivities of the time course are not read
+    from a COPASI report but integrated in process by
+    :py:func:`native.sensitivities` for every output time from `start`
+    to `end` by `step_size`. The `sensitivities` attribute is then
+    indexed by (Time, effect) and the whole (times, variables, causes)
+    array is in `array`. Only the time_series subtask is native.
+    """
 
     ## subtasks
     subtasks = {
@@ -5441,6 +6066,20 @@ class Sensitivities(_Task):
 
     update_model = False
 
+    _native_causes = [
+        'single_object',
+        'local_parameters',
+        'all_parameters',
+        'initial_concentrations',
+        'all_parameters_and_initial_concentrations',
+    ]
+
+    _native_effects = [
+        'single_object',
+        'all_variables',
+        'non_constant_species_concentrations',
+    ]
+
     def __init__(self, model, **kwargs):
         self.model = self.read_model(model)
         default_report_name = os.path.join(os.path.dirname(self.model.copasi_file), 'sensitivities.txt')
@@ -5460,6 +6099,13 @@ class Sensitivities(_Task):
             'confirm_overwrite': False,
             'scheduled': True,
             'run': True,
+            'engine': 'copasi',
+            'start': 0,
+            'end': 1,
+            'step_size': 0.01,
+            'method': 'BDF',
+            'relative_tolerance': 1e-6,
+            'absolute_tolerance': 1e-12,
         }
 
         default_properties.update(kwargs)
@@ -5468,6 +6114,10 @@ class Sensitivities(_Task):
         self.update_properties(default_properties)
         self._do_checks()
 
+        if self.engine == 'native':
+            self.times, self.array, self.sensitivities = self.native_sensitivities()
+            return
+
         ## change signle obejct reference for the pycotools3 model variable equiv
         self.get_single_object_references()
         ## add a report to output specifications
@@ -5495,6 +6145,20 @@ class Sensitivities(_Task):
 
     def _do_checks(self):
         """ """
+        if self.engine not in ['copasi', 'native']:
+            raise errors.InputError('engine "{}" not in "{}"'.format(self.engine, ['copasi', 'native']))
+
+        if self.engine == 'native':
+            if self.subtask != 'time_series':
+                raise errors.InputError('The native engine only computes the "time_series" '
+                                        'subtask. Got "{}"'.format(self.subtask))
+            if self.cause not in self._native_causes:
+                raise errors.InputError('cause "{}" not available with the native engine. These '
+                                        'are available: "{}"'.format(self.cause, self._native_causes))
+            if self.effect not in self._native_effects:
+                raise errors.InputError('effect "{}" not available with the native engine. These '
+                                        'are available: "{}"'.format(self.effect, self._native_effects))
+
         if self.subtask == 'evaluation':
             if self.cause not in self.evaluation_cause:
                 raise errors.InputError('cause "{}" not in "{}"'.format(self.cause, self.evaluation_cause))
@@ -5846,6 +6510,54 @@ class Sensitivities(_Task):
         df[self.effect] = new_index
         return df.set_index(self.effect)
 
+    def native_causes(self):
+        """Names of the parameters, compartments and species that
+        `cause` means for :py:func:`native.sensitivities`"""
+        compiled = native.compile_model(self.model)
+        parameters = native.sensitivity_labels(self.model)[1]
+        locals_ = [i.global_name for i in self.model.local_parameters]
+        species = [i.name for i in self.model.metabolites if i.name in compiled.state_index]
+        if self.cause == 'single_object':
+            return [self.cause_single_object]
+        elif self.cause == 'local_parameters':
+            return [i for i in parameters if i in locals_]
+        elif self.cause == 'initial_concentrations':
+            return species
+        elif self.cause == 'all_parameters_and_initial_concentrations':
+            return parameters + species
+        return parameters
+
+    def native_sensitivities(self):
+        """Sensitivities of the whole time course from the native engine
+
+        Returns:
+            tuple: (times, array, df). The array has shape (times, effects, causes)
+            and df is the array stacked into rows indexed by (Time, effect)
+
+        """
+        causes = self.native_causes()
+        variables = native.sensitivity_labels(self.model, causes)[0]
+        array = native.sensitivities(self.model, self.start, self.end, self.step_size, causes,
+                                     method=self.method, relative_tolerance=self.relative_tolerance,
+                                     absolute_tolerance=self.absolute_tolerance)
+        if self.effect == 'single_object':
+            effects = [self.effect_single_object]
+        elif self.effect == 'non_constant_species_concentrations':
+            species = [i.name for i in self.model.metabolites]
+            effects = [i for i in variables if i in species]
+        else:
+            effects = variables
+        for i in effects:
+            if i not in variables:
+                raise errors.InputError('"{}" is not integrated so has no sensitivities. These '
+                                        'are: "{}"'.format(i, variables))
+        array = array[:, [variables.index(i) for i in effects], :]
+        times = native.time_points(self.start, self.end, self.step_size)
+        index = pandas.MultiIndex.from_product([times, effects], names=['Time', self.effect])
+        df = pandas.DataFrame(array.reshape(-1, len(causes)), index=index, columns=causes)
+        df.columns.name = self.cause
+        return times, array, df
+
 
 class FIM(Sensitivities):
     """Let S = matrix of partial derivatives of metabolites with respect to
@@ -5871,7 +6583,8 @@ class FIM(Sensitivities):
 
     @property
     def fim(self):
-        """ """
+        """With engine='native' the sum over every output time of
+        the time course"""
         return self.sensitivities.transpose().dot(self.sensitivities)
 
 
@@ -120,7 +120,7 @@ import scipy
 import os
 import matplotlib
 import itertools
-from . import tasks, errors, misc, model
+from . import tasks, errors, misc, model, native
 import seaborn
 import logging
 from subprocess import check_call, Popen
@@ -1437,6 +1437,10 @@ class PlotTimeCourseEnsemble(_Viz):
     run_mode            `str` or `bool`. Passed to :py:class:`tasks.Run`
                         Optionally perform time course simulations in parallel
                         by giving ``run_mode=multiprocess``
+    engine              `str`. Default 'copasi'. 'native' simulates all
+                        parameter sets together in process with
+                        :py:func:`native.simulate_ensemble` instead of
+                        running CopasiSE once per set
     copasi_file         `str` path to copasi file that was used to generate
                         parameter ensemble. Must be still configured for
                         parameter estimation in order to extract parameter headers
@@ -1497,6 +1501,7 @@ class PlotTimeCourseEnsemble(_Viz):
                    'ylabel': None,
                    'xlabel': None,
                    'run_mode': True,
+                   'engine': 'copasi',
                    'despine': True,
                    'legend': True,
                    'legend_loc': (1, 0.1),
@@ -1701,13 +1706,21 @@ class PlotTimeCourseEnsemble(_Viz):
 
             I = model.InsertParameters(self.cls.model, parameter_dict=indep_vars, inplace=True)
             d[exp_file] = OrderedDict()
+            if self.engine == 'native':
+                df_dct[os.path.split(exp_file)[1][:-4]] = self._simulate_ensemble_natively(
+                    I.model, max(end_times))
+                continue
+
+            ## resolve the parameter names once for every parameter set
+            plan = model.InsertionPlan(I.model, self.data.columns)
             for i in range(self.data.shape[0]):
-                I = model.InsertParameters(self.cls.model, df=self.data, index=i, inplace=True)
+                plan.apply(self.data.iloc[i])
+                plan.model.save()
 
                 if not self.silent:
                     LOG.info('inserting parameter set {}'.format(i))
-                    LOG.info(I.parameters.transpose().sort_index())
-                TC = tasks.TimeCourse(I.model,
+                    LOG.info(self.data.iloc[i].sort_index())
+                TC = tasks.TimeCourse(plan.model,
                                       end=max(end_times),
                                       step_size=self.step_size,
                                       intervals=intervals,
@@ -1719,6 +1732,26 @@ class PlotTimeCourseEnsemble(_Viz):
             df_dct[os.path.split(exp_file)[1][:-4]] = pandas.concat(d[exp_file])
         return pandas.concat(df_dct)
 
+    def _simulate_ensemble_natively(self, mod, end):
+        """Simulate every parameter set at once with :py:func:`native.simulate_ensemble`
+
+        Args:
+            mod (:py:class:`model.Model`): model with the independent variables inserted
+            end (float): end time
+
+        Returns:
+            pandas.DataFrame indexed like the output of :py:meth:`simulate_ensemble`
+            for one experiment
+
+        """
+        results = native.simulate_ensemble(mod, self.data, 0, end, self.step_size, species='mg')
+        times = pandas.Index(native.time_points(0, end, self.step_size), name='Time')
+        variables = mod.get_variable_names(which='mg', include_assignments=True)
+        return pandas.concat(OrderedDict(
+            (i, pandas.DataFrame(results[:, i, :], index=times, columns=variables))
+            for i in range(results.shape[1])
+        ))
+
     @property
     def observables(self):
         """
@@ -77,7 +77,8 @@ setup(
     extras_require={
         'docs': [
             'sphinx >= 1.4',
-            'sphinx_rtd_theme']
+            'sphinx_rtd_theme'],
+        'native': ['sympy'],
     },
     python_requires='>=3'
 )